@@ -1,3 +1,162 @@
 """PromptLab - AI Prompt Engineering Platform"""
 
 __version__ = "0.1.0"
+
+
+def create_app(config=None, storage=None):
+    """Build a PromptLab application.
+
+    Importing the package is cheap: FastAPI, the routes and optional
+    subsystems (profiling, admission control, snapshots, the blob compactor,
+    search workers, background jobs, tenants) are only imported here, when an
+    application is actually built.
+
+    With tenants enabled, ``storage`` serves the default tenant. Every other
+    tenant's store is set up the same way on first use, with its blob
+    directory under ``<blob_dir>/tenants/<tenant>`` and its snapshot at
+    ``<snapshot_path>.<tenant>``.
+
+    Args:
+        config (Optional[Settings]): Runtime settings; read from the environment if None.
+        storage (Optional[Storage]): The store to serve; the global ``storage`` if None.
+
+    Returns:
+        FastAPI: The configured application.
+
+    Example:
+        >>> from app import create_app
+        >>> from app.config import Settings
+        >>> application = create_app(Settings(snapshot_path="snapshot.bin"))
+    """
+    from contextlib import asynccontextmanager
+
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+
+    from app.api import router
+    from app.config import Settings
+    from app.jobs import JobRunner
+    from app.metrics import MetricsMiddleware, Registry, register_storage_sizes
+
+    if config is None:
+        config = Settings.from_env()
+    if storage is None:
+        from app.storage import storage
+
+    def snapshot_path(tenant):
+        if tenant is None:
+            return config.snapshot_path
+        return f"{config.snapshot_path}.{tenant}"
+
+    def set_up(tenant, store):
+        # ``tenant`` is None for the application's own store
+        store.set_near_duplicate_threshold(config.near_duplicate_threshold)
+        store.configure_search(config.search_workers)
+        store.set_tombstone_retention(config.tombstone_retention)
+        store.configure_journal(config.journal_max_entries, config.journal_max_bytes,
+                                config.journal_retention)
+        if config.tenants_enabled:
+            store.set_quota(config.tenant_max_prompts or None, config.tenant_max_bytes or None)
+
+        if config.blob_dir:
+            import os
+            from app.blobstore import BlobStore
+            blob_dir = config.blob_dir if tenant is None else os.path.join(
+                config.blob_dir, "tenants", tenant)
+            store.attach_blob_store(BlobStore(blob_dir, config.blob_threshold))
+
+        if config.snapshot_path:
+            import os
+            from app.snapshot import load_snapshot
+            if os.path.exists(snapshot_path(tenant)):
+                load_snapshot(store, snapshot_path(tenant))
+
+    set_up(None, storage)
+
+    # Scrape-time gauges over this application's stores; process-wide
+    # request and storage metrics stay on the global registry.
+    metrics = Registry()
+    tenants = None
+    if config.tenants_enabled:
+        from app.metrics import register_tenant_usage
+        from app.tenants import DEFAULT_TENANT, TenantRegistry
+        tenants = TenantRegistry(storage, set_up, allowed=config.tenant_allowlist or None,
+                                 max_tenants=config.tenant_max_tenants)
+        register_tenant_usage(metrics, tenants)
+
+    def stores():
+        if tenants is None:
+            return [(None, storage)]
+        return [(None if tenant == DEFAULT_TENANT else tenant, store)
+                for tenant, store in tenants.items()]
+
+    jobs = JobRunner(config.job_workers)
+
+    @asynccontextmanager
+    async def lifespan(application):
+        compactor = None
+        if config.blob_dir:
+            from app.blobstore import BlobCompactor
+            compactor = BlobCompactor(tenants or storage, config.blob_compact_interval)
+            compactor.start()
+        if config.gc_freeze:
+            import gc
+            # Startup state (a loaded snapshot, above all) lives for the whole
+            # process: keep it out of later collections instead of re-scanning
+            # it on every gen-2 pass.
+            gc.collect()
+            gc.freeze()
+        yield
+        if compactor is not None:
+            compactor.stop()
+        jobs.shutdown()
+        for _, store in stores():
+            store.close_search()
+        if config.snapshot_path and config.snapshot_on_shutdown:
+            from app.snapshot import write_snapshot
+            for tenant, store in stores():
+                write_snapshot(store, snapshot_path(tenant))
+
+    application = FastAPI(
+        title="PromptLab API",
+        description="AI Prompt Engineering Platform",
+        version=__version__,
+        lifespan=lifespan,
+    )
+    application.state.storage = storage
+    application.state.config = config
+    application.state.jobs = jobs
+    application.state.tenants = tenants
+    application.state.metrics = metrics
+    application.include_router(router)
+    if tenants is not None:
+        from app.tenants import TENANT_PREFIX
+        application.include_router(router, prefix=TENANT_PREFIX)
+
+    # Admission control (inside CORS, so rejections still carry CORS headers)
+    if config.admission_enabled:
+        from app.admission import install_admission
+        install_admission(application, config)
+
+    # CORS middleware
+    application.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["ETag"],
+    )
+
+    # Metrics middleware (outermost, so it also times CORS handling)
+    application.add_middleware(MetricsMiddleware)
+    from app.tenants import DEFAULT_TENANT
+    register_storage_sizes(metrics, lambda: tenants.items() if tenants is not None
+                           else [(DEFAULT_TENANT, storage)])
+
+    # Per-request profiling hook (installed only when enabled in settings)
+    if config.profiling_enabled:
+        from app.profiling import install_profiling
+        install_profiling(application, config)
+
+    return application
@@ -0,0 +1,287 @@
+"""Admission control and load shedding for PromptLab
+
+Two mechanisms protect the server when it is overloaded:
+
+- A per-client token bucket rate limiter. Clients are identified by their
+  address. The ``X-Client-Id`` header is only honoured on requests arriving
+  from a configured trusted proxy, so a client cannot pick a fresh identity
+  per request. A client with an empty bucket gets ``429 Too Many Requests``.
+- Concurrency limiters with separate budgets for expensive routes (scans of
+  the whole corpus such as ``GET /prompts?search=``) and for cheap routes
+  (point lookups and writes). A request waits for a slot in its budget for at
+  most the queue wait target. If the expected wait is already longer than the
+  target, the request is rejected at once with ``503 Service Unavailable``.
+
+Both rejections carry a ``Retry-After`` header. A burst of searches can then
+only fill the expensive budget, and ``GET /prompts/{id}`` keeps its own slots.
+``/health`` and ``/metrics`` are never throttled.
+
+Admission control is off unless ``Settings.admission_enabled`` is set.
+"""
+
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, deque
+from typing import Deque, Optional, Tuple
+
+from app.config import Settings
+from app.metrics import ADMISSION_QUEUE_WAIT, ADMISSION_SHED
+from app.tenants import strip_tenant_prefix
+
+EXEMPT_PATHS = frozenset({"/health", "/metrics"})
+
+# (method, path) pairs whose handlers scan the whole corpus.
+EXPENSIVE_ROUTES = frozenset({
+    ("GET", "/prompts"),
+    ("GET", "/prompts:search"),
+    ("GET", "/prompts:near-duplicates"),
+    ("POST", "/prompts:bulk-update"),
+    ("POST", "/restore"),
+})
+
+# Weight of the newest sample in the moving average of slot hold times.
+SERVICE_TIME_ALPHA = 0.2
+
+
+class RateLimiter:
+    """Per-client token buckets.
+
+    Each client may make ``burst`` requests at once and then ``rate``
+    requests per second. Only the ``max_clients`` most recently seen clients
+    are tracked, so memory stays bounded.
+
+    Attributes:
+        rate (float): Tokens added per second.
+        burst (int): Bucket capacity.
+        max_clients (int): Number of buckets kept.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10_000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, client: str, now: Optional[float] = None) -> float:
+        """Take one token from ``client``'s bucket.
+
+        Args:
+            client (str): The client identity.
+            now (Optional[float]): Current ``time.monotonic()`` value, for tests.
+
+        Returns:
+            float: 0.0 if the request is allowed, otherwise seconds until a token is free.
+
+        Example:
+            >>> limiter = RateLimiter(rate=1.0, burst=1)
+            >>> limiter.acquire("alice"), limiter.acquire("alice") > 0
+            (0.0, True)
+        """
+        if now is None:
+            now = time.monotonic()
+        tokens, updated = self._buckets.pop(client, (float(self.burst), now))
+        tokens = min(float(self.burst), tokens + (now - updated) * self.rate)
+        if tokens >= 1.0:
+            tokens -= 1.0
+            wait = 0.0
+        else:
+            wait = (1.0 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+class ConcurrencyLimiter:
+    """A concurrency budget with a bounded queue wait.
+
+    At most ``limit`` requests hold a slot. Further requests wait in FIFO
+    order, but never longer than ``queue_wait_target``. The expected wait is
+    estimated from the queue length and a moving average of slot hold times.
+    If it already exceeds the target, the request is rejected immediately
+    instead of queueing first.
+
+    Attributes:
+        limit (int): Number of slots.
+        queue_wait_target (float): Longest time in seconds a request may wait.
+        active (int): Slots currently held.
+        service_time (float): Moving average of seconds a slot is held.
+    """
+
+    def __init__(self, limit: int, queue_wait_target: float):
+        self.limit = limit
+        self.queue_wait_target = queue_wait_target
+        self.active = 0
+        self.service_time = 0.0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        """Number of requests waiting for a slot."""
+        return len(self._waiters)
+
+    def estimated_wait(self) -> float:
+        """Expected seconds until a newly queued request gets a slot.
+
+        Returns:
+            float: The estimate, 0.0 before any slot has been released.
+        """
+        return (len(self._waiters) + 1) * self.service_time / self.limit
+
+    async def acquire(self) -> Optional[float]:
+        """Wait for a slot.
+
+        Returns:
+            Optional[float]: None once a slot is held, otherwise the suggested
+            seconds before retrying. The caller must then not call :meth:`release`.
+
+        Example:
+            >>> retry_after = await limiter.acquire()
+            >>> if retry_after is None:
+            ...     try:
+            ...         await handle()
+            ...     finally:
+            ...         limiter.release(held_seconds)
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return None
+        expected = self.estimated_wait()
+        if expected > self.queue_wait_target:
+            return expected
+
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(future, self.queue_wait_target)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return None  # the slot was handed over as the timeout fired
+            self._discard(future)
+            return max(self.estimated_wait(), self.queue_wait_target)
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release(0.0)
+            else:
+                self._discard(future)
+            raise
+        return None
+
+    def release(self, held: float) -> None:
+        """Give a slot back, handing it to the oldest waiter if there is one.
+
+        Args:
+            held (float): Seconds the slot was held, used for the wait estimate.
+        """
+        if held > 0.0:
+            self.service_time += SERVICE_TIME_ALPHA * (held - self.service_time)
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def _discard(self, future: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(future)
+        except ValueError:
+            pass
+
+
+class AdmissionMiddleware:
+    """ASGI middleware applying rate limits and concurrency budgets.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        rate_limiter (Optional[RateLimiter]): None when rate limiting is disabled.
+        limiters (dict): The ``"expensive"`` and ``"cheap"`` concurrency limiters.
+        client_header (bytes): The lower-cased client identity header name.
+        trusted_proxies (frozenset): Peer addresses whose client identity header is honoured.
+    """
+
+    def __init__(self, app, settings: Settings):
+        self.app = app
+        self.rate_limiter = None
+        if settings.rate_limit_per_second > 0:
+            self.rate_limiter = RateLimiter(settings.rate_limit_per_second,
+                                            settings.rate_limit_burst)
+        self.limiters = {
+            "expensive": ConcurrencyLimiter(settings.expensive_concurrency,
+                                            settings.queue_wait_target),
+            "cheap": ConcurrencyLimiter(settings.cheap_concurrency,
+                                        settings.queue_wait_target),
+        }
+        self.client_header = settings.client_id_header.lower().encode("latin-1")
+        self.trusted_proxies = frozenset(settings.trusted_proxies)
+
+    async def __call__(self, scope, receive, send):
+        # Tenant-scoped routes share the budgets of the routes they mirror
+        path = strip_tenant_prefix(scope.get("path", ""))
+        if scope["type"] != "http" or path in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        budget = "expensive" if (scope["method"], path) in EXPENSIVE_ROUTES else "cheap"
+
+        if self.rate_limiter is not None:
+            wait = self.rate_limiter.acquire(self._client(scope))
+            if wait > 0.0:
+                ADMISSION_SHED.labels("rate_limited", budget).inc()
+                await _reject(send, 429, "Rate limit exceeded", wait)
+                return
+
+        limiter = self.limiters[budget]
+        queued_at = time.perf_counter()
+        retry_after = await limiter.acquire()
+        if retry_after is not None:
+            ADMISSION_SHED.labels("overloaded", budget).inc()
+            await _reject(send, 503, "Server overloaded, please retry", retry_after)
+            return
+
+        start = time.perf_counter()
+        ADMISSION_QUEUE_WAIT.labels(budget).observe(start - queued_at)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
+
+    def _client(self, scope) -> str:
+        client = scope.get("client")
+        address = client[0] if client else "anonymous"
+        if address in self.trusted_proxies:
+            for name, value in scope.get("headers", ()):
+                if name == self.client_header:
+                    return value.decode("latin-1")
+        return address
+
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def install_admission(app, settings: Settings) -> None:
+    """Add :class:`AdmissionMiddleware` to ``app`` if the settings enable it.
+
+    Args:
+        app (FastAPI): The application.
+        settings (Settings): The runtime settings.
+
+    Example:
+        >>> install_admission(app, Settings(admission_enabled=True))
+    """
+    if not settings.admission_enabled:
+        return
+    app.add_middleware(AdmissionMiddleware, settings=settings)
@@ -1,39 +1,278 @@
-"""FastAPI routes for PromptLab"""
+"""FastAPI routes for PromptLab
 
-from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from typing import Optional
+Routes are registered on ``router`` and served by applications built with
+:func:`app.create_app`. Each request resolves its ``Storage`` through the
+``get_storage`` dependency, so every application instance can serve its own
+store. The module attribute ``app`` is the default application, built lazily
+on first access (``uvicorn app.api:app`` keeps working).
+"""
+
+import re
+from datetime import datetime
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from typing import Callable, Dict, FrozenSet, Optional, Tuple, Union
+
+from pydantic import BaseModel
 
 from app.models import (
-    Prompt, PromptCreate, PromptUpdate, PromptPatch,
-    Collection, CollectionCreate,
+    Prompt, PromptCreate, PromptUpdate, PromptPatch, PromptProjection, PromptProjectionList,
+    Collection, CollectionCreate, CollectionWithStats,
     PromptList, CollectionList, HealthResponse,
+    BulkUpdateRequest, BulkUpdateResult,
+    NearDuplicate, NearDuplicateList, DuplicateCluster, NearDuplicateReport, Job,
+    PromptChanges, Tombstone, VariableList, VariableUsage, RestoreResult,
     get_current_time
 )
-from app.storage import storage
-from app.utils import sort_prompts_by_date, filter_prompts_by_collection, search_prompts
+from app.config import Settings
+from app.jobs import FINISHED, JobQueueFull, JobRunner
+from app.storage import (IndexNotReady, JournalExpired, QuotaExceeded, RevisionConflict, Storage,
+                         WatermarkExpired)
+from app.tenants import UnknownTenant, parse_tenant
+from app.utils import (
+    filter_prompts_by_collection, search_prompts,
+    parse_fields, project_prompt, PROMPT_FIELDS,
+    parse_if_match, revision_etag, parse_sort, SORT_KEYS
+)
+from app.metrics import REGISTRY, CONTENT_TYPE, TENANT_REQUESTS
+from app.profiling import stage
 from app import __version__
 
 
-app = FastAPI(
-    title="PromptLab API",
-    description="AI Prompt Engineering Platform",
-    version=__version__
+router = APIRouter()
+
+FIELDS_DESCRIPTION = (
+    "Comma-separated subset of prompt fields to return "
+    f"({', '.join(PROMPT_FIELDS)}). Each prompt then holds only those keys; "
+    "unselected fields are not serialized."
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+
+THRESHOLD_DESCRIPTION = (
+    "Minimum estimated Jaccard similarity of the prompt contents (0-1). Defaults to the "
+    "configured threshold; values below it may miss matches."
 )
 
 
+def get_fields(
+    fields: Optional[str] = Query(None, description=FIELDS_DESCRIPTION,
+                                  examples=["id,title,tags,updated_at"])
+) -> Optional[tuple]:
+    """Parse the ``fields`` query parameter shared by the prompt read endpoints.
+
+    Args:
+        fields (Optional[str]): Comma-separated prompt field names.
+
+    Returns:
+        Optional[tuple]: The selected field names, or None for full prompts.
+
+    Raises:
+        HTTPException: If a requested field does not exist, raises a 400 error.
+    """
+    try:
+        return parse_fields(fields)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+SORT_DESCRIPTION = (
+    f"Sort key ({', '.join(SORT_KEYS)}); prefix with '-' for descending. "
+    "Defaults to -created_at (newest first)."
+)
+
+
+def get_sort(
+    sort: Optional[str] = Query(None, description=SORT_DESCRIPTION, examples=["-token_count"])
+) -> Tuple[str, bool]:
+    """Parse the ``sort`` query parameter of the prompt listing.
+
+    Args:
+        sort (Optional[str]): A sort key, optionally prefixed with ``-``.
+
+    Returns:
+        Tuple[str, bool]: The sort key and whether to sort descending.
+
+    Raises:
+        HTTPException: If the key is not sortable, raises a 400 error.
+    """
+    try:
+        return parse_sort(sort)
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+
+
+def get_if_match(
+    if_match: Optional[str] = Header(None, description=(
+        "Only apply the write if the prompt's current ETag (its revision) is listed; "
+        "otherwise respond 412."))
+) -> Optional[FrozenSet[int]]:
+    """Parse the ``If-Match`` header shared by the prompt write endpoints.
+
+    Args:
+        if_match (Optional[str]): The raw header value.
+
+    Returns:
+        Optional[FrozenSet[int]]: Acceptable revisions, or None if any revision is acceptable.
+    """
+    return parse_if_match(if_match)
+
+
+def stored_response(model: BaseModel, status_code: int = 200,
+                    headers: Optional[Dict[str, str]] = None) -> Response:
+    """Serialize a model built from stored records, skipping response validation.
+
+    A route that returns a model has FastAPI dump it, validate the dump
+    against ``response_model`` and then serialize it. Records in the store
+    were validated on the way in, so their JSON is written directly. The
+    ``response_model`` of the route still documents the schema.
+
+    Args:
+        model (BaseModel): A stored record, or a response model holding stored records.
+        status_code (int): The HTTP status code.
+        headers (Optional[Dict[str, str]]): Extra response headers, such as ``ETag``.
+
+    Returns:
+        Response: The serialized model.
+
+    Example:
+        >>> stored_response(prompt, headers={"ETag": revision_etag(prompt.revision)})
+    """
+    return Response(model.model_dump_json(), status_code=status_code, headers=headers,
+                    media_type="application/json")
+
+
+def apply_prompt_update(
+    storage: Storage,
+    prompt_id: str,
+    if_match: Optional[FrozenSet[int]],
+    build: Callable[[Prompt], Prompt]
+) -> Prompt:
+    """Read, modify and write a prompt with compare-and-swap semantics.
+
+    ``build`` turns the stored prompt into its replacement, which is written
+    only if the prompt is still at the revision that was read. Without
+    ``If-Match`` a lost race is retried on the new revision. With ``If-Match``
+    the client's precondition no longer holds, so a 412 is raised.
+
+    Args:
+        storage (Storage): The storage serving the request.
+        prompt_id (str): The ID of the prompt to update.
+        if_match (Optional[FrozenSet[int]]): Revisions accepted by the client, or None.
+        build (Callable[[Prompt], Prompt]): Builds the new prompt from the current one.
+
+    Returns:
+        Prompt: The stored prompt, carrying its new revision.
+
+    Raises:
+        HTTPException: 404 if the prompt does not exist, 412 if its revision does not match,
+            403 if the change would exceed the tenant's byte quota.
+    """
+    while True:
+        existing = storage.get_prompt(prompt_id)
+        if not existing:
+            raise HTTPException(status_code=404, detail="Prompt not found")
+        if if_match is not None and existing.revision not in if_match:
+            raise HTTPException(status_code=412, detail="Prompt has been modified")
+        try:
+            updated = storage.update_prompt(prompt_id, build(existing),
+                                            expected_revision=existing.revision)
+        except RevisionConflict:
+            if if_match is not None:
+                raise HTTPException(status_code=412, detail="Prompt has been modified")
+            continue
+        except QuotaExceeded as error:
+            raise quota_error(error)
+        if updated is None:
+            raise HTTPException(status_code=404, detail="Prompt not found")
+        return updated
+
+
+def get_storage(request: Request) -> Storage:
+    """Resolve the storage instance serving the current request.
+
+    With tenants enabled, this is the store of the tenant named by the
+    ``/tenants/{tenant}`` path prefix or the tenant header.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Storage: The storage attached to the application handling the request,
+        or the requesting tenant's storage.
+
+    Raises:
+        HTTPException: If the tenant is malformed or ambiguous, raises a 400 error;
+            404 if it is not on the allowlist; 403 if it would be one tenant too many.
+    """
+    tenants = request.app.state.tenants
+    if tenants is None:
+        return request.app.state.storage
+    header = request.app.state.config.tenant_header
+    try:
+        tenant = parse_tenant(request.path_params.get("tenant"), request.headers.get(header))
+    except ValueError as error:
+        raise HTTPException(status_code=400, detail=str(error))
+    try:
+        store = tenants.get(tenant)
+    except UnknownTenant:
+        raise HTTPException(status_code=404, detail="Tenant not found")
+    except QuotaExceeded as error:
+        raise quota_error(error)
+    # Only admitted tenants get a metric series
+    TENANT_REQUESTS.labels(tenant).inc()
+    return store
+
+
+def quota_error(error: QuotaExceeded) -> HTTPException:
+    """Build the 403 response for a write refused by a tenant quota.
+
+    Args:
+        error (QuotaExceeded): The refusal raised by the storage.
+
+    Returns:
+        HTTPException: The error to raise.
+    """
+    return HTTPException(status_code=403,
+                         detail=f"Tenant quota exceeded: at most {error.limit} {error.quota}")
+
+
+def get_jobs(request: Request) -> JobRunner:
+    """Resolve the background job runner of the current application.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        JobRunner: The runner attached to the application handling the request.
+    """
+    return request.app.state.jobs
+
+
+def get_settings(request: Request) -> Settings:
+    """Resolve the settings of the current application.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        Settings: The settings the application was built with.
+    """
+    return request.app.state.config
+
+
+def __getattr__(name: str):
+    """Build the default application lazily on first access of ``app``."""
+    if name == "app":
+        from app import create_app
+        application = globals()["app"] = create_app()
+        return application
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # ============== Health Check ==============
 
-@app.get("/health", response_model=HealthResponse)
+@router.get("/health", response_model=HealthResponse)
 def health_check():
     """Check the health status of the application.
 
@@ -47,82 +286,426 @@ def health_check():
     return HealthResponse(status="healthy", version=__version__)
 
 
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(request: Request):
+    """Expose request, storage and size metrics in Prometheus text format.
+
+    Process-wide metrics come from the global registry, the sizes and
+    usage of this application's stores from its own.
+
+    Args:
+        request (Request): The incoming request.
+
+    Returns:
+        PlainTextResponse: The exposition document for a Prometheus scrape.
+
+    Example:
+        >>> response = metrics(request)
+        >>> print(response.body.decode().splitlines()[0])
+    """
+    text = REGISTRY.render() + request.app.state.metrics.render()
+    return PlainTextResponse(text, media_type=CONTENT_TYPE)
+
+
 # ============== Prompt Endpoints ==============
 
-@app.get("/prompts", response_model=PromptList)
+# With ``?fields=`` the read routes return projections; the schemas list both shapes.
+@router.get("/prompts", response_model=Union[PromptList, PromptProjectionList])
 def list_prompts(
     collection_id: Optional[str] = None,
     search: Optional[str] = None,
-    tag: Optional[str] = None
+    tag: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, description="Page size; all matches when omitted."),
+    offset: int = Query(0, ge=0, description="Matches to skip before the page starts."),
+    created_after: Optional[datetime] = Query(None, description="Only prompts created at or after this time."),
+    created_before: Optional[datetime] = Query(None, description="Only prompts created before this time."),
+    updated_after: Optional[datetime] = Query(None, description="Only prompts updated at or after this time."),
+    updated_before: Optional[datetime] = Query(None, description="Only prompts updated before this time."),
+    min_tokens: Optional[int] = Query(None, ge=0, description="Only prompts of at least this many estimated tokens."),
+    max_tokens: Optional[int] = Query(None, ge=0, description="Only prompts of at most this many estimated tokens."),
+    has_variable: Optional[bool] = Query(None, description="Only prompts with (true) or without (false) template variables."),
+    variable: Optional[str] = Query(None, description="Only prompts using this template variable, e.g. customer_name."),
+    sort: Tuple[str, bool] = Depends(get_sort),
+    fields: Optional[tuple] = Depends(get_fields),
+    storage: Storage = Depends(get_storage)
 ):
-    """Retrieve a list of prompts, optionally filtering by collection ID, search query, and tag.
+    """Retrieve a list of prompts, optionally filtering by collection ID, search query, tag, time and size.
+
+    Collection and tag filters and the sort run as vectorized operations
+    over the columnar metadata, and time windows are looked up in sorted
+    range indexes. An unfiltered page sorted by ``created_at``,
+    ``updated_at`` or ``title`` is read straight from an ordered index
+    instead. Token counts and variables come from the statistics
+    derived when each prompt was written. Prompt objects are only fetched
+    for the returned page (and, with ``search``, for the candidates to
+    search).
 
     Args:
         collection_id (Optional[str]): The ID of the collection to filter prompts. Defaults to None.
         search (Optional[str]): A search term to filter the prompt list. Defaults to None.
         tag (Optional[str]): A tag to filter the prompt list. Defaults to None.
+        limit (Optional[int]): Maximum number of prompts to return; all when None.
+        offset (int): Number of matching prompts to skip.
+        created_after (Optional[datetime]): Only prompts created at or after this time.
+        created_before (Optional[datetime]): Only prompts created before this time.
+        updated_after (Optional[datetime]): Only prompts updated at or after this time.
+        updated_before (Optional[datetime]): Only prompts updated before this time.
+        min_tokens (Optional[int]): Only prompts of at least this many estimated tokens.
+        max_tokens (Optional[int]): Only prompts of at most this many estimated tokens.
+        has_variable (Optional[bool]): Only prompts with (True) or without (False) variables.
+        variable (Optional[str]): Only prompts using this template variable.
+        sort (Tuple[str, bool]): Sort key and direction, from ``?sort=`` (injected).
+        fields (Optional[tuple]): Prompt fields to return; all fields when None.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
-        PromptList: A list of prompts with the total count.
+        PromptList: One page of prompts in ``sort`` order (newest first by default), with ``total`` counting
+        all matches. With ``fields``, a JSONResponse whose prompts hold only the
+        selected fields.
 
     Example:
-        >>> prompts = list_prompts(collection_id="123", search="greeting", tag="python")
+        >>> prompts = list_prompts(collection_id="123", search="greeting", tag="python", limit=20)
         >>> for prompt in prompts.prompts:
         ...     print(prompt.title)
     """
-    prompts = storage.get_all_prompts()
+    sort_by, descending = sort
+    load_content = fields is None or "content" in fields
+    page = None
+    unfiltered = not (collection_id or search or tag or variable) and all(
+        value is None for value in (created_after, created_before, updated_after, updated_before,
+                                    min_tokens, max_tokens, has_variable))
+    if unfiltered and limit is not None:
+        with stage("page"):
+            page = storage.page_prompts(sort_by, descending, offset, limit, load_content)
+    if page is not None:
+        prompts, total = page
+    else:
+        prompts, total = filter_and_page(storage, sort_by, descending, offset, limit, search,
+                                         load_content, collection_id=collection_id or None,
+                                         tag=tag or None, created_after=created_after,
+                                         created_before=created_before, updated_after=updated_after,
+                                         updated_before=updated_before, min_tokens=min_tokens,
+                                         max_tokens=max_tokens, has_variable=has_variable,
+                                         variable=variable or None)
+
+    # Project before serialization so unselected fields are never touched
+    if fields:
+        with stage("project"):
+            projected = [project_prompt(prompt, fields) for prompt in prompts]
+        return JSONResponse({"prompts": projected, "total": total})
+
+    return stored_response(PromptList.model_construct(prompts=prompts, total=total))
+
+
+def filter_and_page(storage: Storage, sort_by: str, descending: bool, offset: int,
+                    limit: Optional[int], search: Optional[str], load_content: bool,
+                    **filters) -> Tuple[list, int]:
+    """Select, order and fetch one page of prompts for ``list_prompts``.
+
+    Filter, fetch and load all read one version of the store, so a page is
+    never torn by writes that land while it is being built.
+
+    Args:
+        storage (Storage): The store to read.
+        sort_by (str): The sort key.
+        descending (bool): Sort direction.
+        offset (int): Matches to skip.
+        limit (Optional[int]): Page size; all matches when None.
+        search (Optional[str]): Title and description search term, if any.
+        load_content (bool): Read blob-stored bodies back.
+        **filters: Metadata filters for ``select_prompts``.
+
+    Returns:
+        Tuple[list, int]: The page of prompts and the number of matches.
+    """
+    with storage.snapshot() as view:
+        with stage("filter"):
+            selection = view.select_prompts(**filters)
+
+        # Search if query provided; it needs titles and descriptions, so all
+        # candidates are fetched, in order, before paging.
+        if search:
+            with stage("sort"):
+                prompt_ids = selection.ordered_ids(sort_by, descending)
+            with stage("fetch"):
+                prompts = view.get_prompts(prompt_ids, load_content=False)
+            with stage("search"):
+                prompts = search_prompts(prompts, search)
+            total = len(prompts)
+            prompts = prompts[offset:None if limit is None else offset + limit]
+        else:
+            total = len(selection)
+            with stage("sort"):
+                prompt_ids = selection.ordered_ids(sort_by, descending, offset=offset, limit=limit)
+            with stage("fetch"):
+                prompts = view.get_prompts(prompt_ids, load_content=False)
+
+        # Read large bodies back only for prompts that are actually returned
+        if load_content:
+            with stage("load_content"):
+                prompts = view.with_content(prompts)
+    return prompts, total
+
+
+@router.get("/prompts:search", response_model=Union[PromptList, PromptProjectionList])
+def search_prompt_content(
+    q: str = Query(..., min_length=1, description="Substring, or regular expression with regex=true."),
+    regex: bool = Query(False, description="Interpret q as a regular expression."),
+    limit: int = Query(50, ge=1, le=1000, description="Newest matches to return."),
+    fields: Optional[tuple] = Depends(get_fields),
+    storage: Storage = Depends(get_storage)
+):
+    """Search prompt titles, descriptions and contents.
+
+    Matching is case-insensitive. Unlike ``GET /prompts?search=``, the prompt
+    bodies are searched too; the scan is spread over shards and, when search
+    workers are configured, over several processes.
+
+    Args:
+        q (str): The substring or regular expression to find.
+        regex (bool): Interpret ``q`` as a regular expression.
+        limit (int): Maximum number of prompts to return.
+        fields (Optional[tuple]): Prompt fields to return; all fields when None.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        PromptList: The newest ``limit`` matches, newest first. ``total`` counts
+        every match.
+
+    Raises:
+        HTTPException: If ``regex`` is set and ``q`` is not a valid regular
+            expression, raises a 400 error.
+
+    Example:
+        >>> results = search_prompt_content(q="step by step", limit=10)
+        >>> print(results.total)
+    """
+    with stage("search"):
+        try:
+            total, prompt_ids = storage.search_content(q, regex=regex, limit=limit)
+        except re.error as error:
+            raise HTTPException(status_code=400, detail=f"Invalid regular expression: {error}")
+
+    with stage("fetch"):
+        prompts = storage.get_prompts(prompt_ids, load_content=fields is None or "content" in fields)
+
+    if fields:
+        with stage("project"):
+            projected = [project_prompt(prompt, fields) for prompt in prompts]
+        return JSONResponse({"prompts": projected, "total": total})
+
+    return stored_response(PromptList.model_construct(prompts=prompts, total=total))
+
+
+@router.get("/prompts:near-duplicates", response_model=NearDuplicateReport)
+def near_duplicate_report(
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0, description=THRESHOLD_DESCRIPTION),
+    limit: int = Query(100, ge=1, le=10000, description="Largest clusters to return."),
+    storage: Storage = Depends(get_storage)
+):
+    """Cluster the whole corpus into groups of near-duplicate prompts.
+
+    Only prompts sharing an LSH bucket are compared, so the cost grows with
+    the number of candidate pairs rather than with all n² pairs.
+
+    Args:
+        threshold (Optional[float]): Minimum similarity; the configured default if None.
+        limit (int): Maximum number of clusters to return.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        NearDuplicateReport: Clusters, largest first, with totals over all clusters.
+
+    Raises:
+        HTTPException: 503 while signatures are still being computed after a warm start.
+
+    Example:
+        >>> report = near_duplicate_report(threshold=0.9)
+        >>> print(report.total, report.duplicate_prompts)
+    """
+    try:
+        clusters = storage.near_duplicate_clusters(threshold)
+    except IndexNotReady as error:
+        raise index_not_ready(error)
+    return NearDuplicateReport(
+        threshold=_effective_threshold(threshold, storage),
+        clusters=[DuplicateCluster(prompt_ids=ids, size=len(ids)) for ids in clusters[:limit]],
+        total=len(clusters),
+        duplicate_prompts=sum(len(ids) for ids in clusters),
+    )
+
+
+@router.get("/variables", response_model=VariableList)
+def list_variables(storage: Storage = Depends(get_storage)):
+    """List the template variables used across all prompts, with usage counts.
+
+    Served from the variable index maintained on every write; use
+    ``GET /prompts?variable=`` to fetch the prompts using one of them.
+
+    Args:
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        VariableList: Variables, most used first, ties by name.
+
+    Example:
+        >>> variables = list_variables()
+        >>> print(variables.variables[0].name, variables.variables[0].prompt_count)
+    """
+    counts = sorted(storage.variable_counts().items(), key=lambda item: (-item[1], item[0]))
+    return VariableList(
+        variables=[VariableUsage(name=name, prompt_count=count) for name, count in counts],
+        total=len(counts),
+    )
+
+
+@router.get("/prompts/changes", response_model=PromptChanges)
+def get_prompt_changes(
+    since: Optional[str] = Query(None, description="Watermark from the previous response; "
+                                                   "omit for a full sync."),
+    limit: int = Query(1000, ge=1, le=10000, description="Maximum changes to return."),
+    storage: Storage = Depends(get_storage)
+):
+    """Return the prompts created, updated or deleted since a watermark.
+
+    Each changed prompt is returned once, in its current state; deleted
+    prompts are returned as tombstones. Pass the returned ``watermark`` as
+    ``since`` on the next call, and call again right away while
+    ``has_more`` is true.
+
+    Args:
+        since (Optional[str]): The watermark of the previous sync, or None.
+        limit (int): Maximum number of changes to return.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        PromptChanges: The changes and the new watermark.
+
+    Raises:
+        HTTPException: 400 if ``since`` is not a watermark; 410 if it expired, in
+            which case the client has to resync from ``GET /prompts``.
+
+    Example:
+        >>> delta = get_prompt_changes(since="3f2a9c1e0b7d.42")
+        >>> print(len(delta.changes), len(delta.deleted), delta.watermark)
+    """
+    try:
+        prompts, deleted, watermark, has_more = storage.prompt_changes(since, limit)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+    except WatermarkExpired:
+        raise HTTPException(status_code=410, detail="Watermark expired; resync from GET /prompts")
+    return PromptChanges(
+        changes=prompts,
+        deleted=[Tombstone(id=prompt_id, deleted_at=deleted_at) for prompt_id, deleted_at in deleted],
+        watermark=watermark,
+        has_more=has_more,
+    )
+
+
+@router.get("/prompts/{prompt_id}/near-duplicates", response_model=NearDuplicateList)
+def get_near_duplicates(
+    prompt_id: str,
+    threshold: Optional[float] = Query(None, ge=0.0, le=1.0, description=THRESHOLD_DESCRIPTION),
+    storage: Storage = Depends(get_storage)
+):
+    """Find prompts whose content nearly duplicates a given prompt's.
+
+    Args:
+        prompt_id (str): The ID of the prompt to compare against.
+        threshold (Optional[float]): Minimum similarity; the configured default if None.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        NearDuplicateList: Similar prompts, most similar first.
+
+    Raises:
+        HTTPException: If the prompt is not found, raises a 404 error; 503 while
+            signatures are still being computed after a warm start.
+
+    Example:
+        >>> matches = get_near_duplicates("abc-123", threshold=0.9)
+        >>> print([match.id for match in matches.duplicates])
+    """
+    try:
+        matches = storage.find_near_duplicates(prompt_id, threshold)
+    except IndexNotReady as error:
+        raise index_not_ready(error)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Prompt not found")
+
+    duplicates = []
+    for match_id, score in matches:
+        match = storage.get_prompt(match_id, load_content=False)
+        if match is not None:
+            duplicates.append(NearDuplicate(id=match_id, title=match.title, similarity=score))
+    return NearDuplicateList(prompt_id=prompt_id, threshold=_effective_threshold(threshold, storage),
+                             duplicates=duplicates, total=len(duplicates))
 
-    # Filter by collection if specified
-    if collection_id:
-        prompts = filter_prompts_by_collection(prompts, collection_id)
 
-    # Search if query provided
-    if search:
-        prompts = search_prompts(prompts, search)
+def _effective_threshold(threshold: Optional[float], storage: Storage) -> float:
+    return threshold if threshold is not None else storage.near_duplicate_threshold
 
-    # Filter by tag if specified
-    if tag:
-        prompts = [p for p in prompts if tag in p.tags]
 
-    # Sort by date (newest first)
-    prompts = sort_prompts_by_date(prompts, descending=True)
+def index_not_ready(error: IndexNotReady) -> HTTPException:
+    """Build the 503 for a query whose index is still being built.
 
-    return PromptList(prompts=prompts, total=len(prompts))
+    Args:
+        error (IndexNotReady): The storage error.
 
+    Returns:
+        HTTPException: A 503 asking the client to retry shortly.
+    """
+    return HTTPException(status_code=503, detail=f"The {error.index} index is still being built",
+                         headers={"Retry-After": "5"})
 
-@app.get("/prompts/{prompt_id}", response_model=Prompt)
-def get_prompt(prompt_id: str):
+
+@router.get("/prompts/{prompt_id}", response_model=Union[Prompt, PromptProjection])
+def get_prompt(
+    prompt_id: str,
+    fields: Optional[tuple] = Depends(get_fields),
+    storage: Storage = Depends(get_storage)
+):
     """Retrieve a prompt by its ID.
 
     Args:
         prompt_id (str): The ID of the prompt to retrieve.
+        fields (Optional[tuple]): Prompt fields to return; all fields when None.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
-        Prompt: The prompt object if found.
+        Prompt: The prompt object if found, with its revision as the ``ETag``.
+        With ``fields``, a JSONResponse holding only the selected fields.
 
     Raises:
         HTTPException: If the prompt is not found, raises a 404 error.
     """
-    prompt = storage.get_prompt(prompt_id)
+    load_content = fields is None or "content" in fields
+    prompt = storage.get_prompt(prompt_id, load_content=load_content)
 
     if prompt is None:
         raise HTTPException(status_code=404, detail="Prompt not found")
 
-    return prompt
+    etag = revision_etag(prompt.revision)
+    if fields:
+        return JSONResponse(project_prompt(prompt, fields), headers={"ETag": etag})
+    return stored_response(prompt, headers={"ETag": etag})
 
 
-@app.post("/prompts", response_model=Prompt, status_code=201)
-def create_prompt(prompt_data: PromptCreate):
+@router.post("/prompts", response_model=Prompt, status_code=201)
+def create_prompt(prompt_data: PromptCreate, storage: Storage = Depends(get_storage)):
     """Create a new prompt.
 
     Args:
         prompt_data (PromptCreate): Data required to create a new prompt.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
         Prompt: The created prompt object.
 
     Raises:
         HTTPException: If the specified collection is not found, raises a 400 error.
+            If the tenant is at its prompt or byte quota, raises a 403 error.
 
     Example:
         >>> prompt_data = PromptCreate(title="New Prompt", content="Example content")
@@ -135,101 +718,113 @@ def create_prompt(prompt_data: PromptCreate):
         if not collection:
             raise HTTPException(status_code=400, detail="Collection not found")
 
-    prompt = Prompt(**prompt_data.model_dump())
-    return storage.create_prompt(prompt)
-
-
-@app.put("/prompts/{prompt_id}", response_model=Prompt)
-def update_prompt(prompt_id: str, prompt_data: PromptUpdate):
+    # PromptCreate validated every field; only the defaults are filled in here
+    prompt = Prompt.model_construct(**prompt_data.model_dump())
+    try:
+        created = storage.create_prompt(prompt)
+    except QuotaExceeded as error:
+        raise quota_error(error)
+    return stored_response(created, status_code=201)
+
+
+@router.put("/prompts/{prompt_id}", response_model=Prompt)
+def update_prompt(
+    prompt_id: str,
+    prompt_data: PromptUpdate,
+    if_match: Optional[FrozenSet[int]] = Depends(get_if_match),
+    storage: Storage = Depends(get_storage)
+):
     """Update an existing prompt by its ID.
 
     Args:
         prompt_id (str): The ID of the prompt to update.
         prompt_data (PromptUpdate): Data to update the prompt.
+        if_match (Optional[FrozenSet[int]]): Revisions from ``If-Match``, if sent.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
-        Prompt: The updated prompt object.
+        Prompt: The updated prompt object, with its new revision as the ``ETag``.
 
     Raises:
         HTTPException: If the prompt or specified collection is not found, raises a 404/400 error.
+            If ``If-Match`` does not list the current revision, raises a 412 error.
 
     Example:
         >>> updated_data = PromptUpdate(title="Updated Title")
         >>> updated_prompt = update_prompt("abc-123", updated_data)
         >>> print(updated_prompt.title)
     """
-    existing = storage.get_prompt(prompt_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
-    # Validate collection if provided
-    if prompt_data.collection_id:
-        collection = storage.get_collection(prompt_data.collection_id)
-        if not collection:
-            raise HTTPException(status_code=400, detail="Collection not found")
-
-    updated_prompt = Prompt(
-        id=existing.id,
-        title=prompt_data.title,
-        content=prompt_data.content,
-        description=prompt_data.description,
-        collection_id=prompt_data.collection_id,
-        tags=prompt_data.tags,
-        created_at=existing.created_at,
-        updated_at=get_current_time()
-    )
-
-    return storage.update_prompt(prompt_id, updated_prompt)
-
-
-@app.patch("/prompts/{prompt_id}", response_model=Prompt)
-def patch_prompt(prompt_id: str, prompt_data: PromptPatch):
+    def build(existing: Prompt) -> Prompt:
+        # Validate collection if provided
+        if prompt_data.collection_id:
+            collection = storage.get_collection(prompt_data.collection_id)
+            if not collection:
+                raise HTTPException(status_code=400, detail="Collection not found")
+
+        # Both sides are already validated: the request body by PromptUpdate,
+        # the copied fields when they were stored
+        return Prompt.model_construct(
+            id=existing.id,
+            title=prompt_data.title,
+            content=prompt_data.content,
+            description=prompt_data.description,
+            collection_id=prompt_data.collection_id,
+            tags=prompt_data.tags,
+            created_at=existing.created_at,
+            updated_at=get_current_time()
+        )
+
+    updated = apply_prompt_update(storage, prompt_id, if_match, build)
+    return stored_response(updated, headers={"ETag": revision_etag(updated.revision)})
+
+
+@router.patch("/prompts/{prompt_id}", response_model=Prompt)
+def patch_prompt(
+    prompt_id: str,
+    prompt_data: PromptPatch,
+    if_match: Optional[FrozenSet[int]] = Depends(get_if_match),
+    storage: Storage = Depends(get_storage)
+):
     """Partially update a prompt by its ID.
 
     Args:
         prompt_id (str): The ID of the prompt to update.
         prompt_data (PromptPatch): Data for partial update.
+        if_match (Optional[FrozenSet[int]]): Revisions from ``If-Match``, if sent.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
-        Prompt: The updated prompt object.
+        Prompt: The updated prompt object, with its new revision as the ``ETag``.
 
     Raises:
         HTTPException: If the prompt or specified collection is not found, raises a 404/400 error.
+            If ``If-Match`` does not list the current revision, raises a 412 error.
     """
-    existing = storage.get_prompt(prompt_id)
-    if not existing:
-        raise HTTPException(status_code=404, detail="Prompt not found")
-
     # Extract only the fields that were actually sent in the request
     updated_fields = prompt_data.model_dump(exclude_unset=True)
 
-    # Validate collection if it's being updated
-    if 'collection_id' in updated_fields:
-        collection = storage.get_collection(updated_fields['collection_id'])
-        if not collection:
-            raise HTTPException(status_code=400, detail="Collection not found")
+    def build(existing: Prompt) -> Prompt:
+        # Validate collection if it's being updated
+        if 'collection_id' in updated_fields:
+            collection = storage.get_collection(updated_fields['collection_id'])
+            if not collection:
+                raise HTTPException(status_code=400, detail="Collection not found")
 
-    # Merge existing fields with updated fields
-    updated_prompt = Prompt(
-        id=existing.id,
-        title=updated_fields.get('title', existing.title),
-        content=updated_fields.get('content', existing.content),
-        description=updated_fields.get('description', existing.description),
-        collection_id=updated_fields.get('collection_id', existing.collection_id),
-        tags=updated_fields.get('tags', existing.tags),
-        created_at=existing.created_at,
-        updated_at=get_current_time()
-    )
+        # Merge the sent fields, which PromptPatch validated, into a copy of
+        # the stored prompt; the unchanged fields are not validated again
+        return existing.model_copy(update={**updated_fields, "updated_at": get_current_time()})
 
-    return storage.update_prompt(prompt_id, updated_prompt)
+    updated = apply_prompt_update(storage, prompt_id, if_match, build)
+    return stored_response(updated, headers={"ETag": revision_etag(updated.revision)})
 
 
-@app.delete("/prompts/{prompt_id}", status_code=204)
-def delete_prompt(prompt_id: str):
+@router.delete("/prompts/{prompt_id}", status_code=204)
+def delete_prompt(prompt_id: str, storage: Storage = Depends(get_storage)):
     """Delete a prompt by its ID.
 
     Args:
         prompt_id (str): The ID of the prompt to delete.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
         None: Successfully returns None when the prompt is deleted.
@@ -245,52 +840,149 @@ def delete_prompt(prompt_id: str):
     return None
 
 
+@router.post("/prompts:bulk-update", response_model=BulkUpdateResult)
+def bulk_update_prompts(
+    request: BulkUpdateRequest,
+    storage: Storage = Depends(get_storage)
+):
+    """Add or remove tags, or move to a collection, every prompt matching a filter.
+
+    The filter is evaluated in one pass over prompt metadata and the
+    matching prompts are changed in a single storage call.
+
+    Args:
+        request (BulkUpdateRequest): The filter selecting prompts and the operation to apply.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        BulkUpdateResult: How many prompts matched, changed and stayed unchanged.
+
+    Raises:
+        HTTPException: If the filter or operation is empty, or the target collection
+            does not exist, raises a 400 error.
+
+    Example:
+        >>> body = BulkUpdateRequest(filter=BulkFilter(tags=["draft"]),
+        ...                          operation=BulkOperation(add_tags=["review"]))
+        >>> bulk_update_prompts(body).updated
+        12
+    """
+    selector, operation = request.filter, request.operation
+    # An empty list or a null counts as unset; a sent collection_id (even
+    # null, selecting uncategorized prompts) is a real criterion.
+    if not (selector.ids or selector.tags or selector.search
+            or "collection_id" in selector.model_fields_set):
+        raise HTTPException(
+            status_code=400,
+            detail="Filter must set at least one of collection_id, tags, search, ids"
+        )
+    set_collection = "collection_id" in operation.model_fields_set
+    if not (operation.add_tags or operation.remove_tags or set_collection):
+        raise HTTPException(
+            status_code=400,
+            detail="Operation must add tags, remove tags or set collection_id"
+        )
+    if set_collection and operation.collection_id is not None:
+        if not storage.get_collection(operation.collection_id):
+            raise HTTPException(status_code=400, detail="Collection not found")
+
+    with stage("filter"):
+        if selector.ids:
+            prompts = [prompt for prompt in
+                       (storage.get_prompt(prompt_id, load_content=False)
+                        for prompt_id in dict.fromkeys(selector.ids))
+                       if prompt is not None]
+        else:
+            prompts = storage.get_all_prompts(load_content=False)
+        if "collection_id" in selector.model_fields_set:
+            prompts = filter_prompts_by_collection(prompts, selector.collection_id)
+        if selector.tags:
+            required = set(selector.tags)
+            prompts = [p for p in prompts if required.issubset(p.tags)]
+
+    if selector.search:
+        with stage("search"):
+            prompts = search_prompts(prompts, selector.search)
+
+    with stage("update"):
+        updated = storage.bulk_update_prompts(
+            [prompt.id for prompt in prompts],
+            add_tags=operation.add_tags,
+            remove_tags=operation.remove_tags,
+            set_collection=set_collection,
+            collection_id=operation.collection_id,
+        )
+
+    return BulkUpdateResult(matched=len(prompts), updated=updated,
+                            unchanged=len(prompts) - updated)
+
+
 # ============== Collection Endpoints ==============
 
-@app.get("/collections", response_model=CollectionList)
-def list_collections():
+def with_stats(collection: Collection, storage: Storage) -> CollectionWithStats:
+    """Attach the maintained prompt statistics to a collection.
+
+    Args:
+        collection (Collection): The stored collection.
+        storage (Storage): The storage holding its prompts.
+
+    Returns:
+        CollectionWithStats: The collection and its statistics.
+    """
+    return CollectionWithStats(**collection.model_dump(),
+                               stats=storage.get_collection_stats(collection.id))
+
+
+@router.get("/collections", response_model=CollectionList)
+def list_collections(storage: Storage = Depends(get_storage)):
     """Retrieve a list of all collections.
 
+    Args:
+        storage (Storage): The storage serving the request (injected).
+
     Returns:
-        CollectionList: A list containing all collections and the total number of collections.
+        CollectionList: A list containing all collections, each with its prompt
+        statistics, and the total number of collections.
 
     Example:
         >>> collections_list = list_collections()
         >>> print(collections_list.total)
     """
-    collections = storage.get_all_collections()
+    collections = [with_stats(collection, storage) for collection in storage.get_all_collections()]
     return CollectionList(collections=collections, total=len(collections))
 
 
-@app.get("/collections/{collection_id}", response_model=Collection)
-def get_collection(collection_id: str):
+@router.get("/collections/{collection_id}", response_model=CollectionWithStats)
+def get_collection(collection_id: str, storage: Storage = Depends(get_storage)):
     """Retrieve a collection by its ID.
 
     Args:
         collection_id (str): The ID of the collection to retrieve.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
-        Collection: The collection object if found.
+        CollectionWithStats: The collection object with its prompt statistics, if found.
 
     Raises:
         HTTPException: If the collection is not found, raises a 404 error.
 
     Example:
         >>> collection = get_collection("123")
-        >>> print(collection.name)
+        >>> print(collection.name, collection.stats.prompt_count)
     """
     collection = storage.get_collection(collection_id)
     if not collection:
         raise HTTPException(status_code=404, detail="Collection not found")
-    return collection
+    return with_stats(collection, storage)
 
 
-@app.post("/collections", response_model=Collection, status_code=201)
-def create_collection(collection_data: CollectionCreate):
+@router.post("/collections", response_model=Collection, status_code=201)
+def create_collection(collection_data: CollectionCreate, storage: Storage = Depends(get_storage)):
     """Create a new collection.
 
     Args:
         collection_data (CollectionCreate): The data required to create a new collection.
+        storage (Storage): The storage serving the request (injected).
 
     Returns:
         Collection: The created collection object.
@@ -304,28 +996,197 @@ def create_collection(collection_data: CollectionCreate):
     return storage.create_collection(collection)
 
 
-@app.delete("/collections/{collection_id}", status_code=204)
-def delete_collection(collection_id: str):
+@router.delete("/collections/{collection_id}", status_code=204,
+               responses={202: {"model": Job, "description": "Deletion continues in a background job"}})
+def delete_collection(
+    collection_id: str,
+    storage: Storage = Depends(get_storage),
+    jobs: JobRunner = Depends(get_jobs),
+    settings: Settings = Depends(get_settings)
+):
     """Delete a collection by its ID and handle related prompts.
 
+    Small collections are deleted with their prompts before the response
+    (204). When the collection holds more than ``job_inline_limit`` prompts,
+    the cascade runs as a background job in batches and the response is a
+    202 with the job's status; the collection stays visible until the job
+    has deleted its last prompt.
+
     Args:
         collection_id (str): The ID of the collection to delete.
+        storage (Storage): The storage serving the request (injected).
+        jobs (JobRunner): The background job runner (injected).
+        settings (Settings): The application settings (injected).
 
     Returns:
-        None
+        None, or a 202 JSONResponse holding the ``Job`` with a ``Location`` header.
 
     Raises:
-        HTTPException: If the collection is not found, raises a 404 error.
+        HTTPException: If the collection is not found, raises a 404 error. If the
+            job queue is full, raises a 503 error.
     """
     if not storage.get_collection(collection_id):
         raise HTTPException(status_code=404, detail="Collection not found")
 
-    # Delete all prompts belonging to this collection
-    prompts = storage.get_all_prompts()
-    for prompt in prompts:
-        if prompt.collection_id == collection_id:
-            storage.delete_prompt(prompt.id)
+    prompt_ids = [prompt.id for prompt in
+                  storage.get_prompts_by_collection(collection_id, load_content=False)]
+
+    def cascade():
+        return delete_collection_batches(storage, collection_id, prompt_ids,
+                                         settings.job_batch_size)
+
+    if len(prompt_ids) <= settings.job_inline_limit:
+        for _ in cascade():
+            pass
+        return None
+
+    try:
+        job = jobs.submit("delete_collection", cascade, total=len(prompt_ids))
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Job queue is full",
+                            headers={"Retry-After": "1"})
+    return JSONResponse(job.model_dump(mode="json"), status_code=202,
+                        headers={"Location": f"/jobs/{job.id}"})
+
+
+def delete_collection_batches(storage: Storage, collection_id: str, prompt_ids: list,
+                              batch_size: int):
+    """Delete a collection's prompts in batches, then the collection itself.
+
+    The collection goes last, so a cancelled cascade leaves it in place with
+    its remaining prompts. Prompts moved into it meanwhile are deleted in a
+    final pass.
+
+    Args:
+        storage (Storage): The storage holding the collection.
+        collection_id (str): The collection to delete.
+        prompt_ids (list): The IDs of its prompts when the deletion was requested.
+        batch_size (int): Prompts deleted per batch.
+
+    Yields:
+        int: The number of prompts each batch handled.
+    """
+    for start in range(0, len(prompt_ids), batch_size):
+        batch = prompt_ids[start:start + batch_size]
+        for prompt_id in batch:
+            storage.delete_prompt(prompt_id)
+        yield len(batch)
 
     storage.delete_collection(collection_id)
+    stragglers = storage.get_prompts_by_collection(collection_id, load_content=False)
+    for prompt in stragglers:
+        storage.delete_prompt(prompt.id)
+    if stragglers:
+        yield len(stragglers)
+
+
+# ============== Restore Endpoints ==============
 
-    return None
\ No newline at end of file
+@router.post("/restore", response_model=RestoreResult)
+def restore(
+    as_of: datetime = Query(..., description="Time to restore to (ISO 8601; UTC without an offset)."),
+    prompt_id: Optional[str] = Query(None, description="Restore only this prompt."),
+    collection_id: Optional[str] = Query(None, description="Restore only this collection and its prompts."),
+    storage: Storage = Depends(get_storage)
+):
+    """Restore a prompt, a collection or the whole store to its state at ``as_of``.
+
+    Deleted prompts and collections are recreated, overwritten prompts get
+    their earlier content back (with a new revision), and records created
+    after ``as_of`` are deleted. Only records written since ``as_of`` are
+    looked at, so the cost follows the writes being undone, not the
+    length of the retained history.
+
+    Args:
+        as_of (datetime): The time to go back to.
+        prompt_id (Optional[str]): Restore only this prompt.
+        collection_id (Optional[str]): Restore only this collection and the
+            prompts that were or are in it.
+        storage (Storage): The storage serving the request (injected).
+
+    Returns:
+        RestoreResult: How many prompts and collections were restored or removed.
+
+    Raises:
+        HTTPException: 400 if both ``prompt_id`` and ``collection_id`` are given;
+            404 if the prompt or collection is unknown to the store and its journal;
+            410 if the journal no longer reaches back to ``as_of``; 403 if a
+            restored prompt does not fit the tenant quota.
+
+    Example:
+        >>> restore(as_of=datetime(2024, 5, 1, 12, 0), collection_id="col-1")
+    """
+    if prompt_id is not None and collection_id is not None:
+        raise HTTPException(status_code=400, detail="Pass either prompt_id or collection_id, not both")
+    try:
+        counts = storage.restore(as_of, prompt_id=prompt_id, collection_id=collection_id)
+    except JournalExpired as error:
+        if error.horizon is None:
+            raise HTTPException(status_code=410, detail="Point-in-time restore is disabled")
+        raise HTTPException(status_code=410, detail=(
+            f"as_of is older than the mutation journal; the earliest restorable time "
+            f"is {error.horizon.isoformat()}"))
+    except QuotaExceeded as error:
+        raise quota_error(error)
+    if not any(counts.values()):
+        if prompt_id is not None and storage.get_prompt(prompt_id, load_content=False) is None:
+            raise HTTPException(status_code=404, detail="Prompt not found")
+        if collection_id is not None and storage.get_collection(collection_id) is None:
+            raise HTTPException(status_code=404, detail="Collection not found")
+    return RestoreResult(as_of=as_of, **counts)
+
+
+# ============== Job Endpoints ==============
+
+@router.get("/jobs/{job_id}", response_model=Job)
+def get_job(job_id: str, jobs: JobRunner = Depends(get_jobs)):
+    """Retrieve the status and progress of a background job.
+
+    Args:
+        job_id (str): The ID of the job.
+        jobs (JobRunner): The background job runner (injected).
+
+    Returns:
+        Job: The job's status, with ``done`` and ``total`` for progress.
+
+    Raises:
+        HTTPException: If the job is unknown or has expired, raises a 404 error.
+
+    Example:
+        >>> job = get_job("job-123")
+        >>> print(job.status, job.done, job.total)
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.post("/jobs/{job_id}:cancel", response_model=Job)
+def cancel_job(job_id: str, jobs: JobRunner = Depends(get_jobs)):
+    """Cancel a background job.
+
+    A queued job is cancelled at once; a running job stops after its
+    current batch. Work done by finished batches is not undone.
+
+    Args:
+        job_id (str): The ID of the job.
+        jobs (JobRunner): The background job runner (injected).
+
+    Returns:
+        Job: The job's status after the cancel request.
+
+    Raises:
+        HTTPException: If the job is unknown, raises a 404 error. If it already
+            succeeded or failed, raises a 409 error.
+
+    Example:
+        >>> cancel_job("job-123").cancel_requested
+        True
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in FINISHED and not job.cancel_requested:
+        raise HTTPException(status_code=409, detail="Job already finished")
+    return jobs.cancel(job_id)
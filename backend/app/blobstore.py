@@ -0,0 +1,244 @@
+"""Append-only, memory-mapped blob store for large prompt bodies
+
+Prompt ``content`` above a size threshold is written once to an append-only
+segment file and referenced by ``(generation, offset, length)``. Reads go
+through a read-only ``mmap``, so the bytes live in the OS page cache instead
+of as Python strings on the heap, where the garbage collector would have to
+walk them.
+
+Updates and deletes only mark the old bytes dead. :meth:`BlobStore.compact`
+copies the live blobs into a new segment. A :class:`BlobCompactor` thread
+runs it in the background once enough of the segment is dead. The previous
+segment stays mapped until the next compaction, so readers that still hold
+an old reference can finish.
+"""
+
+import mmap
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+
+@dataclass(frozen=True)
+class BlobRef:
+    """Location of one blob.
+
+    Attributes:
+        generation (int): The segment the blob lives in.
+        offset (int): Byte offset within the segment.
+        length (int): Length in bytes of the UTF-8 encoded body.
+    """
+    generation: int
+    offset: int
+    length: int
+
+
+class StaleBlobRef(KeyError):
+    """Raised when a reference points into a segment that was already retired."""
+
+
+class _Segment:
+    """One append-only segment file and its read-only mapping."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.handle = open(path, "w+b")
+        self.size = 0
+        self.map: Optional[mmap.mmap] = None
+        self.mapped_size = 0
+
+    def append(self, data: bytes) -> int:
+        offset = self.size
+        self.handle.write(data)
+        self.handle.flush()
+        self.size += len(data)
+        return offset
+
+    def covers(self, offset: int, length: int) -> bool:
+        return offset + length <= self.mapped_size
+
+    def read(self, offset: int, length: int) -> bytes:
+        return self.map[offset:offset + length]
+
+    def remap(self) -> None:
+        # The old mapping is not closed explicitly: a concurrent reader may
+        # still be slicing it, and it is released once unreferenced.
+        self.map = mmap.mmap(self.handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.mapped_size = len(self.map)
+
+    def close(self, remove: bool = False) -> None:
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.handle.close()
+        if remove and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class BlobStore:
+    """An append-only, memory-mapped store for large strings.
+
+    Attributes:
+        directory (str): Where segment files are kept.
+        threshold (int): Bodies with at least this many characters belong in the store.
+        live_bytes (int): Bytes referenced by live blobs.
+        dead_bytes (int): Bytes released but not yet compacted away.
+    """
+
+    def __init__(self, directory: str, threshold: int = 64 * 1024):
+        self.directory = directory
+        self.threshold = threshold
+        self.live_bytes = 0
+        self.dead_bytes = 0
+        self._lock = threading.Lock()
+        self._generation = 0
+        os.makedirs(directory, exist_ok=True)
+        self._segments: Dict[int, _Segment] = {0: _Segment(self._segment_path(0))}
+
+    @property
+    def generation(self) -> int:
+        """The generation new blobs are written to; each compaction starts a new one."""
+        return self._generation
+
+    def _segment_path(self, generation: int) -> str:
+        return os.path.join(self.directory, f"blobs.{generation}.dat")
+
+    def should_store(self, content: str) -> bool:
+        """Whether ``content`` is large enough to live in the blob store.
+
+        Args:
+            content (str): A prompt body.
+
+        Returns:
+            bool: True if it meets the size threshold.
+        """
+        return len(content) >= self.threshold
+
+    def put(self, content: str) -> BlobRef:
+        """Append ``content`` and return its reference.
+
+        Args:
+            content (str): The body to store.
+
+        Returns:
+            BlobRef: Where the body was written.
+
+        Example:
+            >>> ref = blob_store.put(large_text)
+        """
+        data = content.encode("utf-8")
+        with self._lock:
+            segment = self._segments[self._generation]
+            offset = segment.append(data)
+            self.live_bytes += len(data)
+            return BlobRef(self._generation, offset, len(data))
+
+    def get(self, ref: BlobRef) -> str:
+        """Read the body behind ``ref``.
+
+        Args:
+            ref (BlobRef): A reference returned by :meth:`put` or :meth:`compact`.
+
+        Returns:
+            str: The stored body.
+
+        Raises:
+            StaleBlobRef: If the reference's segment has been retired.
+        """
+        segment = self._segments.get(ref.generation)
+        if segment is None:
+            raise StaleBlobRef(ref)
+        try:
+            if not segment.covers(ref.offset, ref.length):
+                with self._lock:
+                    if not segment.covers(ref.offset, ref.length):
+                        segment.remap()
+            return segment.read(ref.offset, ref.length).decode("utf-8")
+        except (TypeError, ValueError) as error:  # segment retired concurrently
+            raise StaleBlobRef(ref) from error
+
+    def release(self, ref: BlobRef) -> None:
+        """Mark the bytes behind ``ref`` as dead, to be reclaimed by compaction.
+
+        Args:
+            ref (BlobRef): The reference that is no longer used.
+        """
+        with self._lock:
+            self.live_bytes -= ref.length
+            self.dead_bytes += ref.length
+
+    def dead_ratio(self) -> float:
+        """Fraction of stored bytes that are dead.
+
+        Returns:
+            float: Between 0.0 and 1.0.
+        """
+        total = self.live_bytes + self.dead_bytes
+        return self.dead_bytes / total if total else 0.0
+
+    def compact(self, live: Iterable[BlobRef]) -> Dict[BlobRef, BlobRef]:
+        """Copy the ``live`` blobs into a new segment and retire older segments.
+
+        The segment that was current before this call stays readable until the
+        next compaction; anything older is closed and deleted.
+
+        Args:
+            live (Iterable[BlobRef]): Every reference still in use.
+
+        Returns:
+            Dict[BlobRef, BlobRef]: New reference for each live reference.
+        """
+        with self._lock:
+            previous = self._generation
+            generation = previous + 1
+            target = _Segment(self._segment_path(generation))
+            mapping: Dict[BlobRef, BlobRef] = {}
+            live_bytes = 0
+            for ref in live:
+                source = self._segments[ref.generation]
+                if not source.covers(ref.offset, ref.length):
+                    source.remap()
+                data = source.read(ref.offset, ref.length)
+                mapping[ref] = BlobRef(generation, target.append(data), ref.length)
+                live_bytes += ref.length
+            for old_generation in [g for g in self._segments if g < previous]:
+                self._segments.pop(old_generation).close(remove=True)
+            self._segments[generation] = target
+            self._generation = generation
+            self.live_bytes = live_bytes
+            self.dead_bytes = 0
+            return mapping
+
+    def close(self) -> None:
+        """Close and delete every segment file."""
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close(remove=True)
+            self._segments.clear()
+
+
+class BlobCompactor(threading.Thread):
+    """Background thread that compacts a storage's blob store when it gets sparse.
+
+    Attributes:
+        storage: The ``Storage`` whose ``compact_blobs`` method is called.
+        interval (float): Seconds between checks.
+        min_dead_ratio (float): Compact once at least this fraction of bytes is dead.
+    """
+
+    def __init__(self, storage, interval: float = 60.0, min_dead_ratio: float = 0.5):
+        super().__init__(name="promptlab-blob-compactor", daemon=True)
+        self.storage = storage
+        self.interval = interval
+        self.min_dead_ratio = min_dead_ratio
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.storage.compact_blobs(self.min_dead_ratio)
+
+    def stop(self) -> None:
+        """Ask the thread to exit and wait for it."""
+        self._stopped.set()
+        self.join()
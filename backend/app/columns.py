@@ -0,0 +1,749 @@
+"""Columnar shadow of prompt metadata for vectorized filtering and sorting
+
+``GET /prompts`` used to filter and sort by looping over every ``Prompt``
+object. :class:`PromptColumns` keeps the fields those queries touch in NumPy
+arrays, one row per prompt:
+
+- ``created_at`` and ``updated_at`` as int64 microseconds since the epoch
+- the collection as an int32 code into a dictionary of collection IDs
+  (``-1`` for no collection)
+- the derived ``token_count`` and ``char_count`` as int64, and whether the
+  content has any variables as a bool
+- tags and template variables as sparse bitmaps: per tag (or variable), the
+  set of rows carrying it
+- the prompt ID, in an object array
+
+Each timestamp column also has a range index: its ``(time, row)`` pairs sorted
+by time, so a ``created_after``/``created_before`` window is found with two
+binary searches instead of a scan. The timestamps and the case-folded title
+also have an ordered index that every write keeps sorted, so a page of an
+unfiltered listing in one of those orders is read without sorting anything.
+
+A tag or variable filter starts from that set, so the rest of the query
+only touches the rows it names. Other filters become boolean masks and ordering becomes one ``argsort`` (or an
+``argpartition`` when only the first page is wanted). ``Prompt`` objects
+are then fetched for the returned page only. Rows of deleted prompts are
+reused by later inserts.
+"""
+
+import threading
+from bisect import bisect_left
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.models import Prompt
+
+TIME_KEYS = ("created_at", "updated_at")
+SORT_KEYS = TIME_KEYS + ("title", "token_count", "char_count")
+# Sort keys whose order is maintained on every write, for paging without a sort
+ORDERED_KEYS = TIME_KEYS + ("title",)
+
+# Sort key -> attribute holding its column
+_KEY_COLUMNS = {"created_at": "_created", "updated_at": "_updated", "title": "_titles",
+                "token_count": "_tokens", "char_count": "_chars"}
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_NO_COLLECTION = -1
+_INITIAL_CAPACITY = 1024
+_MIN_MERGE = 4096
+# Pairs per OrderedIndex chunk; a chunk splits at twice this
+_CHUNK = 1024
+_MAX_ROW = 1 << 62
+
+
+def to_micros(value: datetime) -> int:
+    """Convert a datetime to integer microseconds since the epoch.
+
+    Naive datetimes are taken as UTC, like ``get_current_time`` produces them.
+
+    Args:
+        value (datetime): The timestamp.
+
+    Returns:
+        int: Microseconds since 1970-01-01T00:00:00 UTC.
+
+    Example:
+        >>> to_micros(datetime(1970, 1, 1, 0, 0, 1))
+        1000000
+    """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - _EPOCH) // _MICROSECOND
+
+
+class Selection:
+    """The prompts matching a filter, captured at one point in time.
+
+    Ordering a selection does not touch :class:`PromptColumns` again, so
+    writes made after the selection was taken cannot mix into its result.
+
+    Attributes:
+        ids (np.ndarray): The matching prompt IDs, in row order.
+        keys (Dict[str, np.ndarray]): Sort key columns, aligned with ``ids``.
+        version (int): The ``PromptColumns.version`` the selection reflects.
+    """
+
+    __slots__ = ("ids", "keys", "version")
+
+    def __init__(self, ids: np.ndarray, keys: Dict[str, np.ndarray], version: int = 0):
+        self.ids = ids
+        self.keys = keys
+        self.version = version
+
+    def replace(self, prompt_ids: Iterable[str], prompts: Iterable[Prompt],
+                version: int) -> "Selection":
+        """Return a copy with the rows of ``prompt_ids`` swapped for ``prompts``.
+
+        Used to move a selection to another version: drop every prompt that
+        changed in between, then add back the versions that match.
+
+        Args:
+            prompt_ids (Iterable[str]): Prompts whose rows are dropped.
+            prompts (Iterable[Prompt]): Matching prompts to append, in their
+                state at ``version``.
+            version (int): The version the result reflects.
+
+        Returns:
+            Selection: The adjusted selection.
+        """
+        dropped = list(prompt_ids)
+        keep = ~np.isin(self.ids, np.array(dropped, dtype=object)) if dropped \
+            else np.ones(len(self.ids), dtype=bool)
+        prompts = list(prompts)
+        ids = np.empty(len(prompts), dtype=object)
+        ids[:] = [prompt.id for prompt in prompts]
+        keys = {key: np.concatenate((column[keep], np.fromiter(
+                    (sort_key(prompt, key) for prompt in prompts), dtype=column.dtype,
+                    count=len(prompts))))
+                for key, column in self.keys.items()}
+        return Selection(np.concatenate((self.ids[keep], ids)), keys, version)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def ordered_ids(self, sort_by: str = "created_at", descending: bool = True,
+                    offset: int = 0, limit: Optional[int] = None) -> List[str]:
+        """Return one page of the matching IDs in sort order.
+
+        Ties keep row order, as a stable sort would.
+
+        Args:
+            sort_by (str): One of ``SORT_KEYS``.
+            descending (bool): Largest (newest) first when True.
+            offset (int): Matches to skip.
+            limit (Optional[int]): Page size; all remaining matches when None.
+
+        Returns:
+            List[str]: The prompt IDs of the page.
+        """
+        keys = self.keys[sort_by]
+        if keys.dtype == object:
+            # Strings cannot be negated; their ranks sort the same way
+            keys = np.unique(keys, return_inverse=True)[1]
+        if descending:
+            keys = -keys
+        end = len(keys) if limit is None else min(len(keys), offset + limit)
+        if offset >= end:
+            return []
+        if end < len(keys):
+            # Only the first ``end`` positions matter: partition, then sort those.
+            # Ties at the cut are resolved by row, as the full stable sort would.
+            cut = np.partition(keys, end - 1)[end - 1]
+            before = np.flatnonzero(keys < cut)
+            at_cut = np.flatnonzero(keys == cut)[:end - len(before)]
+            candidates = np.concatenate((before, at_cut))
+            order = candidates[np.lexsort((candidates, keys[candidates]))]
+        else:
+            order = np.argsort(keys, kind="stable")
+        return self.ids[order[offset:end]].tolist()
+
+
+def title_key(title: str) -> str:
+    """The value a title sorts by: case-folded, so ``apple`` sorts next to ``Apple``."""
+    return title.casefold()
+
+
+def sort_key(prompt: Prompt, key: str):
+    """The value a prompt has in the ``key`` sort column.
+
+    Args:
+        prompt (Prompt): The prompt.
+        key (str): One of ``SORT_KEYS``.
+
+    Returns:
+        The column value: an int, or a string for ``title``.
+    """
+    if key in TIME_KEYS:
+        return to_micros(getattr(prompt, key))
+    if key == "title":
+        return title_key(prompt.title)
+    return getattr(prompt, key)
+
+
+def matches(prompt: Prompt, **filters) -> bool:
+    """Whether one prompt passes the filters of :meth:`PromptColumns.select`.
+
+    Args:
+        prompt (Prompt): The prompt to test.
+        **filters: Keyword filters, as accepted by ``select``; None means unfiltered.
+
+    Returns:
+        bool: True if ``select`` would include the prompt.
+    """
+    get = filters.get
+    for key, low, high in (("created_at", get("created_after"), get("created_before")),
+                           ("updated_at", get("updated_after"), get("updated_before"))):
+        if low is not None and sort_key(prompt, key) < to_micros(low):
+            return False
+        if high is not None and sort_key(prompt, key) >= to_micros(high):
+            return False
+    collection_id, tag, variable = get("collection_id"), get("tag"), get("variable")
+    min_tokens, max_tokens, has_variable = get("min_tokens"), get("max_tokens"), get("has_variable")
+    return ((collection_id is None or prompt.collection_id == collection_id)
+            and (tag is None or tag in prompt.tags)
+            and (variable is None or variable in prompt.variables)
+            and (min_tokens is None or prompt.token_count >= min_tokens)
+            and (max_tokens is None or prompt.token_count <= max_tokens)
+            and (has_variable is None or bool(prompt.variables) == has_variable))
+
+
+class RangeIndex:
+    """``(key, row)`` pairs of one int64 column, sorted by key.
+
+    New pairs go to an unsorted tail and are merged into the sorted part
+    once the tail outgrows an eighth of it, so a write costs amortized
+    O(log n). Pairs are never removed one by one. A pair whose row has since
+    been rewritten no longer matches the column and is dropped at lookup
+    time, and the next merge discards it.
+    """
+
+    def __init__(self):
+        self.build(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return len(self._keys) + len(self._tail_keys)
+
+    def build(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        """Replace the index with the given pairs.
+
+        Args:
+            keys (np.ndarray): Key of each row.
+            rows (np.ndarray): The rows, aligned with ``keys``.
+        """
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self._rows = rows[order]
+        self._tail_keys: List[int] = []
+        self._tail_rows: List[int] = []
+
+    def add(self, key: int, row: int) -> bool:
+        """Record a row's new key.
+
+        Args:
+            key (int): The key now stored for ``row``.
+            row (int): The row.
+
+        Returns:
+            bool: True when the tail is due to be merged into the sorted part.
+        """
+        self._tail_keys.append(key)
+        self._tail_rows.append(row)
+        return len(self._tail_keys) > max(_MIN_MERGE, len(self._keys) // 8)
+
+    def rows_between(self, low: Optional[int], high: Optional[int],
+                     column: np.ndarray) -> np.ndarray:
+        """Return the rows whose current key lies in ``[low, high)``.
+
+        Args:
+            low (Optional[int]): Inclusive lower bound; unbounded when None.
+            high (Optional[int]): Exclusive upper bound; unbounded when None.
+            column (np.ndarray): The column as it is now, to drop outdated pairs.
+
+        Returns:
+            np.ndarray: Matching rows, possibly with repeats, including dead rows.
+        """
+        start = 0 if low is None else int(np.searchsorted(self._keys, low, side="left"))
+        stop = len(self._keys) if high is None else \
+            int(np.searchsorted(self._keys, high, side="left"))
+        keys, rows = self._keys[start:stop], self._rows[start:stop]
+        if self._tail_keys:
+            tail_keys = np.array(self._tail_keys, dtype=np.int64)
+            tail_rows = np.array(self._tail_rows, dtype=np.int64)
+            inside = np.ones(len(tail_keys), dtype=bool)
+            if low is not None:
+                inside &= tail_keys >= low
+            if high is not None:
+                inside &= tail_keys < high
+            keys = np.concatenate((keys, tail_keys[inside]))
+            rows = np.concatenate((rows, tail_rows[inside]))
+        return rows[column[rows] == keys]
+
+
+class OrderedIndex:
+    """``(key, row)`` pairs of one sort column, kept in order on every write.
+
+    The pairs live in sorted chunks of up to ``2 * _CHUNK`` entries, found
+    by bisecting the last pair of each chunk. Unlike :class:`RangeIndex`,
+    the index is exact. A write moves one row, removing its old pair and
+    inserting the new one, and each costs a binary search plus a copy of a
+    single chunk. A page is located by its position and read from the few
+    chunks it spans.
+
+    Ties are ordered by row, ascending in both directions, as in
+    :meth:`Selection.ordered_ids`.
+    """
+
+    def __init__(self, dtype):
+        self._dtype = dtype
+        self.build(np.empty(0, dtype=dtype), np.empty(0, dtype=np.int64))
+
+    def __len__(self) -> int:
+        return self._count
+
+    def build(self, keys: np.ndarray, rows: np.ndarray) -> None:
+        """Replace the index with the given pairs.
+
+        Args:
+            keys (np.ndarray): Key of each row.
+            rows (np.ndarray): The rows, aligned with ``keys``.
+        """
+        ranks = np.unique(keys, return_inverse=True)[1] if keys.dtype == object else keys
+        order = np.lexsort((rows, ranks))
+        keys, rows = keys[order], rows[order]
+        self._keys = [keys[start:start + _CHUNK] for start in range(0, len(keys), _CHUNK)]
+        self._rows = [rows[start:start + _CHUNK] for start in range(0, len(rows), _CHUNK)]
+        self._maxes = [self._pair(chunk_keys, chunk_rows, -1)
+                       for chunk_keys, chunk_rows in zip(self._keys, self._rows)]
+        self._count = len(keys)
+        self._starts: Optional[np.ndarray] = None
+
+    def add(self, key, row: int) -> None:
+        """Insert the pair of a row.
+
+        Args:
+            key: The row's key.
+            row (int): The row.
+        """
+        self._starts = None
+        self._count += 1
+        if not self._keys:
+            self._keys.append(np.array([key], dtype=self._dtype))
+            self._rows.append(np.array([row], dtype=np.int64))
+            self._maxes.append((key, row))
+            return
+        chunk = min(bisect_left(self._maxes, (key, row)), len(self._keys) - 1)
+        keys, rows = self._keys[chunk], self._rows[chunk]
+        position = self._locate(keys, rows, key, row)
+        keys = self._keys[chunk] = np.concatenate(
+            (keys[:position], np.array([key], dtype=self._dtype), keys[position:]))
+        rows = self._rows[chunk] = np.concatenate(
+            (rows[:position], np.array([row], dtype=np.int64), rows[position:]))
+        if position == len(keys) - 1:
+            self._maxes[chunk] = (key, row)
+        if len(keys) > 2 * _CHUNK:
+            self._keys[chunk:chunk + 1] = [keys[:_CHUNK], keys[_CHUNK:]]
+            self._rows[chunk:chunk + 1] = [rows[:_CHUNK], rows[_CHUNK:]]
+            self._maxes.insert(chunk, self._pair(keys, rows, _CHUNK - 1))
+
+    def remove(self, key, row: int) -> None:
+        """Delete the pair of a row.
+
+        Args:
+            key: The key the row was indexed under.
+            row (int): The row.
+        """
+        chunk = bisect_left(self._maxes, (key, row))
+        if chunk == len(self._keys):
+            return
+        keys, rows = self._keys[chunk], self._rows[chunk]
+        position = self._locate(keys, rows, key, row)
+        if position == len(keys) or rows[position] != row or keys[position] != key:
+            return
+        self._starts = None
+        self._count -= 1
+        if len(keys) == 1:
+            del self._keys[chunk], self._rows[chunk], self._maxes[chunk]
+            return
+        keys = self._keys[chunk] = np.concatenate((keys[:position], keys[position + 1:]))
+        rows = self._rows[chunk] = np.concatenate((rows[:position], rows[position + 1:]))
+        if position == len(keys):
+            self._maxes[chunk] = self._pair(keys, rows, -1)
+
+    def page(self, offset: int, limit: Optional[int], descending: bool) -> np.ndarray:
+        """Return the rows of one page of the sorted order.
+
+        Args:
+            offset (int): Pairs to skip.
+            limit (Optional[int]): Page size; all remaining pairs when None.
+            descending (bool): Largest key first when True.
+
+        Returns:
+            np.ndarray: The rows of the page, in order.
+        """
+        count = self._count
+        end = count if limit is None else min(count, offset + limit)
+        if offset >= end:
+            return np.empty(0, dtype=np.int64)
+        if not descending:
+            return self._slice(offset, end)[1]
+        # Read whole tie groups at both edges so ties can be put back in row order
+        low, high = count - end, count - offset
+        low = self._position(self._key_at(low), -1)
+        high = self._position(self._key_at(high - 1), _MAX_ROW)
+        keys, rows = self._slice(low, high)
+        if keys.dtype == object:
+            keys = np.unique(keys, return_inverse=True)[1]
+        order = np.argsort(-keys, kind="stable")
+        skip = offset - (count - high)
+        return rows[order[skip:skip + end - offset]]
+
+    # ----- internals -----
+
+    @staticmethod
+    def _pair(keys: np.ndarray, rows: np.ndarray, position: int) -> Tuple:
+        key = keys[position]
+        return (key.item() if isinstance(key, np.generic) else key), int(rows[position])
+
+    @staticmethod
+    def _locate(keys: np.ndarray, rows: np.ndarray, key, row: int) -> int:
+        low = int(np.searchsorted(keys, key, side="left"))
+        high = int(np.searchsorted(keys, key, side="right"))
+        return low + int(np.searchsorted(rows[low:high], row))
+
+    def _chunk_starts(self) -> np.ndarray:
+        if self._starts is None:
+            lengths = np.fromiter((len(chunk) for chunk in self._keys), dtype=np.int64,
+                                  count=len(self._keys))
+            self._starts = np.concatenate(([0], np.cumsum(lengths)))
+        return self._starts
+
+    def _key_at(self, position: int):
+        starts = self._chunk_starts()
+        chunk = int(np.searchsorted(starts, position, side="right")) - 1
+        return self._keys[chunk][position - starts[chunk]]
+
+    def _position(self, key, row: int) -> int:
+        """Number of pairs before ``(key, row)``."""
+        chunk = bisect_left(self._maxes, (key, row))
+        if chunk == len(self._keys):
+            return self._count
+        return int(self._chunk_starts()[chunk]) + self._locate(
+            self._keys[chunk], self._rows[chunk], key, row)
+
+    def _slice(self, start: int, stop: int) -> Tuple[np.ndarray, np.ndarray]:
+        starts = self._chunk_starts()
+        first = int(np.searchsorted(starts, start, side="right")) - 1
+        keys, rows = [], []
+        chunk = first
+        while chunk < len(self._keys) and starts[chunk] < stop:
+            low = max(start - starts[chunk], 0)
+            high = min(stop - starts[chunk], len(self._keys[chunk]))
+            keys.append(self._keys[chunk][low:high])
+            rows.append(self._rows[chunk][low:high])
+            chunk += 1
+        return np.concatenate(keys), np.concatenate(rows)
+
+
+class PromptColumns:
+    """Prompt metadata in NumPy columns, maintained by Storage on every write.
+
+    Attributes:
+        version (int): Number of writes applied so far; every ``upsert``,
+            ``remove`` and ``rebuild`` adds one.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.version = 0
+        self._reset(_INITIAL_CAPACITY)
+
+    def upsert(self, prompt: Prompt) -> None:
+        """Insert a prompt's row, or overwrite it if the prompt already has one.
+
+        Args:
+            prompt (Prompt): The stored record.
+        """
+        with self._lock:
+            row = self._row_of.get(prompt.id)
+            if row is None:
+                row = self._allocate()
+                self._row_of[prompt.id] = row
+                self._ids[row] = prompt.id
+                self._alive[row] = True
+                self._write(row, prompt, fresh=True)
+            else:
+                self._unlabel(row)
+                self._write(row, prompt, fresh=False)
+            self.version += 1
+
+    def remove(self, prompt_id: str) -> None:
+        """Free a deleted prompt's row.
+
+        Args:
+            prompt_id (str): The prompt.
+        """
+        with self._lock:
+            row = self._row_of.pop(prompt_id, None)
+            self.version += 1
+            if row is None:
+                return
+            self._unlabel(row)
+            for key, index in self._orders.items():
+                index.remove(self._key_of(key, row), row)
+            self._alive[row] = False
+            self._ids[row] = None
+            self._titles[row] = None
+            self._free.append(row)
+
+    def rebuild(self, prompts: Iterable[Prompt]) -> None:
+        """Replace every row with those of ``prompts``.
+
+        Args:
+            prompts (Iterable[Prompt]): Every stored record.
+        """
+        prompts = list(prompts)
+        with self._lock:
+            self._reset(max(_INITIAL_CAPACITY, len(prompts)))
+            for row, prompt in enumerate(prompts):
+                self._row_of[prompt.id] = row
+                self._ids[row] = prompt.id
+                self._label(row, prompt)
+            count = len(prompts)
+            self._size = count
+            self._alive[:count] = True
+            self._created[:count] = [to_micros(prompt.created_at) for prompt in prompts]
+            self._updated[:count] = [to_micros(prompt.updated_at) for prompt in prompts]
+            self._titles[:count] = [title_key(prompt.title) for prompt in prompts]
+            self._collection[:count] = [self._code(prompt.collection_id) for prompt in prompts]
+            self._tokens[:count] = [prompt.token_count for prompt in prompts]
+            self._chars[:count] = [prompt.char_count for prompt in prompts]
+            self._has_vars[:count] = [bool(prompt.variables) for prompt in prompts]
+            self._rebuild_ranges()
+            rows = np.arange(count, dtype=np.int64)
+            for key, index in self._orders.items():
+                index.build(self._column(key)[:count], rows)
+            self.version += 1
+
+    def page(self, sort_by: str, descending: bool, offset: int = 0,
+             limit: Optional[int] = None) -> Optional[Tuple[List[str], int]]:
+        """Return one page of all prompts in sort order, from the ordered index.
+
+        Costs a binary search plus the page, however many prompts are stored.
+        The order is the one ``select().ordered_ids`` gives.
+
+        Args:
+            sort_by (str): The sort key.
+            descending (bool): Largest (newest, or last by title) first when True.
+            offset (int): Prompts to skip.
+            limit (Optional[int]): Page size; all remaining prompts when None.
+
+        Returns:
+            Optional[Tuple[List[str], int]]: The page's prompt IDs and the number of
+            prompts stored; None if ``sort_by`` has no ordered index.
+
+        Example:
+            >>> columns.page("title", descending=False, limit=20)
+            (['p-3', 'p-9'], 2)
+        """
+        index = self._orders.get(sort_by)
+        if index is None:
+            return None
+        with self._lock:
+            rows = index.page(offset, limit, descending)
+            return self._ids[rows].tolist(), len(self._row_of)
+
+    def select(self, collection_id: Optional[str] = None, tag: Optional[str] = None,
+               created_after: Optional[datetime] = None,
+               created_before: Optional[datetime] = None,
+               updated_after: Optional[datetime] = None,
+               updated_before: Optional[datetime] = None,
+               min_tokens: Optional[int] = None, max_tokens: Optional[int] = None,
+               has_variable: Optional[bool] = None,
+               variable: Optional[str] = None) -> Selection:
+        """Select the prompts matching every given filter.
+
+        Time windows are half-open: ``*_after`` is inclusive and ``*_before``
+        is exclusive, so consecutive windows never overlap.
+
+        Args:
+            collection_id (Optional[str]): Only prompts in this collection.
+            tag (Optional[str]): Only prompts carrying this tag.
+            created_after (Optional[datetime]): Only prompts created at or after this time.
+            created_before (Optional[datetime]): Only prompts created before this time.
+            updated_after (Optional[datetime]): Only prompts updated at or after this time.
+            updated_before (Optional[datetime]): Only prompts updated before this time.
+            min_tokens (Optional[int]): Only prompts of at least this many tokens.
+            max_tokens (Optional[int]): Only prompts of at most this many tokens.
+            has_variable (Optional[bool]): Only prompts with (True) or without (False)
+                template variables.
+            variable (Optional[str]): Only prompts using this template variable.
+
+        Returns:
+            Selection: The matching prompts, ready to be ordered and paged.
+
+        Example:
+            >>> selection = columns.select(collection_id="col-1", tag="python")
+            >>> selection.ordered_ids(limit=20)
+            ['p-9', 'p-3']
+        """
+        with self._lock:
+            size = self._size
+            rows = self._labelled(((self._tags, tag), (self._vars, variable)))
+            if rows is None:
+                rows = np.flatnonzero(self._alive[:size])
+            mask = np.ones(len(rows), dtype=bool)
+            if collection_id is not None:
+                code = self._codes.get(collection_id)
+                if code is None:
+                    mask[:] = False
+                else:
+                    mask &= self._collection[rows] == code
+            for key, low, high in (("created_at", created_after, created_before),
+                                   ("updated_at", updated_after, updated_before)):
+                if low is not None or high is not None:
+                    in_range = np.zeros(size, dtype=bool)
+                    in_range[self._ranges[key].rows_between(
+                        None if low is None else to_micros(low),
+                        None if high is None else to_micros(high),
+                        self._column(key))] = True
+                    mask &= in_range[rows]
+            if min_tokens is not None:
+                mask &= self._tokens[rows] >= min_tokens
+            if max_tokens is not None:
+                mask &= self._tokens[rows] <= max_tokens
+            if has_variable is not None:
+                mask &= self._has_vars[rows] == has_variable
+            rows = rows[mask]
+            return Selection(self._ids[rows],
+                             {key: self._column(key)[rows] for key in SORT_KEYS}, self.version)
+
+    def variable_counts(self) -> Dict[str, int]:
+        """Count the prompts using each template variable.
+
+        Returns:
+            Dict[str, int]: Number of prompts per variable name.
+        """
+        with self._lock:
+            return {name: len(rows) for name, rows in self._vars.items()}
+
+    def __len__(self) -> int:
+        return len(self._row_of)
+
+    # ----- internals; callers hold the lock -----
+
+    def _reset(self, capacity: int) -> None:
+        self._row_of: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._ids = np.empty(capacity, dtype=object)
+        self._alive = np.zeros(capacity, dtype=bool)
+        self._created = np.zeros(capacity, dtype=np.int64)
+        self._updated = np.zeros(capacity, dtype=np.int64)
+        self._titles = np.empty(capacity, dtype=object)
+        self._collection = np.full(capacity, _NO_COLLECTION, dtype=np.int32)
+        self._tokens = np.zeros(capacity, dtype=np.int64)
+        self._chars = np.zeros(capacity, dtype=np.int64)
+        self._has_vars = np.zeros(capacity, dtype=bool)
+        self._codes: Dict[str, int] = {}
+        self._tags: Dict[str, Set[int]] = {}
+        self._vars: Dict[str, Set[int]] = {}
+        # Per row, the tags and variables it was labelled with, to undo on rewrite
+        self._row_labels: Dict[int, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+        self._ranges: Dict[str, RangeIndex] = {key: RangeIndex() for key in TIME_KEYS}
+        self._orders: Dict[str, OrderedIndex] = {
+            key: OrderedIndex(object if key == "title" else np.int64) for key in ORDERED_KEYS}
+
+    def _column(self, key: str) -> np.ndarray:
+        return getattr(self, _KEY_COLUMNS[key])
+
+    def _key_of(self, key: str, row: int):
+        value = self._column(key)[row]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def _rebuild_ranges(self) -> None:
+        rows = np.flatnonzero(self._alive[:self._size])
+        for key, index in self._ranges.items():
+            index.build(self._column(key)[rows], rows)
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size == len(self._alive):
+            self._grow(2 * len(self._alive))
+        row = self._size
+        self._size += 1
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        for name in ("_ids", "_alive", "_created", "_updated", "_titles", "_collection",
+                     "_tokens", "_chars", "_has_vars"):
+            column = getattr(self, name)
+            if column.dtype == object:
+                grown = np.empty(capacity, dtype=object)
+            else:
+                fill = _NO_COLLECTION if name == "_collection" else 0
+                grown = np.full(capacity, fill, dtype=column.dtype)
+            grown[:len(column)] = column
+            setattr(self, name, grown)
+
+    def _write(self, row: int, prompt: Prompt, fresh: bool) -> None:
+        merge = False
+        for key, column, value in (("created_at", self._created, to_micros(prompt.created_at)),
+                                   ("updated_at", self._updated, to_micros(prompt.updated_at)),
+                                   ("title", self._titles, title_key(prompt.title))):
+            if fresh or column[row] != value:
+                if not fresh:
+                    self._orders[key].remove(self._key_of(key, row), row)
+                column[row] = value
+                self._orders[key].add(value, row)
+                if key in self._ranges:
+                    merge = self._ranges[key].add(value, row) or merge
+        self._collection[row] = self._code(prompt.collection_id)
+        self._tokens[row] = prompt.token_count
+        self._chars[row] = prompt.char_count
+        self._has_vars[row] = bool(prompt.variables)
+        self._label(row, prompt)
+        if merge:
+            self._rebuild_ranges()
+
+    def _code(self, collection_id: Optional[str]) -> int:
+        if collection_id is None:
+            return _NO_COLLECTION
+        code = self._codes.get(collection_id)
+        if code is None:
+            code = self._codes[collection_id] = len(self._codes)
+        return code
+
+    def _labelled(self, filters) -> Optional[np.ndarray]:
+        """Sorted rows carrying every requested label, or None if none was requested."""
+        found: Optional[Set[int]] = None
+        for index, label in filters:
+            if label is None:
+                continue
+            rows = index.get(label, set())
+            found = set(rows) if found is None else found & rows
+        if found is None:
+            return None
+        return np.sort(np.fromiter(found, dtype=np.int64, count=len(found)))
+
+    def _label(self, row: int, prompt: Prompt) -> None:
+        tags, variables = tuple(prompt.tags), tuple(prompt.variables)
+        if tags or variables:
+            self._row_labels[row] = (tags, variables)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(row)
+        for name in variables:
+            self._vars.setdefault(name, set()).add(row)
+
+    def _unlabel(self, row: int) -> None:
+        tags, variables = self._row_labels.pop(row, ((), ()))
+        for index, labels in ((self._tags, tags), (self._vars, variables)):
+            for label in labels:
+                rows = index.get(label)
+                if rows is not None:
+                    rows.discard(row)
+                    if not rows:
+                        del index[label]
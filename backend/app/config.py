@@ -0,0 +1,167 @@
+"""Runtime configuration for PromptLab
+
+Settings are read from ``PROMPTLAB_*`` environment variables so the same
+image can be tuned per deployment without code changes.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+
+def _env_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass
+class Settings:
+    """Application settings.
+
+    Attributes:
+        profiling_enabled (bool): Allow per-request profiling. When False the
+            profiling hook is not installed at all.
+        profile_header (str): Request header that opts a single request into profiling.
+        profile_dir (Optional[str]): Directory for profile artifacts; a temporary
+            directory is used when unset.
+        snapshot_path (Optional[str]): Snapshot file bulk-loaded at startup, if it exists.
+        snapshot_on_shutdown (bool): Write the store back to ``snapshot_path`` on shutdown,
+            so the next start is warm.
+        gc_freeze (bool): Move every object alive once startup is done (the loaded
+            snapshot included) out of the cyclic garbage collector's later passes.
+        blob_dir (Optional[str]): Directory for the memory-mapped blob file; large
+            prompt bodies stay on the heap when unset.
+        blob_threshold (int): Bodies with at least this many characters go to the blob file.
+        blob_compact_interval (float): Seconds between background compaction checks.
+        admission_enabled (bool): Apply rate limits and concurrency budgets. When
+            False the admission middleware is not installed.
+        rate_limit_per_second (float): Requests per second allowed per client; 0 disables
+            rate limiting.
+        rate_limit_burst (int): Requests a client may make at once before the rate applies.
+        client_id_header (str): Request header identifying the client for rate limiting,
+            honoured only from ``trusted_proxies``; the client address is used otherwise.
+        trusted_proxies (Tuple[str, ...]): Peer addresses of proxies allowed to set
+            ``client_id_header``.
+        expensive_concurrency (int): Concurrent requests allowed on expensive (scanning) routes.
+        cheap_concurrency (int): Concurrent requests allowed on all other routes.
+        queue_wait_target (float): Longest time in seconds a request may wait for a
+            concurrency slot before it is shed with a 503.
+        near_duplicate_threshold (float): Default similarity above which prompts count as
+            near-duplicates; also tunes the LSH banding.
+        search_workers (int): Worker processes for content searches; 0 scans in the
+            request thread.
+        job_workers (int): Background jobs running at the same time.
+        job_batch_size (int): Items a background job processes between yields.
+        job_inline_limit (int): Collections with at most this many prompts are deleted
+            inside the request (204); larger ones in a background job (202).
+        tombstone_retention (float): Seconds delete tombstones are kept for delta sync.
+        tenants_enabled (bool): Give each tenant its own store, selected by
+            ``tenant_header`` or the ``/tenants/{tenant}`` path prefix.
+        tenant_header (str): Request header naming the tenant.
+        tenant_allowlist (Tuple[str, ...]): The only tenants served besides ``default``;
+            any tenant when empty.
+        tenant_max_tenants (int): Most tenant stores created besides ``default``; 0 for
+            no limit.
+        tenant_max_prompts (int): Most prompts per tenant; 0 for no limit.
+        tenant_max_bytes (int): Most bytes of prompt text per tenant; 0 for no limit.
+        journal_max_entries (int): Writes kept in the mutation journal for point-in-time
+            restore; 0 disables the journal.
+        journal_max_bytes (int): Most bytes of record text the journal keeps.
+        journal_retention (float): Seconds a write is kept in the journal.
+    """
+    profiling_enabled: bool = False
+    profile_header: str = "X-PromptLab-Profile"
+    profile_dir: Optional[str] = None
+    snapshot_path: Optional[str] = None
+    snapshot_on_shutdown: bool = False
+    gc_freeze: bool = False
+    blob_dir: Optional[str] = None
+    blob_threshold: int = 64 * 1024
+    blob_compact_interval: float = 60.0
+    admission_enabled: bool = False
+    rate_limit_per_second: float = 50.0
+    rate_limit_burst: int = 100
+    client_id_header: str = "X-Client-Id"
+    trusted_proxies: Tuple[str, ...] = ()
+    expensive_concurrency: int = 4
+    cheap_concurrency: int = 64
+    queue_wait_target: float = 0.1
+    near_duplicate_threshold: float = 0.8
+    search_workers: int = 0
+    job_workers: int = 2
+    job_batch_size: int = 500
+    job_inline_limit: int = 1000
+    tombstone_retention: float = 24 * 3600.0
+    tenants_enabled: bool = False
+    tenant_header: str = "X-Tenant-Id"
+    tenant_allowlist: Tuple[str, ...] = ()
+    tenant_max_tenants: int = 100
+    tenant_max_prompts: int = 0
+    tenant_max_bytes: int = 0
+    journal_max_entries: int = 100_000
+    journal_max_bytes: int = 64 * 1024 * 1024
+    journal_retention: float = 7 * 24 * 3600.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from ``PROMPTLAB_*`` environment variables.
+
+        Returns:
+            Settings: The settings for this process.
+
+        Example:
+            >>> settings = Settings.from_env()
+            >>> settings.profiling_enabled
+            False
+        """
+        return cls(
+            profiling_enabled=_env_bool("PROMPTLAB_PROFILING"),
+            profile_header=os.environ.get("PROMPTLAB_PROFILE_HEADER", cls.profile_header),
+            profile_dir=os.environ.get("PROMPTLAB_PROFILE_DIR") or None,
+            snapshot_path=os.environ.get("PROMPTLAB_SNAPSHOT") or None,
+            snapshot_on_shutdown=_env_bool("PROMPTLAB_SNAPSHOT_ON_SHUTDOWN"),
+            gc_freeze=_env_bool("PROMPTLAB_GC_FREEZE"),
+            blob_dir=os.environ.get("PROMPTLAB_BLOB_DIR") or None,
+            blob_threshold=int(os.environ.get("PROMPTLAB_BLOB_THRESHOLD", cls.blob_threshold)),
+            blob_compact_interval=float(
+                os.environ.get("PROMPTLAB_BLOB_COMPACT_INTERVAL", cls.blob_compact_interval)),
+            admission_enabled=_env_bool("PROMPTLAB_ADMISSION"),
+            rate_limit_per_second=float(
+                os.environ.get("PROMPTLAB_RATE_LIMIT", cls.rate_limit_per_second)),
+            rate_limit_burst=int(os.environ.get("PROMPTLAB_RATE_LIMIT_BURST", cls.rate_limit_burst)),
+            client_id_header=os.environ.get("PROMPTLAB_CLIENT_ID_HEADER", cls.client_id_header),
+            trusted_proxies=tuple(
+                proxy.strip() for proxy in os.environ.get("PROMPTLAB_TRUSTED_PROXIES", "").split(",")
+                if proxy.strip()),
+            expensive_concurrency=int(
+                os.environ.get("PROMPTLAB_EXPENSIVE_CONCURRENCY", cls.expensive_concurrency)),
+            cheap_concurrency=int(
+                os.environ.get("PROMPTLAB_CHEAP_CONCURRENCY", cls.cheap_concurrency)),
+            queue_wait_target=float(
+                os.environ.get("PROMPTLAB_QUEUE_WAIT_TARGET", cls.queue_wait_target)),
+            near_duplicate_threshold=float(os.environ.get(
+                "PROMPTLAB_NEAR_DUPLICATE_THRESHOLD", cls.near_duplicate_threshold)),
+            search_workers=int(os.environ.get("PROMPTLAB_SEARCH_WORKERS", cls.search_workers)),
+            job_workers=int(os.environ.get("PROMPTLAB_JOB_WORKERS", cls.job_workers)),
+            job_batch_size=int(os.environ.get("PROMPTLAB_JOB_BATCH_SIZE", cls.job_batch_size)),
+            job_inline_limit=int(os.environ.get("PROMPTLAB_JOB_INLINE_LIMIT", cls.job_inline_limit)),
+            tombstone_retention=float(
+                os.environ.get("PROMPTLAB_TOMBSTONE_RETENTION", cls.tombstone_retention)),
+            tenants_enabled=_env_bool("PROMPTLAB_TENANTS"),
+            tenant_header=os.environ.get("PROMPTLAB_TENANT_HEADER", cls.tenant_header),
+            tenant_allowlist=tuple(
+                tenant.strip() for tenant in os.environ.get("PROMPTLAB_TENANT_ALLOWLIST", "").split(",")
+                if tenant.strip()),
+            tenant_max_tenants=int(
+                os.environ.get("PROMPTLAB_TENANT_MAX_TENANTS", cls.tenant_max_tenants)),
+            tenant_max_prompts=int(
+                os.environ.get("PROMPTLAB_TENANT_MAX_PROMPTS", cls.tenant_max_prompts)),
+            tenant_max_bytes=int(os.environ.get("PROMPTLAB_TENANT_MAX_BYTES", cls.tenant_max_bytes)),
+            journal_max_entries=int(
+                os.environ.get("PROMPTLAB_JOURNAL_MAX_ENTRIES", cls.journal_max_entries)),
+            journal_max_bytes=int(os.environ.get("PROMPTLAB_JOURNAL_MAX_BYTES", cls.journal_max_bytes)),
+            journal_retention=float(
+                os.environ.get("PROMPTLAB_JOURNAL_RETENTION", cls.journal_retention)),
+        )
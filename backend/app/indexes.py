@@ -0,0 +1,884 @@
+"""Secondary indexes maintained by Storage on every write
+
+Indexes are updated incrementally as prompts are created, updated and
+deleted. Reads then never have to scan the whole store.
+"""
+
+import threading
+import uuid
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from app.columns import to_micros
+from app.minhash import choose_bands, similarity
+from app.models import Collection, CollectionStats, Prompt, get_current_time
+
+DEFAULT_NEAR_DUPLICATE_THRESHOLD = 0.8
+DEFAULT_TOMBSTONE_RETENTION = 24 * 3600.0
+DEFAULT_JOURNAL_ENTRIES = 100_000
+DEFAULT_JOURNAL_BYTES = 64 * 1024 * 1024
+DEFAULT_JOURNAL_RETENTION = 7 * 24 * 3600.0
+
+# Superseded log entries tolerated before the change log is compacted.
+_MIN_STALE_ENTRIES = 1024
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class _CollectionEntry:
+    """Members and aggregates of one collection."""
+
+    __slots__ = ("members", "tag_counts", "latest")
+
+    def __init__(self):
+        self.members: Dict[str, datetime] = {}
+        self.tag_counts: Dict[str, int] = {}
+        self.latest: Optional[datetime] = None
+
+    def add_tags(self, tags: Iterable[str], delta: int) -> None:
+        counts = self.tag_counts
+        for tag in set(tags):
+            count = counts.get(tag, 0) + delta
+            if count:
+                counts[tag] = count
+            else:
+                del counts[tag]
+
+
+class CollectionStatsIndex:
+    """Per-collection membership, prompt count, latest ``updated_at`` and tag histogram.
+
+    Prompts without a collection are tracked under the key None. Reading the
+    stats of a collection costs O(1) in the number of prompts. The latest
+    ``updated_at`` is only recomputed from the members when the newest prompt
+    leaves a collection, or is updated to an older timestamp.
+    """
+
+    def __init__(self):
+        self._entries: Dict[Optional[str], _CollectionEntry] = {}
+        self._lock = threading.Lock()
+
+    def add(self, prompt: Prompt) -> None:
+        """Count a newly stored prompt.
+
+        Args:
+            prompt (Prompt): The stored record.
+        """
+        with self._lock:
+            self._add(prompt)
+
+    def remove(self, prompt: Prompt) -> None:
+        """Stop counting a prompt that is no longer stored.
+
+        Args:
+            prompt (Prompt): The record being removed.
+        """
+        with self._lock:
+            self._remove(prompt)
+
+    def replace(self, old: Prompt, new: Prompt) -> None:
+        """Move the counts of a prompt from its ``old`` record to its ``new`` one.
+
+        Args:
+            old (Prompt): The record being replaced.
+            new (Prompt): The record replacing it.
+        """
+        with self._lock:
+            if old.collection_id != new.collection_id:
+                self._remove(old)
+                self._add(new)
+                return
+            entry = self._entries[new.collection_id]
+            entry.members[new.id] = new.updated_at
+            if old.tags != new.tags:
+                entry.add_tags(old.tags, -1)
+                entry.add_tags(new.tags, 1)
+            if new.updated_at >= entry.latest:
+                entry.latest = new.updated_at
+            elif old.updated_at == entry.latest:
+                entry.latest = max(entry.members.values())
+
+    def rebuild(self, prompts: Iterable[Prompt]) -> None:
+        """Replace all counts with those of ``prompts``.
+
+        Args:
+            prompts (Iterable[Prompt]): Every stored record.
+        """
+        with self._lock:
+            self._entries = {}
+            for prompt in prompts:
+                self._add(prompt)
+
+    def stats(self, collection_id: Optional[str]) -> CollectionStats:
+        """Return the aggregates of one collection.
+
+        Args:
+            collection_id (Optional[str]): The collection, or None for prompts without one.
+
+        Returns:
+            CollectionStats: Zero counts if the collection holds no prompts.
+        """
+        with self._lock:
+            entry = self._entries.get(collection_id)
+            if entry is None:
+                return CollectionStats()
+            return CollectionStats(
+                prompt_count=len(entry.members),
+                last_updated_at=entry.latest,
+                tag_counts=dict(entry.tag_counts),
+            )
+
+    def members(self, collection_id: Optional[str]) -> List[str]:
+        """Return the IDs of the prompts in one collection.
+
+        Args:
+            collection_id (Optional[str]): The collection, or None for prompts without one.
+
+        Returns:
+            List[str]: Prompt IDs in insertion order.
+        """
+        with self._lock:
+            entry = self._entries.get(collection_id)
+            return list(entry.members) if entry is not None else []
+
+    def _add(self, prompt: Prompt) -> None:
+        entry = self._entries.get(prompt.collection_id)
+        if entry is None:
+            entry = self._entries[prompt.collection_id] = _CollectionEntry()
+        entry.members[prompt.id] = prompt.updated_at
+        entry.add_tags(prompt.tags, 1)
+        if entry.latest is None or prompt.updated_at > entry.latest:
+            entry.latest = prompt.updated_at
+
+    def _remove(self, prompt: Prompt) -> None:
+        entry = self._entries.get(prompt.collection_id)
+        if entry is None or entry.members.pop(prompt.id, None) is None:
+            return
+        if not entry.members:
+            del self._entries[prompt.collection_id]
+            return
+        entry.add_tags(prompt.tags, -1)
+        if prompt.updated_at == entry.latest:
+            entry.latest = max(entry.members.values())
+
+
+class NearDuplicateIndex:
+    """MinHash signatures of prompt contents, bucketed by LSH band.
+
+    Two prompts are candidates when they share a bucket in any band, and are
+    reported when their signatures agree on at least ``threshold`` of their
+    positions. The banding is chosen for ``threshold``; querying with a
+    lower threshold can miss pairs that never share a bucket.
+
+    Attributes:
+        threshold (float): Default similarity threshold; also sets the banding.
+        complete (bool): Whether every stored prompt has a signature. False
+            after a bulk load, until :meth:`Storage.complete_signatures`
+            fills in the missing signatures in the background.
+    """
+
+    def __init__(self, threshold: float = DEFAULT_NEAR_DUPLICATE_THRESHOLD):
+        self._lock = threading.Lock()
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self.complete = True
+        self.set_threshold(threshold)
+
+    def set_threshold(self, threshold: float) -> None:
+        """Change the default threshold and re-band the stored signatures.
+
+        Args:
+            threshold (float): Similarity between 0 and 1.
+        """
+        with self._lock:
+            self.threshold = threshold
+            self._bands, self._rows = choose_bands(threshold)
+            self._buckets = {}
+            for prompt_id, signature in self._signatures.items():
+                self._bucket(prompt_id, signature)
+
+    def add(self, prompt_id: str, signature: Tuple[int, ...]) -> None:
+        """Store or replace the signature of a prompt.
+
+        Args:
+            prompt_id (str): The prompt.
+            signature (Tuple[int, ...]): Its content signature.
+        """
+        with self._lock:
+            self._unbucket(prompt_id)
+            self._signatures[prompt_id] = signature
+            self._bucket(prompt_id, signature)
+
+    def remove(self, prompt_id: str) -> None:
+        """Forget the signature of a prompt.
+
+        Args:
+            prompt_id (str): The prompt.
+        """
+        with self._lock:
+            self._unbucket(prompt_id)
+
+    def __contains__(self, prompt_id: str) -> bool:
+        return prompt_id in self._signatures
+
+    def reset(self, complete: bool) -> None:
+        """Drop every signature.
+
+        Args:
+            complete (bool): Whether the store is empty, so nothing is missing.
+        """
+        with self._lock:
+            self._signatures = {}
+            self._buckets = {}
+            self.complete = complete
+
+    def similar(self, prompt_id: str, threshold: float) -> List[Tuple[str, float]]:
+        """Find prompts whose content is similar to that of ``prompt_id``.
+
+        Args:
+            prompt_id (str): The prompt to compare against.
+            threshold (float): Minimum estimated Jaccard similarity.
+
+        Returns:
+            List[Tuple[str, float]]: ``(prompt_id, similarity)`` pairs, most similar first.
+        """
+        with self._lock:
+            signature = self._signatures.get(prompt_id)
+            if signature is None:
+                return []
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(prompt_id)
+            scored = [(other, similarity(signature, self._signatures[other]))
+                      for other in candidates]
+        matches = [(other, round(score, 4)) for other, score in scored if score >= threshold]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches
+
+    def clusters(self, threshold: float) -> List[List[str]]:
+        """Group all prompts into clusters of near-duplicates.
+
+        Only prompts sharing an LSH bucket are compared. Within a bucket,
+        each prompt is compared against one representative per cluster
+        found there so far, not against every other member, so a bucket of
+        exact duplicates costs linear time.
+
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity for a link.
+
+        Returns:
+            List[List[str]]: Clusters of two or more prompt IDs, largest first.
+        """
+        with self._lock:
+            signatures = dict(self._signatures)
+            buckets = [sorted(members) for members in self._buckets.values() if len(members) > 1]
+
+        parent: Dict[str, str] = {}
+
+        def find(item: str) -> str:
+            root = item
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while item != root:
+                parent[item], item = root, parent[item]
+            return root
+
+        for members in buckets:
+            representatives: List[str] = []
+            for member in members:
+                root = find(member)
+                for representative in representatives:
+                    other = find(representative)
+                    if other == root:
+                        break
+                    if similarity(signatures[member], signatures[representative]) >= threshold:
+                        parent[root] = other
+                        break
+                else:
+                    representatives.append(member)
+
+        # Every linked prompt has a parent entry; roots never do.
+        groups: Dict[str, List[str]] = {}
+        for member in list(parent):
+            groups.setdefault(find(member), []).append(member)
+        clusters = [sorted(group + [root]) for root, group in groups.items()]
+        clusters.sort(key=lambda cluster: (-len(cluster), cluster[0]))
+        return clusters
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, int]]:
+        rows = self._rows
+        return [(band, hash(signature[band * rows:(band + 1) * rows]))
+                for band in range(self._bands)]
+
+    def _bucket(self, prompt_id: str, signature: Tuple[int, ...]) -> None:
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(prompt_id)
+
+    def _unbucket(self, prompt_id: str) -> None:
+        signature = self._signatures.pop(prompt_id, None)
+        if signature is None:
+            return
+        for key in self._band_keys(signature):
+            members = self._buckets.get(key)
+            if members is not None:
+                members.discard(prompt_id)
+                if not members:
+                    del self._buckets[key]
+
+
+class ChangeLog:
+    """Write sequence numbers and delete tombstones, for delta sync.
+
+    Every write to a prompt takes the next sequence number and appends
+    ``(seq, prompt_id)`` to a log that is therefore ordered by sequence. A
+    delete appends a tombstone the same way. A reader resumes after the
+    last sequence number it saw by bisecting the log. An entry is live
+    while it is the newest entry of its prompt; superseded entries are
+    skipped and dropped by compaction.
+
+    Tombstones are kept for ``retention`` seconds. Once one has been
+    compacted away, readers whose watermark predates it may have missed a
+    delete, so :meth:`changes` reports their watermark as expired.
+
+    Attributes:
+        epoch (str): Changes with each reset (bulk load or clear); watermarks of
+            other epochs are expired.
+        retention (float): Seconds a tombstone is kept.
+    """
+
+    def __init__(self, retention: float = DEFAULT_TOMBSTONE_RETENTION):
+        self._lock = threading.Lock()
+        self.retention = retention
+        self.reset(())
+
+    def reset(self, prompt_ids: Iterable[str]) -> None:
+        """Start a new epoch holding one entry per prompt.
+
+        Args:
+            prompt_ids (Iterable[str]): Every stored prompt ID.
+        """
+        with self._lock:
+            self.epoch = uuid.uuid4().hex[:12]
+            self._seqs: List[int] = []
+            self._ids: List[str] = []
+            self._latest: Dict[str, int] = {}
+            self._tombstones: Dict[str, Tuple[int, datetime]] = {}
+            self._sequence = 0
+            self._horizon = 0
+            self._last_expiry: Optional[datetime] = None
+            for prompt_id in prompt_ids:
+                self._append(prompt_id)
+
+    def record(self, prompt_id: str) -> None:
+        """Log a create or update of a prompt.
+
+        Args:
+            prompt_id (str): The prompt written.
+        """
+        with self._lock:
+            self._tombstones.pop(prompt_id, None)
+            self._append(prompt_id)
+            self._maybe_compact()
+
+    def record_delete(self, prompt_id: str, deleted_at: datetime) -> None:
+        """Log the delete of a prompt as a tombstone.
+
+        Args:
+            prompt_id (str): The prompt deleted.
+            deleted_at (datetime): When it was deleted.
+        """
+        with self._lock:
+            self._tombstones[prompt_id] = (self._append(prompt_id), deleted_at)
+            self._expire_tombstones(deleted_at)
+            self._maybe_compact()
+
+    def changes(self, epoch: Optional[str], since: Optional[int], limit: int,
+                now: Optional[datetime] = None, floor: int = 0
+                ) -> Optional[Tuple[List[Tuple[str, Optional[datetime]]], str, int, int, bool]]:
+        """Return the prompts written or deleted after sequence number ``since``.
+
+        A full sync (``since`` None) returns every live entry. It needs no
+        horizon check, since the tombstones compacted so far belong to prompts
+        that are gone and are never returned. Its pages carry the horizon it
+        started at as ``floor``, so resuming one is only refused if a tombstone
+        it has not passed yet was compacted meanwhile.
+
+        Args:
+            epoch (Optional[str]): The epoch ``since`` belongs to; None for the current one.
+            since (Optional[int]): The last sequence number the reader has seen; None
+                for a full sync.
+            limit (int): Maximum number of changes to return.
+            now (Optional[datetime]): The current time, for tombstone expiry.
+            floor (int): The horizon the reader's full sync started at, if it is still
+                paging through one.
+
+        Returns:
+            Optional[Tuple]: ``(changes, epoch, watermark, floor, has_more)``, where
+            ``changes`` holds ``(prompt_id, deleted_at)`` pairs in sequence order
+            (``deleted_at`` is None for writes), ``watermark`` is the sequence number
+            to resume after and ``floor`` is to be passed back with it. None if
+            ``since`` belongs to another epoch or predates a compacted tombstone.
+        """
+        with self._lock:
+            self._expire_tombstones(now)
+            if since is None:
+                since, floor = 0, self._horizon
+            if epoch not in (None, self.epoch) or floor > self._sequence \
+                    or not self._horizon <= max(since, floor) or since > self._sequence:
+                return None
+            changes: List[Tuple[str, Optional[datetime]]] = []
+            watermark = since
+            position = bisect_right(self._seqs, since)
+            for position in range(position, len(self._seqs)):
+                seq, prompt_id = self._seqs[position], self._ids[position]
+                if self._latest.get(prompt_id) != seq:
+                    continue
+                if len(changes) == limit:
+                    return changes, self.epoch, watermark, floor, True
+                tombstone = self._tombstones.get(prompt_id)
+                changes.append((prompt_id, tombstone[1] if tombstone is not None else None))
+                watermark = seq
+            return changes, self.epoch, self._sequence, floor, False
+
+    @property
+    def sequence(self) -> int:
+        """The sequence number of the newest change."""
+        return self._sequence
+
+    def __len__(self) -> int:
+        return len(self._seqs)
+
+    # ----- internals; callers hold the lock -----
+
+    def _append(self, prompt_id: str) -> int:
+        self._sequence += 1
+        self._seqs.append(self._sequence)
+        self._ids.append(prompt_id)
+        self._latest[prompt_id] = self._sequence
+        return self._sequence
+
+    def _maybe_compact(self) -> None:
+        stale = len(self._seqs) - len(self._latest)
+        if stale > max(_MIN_STALE_ENTRIES, len(self._latest)):
+            self._compact()
+
+    def _expire_tombstones(self, now: Optional[datetime]) -> None:
+        """Drop tombstones older than the retention period, at most once a minute."""
+        if not self._tombstones:
+            return
+        now = now or get_current_time()
+        if self._last_expiry is not None and now - self._last_expiry < timedelta(minutes=1):
+            return
+        self._last_expiry = now
+        cutoff = now - timedelta(seconds=self.retention)
+        expired = [prompt_id for prompt_id, (_, deleted_at) in self._tombstones.items()
+                   if deleted_at < cutoff]
+        for prompt_id in expired:
+            seq, _ = self._tombstones.pop(prompt_id)
+            del self._latest[prompt_id]
+            self._horizon = max(self._horizon, seq)
+        if expired:
+            self._compact()
+
+    def _compact(self) -> None:
+        latest = self._latest
+        kept = [(seq, prompt_id) for seq, prompt_id in zip(self._seqs, self._ids)
+                if latest.get(prompt_id) == seq]
+        self._seqs = [seq for seq, _ in kept]
+        self._ids = [prompt_id for _, prompt_id in kept]
+
+
+class QuotaExceeded(Exception):
+    """Raised when a write would take a store past one of its quotas.
+
+    Attributes:
+        quota (str): ``"prompts"`` or ``"bytes"``.
+        limit (int): The configured limit.
+    """
+
+    def __init__(self, quota: str, limit: int):
+        super().__init__(f"quota exceeded: at most {limit} {quota}")
+        self.quota = quota
+        self.limit = limit
+
+
+def record_bytes(prompt: Prompt) -> int:
+    """UTF-8 size of the text a prompt stores: title, description and content."""
+    size = 0
+    for text in (prompt.title, prompt.description, prompt.content):
+        if text:
+            size += len(text) if text.isascii() else len(text.encode("utf-8"))
+    return size
+
+
+class UsageIndex:
+    """Prompt count and stored bytes of a store, with optional limits.
+
+    Writes are admitted only while they keep the store within its limits.
+    A write that does not grow the store (an update to a smaller or equal
+    body, say) is always admitted, so a store over a lowered limit can
+    still be trimmed.
+
+    Attributes:
+        max_prompts (Optional[int]): Most prompts the store may hold; None for no limit.
+        max_bytes (Optional[int]): Most bytes (see :func:`record_bytes`) it may hold.
+        rejections (Dict[str, int]): Writes refused so far, per quota.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.max_prompts: Optional[int] = None
+        self.max_bytes: Optional[int] = None
+        self.rejections: Dict[str, int] = {"prompts": 0, "bytes": 0}
+        self.reset(())
+
+    def reset(self, prompts: Iterable[Prompt]) -> None:
+        """Recount usage from scratch.
+
+        Args:
+            prompts (Iterable[Prompt]): Every stored prompt, with full content.
+        """
+        with self._lock:
+            self._sizes: Dict[str, int] = {prompt.id: record_bytes(prompt) for prompt in prompts}
+            self.bytes = sum(self._sizes.values())
+
+    def admit(self, prompt_id: str, size: int) -> None:
+        """Account for a write of ``size`` bytes to ``prompt_id``, if the limits allow it.
+
+        Args:
+            prompt_id (str): The prompt written.
+            size (int): Its new size, from :func:`record_bytes`.
+
+        Raises:
+            QuotaExceeded: If the write would take the store past a limit.
+        """
+        with self._lock:
+            previous = self._sizes.get(prompt_id)
+            if previous is None and self.max_prompts is not None \
+                    and len(self._sizes) >= self.max_prompts:
+                self.rejections["prompts"] += 1
+                raise QuotaExceeded("prompts", self.max_prompts)
+            total = self.bytes + size - (previous or 0)
+            if self.max_bytes is not None and size > (previous or 0) and total > self.max_bytes:
+                self.rejections["bytes"] += 1
+                raise QuotaExceeded("bytes", self.max_bytes)
+            self._sizes[prompt_id] = size
+            self.bytes = total
+
+    def remove(self, prompt_id: str) -> None:
+        """Release the usage of a deleted prompt.
+
+        Args:
+            prompt_id (str): The prompt deleted.
+        """
+        with self._lock:
+            self.bytes -= self._sizes.pop(prompt_id, 0)
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+
+class VersionLog:
+    """Superseded prompt records kept for readers pinned at older versions.
+
+    Versions count the writes to a store. While no reader is pinned, writes
+    record nothing. While one is, each write first saves the record it
+    replaces (None for a create) with the version of the write, so a
+    reader at version ``v`` finds the record as of ``v`` in the oldest
+    entry newer than ``v``, or else in the live store. Entries are
+    reclaimed as soon as no pinned reader is old enough to need them.
+
+    Attributes:
+        lock (threading.Lock): Serializes writers publishing a version and
+            readers pinning one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._pins: Dict[int, int] = {}
+        self._superseded: Dict[str, List[Tuple[int, Optional[Prompt]]]] = {}
+        self._retained = 0
+
+    @property
+    def pinned(self) -> bool:
+        """Whether any reader holds a version; callers hold ``lock``."""
+        return bool(self._pins)
+
+    def record(self, prompt_id: str, version: int, previous: Optional[Prompt]) -> None:
+        """Save the record a write at ``version`` replaces; callers hold ``lock``.
+
+        Args:
+            prompt_id (str): The prompt written.
+            version (int): The version the write creates.
+            previous (Optional[Prompt]): The record before the write, with its
+                full content; None if the write creates the prompt.
+        """
+        self._superseded.setdefault(prompt_id, []).append((version, previous))
+        self._retained += 1
+
+    def pin(self, version: int) -> None:
+        """Hold ``version`` for a reader; callers hold ``lock``.
+
+        Args:
+            version (int): The current version.
+        """
+        self._pins[version] = self._pins.get(version, 0) + 1
+
+    def unpin(self, version: int) -> None:
+        """Release a reader's version and reclaim what no reader needs anymore.
+
+        Args:
+            version (int): A version passed to :meth:`pin`.
+        """
+        with self.lock:
+            remaining = self._pins[version] - 1
+            if remaining:
+                self._pins[version] = remaining
+                return
+            del self._pins[version]
+            if not self._pins:
+                self._superseded = {}
+                self._retained = 0
+            elif version < min(self._pins):
+                self._reclaim(min(self._pins))
+
+    def as_of(self, prompt_id: str, version: int) -> Tuple[bool, Optional[Prompt]]:
+        """Find the record a reader pinned at ``version`` sees.
+
+        Args:
+            prompt_id (str): The prompt.
+            version (int): The reader's version.
+
+        Returns:
+            Tuple[bool, Optional[Prompt]]: ``(True, record)`` if the prompt changed
+            after ``version``, where ``record`` is its state then (None if it did
+            not exist yet); ``(False, None)`` if the live record is still current.
+        """
+        for written, previous in self._superseded.get(prompt_id, ()):
+            if written > version:
+                return True, previous
+        return False, None
+
+    def changed(self, since: int, until: Optional[int] = None) -> List[str]:
+        """List the prompts written after version ``since``.
+
+        Args:
+            since (int): The reader's version.
+            until (Optional[int]): The last version to include; all if None.
+
+        Returns:
+            List[str]: The prompt IDs.
+        """
+        return [prompt_id for prompt_id, entries in list(self._superseded.items())
+                if any(since < written and (until is None or written <= until)
+                       for written, _ in entries)]
+
+    def __len__(self) -> int:
+        return self._retained
+
+    # ----- internals; callers hold the lock -----
+
+    def _reclaim(self, oldest: int) -> None:
+        # A reader at ``oldest`` only needs entries written after it
+        for prompt_id, entries in list(self._superseded.items()):
+            kept = [entry for entry in entries if entry[0] > oldest]
+            self._retained -= len(entries) - len(kept)
+            if kept:
+                self._superseded[prompt_id] = kept
+            else:
+                del self._superseded[prompt_id]
+
+
+# A journaled record: ``("prompt", id)`` or ``("collection", id)``.
+JournalKey = Tuple[str, str]
+JournalRecord = Union[Prompt, Collection, None]
+
+
+class JournalExpired(Exception):
+    """Raised when a restore reaches back further than the mutation journal.
+
+    Attributes:
+        horizon (Optional[datetime]): The earliest restorable time; None if
+            the journal is disabled.
+    """
+
+    def __init__(self, horizon: Optional[datetime]):
+        super().__init__("journal disabled" if horizon is None
+                         else f"journal only reaches back to {horizon.isoformat()}")
+        self.horizon = horizon
+
+
+def journal_bytes(record: JournalRecord) -> int:
+    """UTF-8 size of the text a journaled record holds."""
+    if record is None:
+        return 0
+    if isinstance(record, Prompt):
+        return record_bytes(record)
+    return len((record.name + (record.description or "")).encode("utf-8"))
+
+
+class _JournalEntry:
+    """One journaled write: the record after it, and, for the oldest entry of
+    its key, the record before it."""
+
+    __slots__ = ("at", "key", "before", "after", "size")
+
+    def __init__(self, at: int, key: JournalKey, before: JournalRecord, after: JournalRecord):
+        self.at = at
+        self.key = key
+        self.before = before
+        self.after = after
+        self.size = journal_bytes(before) + journal_bytes(after)
+
+
+def _entry_at(entry: _JournalEntry) -> int:
+    return entry.at
+
+
+class MutationJournal:
+    """Recent writes to prompts and collections, for point-in-time restore.
+
+    Every write appends the record it leaves behind (None for a delete),
+    with its time. Entries are also indexed per record, so the state of one
+    record as of a time is a bisection of its own history, and restoring a
+    whole store only visits the entries written after the restore time. The
+    record a key held before its oldest retained entry is kept on that
+    entry, and handed on to the next one when the oldest is trimmed.
+
+    The journal keeps at most ``max_entries`` entries and ``max_bytes`` of
+    record text, and drops entries older than ``retention`` seconds. Writes
+    older than the newest dropped entry can no longer be undone, so that
+    entry's time is the journal's horizon.
+
+    Attributes:
+        max_entries (int): Most entries kept; 0 disables the journal.
+        max_bytes (int): Most bytes of record text kept.
+        retention (float): Seconds an entry is kept.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_JOURNAL_ENTRIES,
+                 max_bytes: int = DEFAULT_JOURNAL_BYTES,
+                 retention: float = DEFAULT_JOURNAL_RETENTION):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.retention = retention
+        self.reset()
+
+    @property
+    def enabled(self) -> bool:
+        """Whether writes are journaled."""
+        return self.max_entries > 0
+
+    @property
+    def horizon(self) -> datetime:
+        """The earliest time a restore can go back to."""
+        return _EPOCH + timedelta(microseconds=self._horizon)
+
+    @property
+    def bytes(self) -> int:
+        """Bytes of record text held."""
+        return self._bytes
+
+    def reset(self, now: Optional[datetime] = None) -> None:
+        """Forget all history; restores can go back no further than ``now``.
+
+        Args:
+            now (Optional[datetime]): The current time.
+        """
+        with self._lock:
+            self._entries: List[_JournalEntry] = []
+            self._head = 0
+            self._history: Dict[JournalKey, List[_JournalEntry]] = {}
+            self._bytes = 0
+            self._horizon = self._last = to_micros(now or get_current_time())
+
+    def record(self, key: JournalKey, before: JournalRecord, after: JournalRecord,
+               now: Optional[datetime] = None) -> None:
+        """Journal one write.
+
+        Writes to the same key must be recorded in the order they were applied.
+
+        Args:
+            key (JournalKey): The record written.
+            before (JournalRecord): The record before the write, with its full
+                content; None if the write created it.
+            after (JournalRecord): The record after the write, with its full
+                content; None if the write deleted it.
+            now (Optional[datetime]): The time of the write.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            at = self._last = max(to_micros(now or get_current_time()), self._last)
+            history = self._history.setdefault(key, [])
+            entry = _JournalEntry(at, key, None if history else before, after)
+            history.append(entry)
+            self._entries.append(entry)
+            self._bytes += entry.size
+            self._trim(at)
+
+    def states_at(self, as_of: datetime, keys: Optional[Iterable[JournalKey]] = None
+                  ) -> Dict[JournalKey, JournalRecord]:
+        """Find what records held as of a time, for the records written since.
+
+        Args:
+            as_of (datetime): The time to look back to; naive times are UTC.
+            keys (Optional[Iterable[JournalKey]]): Only these records; all
+                records written after ``as_of`` when None.
+
+        Returns:
+            Dict[JournalKey, JournalRecord]: For each record written after
+            ``as_of``, its state then; None if it did not exist.
+
+        Raises:
+            JournalExpired: If the journal is disabled or ``as_of`` is before its horizon.
+        """
+        at = to_micros(as_of)
+        with self._lock:
+            if not self.enabled:
+                raise JournalExpired(None)
+            if at < self._horizon:
+                raise JournalExpired(self.horizon)
+            if keys is None:
+                start = bisect_right(self._entries, at, lo=self._head, key=_entry_at)
+                keys = {entry.key for entry in self._entries[start:]}
+            states: Dict[JournalKey, JournalRecord] = {}
+            for key in keys:
+                history = self._history.get(key)
+                if not history or history[-1].at <= at:
+                    continue
+                position = bisect_right(history, at, key=_entry_at)
+                states[key] = history[position - 1].after if position else history[0].before
+            return states
+
+    def __len__(self) -> int:
+        return len(self._entries) - self._head
+
+    # ----- internals; callers hold the lock -----
+
+    def _trim(self, now: int) -> None:
+        cutoff = now - int(self.retention * 1_000_000)
+        entries = self._entries
+        while self._head < len(entries) and (
+                len(entries) - self._head > self.max_entries or self._bytes > self.max_bytes
+                or entries[self._head].at < cutoff):
+            entry = entries[self._head]
+            self._head += 1
+            self._bytes -= entry.size
+            self._horizon = max(self._horizon, entry.at)
+            history = self._history[entry.key]
+            del history[0]
+            if history:
+                successor = history[0]
+                successor.before = entry.after
+                size = journal_bytes(entry.after)
+                successor.size += size
+                self._bytes += size
+            else:
+                del self._history[entry.key]
+        if self._head > 1024 and self._head * 2 > len(entries):
+            del entries[:self._head]
+            self._head = 0
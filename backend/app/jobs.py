@@ -0,0 +1,207 @@
+"""In-process background jobs for heavy maintenance operations
+
+A :class:`JobRunner` executes jobs on a small, fixed pool of threads, so a
+large cascade delete no longer holds a request thread for seconds. A job is a
+generator that does its work in batches and yields the number of items each
+batch processed. Between batches the runner records progress, checks for a
+cancel request and briefly sleeps, which releases the GIL to foreground
+requests.
+
+Finished jobs are kept for inspection through ``GET /jobs/{id}`` until
+``max_finished`` newer jobs have finished.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+
+from app.metrics import JOBS_FINISHED
+from app.models import Job, generate_id, get_current_time
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = frozenset({SUCCEEDED, FAILED, CANCELLED})
+
+# A job's work: yields the number of items processed by each batch.
+JobSteps = Callable[[], Iterator[int]]
+
+
+class JobQueueFull(Exception):
+    """Raised when a job is submitted while ``max_queued`` jobs are already waiting."""
+
+
+class JobRunner:
+    """A bounded pool of worker threads running batched jobs.
+
+    Attributes:
+        workers (int): Jobs running at the same time.
+        max_queued (int): Jobs that may wait for a worker before submissions are refused.
+        max_finished (int): Finished jobs kept for status queries.
+        batch_pause (float): Seconds slept between batches, to give way to requests.
+    """
+
+    def __init__(self, workers: int = 2, max_queued: int = 100, max_finished: int = 1000,
+                 batch_pause: float = 0.001):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_finished = max_finished
+        self.batch_pause = batch_pause
+        self._jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._cancels: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def submit(self, kind: str, steps: JobSteps, total: int = 0) -> Job:
+        """Queue a job.
+
+        Args:
+            kind (str): What the job does, reported in its status.
+            steps (JobSteps): Called on a worker thread; returns an iterator whose
+                items are the number of items each batch processed.
+            total (int): Expected number of items, for progress reporting.
+
+        Returns:
+            Job: The job's status at submission.
+
+        Raises:
+            JobQueueFull: If ``max_queued`` jobs are already waiting.
+
+        Example:
+            >>> job = runner.submit("delete_collection", steps, total=5000)
+            >>> job.status
+            'queued'
+        """
+        with self._lock:
+            queued = sum(1 for job in self._jobs.values() if job.status == QUEUED)
+            if queued >= self.max_queued:
+                raise JobQueueFull(f"{queued} jobs already queued")
+            job = Job(id=generate_id(), kind=kind, status=QUEUED, total=total,
+                      created_at=get_current_time())
+            self._jobs[job.id] = job
+            self._cancels[job.id] = threading.Event()
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="promptlab-job")
+            pool = self._pool
+            snapshot = job.model_copy()
+        pool.submit(self._run, job.id, steps)
+        return snapshot
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Return a job's current status.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Optional[Job]: A copy of the status, or None if the job is unknown or expired.
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.model_copy() if job is not None else None
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Ask a job to stop.
+
+        A queued job is cancelled at once. A running job stops at its next
+        batch boundary; work done by earlier batches is kept. Cancelling a
+        finished job has no effect.
+
+        Args:
+            job_id (str): The job ID.
+
+        Returns:
+            Optional[Job]: The job's status after the request, or None if unknown.
+
+        Example:
+            >>> runner.cancel(job.id).cancel_requested
+            True
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if job.status not in FINISHED:
+                job.cancel_requested = True
+                self._cancels[job_id].set()
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+            return job.model_copy()
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Block until a job has finished.
+
+        Args:
+            job_id (str): The job ID.
+            timeout (Optional[float]): Give up after this many seconds.
+
+        Returns:
+            Optional[Job]: The job's last known status, or None if unknown.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job.status in FINISHED:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(0.005)
+
+    def shutdown(self) -> None:
+        """Cancel every unfinished job and wait for the workers to exit."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+            for job in self._jobs.values():
+                if job.status not in FINISHED:
+                    job.cancel_requested = True
+                    self._cancels[job.id].set()
+                    if job.status == QUEUED:
+                        self._finish(job, CANCELLED)
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def _run(self, job_id: str, steps: JobSteps) -> None:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return
+            job.status = RUNNING
+            job.started_at = get_current_time()
+            cancelled = self._cancels[job_id]
+
+        try:
+            batches = steps()
+            for processed in batches:
+                with self._lock:
+                    job.done += processed
+                    job.total = max(job.total, job.done)
+                if cancelled.is_set():
+                    batches.close()
+                    with self._lock:
+                        self._finish(job, CANCELLED)
+                    return
+                time.sleep(self.batch_pause)
+        except Exception as error:
+            with self._lock:
+                job.error = f"{type(error).__name__}: {error}"
+                self._finish(job, FAILED)
+            return
+        with self._lock:
+            self._finish(job, SUCCEEDED)
+
+    def _finish(self, job: Job, status: str) -> None:
+        """Record a final status and expire the oldest finished jobs. Caller holds the lock."""
+        job.status = status
+        job.finished_at = get_current_time()
+        JOBS_FINISHED.labels(job.kind, status).inc()
+        self._finished[job.id] = None
+        while len(self._finished) > self.max_finished:
+            expired, _ = self._finished.popitem(last=False)
+            del self._jobs[expired]
+            del self._cancels[expired]
@@ -0,0 +1,543 @@
+"""Prometheus-style metrics for PromptLab
+
+This module provides a small, dependency-free metrics registry that renders
+the Prometheus text exposition format. Counters and histograms are sharded
+per thread: each writer thread owns its own preallocated cell array, so the
+hot path never takes a lock. Scrapes sum the shards; the shard of an exited
+thread is folded into a running total.
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, tuned for an in-memory API (50us .. 10s).
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005,
+    0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Method label values; any other request method is counted as "other".
+HTTP_METHODS = frozenset({"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS",
+                          "TRACE", "CONNECT"})
+
+
+class _ShardOwner:
+    """A token held only by its thread's local storage, so it dies with the thread."""
+
+    __slots__ = ("__weakref__",)
+
+
+class _ThreadCells:
+    """A set of numeric cells sharded per thread.
+
+    Every thread that writes gets its own list of ``width`` cells on first
+    use. Only that thread ever mutates it, so increments need no lock. The
+    registration of a new shard is the only locked operation on the hot path.
+    When the thread exits, its shard is folded into ``_retired``, so the
+    number of shards follows the live threads rather than every thread ever
+    started.
+
+    Attributes:
+        width (int): Number of cells in each shard.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self._local = threading.local()
+        self._shards: Dict[int, list] = {}
+        self._retired = [0] * width
+        # Reentrant: a shard may be retired by a collection on a thread
+        # that already holds the lock.
+        self._lock = threading.RLock()
+
+    def cells(self) -> list:
+        """Return the calling thread's cell array, creating it if needed.
+
+        Returns:
+            list: The mutable cells owned by the current thread.
+        """
+        try:
+            return self._local.cells
+        except AttributeError:
+            cells = [0] * self.width
+            owner = _ShardOwner()
+            with self._lock:
+                self._shards[id(cells)] = cells
+            weakref.finalize(owner, self._retire, id(cells))
+            self._local.owner = owner
+            self._local.cells = cells
+            return cells
+
+    def _retire(self, key: int) -> None:
+        # The owning thread has exited, so nothing writes to its shard anymore.
+        with self._lock:
+            shard = self._shards.pop(key)
+            for index, value in enumerate(shard):
+                self._retired[index] += value
+
+    def totals(self) -> list:
+        """Sum the cells of every shard, including those of exited threads.
+
+        Returns:
+            list: One total per cell index.
+        """
+        with self._lock:
+            totals = list(self._retired)
+            for shard in list(self._shards.values()):
+                for index, value in enumerate(shard):
+                    totals[index] += value
+        return totals
+
+
+class _Metric:
+    """Base class for a metric family with optional labels.
+
+    Attributes:
+        name (str): The metric name as exported.
+        documentation (str): The ``# HELP`` text.
+        labelnames (Tuple[str, ...]): Names of the labels for this family.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, *values: str):
+        """Return the child metric for the given label values.
+
+        Args:
+            *values (str): One value per label name, in order.
+
+        Returns:
+            The child metric, created on first use.
+
+        Example:
+            >>> REQUESTS.labels("GET", "/prompts", "200").inc()
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self) -> Iterable[Tuple[str, Tuple[Tuple[str, str], ...], float]]:
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        """Render the family in Prometheus text format.
+
+        Returns:
+            List[str]: The exposition lines for this family.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        for suffix, labels, value in self._samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return lines
+
+
+class _CounterChild:
+    """A single monotonically increasing counter."""
+
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount: float = 1) -> None:
+        """Increment the counter by ``amount``."""
+        self._cells.cells()[0] += amount
+
+    @property
+    def value(self) -> float:
+        """The current total across all threads."""
+        return self._cells.totals()[0]
+
+
+class Counter(_Metric):
+    """A labelled family of monotonically increasing counters."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _CounterChild:
+        return _CounterChild()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", tuple(zip(self.labelnames, values)), child.value
+
+
+class _GaugeChild:
+    """A single gauge that can go up and down."""
+
+    __slots__ = ("_cells",)
+
+    def __init__(self):
+        self._cells = _ThreadCells(1)
+
+    def inc(self, amount: float = 1) -> None:
+        """Increase the gauge by ``amount``."""
+        self._cells.cells()[0] += amount
+
+    def dec(self, amount: float = 1) -> None:
+        """Decrease the gauge by ``amount``."""
+        self._cells.cells()[0] -= amount
+
+    @property
+    def value(self) -> float:
+        """The current value across all threads."""
+        return self._cells.totals()[0]
+
+
+class Gauge(_Metric):
+    """A labelled family of gauges updated with ``inc``/``dec``."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _GaugeChild:
+        return _GaugeChild()
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            yield "", tuple(zip(self.labelnames, values)), child.value
+
+
+class CallbackGauge(_Metric):
+    """A gauge family whose values are computed at scrape time.
+
+    The callback returns a mapping of label-value tuples to numbers, so sizes
+    of storage indexes and caches cost nothing on the request path.
+    """
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def _samples(self):
+        for values, value in self._callback().items():
+            yield "", tuple(zip(self.labelnames, values)), value
+
+
+class CallbackCounter(CallbackGauge):
+    """A counter family whose totals are read at scrape time."""
+
+    kind = "counter"
+
+
+class _HistogramChild:
+    """A single histogram with preallocated buckets.
+
+    Cell layout per thread: one count per bucket (the last is ``+Inf``),
+    followed by the running sum.
+    """
+
+    __slots__ = ("_bounds", "_cells")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        self._cells = _ThreadCells(len(bounds) + 2)
+
+    def observe(self, value: float) -> None:
+        """Record one observation."""
+        cells = self._cells.cells()
+        cells[bisect_left(self._bounds, value)] += 1
+        cells[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], int, float]:
+        """Return cumulative bucket counts, the total count and the sum.
+
+        Returns:
+            Tuple[List[int], int, float]: ``(cumulative, count, sum)``.
+        """
+        totals = self._cells.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, running, totals[-1]
+
+
+class Histogram(_Metric):
+    """A labelled family of histograms with fixed bucket bounds.
+
+    Attributes:
+        buckets (Tuple[float, ...]): Upper bounds of the finite buckets.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def _samples(self):
+        for values, child in list(self._children.items()):
+            base = tuple(zip(self.labelnames, values))
+            cumulative, count, total = child.snapshot()
+            for bound, bucket_count in zip(self.buckets, cumulative):
+                yield "_bucket", base + (("le", _format_value(bound)),), bucket_count
+            yield "_bucket", base + (("le", "+Inf"),), count
+            yield "_sum", base, total
+            yield "_count", base, count
+
+
+class Registry:
+    """A collection of metric families rendered together.
+
+    Attributes:
+        _metrics: Registered families keyed by name, in registration order.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        """Add a metric family, replacing any family with the same name.
+
+        Args:
+            metric (_Metric): The family to register.
+
+        Returns:
+            _Metric: The registered family.
+        """
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str) -> Optional[_Metric]:
+        """Look up a registered family by name."""
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Render every family in Prometheus text format.
+
+        Returns:
+            str: The full exposition document.
+        """
+        lines: List[str] = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    pairs = (f'{name}="{_escape(str(value))}"' for name, value in labels)
+    return "{" + ",".join(pairs) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+# ============== Global Registry ==============
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "promptlab_http_requests_total",
+    "Total HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+))
+
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "promptlab_http_request_duration_seconds",
+    "HTTP request latency by method and route template.",
+    ("method", "route"),
+))
+
+HTTP_IN_FLIGHT = REGISTRY.register(Gauge(
+    "promptlab_http_requests_in_flight",
+    "HTTP requests currently being served.",
+    ("method",),
+))
+
+ADMISSION_SHED = REGISTRY.register(Counter(
+    "promptlab_admission_shed_total",
+    "Requests rejected by admission control, by reason and concurrency budget.",
+    ("reason", "budget"),
+))
+
+ADMISSION_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "promptlab_admission_queue_wait_seconds",
+    "Time admitted requests waited for a concurrency slot, by budget.",
+    ("budget",),
+))
+
+JOBS_FINISHED = REGISTRY.register(Counter(
+    "promptlab_jobs_total",
+    "Background jobs that finished, by kind and final status.",
+    ("kind", "status"),
+))
+
+STORAGE_OPERATIONS = REGISTRY.register(Counter(
+    "promptlab_storage_operations_total",
+    "Storage operations by name.",
+    ("operation",),
+))
+
+STORAGE_LATENCY = REGISTRY.register(Histogram(
+    "promptlab_storage_operation_duration_seconds",
+    "Storage operation latency by name.",
+    ("operation",),
+))
+
+
+def timed_operation(operation: str) -> Callable:
+    """Decorate a storage method so that its calls are counted and timed.
+
+    Args:
+        operation (str): The label value used for the ``operation`` label.
+
+    Returns:
+        Callable: A decorator wrapping the method.
+
+    Example:
+        >>> @timed_operation("get_prompt")
+        ... def get_prompt(self, prompt_id): ...
+    """
+    counter = STORAGE_OPERATIONS.labels(operation)
+    histogram = STORAGE_LATENCY.labels(operation)
+
+    def decorator(func: Callable) -> Callable:
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+                counter.inc()
+        return wrapper
+
+    return decorator
+
+
+def register_storage_sizes(registry: Registry,
+                           stores: Callable[[], Iterable[Tuple[str, object]]]) -> None:
+    """Export the entry counts of every store as a scrape-time gauge.
+
+    Args:
+        registry (Registry): The application's own registry, so that each
+            application reports its own stores.
+        stores (Callable[[], Iterable[Tuple[str, object]]]): Returns ``(tenant, store)``
+            pairs at scrape time; each store has a ``sizes()`` method returning name -> count.
+
+    Example:
+        >>> register_storage_sizes(application.state.metrics, lambda: [("default", storage)])
+    """
+    registry.register(CallbackGauge(
+        "promptlab_storage_entries",
+        "Entries held by storage structures (records, indexes and caches), per tenant.",
+        ("tenant", "structure"),
+        lambda: {(tenant, name): size
+                 for tenant, store in stores() for name, size in store.sizes().items()},
+    ))
+
+
+TENANT_REQUESTS = REGISTRY.register(Counter(
+    "promptlab_tenant_requests_total",
+    "Requests served from each tenant's store.",
+    ("tenant",),
+))
+
+
+def register_tenant_usage(registry: Registry, tenants) -> None:
+    """Export the quota usage of every tenant at scrape time.
+
+    Args:
+        registry (Registry): The application's own registry.
+        tenants: Any object with a ``usage()`` method returning tenant ->
+            ``Storage.usage()``, such as a ``TenantRegistry``.
+
+    Example:
+        >>> register_tenant_usage(application.state.metrics, tenants)
+    """
+    registry.register(CallbackGauge(
+        "promptlab_tenant_prompts",
+        "Prompts stored per tenant.",
+        ("tenant",),
+        lambda: {(tenant,): usage["prompts"] for tenant, usage in tenants.usage().items()},
+    ))
+    registry.register(CallbackGauge(
+        "promptlab_tenant_bytes",
+        "Bytes of prompt text stored per tenant.",
+        ("tenant",),
+        lambda: {(tenant,): usage["bytes"] for tenant, usage in tenants.usage().items()},
+    ))
+    registry.register(CallbackCounter(
+        "promptlab_tenant_quota_rejections_total",
+        "Writes refused because a tenant was at its quota, by quota.",
+        ("tenant", "quota"),
+        lambda: {(tenant, quota): usage[f"rejected_{quota}"]
+                 for tenant, usage in tenants.usage().items() for quota in ("prompts", "bytes")},
+    ))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route request counts and latencies.
+
+    The route label is the matched route template (for example
+    ``/prompts/{prompt_id}``) and the method label is one of
+    ``HTTP_METHODS`` or ``"other"``, so label cardinality stays bounded
+    whatever clients send.
+
+    Attributes:
+        app: The wrapped ASGI application.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"] if scope["method"] in HTTP_METHODS else "other"
+        in_flight = HTTP_IN_FLIGHT.labels(method)
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "<unmatched>"
+            HTTP_LATENCY.labels(method, template).observe(elapsed)
+            HTTP_REQUESTS.labels(method, template, str(status_holder[0])).inc()
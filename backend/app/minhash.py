@@ -0,0 +1,139 @@
+"""MinHash signatures and LSH banding for near-duplicate detection
+
+A prompt's content is reduced to a set of word shingles (runs of
+``SHINGLE_SIZE`` consecutive words). Its MinHash signature holds the minimum
+of ``NUM_PERMUTATIONS`` independent hash functions over that set. The
+fraction of equal positions in two signatures estimates the Jaccard
+similarity of the two shingle sets.
+
+LSH splits the signature into ``bands`` bands of ``rows`` positions.
+Prompts that agree on a whole band land in the same bucket and become
+candidate pairs. The candidate probability rises steeply around
+``(1 / bands) ** (1 / rows)``, so :func:`choose_bands` picks the split
+whose curve rises just below the requested threshold. Candidates are then
+confirmed by comparing full signatures, and all other pairs are never
+compared.
+"""
+
+import hashlib
+import random
+import re
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+NUM_PERMUTATIONS = 64
+SHINGLE_SIZE = 3
+
+_MAX_HASH = (1 << 32) - 1
+_WORD = re.compile(r"\w+")
+# Shingles hashed per NumPy step, bounding the (block, permutations) matrix.
+_BLOCK = 4096
+
+# Multiply-shift hash functions ``((a * x + b) mod 2**64) >> 32``: the uint64
+# arithmetic wraps, so all permutations are applied to all shingles at once.
+# Fixed seed: signatures must be comparable across processes and restarts.
+_rng = random.Random(0x5EED)
+_MULTIPLIERS = np.array([_rng.getrandbits(64) | 1 for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_OFFSETS = np.array([_rng.getrandbits(64) for _ in range(NUM_PERMUTATIONS)], dtype=np.uint64)
+_SHIFT = np.uint64(32)
+# Base of the rolling hash that combines the word hashes of a shingle.
+_BASE = np.uint64(0x100000001B3)
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Split ``text`` into overlapping word shingles.
+
+    Args:
+        text (str): The prompt content.
+        size (int): Words per shingle.
+
+    Returns:
+        List[str]: The shingles; a text shorter than ``size`` words is one shingle.
+
+    Example:
+        >>> shingles("Summarize the text below", size=3)
+        ['summarize the text', 'the text below']
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) <= size:
+        return [" ".join(words)]
+    return [" ".join(words[index:index + size]) for index in range(len(words) - size + 1)]
+
+
+def signature(text: str) -> Tuple[int, ...]:
+    """Compute the MinHash signature of ``text``.
+
+    Each distinct word is hashed once and the shingles of :func:`shingles`
+    are hashed by combining the hashes of their words, so the work is a few
+    NumPy passes over the text rather than Python loops per shingle and
+    permutation.
+
+    Args:
+        text (str): The prompt content.
+
+    Returns:
+        Tuple[int, ...]: ``NUM_PERMUTATIONS`` minimum hash values.
+
+    Example:
+        >>> len(signature("Write a haiku about the sea"))
+        64
+    """
+    words = _WORD.findall(text.lower())
+    vocabulary = {word: int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(),
+                                       "little")
+                  for word in dict.fromkeys(words)}
+    word_hashes = np.fromiter((vocabulary[word] for word in words), dtype=np.uint64, count=len(words))
+    size = min(SHINGLE_SIZE, len(words))
+    count = len(words) - size + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(size):
+        hashes = hashes * _BASE + word_hashes[offset:offset + count]
+    hashes = np.unique(hashes)
+
+    minimum = np.full(NUM_PERMUTATIONS, _MAX_HASH, dtype=np.uint64)
+    for start in range(0, len(hashes), _BLOCK):
+        block = hashes[start:start + _BLOCK, None] * _MULTIPLIERS + _OFFSETS
+        np.minimum(minimum, (block >> _SHIFT).min(axis=0), out=minimum)
+    return tuple(minimum.tolist())
+
+
+def similarity(first: Sequence[int], second: Sequence[int]) -> float:
+    """Estimate the Jaccard similarity of two signatures.
+
+    Args:
+        first (Sequence[int]): A signature from :func:`signature`.
+        second (Sequence[int]): Another signature.
+
+    Returns:
+        float: The fraction of positions at which the signatures agree.
+    """
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+
+def choose_bands(threshold: float, num_permutations: int = NUM_PERMUTATIONS) -> Tuple[int, int]:
+    """Pick the ``(bands, rows)`` split for a similarity threshold.
+
+    Chooses the split with the most rows whose S-curve midpoint
+    ``(1 / bands) ** (1 / rows)`` is still at or below ``threshold``, so
+    that pairs above the threshold are very likely to become candidates.
+
+    Args:
+        threshold (float): Target Jaccard similarity, between 0 and 1.
+        num_permutations (int): Signature length.
+
+    Returns:
+        Tuple[int, int]: Number of bands and rows per band.
+
+    Example:
+        >>> choose_bands(0.8)
+        (8, 8)
+    """
+    best = (num_permutations, 1)
+    for rows in range(1, num_permutations + 1):
+        if num_permutations % rows:
+            continue
+        bands = num_permutations // rows
+        if (1 / bands) ** (1 / rows) <= threshold:
+            best = (bands, rows)
+    return best
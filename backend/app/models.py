@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, List
-from pydantic import BaseModel, Field
+from typing import Dict, Optional, List
+from pydantic import BaseModel, Field, field_validator
 from uuid import uuid4
 
 
@@ -66,6 +66,17 @@ class PromptPatch(BaseModel):
     collection_id: Optional[str] = None
     tags: Optional[List[str]] = None
 
+    @field_validator("title", "content", "tags")
+    @classmethod
+    def not_null(cls, value):
+        """Reject an explicit null for a field a prompt cannot be without.
+
+        Omitted fields are not validated, so they still mean "leave unchanged".
+        """
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
 
 class Prompt(PromptBase):
     """Represents a fully detailed prompt model with a unique ID and timestamps.
@@ -74,15 +85,70 @@ class Prompt(PromptBase):
         id (str): Unique identifier for the prompt.
         created_at (datetime): Timestamp of when the prompt was created.
         updated_at (datetime): Timestamp of the last update to the prompt.
+        revision (int): Incremented by every update; used for ``If-Match`` checks.
+        char_count (int): Length of the content in characters.
+        token_count (int): Approximate number of tokens in the content.
+        variables (List[str]): Distinct ``{{variable}}`` names in the content, in order.
+        content_valid (bool): Whether the content passes ``validate_prompt_content``.
+
+    The last four fields are derived from ``content`` by ``Storage`` whenever
+    it is written; values sent by clients are ignored.
     """
     id: str = Field(default_factory=generate_id)
     created_at: datetime = Field(default_factory=get_current_time)
     updated_at: datetime = Field(default_factory=get_current_time)
+    revision: int = Field(default=1, ge=1)
+    char_count: int = 0
+    token_count: int = 0
+    variables: List[str] = Field(default_factory=list)
+    content_valid: bool = False
 
     class Config:
         from_attributes = True
 
 
+# ============== Bulk Operation Models ==============
+
+class BulkFilter(BaseModel):
+    """Selects the prompts a bulk operation applies to; all given criteria must match.
+
+    Attributes:
+        collection_id (Optional[str]): Only prompts in this collection.
+        tags (Optional[List[str]]): Only prompts carrying every one of these tags.
+        search (Optional[str]): Only prompts whose title or description contains this text.
+        ids (Optional[List[str]]): Only prompts with these IDs.
+    """
+    collection_id: Optional[str] = None
+    tags: Optional[List[str]] = None
+    search: Optional[str] = Field(None, min_length=1)
+    ids: Optional[List[str]] = None
+
+
+class BulkOperation(BaseModel):
+    """Changes applied to every selected prompt.
+
+    Attributes:
+        add_tags (List[str]): Tags to add where missing.
+        remove_tags (List[str]): Tags to remove where present.
+        collection_id (Optional[str]): When sent, the collection to move prompts into;
+            ``null`` removes them from their collection.
+    """
+    add_tags: List[str] = Field(default_factory=list)
+    remove_tags: List[str] = Field(default_factory=list)
+    collection_id: Optional[str] = None
+
+
+class BulkUpdateRequest(BaseModel):
+    """Request body for a bulk update.
+
+    Attributes:
+        filter (BulkFilter): Which prompts to change.
+        operation (BulkOperation): What to change.
+    """
+    filter: BulkFilter
+    operation: BulkOperation
+
+
 # ============== Collection Models ==============
 
 class CollectionBase(BaseModel):
@@ -115,6 +181,28 @@ class Collection(CollectionBase):
         from_attributes = True
 
 
+class CollectionStats(BaseModel):
+    """Aggregates over the prompts of a collection, maintained on every write.
+
+    Attributes:
+        prompt_count (int): Number of prompts in the collection.
+        last_updated_at (Optional[datetime]): Latest ``updated_at`` among them, if any.
+        tag_counts (Dict[str, int]): Number of prompts carrying each tag.
+    """
+    prompt_count: int = 0
+    last_updated_at: Optional[datetime] = None
+    tag_counts: Dict[str, int] = Field(default_factory=dict)
+
+
+class CollectionWithStats(Collection):
+    """A collection together with its prompt statistics.
+
+    Attributes:
+        stats (CollectionStats): Counts over the prompts in the collection.
+    """
+    stats: CollectionStats
+
+
 # ============== Response Models ==============
 
 class PromptList(BaseModel):
@@ -128,17 +216,209 @@ class PromptList(BaseModel):
     total: int
 
 
+class PromptProjection(BaseModel):
+    """A prompt reduced to the fields selected with ``?fields=``.
+
+    Every field of ``Prompt`` is optional: only the selected ones are present.
+    """
+    id: Optional[str] = None
+    title: Optional[str] = None
+    content: Optional[str] = None
+    description: Optional[str] = None
+    collection_id: Optional[str] = None
+    tags: Optional[List[str]] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    revision: Optional[int] = None
+    char_count: Optional[int] = None
+    token_count: Optional[int] = None
+    variables: Optional[List[str]] = None
+    content_valid: Optional[bool] = None
+
+
+class PromptProjectionList(BaseModel):
+    """Response model for a list of prompts reduced with ``?fields=``.
+
+    Attributes:
+        prompts (List[PromptProjection]): The prompts, holding only the selected fields.
+        total (int): Total number of prompts available.
+    """
+    prompts: List[PromptProjection]
+    total: int
+
+
 class CollectionList(BaseModel):
     """Response model for a list of collections.
     
     Attributes:
-        collections (List[Collection]): A list of collection instances.
+        collections (List[CollectionWithStats]): A list of collections with their statistics.
         total (int): Total number of collections available.
     """
-    collections: List[Collection]
+    collections: List[CollectionWithStats]
     total: int
 
 
+class BulkUpdateResult(BaseModel):
+    """Response model for a bulk update.
+
+    Attributes:
+        matched (int): Prompts selected by the filter.
+        updated (int): Prompts that were changed.
+        unchanged (int): Selected prompts the operation did not change.
+    """
+    matched: int
+    updated: int
+    unchanged: int
+
+
+class Tombstone(BaseModel):
+    """A deleted prompt, as reported by delta sync.
+
+    Attributes:
+        id (str): The deleted prompt's ID.
+        deleted_at (datetime): When it was deleted.
+    """
+    id: str
+    deleted_at: datetime
+
+
+class PromptChanges(BaseModel):
+    """Response model for delta sync.
+
+    Attributes:
+        changes (List[Prompt]): Prompts created or updated since the watermark, in
+            their current state.
+        deleted (List[Tombstone]): Prompts deleted since the watermark.
+        watermark (str): Pass as ``since`` to fetch the next changes.
+        has_more (bool): Whether more changes are waiting beyond ``limit``.
+    """
+    changes: List[Prompt]
+    deleted: List[Tombstone]
+    watermark: str
+    has_more: bool
+
+
+class NearDuplicate(BaseModel):
+    """A prompt whose content nearly duplicates another's.
+
+    Attributes:
+        id (str): The similar prompt's ID.
+        title (str): The similar prompt's title.
+        similarity (float): Estimated Jaccard similarity of the two contents.
+    """
+    id: str
+    title: str
+    similarity: float
+
+
+class NearDuplicateList(BaseModel):
+    """Response model for the near-duplicates of one prompt.
+
+    Attributes:
+        prompt_id (str): The prompt that was compared against.
+        threshold (float): The similarity threshold applied.
+        duplicates (List[NearDuplicate]): Matches, most similar first.
+        total (int): Number of matches.
+    """
+    prompt_id: str
+    threshold: float
+    duplicates: List[NearDuplicate]
+    total: int
+
+
+class DuplicateCluster(BaseModel):
+    """A group of prompts linked by near-duplicate content.
+
+    Attributes:
+        prompt_ids (List[str]): The prompts in the cluster.
+        size (int): Number of prompts in the cluster.
+    """
+    prompt_ids: List[str]
+    size: int
+
+
+class NearDuplicateReport(BaseModel):
+    """Response model for the corpus-wide near-duplicate report.
+
+    Attributes:
+        threshold (float): The similarity threshold applied.
+        clusters (List[DuplicateCluster]): Clusters, largest first.
+        total (int): Number of clusters found, before ``limit`` is applied.
+        duplicate_prompts (int): Prompts in any cluster, before ``limit`` is applied.
+    """
+    threshold: float
+    clusters: List[DuplicateCluster]
+    total: int
+    duplicate_prompts: int
+
+
+class VariableUsage(BaseModel):
+    """A template variable and how many prompts use it.
+
+    Attributes:
+        name (str): The variable name, as written inside ``{{ }}``.
+        prompt_count (int): Number of prompts whose content uses it.
+    """
+    name: str
+    prompt_count: int
+
+
+class VariableList(BaseModel):
+    """Response model for the template variables in use.
+
+    Attributes:
+        variables (List[VariableUsage]): Variables, most used first.
+        total (int): Number of distinct variables.
+    """
+    variables: List[VariableUsage]
+    total: int
+
+
+class Job(BaseModel):
+    """Status of a background job.
+
+    Attributes:
+        id (str): Unique identifier of the job.
+        kind (str): What the job does, e.g. ``delete_collection``.
+        status (str): One of ``queued``, ``running``, ``succeeded``, ``failed`` or ``cancelled``.
+        done (int): Items processed so far.
+        total (int): Items to process; may grow if more work is found while running.
+        cancel_requested (bool): Whether a cancel was requested; a running job stops
+            at its next batch boundary.
+        error (Optional[str]): Failure message when ``status`` is ``failed``.
+        created_at (datetime): When the job was submitted.
+        started_at (Optional[datetime]): When a worker picked the job up.
+        finished_at (Optional[datetime]): When the job succeeded, failed or was cancelled.
+    """
+    id: str
+    kind: str
+    status: str
+    done: int = 0
+    total: int = 0
+    cancel_requested: bool = False
+    error: Optional[str] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+class RestoreResult(BaseModel):
+    """Response model for a point-in-time restore.
+
+    Attributes:
+        as_of (datetime): The time the records were restored to.
+        prompts_restored (int): Prompts recreated or rewritten.
+        prompts_removed (int): Prompts deleted because they did not exist at ``as_of``.
+        collections_restored (int): Collections recreated.
+        collections_removed (int): Collections deleted because they did not exist at ``as_of``.
+    """
+    as_of: datetime
+    prompts_restored: int
+    prompts_removed: int
+    collections_restored: int
+    collections_removed: int
+
+
 class HealthResponse(BaseModel):
     """Model representing the health status of the application.
     
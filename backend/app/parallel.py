@@ -0,0 +1,450 @@
+"""Sharded full-text scans over shared memory and a process pool
+
+Substring and regex searches over prompt ``content`` are CPU-bound, and the
+GIL keeps them on one core. :class:`ShardedSearch` partitions prompts into
+``num_shards`` shards by a stable hash of their id. Each shard's searchable
+text is packed into a base segment, plus a small delta segment holding the
+records written since the base was packed. The delta's records are masked
+out of the base scan, so a write costs the query one record of packing, not
+a repack of the shard. A shard is repacked whole only once its delta grows
+past ``max_delta`` records.
+
+With worker processes, segments live in ``multiprocessing.shared_memory``.
+A query hands one task per segment to a process pool. Workers map the
+segment by name and scan it without copying, and each returns its match
+count and its newest ``limit`` matches. Without workers the segments are
+plain bytes scanned in the calling thread. The partial results are merged
+into a global top-k, newest first (by ``created_at``, the order
+``GET /prompts`` uses).
+
+Segment layout (all integers little-endian)::
+
+    count   uint64                      number of records
+    offsets uint64 * (count + 1)        start of each record in the text area
+    stamps  float64 * count             created_at as a POSIX timestamp
+    text    bytes                       "title\\x00description\\x00content\\n" per record
+
+The text is lower-cased, so matching is case-insensitive. A shared segment
+is unlinked once it has been superseded and no running query still uses it,
+or at the latest when it is garbage collected or the process exits. This
+module imports only the standard library, so spawned workers start quickly.
+"""
+
+import heapq
+import re
+import struct
+import threading
+import weakref
+import zlib
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import islice
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from typing import Callable, Container, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+DEFAULT_SHARDS = 32
+# Records a shard's delta may hold before the shard is repacked whole.
+DEFAULT_MAX_DELTA = 512
+
+_HEADER = struct.Struct("<Q")
+_FIELD_SEPARATOR = "\x00"
+
+# Segments a worker keeps mapped between tasks.
+_WORKER_CACHE_SIZE = 256
+
+
+def shard_of(prompt_id: str, num_shards: int) -> int:
+    """Return the shard a prompt belongs to.
+
+    Uses CRC-32 rather than ``hash()``, which is salted per process.
+
+    Args:
+        prompt_id (str): The prompt ID.
+        num_shards (int): Number of shards.
+
+    Returns:
+        int: The shard index.
+
+    Example:
+        >>> shard_of("abc-123", 32)
+        0
+    """
+    return zlib.crc32(prompt_id.encode("utf-8")) % num_shards
+
+
+def pack_records(records: Iterable[Tuple[str, Optional[str], str, float]]) -> bytes:
+    """Pack ``(title, description, content, timestamp)`` records into the segment layout.
+
+    Args:
+        records (Iterable[Tuple[str, Optional[str], str, float]]): The records, in shard order.
+
+    Returns:
+        bytes: The segment contents.
+    """
+    offsets = array("Q", [0])
+    stamps = array("d")
+    chunks: List[bytes] = []
+    position = 0
+    for title, description, content, stamp in records:
+        text = (_FIELD_SEPARATOR.join((title, description or "", content)) + "\n").lower()
+        text = text.encode("utf-8")
+        chunks.append(text)
+        position += len(text)
+        offsets.append(position)
+        stamps.append(stamp)
+    return b"".join([_HEADER.pack(len(stamps)), offsets.tobytes(), stamps.tobytes(), *chunks])
+
+
+def scan(buffer, query: str, regex: bool, limit: int,
+         skip: Container[int] = ()) -> Tuple[int, List[Tuple[float, int]]]:
+    """Find the records of one packed segment that match ``query``.
+
+    The pattern runs over the whole text area at C speed. Each match is
+    mapped to its record by bisecting the offsets, and the scan then
+    continues at the next record. A match that runs past the end of its
+    record is searched again within the record's bounds.
+
+    Args:
+        buffer: The segment, as bytes or a memoryview.
+        query (str): A substring, or a regular expression if ``regex`` is True.
+        regex (bool): Interpret ``query`` as a regular expression.
+        limit (int): Number of newest matches to return.
+        skip (Container[int]): Record indices to leave out, because a newer
+            copy of the record lives in a delta segment.
+
+    Returns:
+        Tuple[int, List[Tuple[float, int]]]: The number of matching records, and
+        up to ``limit`` ``(-timestamp, record index)`` pairs in ascending order,
+        which is newest first.
+    """
+    view = memoryview(buffer)
+    count = _HEADER.unpack_from(view, 0)[0]
+    stamps_start = _HEADER.size + 8 * (count + 1)
+    offsets = view[_HEADER.size:stamps_start].cast("Q")
+    stamps = view[stamps_start:stamps_start + 8 * count].cast("d")
+    text = view[stamps_start + 8 * count:]
+    pattern = compile_query(query, regex)
+
+    matches: List[int] = []
+    position, end = 0, offsets[count]
+    while position < end:
+        match = pattern.search(text, position, end)
+        if match is None or match.start() >= end:
+            break
+        index = bisect_right(offsets, match.start()) - 1
+        record_end = offsets[index + 1]
+        if index in skip:
+            pass
+        elif match.end() <= record_end or pattern.search(text, match.start(), record_end):
+            matches.append(index)
+        position = record_end
+
+    top = heapq.nsmallest(limit, ((-stamps[index], index) for index in matches))
+    return len(matches), top
+
+
+def compile_query(query: str, regex: bool) -> "re.Pattern[bytes]":
+    """Compile a search query for the packed, lower-cased text.
+
+    Args:
+        query (str): A substring, or a regular expression if ``regex`` is True.
+        regex (bool): Interpret ``query`` as a regular expression.
+
+    Returns:
+        re.Pattern[bytes]: The compiled pattern. ``^`` and ``$`` match at line
+        and record boundaries.
+
+    Raises:
+        re.error: If ``query`` is not a valid regular expression.
+    """
+    if regex:
+        return re.compile(query.encode("utf-8"), re.IGNORECASE | re.MULTILINE)
+    return re.compile(re.escape(query.lower().encode("utf-8")))
+
+
+# ============== Worker Side ==============
+
+_attached: "OrderedDict[str, SharedMemory]" = OrderedDict()
+
+
+def _attach(name: str) -> SharedMemory:
+    segment = _attached.get(name)
+    if segment is not None:
+        _attached.move_to_end(name)
+        return segment
+    # Spawned workers share the parent's resource tracker, and the parent
+    # unlinks the segment when it is retired.
+    segment = SharedMemory(name=name)
+    _attached[name] = segment
+    while len(_attached) > _WORKER_CACHE_SIZE:
+        _attached.popitem(last=False)[1].close()
+    return segment
+
+
+def search_segment(name: str, query: str, regex: bool, limit: int,
+                   skip: FrozenSet[int] = frozenset()) -> Tuple[int, List[Tuple[float, int]]]:
+    """Pool task: scan the shared memory segment ``name``.
+
+    Args:
+        name (str): The segment name.
+        query (str): The substring or regular expression.
+        regex (bool): Interpret ``query`` as a regular expression.
+        limit (int): Number of newest matches to return.
+        skip (FrozenSet[int]): Record indices to leave out.
+
+    Returns:
+        Tuple[int, List[Tuple[float, int]]]: As for :func:`scan`.
+    """
+    return scan(_attach(name).buf, query, regex, limit, skip)
+
+
+# ============== Parent Side ==============
+
+def _release_segment(segment: SharedMemory) -> None:
+    segment.close()
+    try:
+        segment.unlink()
+    except FileNotFoundError:
+        pass
+
+
+class _ShardVersion:
+    """One immutable packed copy of a shard (or of its delta) and the prompt IDs it holds.
+
+    The packed bytes go into a shared memory segment when ``shared`` is
+    set, for worker processes, and otherwise stay in this process. A shared
+    segment is released by :meth:`destroy`, or by a finalizer if the
+    version is dropped without it.
+    """
+
+    __slots__ = ("data", "segment", "ids", "positions", "skip", "users", "retired", "_finalizer",
+                 "__weakref__")
+
+    def __init__(self, data: bytes, ids: List[str], shared: bool,
+                 skip: FrozenSet[int] = frozenset()):
+        self.ids = ids
+        self.positions: Dict[str, int] = {}
+        self.skip = skip
+        self.users = 0
+        self.retired = False
+        self.segment: Optional[SharedMemory] = None
+        self._finalizer = None
+        if shared:
+            self.data = None
+            self.segment = SharedMemory(create=True, size=max(len(data), 1))
+            self.segment.buf[:len(data)] = data
+            self._finalizer = weakref.finalize(self, _release_segment, self.segment)
+        else:
+            self.data = data
+
+    def scan(self, query: str, regex: bool, limit: int,
+             skip: FrozenSet[int]) -> Tuple[int, List[Tuple[float, int]]]:
+        return scan(self.data if self.segment is None else self.segment.buf, query, regex, limit,
+                    skip)
+
+    def destroy(self) -> None:
+        if self._finalizer is not None:
+            self._finalizer()
+
+
+class ShardedSearch:
+    """Shard membership, packed shard segments and the worker pool.
+
+    Storage reports every write through :meth:`add`, :meth:`touch` and
+    :meth:`discard`. These only record which prompts changed. Packing happens
+    lazily in :meth:`search`: the changed records of a shard are packed into
+    its delta, and the shard is repacked whole once the delta holds more
+    than ``max_delta`` records. A query under steady writes therefore packs
+    at most ``num_shards * max_delta`` records, however large the store.
+
+    Attributes:
+        num_shards (int): Number of shards.
+        workers (int): Worker processes; 0 scans the shards in the calling thread,
+            without shared memory.
+        max_delta (int): Changed records a shard's delta may hold before the
+            shard is repacked.
+    """
+
+    def __init__(self, num_shards: int = DEFAULT_SHARDS, workers: int = 0,
+                 max_delta: int = DEFAULT_MAX_DELTA):
+        self.num_shards = num_shards
+        self.workers = workers
+        self.max_delta = max_delta
+        self._members: List[Dict[str, None]] = [{} for _ in range(num_shards)]
+        # Prompts written since each shard's base was packed
+        self._changed: List[Dict[str, None]] = [{} for _ in range(num_shards)]
+        # Shards to repack whole, and shards whose delta is out of date
+        self._stale = set(range(num_shards))
+        self._dirty: set = set()
+        self._bases: List[Optional[_ShardVersion]] = [None] * num_shards
+        self._deltas: List[Optional[_ShardVersion]] = [None] * num_shards
+        self._lock = threading.Lock()
+        self._dirty_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+
+    def add(self, prompt_id: str) -> None:
+        """Record a new prompt."""
+        shard = shard_of(prompt_id, self.num_shards)
+        with self._dirty_lock:
+            self._members[shard][prompt_id] = None
+            self._changed[shard][prompt_id] = None
+            self._dirty.add(shard)
+
+    def touch(self, prompt_id: str) -> None:
+        """Record that a prompt's searchable fields may have changed."""
+        shard = shard_of(prompt_id, self.num_shards)
+        with self._dirty_lock:
+            self._changed[shard][prompt_id] = None
+            self._dirty.add(shard)
+
+    def discard(self, prompt_id: str) -> None:
+        """Record that a prompt was deleted."""
+        shard = shard_of(prompt_id, self.num_shards)
+        with self._dirty_lock:
+            self._members[shard].pop(prompt_id, None)
+            self._changed[shard][prompt_id] = None
+            self._dirty.add(shard)
+
+    def reset(self, prompt_ids: Iterable[str]) -> None:
+        """Replace all membership, for bulk loads and clears.
+
+        Args:
+            prompt_ids (Iterable[str]): Every stored prompt ID.
+        """
+        members: List[Dict[str, None]] = [{} for _ in range(self.num_shards)]
+        for prompt_id in prompt_ids:
+            members[shard_of(prompt_id, self.num_shards)][prompt_id] = None
+        with self._dirty_lock:
+            self._members = members
+            self._changed = [{} for _ in range(self.num_shards)]
+            self._stale = set(range(self.num_shards))
+            self._dirty = set()
+
+    def search(self, query: str, regex: bool, limit: int,
+               load: Callable[[List[str]], List[Tuple[str, Tuple]]]) -> Tuple[int, List[str]]:
+        """Run a search across every shard.
+
+        Args:
+            query (str): The substring or regular expression.
+            regex (bool): Interpret ``query`` as a regular expression.
+            limit (int): Number of newest matches to return.
+            load (Callable): Maps prompt IDs to ``(prompt_id, (title, description,
+                content, timestamp))`` pairs, used to pack shards and deltas. IDs that
+                no longer exist are left out.
+
+        Returns:
+            Tuple[int, List[str]]: The total number of matches and the IDs of the
+            newest ``limit`` matches, newest first.
+
+        Raises:
+            re.error: If ``regex`` is set and ``query`` is not a valid pattern.
+        """
+        compile_query(query, regex)
+        versions = self._acquire(load)
+        try:
+            # A base skips the records its shard's delta holds newer copies of
+            tasks = []
+            for base, delta in versions:
+                tasks.append((base, delta.skip if delta is not None else frozenset()))
+                if delta is not None:
+                    tasks.append((delta, frozenset()))
+            if self.workers > 0:
+                results = list(self._executor().map(
+                    search_segment, [version.segment.name for version, _ in tasks],
+                    *zip(*[(query, regex, limit, skip) for _, skip in tasks])))
+            else:
+                results = [version.scan(query, regex, limit, skip) for version, skip in tasks]
+            total = sum(count for count, _ in results)
+            merged = heapq.merge(*(
+                [(key, version.ids[index]) for key, index in top]
+                for (version, _), (_, top) in zip(tasks, results)
+            ), key=lambda item: item[0])
+            return total, [prompt_id for _, prompt_id in islice(merged, limit)]
+        finally:
+            self._release(versions)
+
+    def close(self) -> None:
+        """Shut down the worker pool and release every segment."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        with self._refresh_lock, self._lock:
+            for shard in range(self.num_shards):
+                for version in (self._bases[shard], self._deltas[shard]):
+                    self._retire(version)
+                self._bases[shard] = self._deltas[shard] = None
+            with self._dirty_lock:
+                self._changed = [{} for _ in range(self.num_shards)]
+                self._stale = set(range(self.num_shards))
+                self._dirty = set()
+
+    def _executor(self) -> Executor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(self.workers, mp_context=get_context("spawn"))
+        return self._pool
+
+    def _acquire(self, load) -> List[Tuple[_ShardVersion, Optional[_ShardVersion]]]:
+        shared = self.workers > 0
+        with self._refresh_lock:
+            with self._dirty_lock:
+                stale = self._stale | {shard for shard in self._dirty
+                                       if len(self._changed[shard]) > self.max_delta}
+                dirty = self._dirty - stale
+                self._stale, self._dirty = set(), set()
+                repack = {shard: list(self._members[shard]) for shard in stale}
+                for shard in stale:
+                    self._changed[shard] = {}
+                changed = {shard: list(self._changed[shard]) for shard in dirty}
+
+            bases, deltas = {}, {}
+            for shard, ids in repack.items():
+                base = bases[shard] = self._pack(load(ids), shared)
+                base.positions = {prompt_id: index for index, prompt_id in enumerate(base.ids)}
+                deltas[shard] = None
+            for shard, ids in changed.items():
+                positions = self._bases[shard].positions
+                skip = frozenset(positions[prompt_id] for prompt_id in ids if prompt_id in positions)
+                deltas[shard] = self._pack(load(ids), shared, skip)
+
+            with self._lock:
+                for shard, version in bases.items():
+                    self._retire(self._bases[shard])
+                    self._bases[shard] = version
+                for shard, version in deltas.items():
+                    self._retire(self._deltas[shard])
+                    self._deltas[shard] = version
+                versions = list(zip(self._bases, self._deltas))
+                for base, delta in versions:
+                    base.users += 1
+                    if delta is not None:
+                        delta.users += 1
+        return versions
+
+    @staticmethod
+    def _pack(records: List[Tuple[str, Tuple]], shared: bool,
+              skip: FrozenSet[int] = frozenset()) -> _ShardVersion:
+        return _ShardVersion(pack_records(record for _, record in records),
+                             [prompt_id for prompt_id, _ in records], shared, skip)
+
+    @staticmethod
+    def _retire(version: Optional[_ShardVersion]) -> None:
+        if version is not None:
+            version.retired = True
+            if version.users == 0:
+                version.destroy()
+
+    def _release(self, versions: List[Tuple[_ShardVersion, Optional[_ShardVersion]]]) -> None:
+        with self._lock:
+            for base, delta in versions:
+                for version in (base, delta):
+                    if version is None:
+                        continue
+                    version.users -= 1
+                    if version.retired and version.users == 0:
+                        version.destroy()
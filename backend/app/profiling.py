@@ -0,0 +1,235 @@
+"""Per-request opt-in profiling for PromptLab
+
+When ``Settings.profiling_enabled`` is set, a request carrying the profile
+header (``X-PromptLab-Profile: 1`` by default) runs its endpoint under
+``cProfile``. Named stages inside the endpoint (fetch, filter, search, sort)
+and the response serialization are timed separately. The result is returned
+in a ``Server-Timing`` header and written as a ``.prof`` file plus a JSON
+summary to the profile directory.
+
+When profiling is disabled nothing is installed: no middleware runs and the
+endpoints are not wrapped. ``stage()`` then costs a single context variable
+lookup and returns a shared no-op context manager.
+"""
+
+import asyncio
+import cProfile
+import io
+import json
+import os
+import pstats
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.routing import APIRoute
+
+from app.config import Settings
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar("promptlab_profile", default=None)
+_NO_STAGE = nullcontext()
+
+TOP_FUNCTIONS = 25
+
+
+class RequestProfile:
+    """The profile of a single opted-in request.
+
+    Attributes:
+        id (str): Identifier used for the artifact file names.
+        method (str): The HTTP method.
+        path (str): The request path including the query string.
+        stages (List[Tuple[str, float]]): ``(name, seconds)`` per timed stage, in order.
+        profiler (cProfile.Profile): The profiler the endpoint ran under.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.stages: List[Tuple[str, float]] = []
+        self.profiler = cProfile.Profile()
+        self.started = time.perf_counter()
+        self.handler_returned: Optional[float] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Time the enclosed block as stage ``name``.
+
+        Args:
+            name (str): The stage name, for example ``"filter"``.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.append((name, time.perf_counter() - start))
+
+    def timings(self, response_started: float) -> Dict[str, float]:
+        """Return stage timings in milliseconds, including serialize and total.
+
+        Args:
+            response_started (float): ``perf_counter`` time of the response start.
+
+        Returns:
+            Dict[str, float]: Milliseconds keyed by stage name.
+        """
+        timings: Dict[str, float] = {}
+        for name, seconds in self.stages:
+            timings[name] = timings.get(name, 0.0) + seconds * 1000
+        if self.handler_returned is not None:
+            timings["serialize"] = (response_started - self.handler_returned) * 1000
+        timings["total"] = (response_started - self.started) * 1000
+        return {name: round(value, 3) for name, value in timings.items()}
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> str:
+        """Render the hottest functions by cumulative time.
+
+        Args:
+            limit (int): Number of rows to include.
+
+        Returns:
+            str: The ``pstats`` report text.
+        """
+        buffer = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=buffer)
+        stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(limit)
+        return buffer.getvalue()
+
+
+def stage(name: str):
+    """Return a context manager timing stage ``name`` of the current profiled request.
+
+    Outside a profiled request this returns a shared no-op context manager.
+
+    Args:
+        name (str): The stage name, for example ``"search"``.
+
+    Returns:
+        A context manager.
+
+    Example:
+        >>> with stage("sort"):
+        ...     prompts = sort_prompts_by_date(prompts)
+    """
+    profile = _current.get()
+    if profile is None:
+        return _NO_STAGE
+    return profile.stage(name)
+
+
+def _profiled_endpoint(func: Callable) -> Callable:
+    """Wrap a sync endpoint so that a profiled request runs it under cProfile.
+
+    The wrapper runs in the threadpool thread that executes the endpoint,
+    which is the thread cProfile has to be enabled on.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        try:
+            return profile.profiler.runcall(func, *args, **kwargs)
+        finally:
+            profile.handler_returned = time.perf_counter()
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying the profile header.
+
+    Attributes:
+        app: The wrapped ASGI application.
+        header (bytes): The lower-cased opt-in header name.
+        directory (str): Where profile artifacts are written.
+    """
+
+    def __init__(self, app, header: str, directory: str):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._requested(scope):
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if scope.get("query_string"):
+            path += "?" + scope["query_string"].decode("latin-1")
+        profile = RequestProfile(scope["method"], path)
+        result: Dict = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                timings = profile.timings(time.perf_counter())
+                result["timings"] = timings
+                result["status"] = message["status"]
+                server_timing = ", ".join(f"{name};dur={value}" for name, value in timings.items())
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", server_timing.encode("latin-1")),
+                    (b"x-promptlab-profile-id", profile.id.encode("latin-1")),
+                ]
+            await send(message)
+
+        token = _current.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            self._write(profile, result)
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope.get("headers", ()):
+            if name == self.header:
+                return value.strip().lower() not in (b"", b"0", b"false")
+        return False
+
+    def _write(self, profile: RequestProfile, result: Dict) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, profile.id)
+        ran = profile.handler_returned is not None
+        if ran:
+            profile.profiler.dump_stats(base + ".prof")
+        summary = {
+            "id": profile.id,
+            "method": profile.method,
+            "path": profile.path,
+            "status": result.get("status"),
+            "timings_ms": result.get("timings", {}),
+            "top_functions": profile.top_functions() if ran else "",
+        }
+        with open(base + ".json", "w", encoding="utf-8") as handle:
+            json.dump(summary, handle, indent=2)
+
+
+def install_profiling(app: FastAPI, settings: Settings) -> None:
+    """Enable per-request profiling on ``app`` if the settings allow it.
+
+    Wraps every sync endpoint and adds :class:`ProfilingMiddleware`. Does
+    nothing when ``settings.profiling_enabled`` is False.
+
+    Args:
+        app (FastAPI): The application whose routes are already registered.
+        settings (Settings): The runtime settings.
+
+    Example:
+        >>> install_profiling(app, Settings(profiling_enabled=True))
+    """
+    if not settings.profiling_enabled:
+        return
+    for route in app.routes:
+        if isinstance(route, APIRoute) and not _is_coroutine(route.dependant.call):
+            route.dependant.call = _profiled_endpoint(route.dependant.call)
+    directory = settings.profile_dir or os.path.join(tempfile.gettempdir(), "promptlab-profiles")
+    app.add_middleware(ProfilingMiddleware, header=settings.profile_header, directory=directory)
+
+
+def _is_coroutine(func: Callable) -> bool:
+    return asyncio.iscoroutinefunction(func)
@@ -0,0 +1,513 @@
+"""Snapshot files for warm starts, backups and restores
+
+Version 3 snapshots use a binary, column-oriented format, so a store can be
+dumped and restored without re-encoding each record:
+
+- fixed-width columns: timestamps as int64 microseconds, revisions and the
+  derived content statistics as integers, and collections, tags and
+  variables as int32 codes into a string table
+- a string table of interned tags, variable names and collection IDs
+- length-prefixed text: per text field, an int64 column of UTF-8 byte lengths
+  (``-1`` for None), followed by the concatenated bytes
+
+::
+
+    header     magic "PLSNAP03", version (u32), flags (u32)
+    sections   8-byte aligned, in any order
+    directory  per section: name (32 bytes), offset (u64), length (u64)
+    footer     directory offset (u64), prompts (u64), collections (u64),
+               sections (u32), CRC-32 (u32), magic "PLSNEND\\0"
+
+:class:`SnapshotWriter` streams each section to disk in batches, so no
+whole-file buffer is ever built. :class:`SnapshotReader` memory-maps the
+file and checks the CRC-32 over every byte before the checksum. It reads the
+numeric columns in place with ``numpy.frombuffer`` and decodes text in
+batches of about 4 MB. The records are then built directly from their
+already-validated field values, without per-item validation or
+``create_prompt`` replay. The cyclic garbage collector is paused while the
+records are built. Files are written to a temporary name and then renamed into
+place, so a crash never leaves a torn snapshot.
+
+Versions 1 and 2 were a single pickle. They are refused rather than
+unpickled, since unpickling a file can run arbitrary code.
+"""
+
+import gc
+import mmap
+import os
+import struct
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.columns import to_micros
+from app.models import Collection, Prompt
+from app.storage import Storage
+from app.utils import content_stats
+
+SNAPSHOT_VERSION = 3
+
+PROMPT_FIELDS = ("id", "title", "content", "description", "collection_id", "tags",
+                 "created_at", "updated_at", "revision", "char_count", "token_count",
+                 "variables", "content_valid")
+STATS_FIELDS = ("char_count", "token_count", "variables", "content_valid")
+COLLECTION_FIELDS = ("id", "name", "description", "created_at")
+
+MAGIC = b"PLSNAP03"
+END_MAGIC = b"PLSNEND\0"
+_HEADER = struct.Struct("<8sII")
+_ENTRY = struct.Struct("<32sQQ")
+_FOOTER = struct.Struct("<QQQII8s")
+_ALIGNMENT = 8
+_WRITE_BATCH = 65536
+_DECODE_BYTES = 4 * 1024 * 1024
+_PICKLE_PROTOCOL = b"\x80"  # first byte of the version 1 and 2 files
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is missing, corrupt or of an unknown version."""
+
+
+class SnapshotWriter:
+    """Streams a version 3 snapshot to disk one section at a time.
+
+    The file is written under a temporary name and only renamed to ``path``
+    by :meth:`close`, after the directory and checksum have been written.
+
+    Attributes:
+        path (str): The destination file.
+
+    Example:
+        >>> with SnapshotWriter("backup.snap") as writer:
+        ...     writer.write_column("prompt.revision", np.arange(3))
+        ...     writer.write_text("prompt.title", ["a", "b", None])
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._temporary = f"{path}.tmp-{os.getpid()}"
+        self._handle = open(self._temporary, "wb")
+        self._crc = 0
+        self._offset = 0
+        self._sections: List[Tuple[str, int, int]] = []
+        self._closed = False
+        self._write(_HEADER.pack(MAGIC, SNAPSHOT_VERSION, 0))
+
+    def __enter__(self) -> "SnapshotWriter":
+        return self
+
+    def __exit__(self, error_type, error, traceback) -> None:
+        if error_type is not None:
+            self.abort()
+        elif not self._closed:
+            self.close()
+
+    def write_column(self, name: str, values: np.ndarray) -> None:
+        """Write a fixed-width numeric column as its own section.
+
+        Args:
+            name (str): Section name, at most 32 ASCII characters.
+            values (np.ndarray): The column; written in little-endian order.
+        """
+        values = np.ascontiguousarray(values, dtype=values.dtype.newbyteorder("<"))
+        self._begin(name)
+        self._write(memoryview(values).cast("B"))
+        self._end(name)
+
+    def write_text(self, name: str, values: Iterable[Optional[str]]) -> int:
+        """Write a text field as ``<name>.d`` (UTF-8 bytes) and ``<name>.n`` (lengths).
+
+        Args:
+            name (str): Field name, at most 30 ASCII characters.
+            values (Iterable[Optional[str]]): The strings; None is kept as None.
+
+        Returns:
+            int: The number of values written.
+        """
+        lengths: List[int] = []
+        self._begin(f"{name}.d")
+        batch: List[bytes] = []
+        for value in values:
+            if value is None:
+                lengths.append(-1)
+                continue
+            encoded = value.encode("utf-8")
+            lengths.append(len(encoded))
+            batch.append(encoded)
+            if len(batch) == _WRITE_BATCH:
+                self._write(b"".join(batch))
+                batch = []
+        self._write(b"".join(batch))
+        self._end(f"{name}.d")
+        self.write_column(f"{name}.n", np.array(lengths, dtype=np.int64))
+        return len(lengths)
+
+    def close(self, prompts: int = 0, collections: int = 0) -> None:
+        """Write the directory and checksummed footer, then move the file into place.
+
+        Called on leaving a ``with`` block if it was not called before.
+
+        Args:
+            prompts (int): Prompt count recorded in the footer.
+            collections (int): Collection count recorded in the footer.
+        """
+        directory = self._offset
+        for name, offset, length in self._sections:
+            self._write(_ENTRY.pack(name.encode("ascii"), offset, length))
+        footer = _FOOTER.pack(directory, prompts, collections, len(self._sections), 0, END_MAGIC)
+        checked = footer[:_FOOTER.size - 12]
+        crc = zlib.crc32(checked, self._crc)
+        self._handle.write(checked + struct.pack("<I", crc) + END_MAGIC)
+        self._handle.flush()
+        os.fsync(self._handle.fileno())
+        self._handle.close()
+        self._closed = True
+        os.replace(self._temporary, self.path)
+
+    def abort(self) -> None:
+        """Discard the partly written file."""
+        self._closed = True
+        self._handle.close()
+        if os.path.exists(self._temporary):
+            os.remove(self._temporary)
+
+    def _write(self, data) -> None:
+        self._handle.write(data)
+        self._crc = zlib.crc32(data, self._crc)
+        self._offset += len(data)
+
+    def _begin(self, name: str) -> None:
+        if len(name.encode("ascii")) > 32:
+            raise ValueError(f"section name too long: {name}")
+        padding = -self._offset % _ALIGNMENT
+        if padding:
+            self._write(bytes(padding))
+        self._sections.append((name, self._offset, 0))
+
+    def _end(self, name: str) -> None:
+        _, offset, _ = self._sections[-1]
+        self._sections[-1] = (name, offset, self._offset - offset)
+
+
+class SnapshotReader:
+    """A memory-mapped, checksum-verified view of a version 3 snapshot.
+
+    Columns returned by :meth:`column` are read-only views into the mapping
+    and stay valid until :meth:`close`.
+
+    Attributes:
+        path (str): The snapshot file.
+        prompts (int): Prompt count from the footer.
+        collections (int): Collection count from the footer.
+
+    Example:
+        >>> with SnapshotReader("backup.snap") as reader:
+        ...     reader.column("prompt.revision", np.int64)[:3]
+        array([1, 1, 2])
+    """
+
+    def __init__(self, path: str, verify: bool = True):
+        self.path = path
+        try:
+            with open(path, "rb") as handle:
+                self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as error:
+            raise SnapshotError(f"cannot read snapshot {path}: {error}") from error
+        self._view = memoryview(self._map)
+        try:
+            self._sections = self._parse(verify)
+        except SnapshotError:
+            self.close()
+            raise
+
+    def __enter__(self) -> "SnapshotReader":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def column(self, name: str, dtype) -> np.ndarray:
+        """Return a fixed-width column without copying it.
+
+        Args:
+            name (str): The section name.
+            dtype: NumPy dtype of the column.
+
+        Returns:
+            np.ndarray: A read-only view into the mapped file.
+
+        Raises:
+            SnapshotError: If the section is missing or its size does not fit ``dtype``.
+        """
+        offset, length = self._section(name)
+        dtype = np.dtype(dtype).newbyteorder("<")
+        if length % dtype.itemsize:
+            raise SnapshotError(f"section {name} is not a column of {dtype}")
+        return np.frombuffer(self._view, dtype=dtype, count=length // dtype.itemsize,
+                             offset=offset)
+
+    def text(self, name: str) -> List[Optional[str]]:
+        """Decode a text field written by :meth:`SnapshotWriter.write_text`.
+
+        Args:
+            name (str): The field name.
+
+        Returns:
+            List[Optional[str]]: The strings, with None where None was written.
+
+        Raises:
+            SnapshotError: If the field is missing or its lengths do not match its bytes.
+        """
+        lengths = self.column(f"{name}.n", np.int64)
+        offset, size = self._section(f"{name}.d")
+        sizes = np.maximum(lengths, 0)
+        ends = np.cumsum(sizes)
+        if (ends[-1] if len(ends) else 0) != size:
+            raise SnapshotError(f"text field {name} does not match its lengths")
+        starts = ends - sizes
+        view = self._view[offset:offset + size]
+        values: List[Optional[str]] = []
+        index, count = 0, len(lengths)
+        while index < count:
+            # Decode about _DECODE_BYTES at a time. Pure ASCII text has one
+            # character per byte, so the batch can be sliced by byte offsets.
+            stop = int(np.searchsorted(ends, starts[index] + _DECODE_BYTES, side="right"))
+            stop = min(count, max(stop, index + 1))
+            base = int(starts[index])
+            end = int(ends[stop - 1])
+            batch = str(view[base:end], "utf-8")
+            batch_starts = (starts[index:stop] - base).tolist()
+            batch_ends = (ends[index:stop] - base).tolist()
+            if len(batch) == end - base:
+                values.extend(batch[start:end] for start, end in zip(batch_starts, batch_ends))
+            else:
+                values.extend(str(view[base + start:base + end], "utf-8")
+                              for start, end in zip(batch_starts, batch_ends))
+            index = stop
+        view.release()
+        for missing in np.flatnonzero(lengths < 0).tolist():
+            values[missing] = None
+        return values
+
+    def close(self) -> None:
+        """Release the mapping once no column views remain."""
+        try:
+            self._view.release()
+            self._map.close()
+        except BufferError:
+            pass  # a column is still referenced; the mapping goes with it
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._sections
+
+    def _section(self, name: str) -> Tuple[int, int]:
+        try:
+            return self._sections[name]
+        except KeyError:
+            raise SnapshotError(f"snapshot {self.path} has no section {name}") from None
+
+    def _parse(self, verify: bool) -> Dict[str, Tuple[int, int]]:
+        size = len(self._map)
+        if size < _HEADER.size + _FOOTER.size:
+            raise SnapshotError(f"{self.path} is truncated")
+        magic, version, _ = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise SnapshotError(f"{self.path} is not a PromptLab snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise SnapshotError(f"unsupported snapshot version {version}")
+        footer = size - _FOOTER.size
+        directory, self.prompts, self.collections, count, crc, end = \
+            _FOOTER.unpack_from(self._map, footer)
+        if end != END_MAGIC:
+            raise SnapshotError(f"{self.path} is truncated")
+        if verify and zlib.crc32(self._view[:size - 12]) != crc:
+            raise SnapshotError(f"checksum mismatch in {self.path}")
+        if directory + count * _ENTRY.size != footer:
+            raise SnapshotError(f"{self.path} has a corrupt section directory")
+        sections = {}
+        for index in range(count):
+            name, offset, length = _ENTRY.unpack_from(self._map, directory + index * _ENTRY.size)
+            if offset + length > directory:
+                raise SnapshotError(f"{self.path} has a corrupt section directory")
+            sections[name.rstrip(b"\0").decode("ascii")] = (offset, length)
+        return sections
+
+
+def _columns(records: List, fields) -> Dict[str, list]:
+    return {field: [getattr(record, field) for record in records] for field in fields}
+
+
+def _rows(columns: Dict[str, list], fields, model) -> List:
+    # Every row sets every field and was validated on write, so it is not validated again.
+    construct, fields_set = model.model_construct, set(fields)
+    return [construct(fields_set, **dict(zip(fields, values)))
+            for values in zip(*(columns[field] for field in fields))]
+
+
+def _derive_stats(columns: Dict[str, list]) -> None:
+    # Version 3 snapshots written before prompts carried content statistics.
+    stats = [content_stats(content) for content in columns["content"]]
+    for field in STATS_FIELDS:
+        columns[field] = [values[field] for values in stats]
+
+
+def _write_lists(writer: "SnapshotWriter", name: str, lists: List[List[str]], intern) -> None:
+    counts = np.fromiter(map(len, lists), dtype=np.int32, count=len(lists))
+    writer.write_column(f"prompt.n{name}", counts)
+    writer.write_column(f"prompt.{name}", np.fromiter(
+        (intern(value) for values in lists for value in values),
+        dtype=np.int32, count=int(counts.sum())))
+
+
+def _read_lists(reader: "SnapshotReader", name: str, strings: List[str]) -> List[List[str]]:
+    values = [strings[code] for code in reader.column(f"prompt.{name}", np.int32).tolist()]
+    ends = np.cumsum(reader.column(f"prompt.n{name}", np.int32), dtype=np.int64).tolist()
+    return [values[start:end] for start, end in zip([0] + ends, ends)]
+
+
+def _micros(values: Iterable) -> np.ndarray:
+    return np.fromiter((to_micros(value) for value in values), dtype=np.int64)
+
+
+def _datetimes(column: np.ndarray) -> list:
+    # datetime64[us].tolist() yields naive datetime objects in a C loop.
+    return column.astype("datetime64[us]").tolist()
+
+
+def write_snapshot(storage: Storage, path: str) -> int:
+    """Write every prompt and collection in ``storage`` to ``path``.
+
+    Prompts are read from one pinned version of the store, so the file is
+    a consistent image even if writes keep arriving while it is written.
+    Timestamps are stored as UTC microseconds and come back as naive UTC
+    datetimes, the form ``get_current_time`` produces.
+
+    Args:
+        storage (Storage): The store to snapshot.
+        path (str): Destination file; replaced atomically.
+
+    Returns:
+        int: The number of prompts written.
+
+    Example:
+        >>> write_snapshot(storage, "/var/lib/promptlab/snapshot.bin")
+        1000000
+    """
+    with storage.snapshot() as view:
+        prompts = view.get_all_prompts()
+    collections = storage.get_all_collections()
+
+    strings: Dict[str, int] = {}
+    intern = lambda value: strings.setdefault(value, len(strings))  # noqa: E731
+    collection_codes = np.fromiter(
+        (-1 if prompt.collection_id is None else intern(prompt.collection_id)
+         for prompt in prompts), dtype=np.int32, count=len(prompts))
+
+    def integers(field: str, dtype=np.int64) -> np.ndarray:
+        return np.fromiter((getattr(p, field) for p in prompts), dtype=dtype, count=len(prompts))
+
+    with SnapshotWriter(path) as writer:
+        for field in ("id", "title", "content", "description"):
+            writer.write_text(f"prompt.{field}", (getattr(p, field) for p in prompts))
+        writer.write_column("prompt.coll", collection_codes)
+        _write_lists(writer, "tags", [p.tags for p in prompts], intern)
+        _write_lists(writer, "vars", [p.variables for p in prompts], intern)
+        writer.write_column("prompt.created", _micros(p.created_at for p in prompts))
+        writer.write_column("prompt.updated", _micros(p.updated_at for p in prompts))
+        writer.write_column("prompt.revision", integers("revision"))
+        writer.write_column("prompt.chars", integers("char_count"))
+        writer.write_column("prompt.tokens", integers("token_count"))
+        writer.write_column("prompt.valid", integers("content_valid", np.uint8))
+        writer.write_text("strings", strings)
+        for field in ("id", "name", "description"):
+            writer.write_text(f"coll.{field}", (getattr(c, field) for c in collections))
+        writer.write_column("coll.created", _micros(c.created_at for c in collections))
+        writer.close(len(prompts), len(collections))
+    return len(prompts)
+
+
+def read_snapshot(path: str, verify: bool = True) -> Tuple[List[Prompt], List[Collection]]:
+    """Read the records of a snapshot without loading them into a store.
+
+    Args:
+        path (str): A file written by :func:`write_snapshot`.
+        verify (bool): Check the checksum of the file before decoding it.
+
+    Returns:
+        Tuple[List[Prompt], List[Collection]]: Every prompt and collection in the file.
+
+    Raises:
+        SnapshotError: If the file cannot be read, is corrupt or has an unsupported version.
+
+    Example:
+        >>> prompts, collections = read_snapshot("/var/backups/promptlab.snap")
+    """
+    try:
+        with open(path, "rb") as handle:
+            magic = handle.read(len(MAGIC))
+    except OSError as error:
+        raise SnapshotError(f"cannot read snapshot {path}: {error}") from error
+    if magic.startswith(_PICKLE_PROTOCOL):
+        raise SnapshotError(f"{path} is a version 1 or 2 (pickle) snapshot, which is no longer read")
+    if magic != MAGIC:
+        raise SnapshotError(f"{path} is not a PromptLab snapshot")
+
+    with SnapshotReader(path, verify) as reader:
+        strings = reader.text("strings")
+        prompts = {field: reader.text(f"prompt.{field}")
+                   for field in ("id", "title", "content", "description")}
+        prompts["tags"] = _read_lists(reader, "tags", strings)
+        prompts["collection_id"] = [None if code < 0 else strings[code] for code in
+                                    reader.column("prompt.coll", np.int32).tolist()]
+        prompts["created_at"] = _datetimes(reader.column("prompt.created", np.int64))
+        prompts["updated_at"] = _datetimes(reader.column("prompt.updated", np.int64))
+        prompts["revision"] = reader.column("prompt.revision", np.int64).tolist()
+        if "prompt.vars" in reader:
+            prompts["char_count"] = reader.column("prompt.chars", np.int64).tolist()
+            prompts["token_count"] = reader.column("prompt.tokens", np.int64).tolist()
+            prompts["variables"] = _read_lists(reader, "vars", strings)
+            prompts["content_valid"] = \
+                reader.column("prompt.valid", np.uint8).astype(bool).tolist()
+        else:
+            _derive_stats(prompts)
+        collections = {field: reader.text(f"coll.{field}")
+                       for field in ("id", "name", "description")}
+        collections["created_at"] = _datetimes(reader.column("coll.created", np.int64))
+        counts = (reader.prompts, reader.collections)
+
+    if any(len(column) != counts[0] for column in prompts.values()) or \
+            any(len(column) != counts[1] for column in collections.values()):
+        raise SnapshotError(f"{path} has columns of different lengths")
+    return (_rows(prompts, PROMPT_FIELDS, Prompt),
+            _rows(collections, COLLECTION_FIELDS, Collection))
+
+
+def load_snapshot(storage: Storage, path: str) -> int:
+    """Bulk-load ``path`` into ``storage``, replacing its contents.
+
+    Args:
+        storage (Storage): The store to fill.
+        path (str): A file written by :func:`write_snapshot`.
+
+    Returns:
+        int: The number of prompts loaded.
+
+    Raises:
+        SnapshotError: If the file cannot be read, is corrupt or has an unsupported version.
+            The store is left unchanged.
+
+    Example:
+        >>> load_snapshot(storage, "/var/lib/promptlab/snapshot.bin")
+        1000000
+    """
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        prompts, collections = read_snapshot(path)
+        storage.bulk_load(prompts, collections)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return len(prompts)
@@ -4,44 +4,275 @@ This module provides simple in-memory storage for prompts and collections.
 In a production environment, this would be replaced with a database.
 """
 
-from typing import Dict, List, Optional
-from app.models import Prompt, Collection
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from app.models import Prompt, Collection, CollectionStats, get_current_time
+from app.metrics import timed_operation
+from app.blobstore import BlobRef, BlobStore, StaleBlobRef
+from app.columns import PromptColumns, Selection, matches
+from app.indexes import (ChangeLog, CollectionStatsIndex, JournalExpired, MutationJournal,
+                         NearDuplicateIndex, QuotaExceeded, UsageIndex, VersionLog, record_bytes)
+from app.minhash import signature
+from app.parallel import ShardedSearch
+from app.utils import content_stats
+
+# Writers to different prompts rarely share a lock stripe, so they proceed in parallel.
+LOCK_STRIPES = 64
+
+
+class RevisionConflict(Exception):
+    """Raised when a compare-and-swap update finds a different revision than expected.
+
+    Attributes:
+        prompt_id (str): The prompt that was being updated.
+        expected (int): The revision the caller based its update on.
+        current (int): The revision actually stored.
+    """
+
+    def __init__(self, prompt_id: str, expected: int, current: int):
+        super().__init__(f"prompt {prompt_id} is at revision {current}, not {expected}")
+        self.prompt_id = prompt_id
+        self.expected = expected
+        self.current = current
+
+
+class WatermarkExpired(Exception):
+    """Raised when a delta-sync watermark can no longer be served.
+
+    The store was reloaded or cleared since the watermark was issued, or a
+    tombstone the reader has not seen yet was compacted away. The reader has
+    to resync from a full listing.
+    """
+
+
+class IndexNotReady(Exception):
+    """Raised when a query needs an index that is still being built in the background.
+
+    Attributes:
+        index (str): The index that is not ready yet.
+    """
+
+    def __init__(self, index: str):
+        super().__init__(f"the {index} index is still being built")
+        self.index = index
+
+
+class StoreView:
+    """A read-only view of a ``Storage`` frozen at one version.
+
+    Obtained from :meth:`Storage.snapshot`. Every read through the view sees
+    the store exactly as it was when the view was taken, however long the
+    read runs: later writes are neither visible nor able to tear a result,
+    and writers never wait for the view. Records that writers replace are
+    kept in the store's version log until no view needs them.
+
+    Attributes:
+        version (int): The store version the view reads.
+    """
+
+    def __init__(self, storage: "Storage", version: int):
+        self.version = version
+        self._storage = storage
+        self._prompts = storage._prompts
+        self._columns = storage._columns
+        self._versions = storage._versions
+
+    def get_prompt(self, prompt_id: str, load_content: bool = True) -> Optional[Prompt]:
+        """Retrieve a prompt as of the view's version.
+
+        Args:
+            prompt_id (str): The prompt.
+            load_content (bool): Read a blob-stored body back.
+
+        Returns:
+            Optional[Prompt]: The prompt, or None if it did not exist then.
+        """
+        prompt = self._as_of(prompt_id, self._prompts.get(prompt_id))
+        if prompt is not None and load_content:
+            return self._load(prompt)
+        return prompt
+
+    def get_prompts(self, prompt_ids: Iterable[str], load_content: bool = True) -> List[Prompt]:
+        """Retrieve several prompts as of the view's version, in the given order.
+
+        Args:
+            prompt_ids (Iterable[str]): The prompt IDs; IDs that did not exist then are skipped.
+            load_content (bool): Read blob-stored bodies back.
+
+        Returns:
+            List[Prompt]: The prompts found.
+        """
+        records = self._prompts
+        prompts = [prompt for prompt in (self._as_of(prompt_id, records.get(prompt_id))
+                                         for prompt_id in prompt_ids) if prompt is not None]
+        return self.with_content(prompts) if load_content else prompts
+
+    def get_all_prompts(self, load_content: bool = True) -> List[Prompt]:
+        """List every prompt that existed at the view's version.
+
+        Args:
+            load_content (bool): Read blob-stored bodies back.
+
+        Returns:
+            List[Prompt]: The prompts, live ones in store order, then those deleted since.
+        """
+        live = list(self._prompts.items())
+        prompts = [prompt for prompt in (self._as_of(prompt_id, record)
+                                         for prompt_id, record in live) if prompt is not None]
+        live_ids = {prompt_id for prompt_id, _ in live}
+        for prompt_id in self._versions.changed(self.version):
+            if prompt_id not in live_ids:
+                prompt = self._as_of(prompt_id, None)
+                if prompt is not None:
+                    prompts.append(prompt)
+        return self.with_content(prompts) if load_content else prompts
+
+    def select_prompts(self, **filters) -> Selection:
+        """Select the prompts that matched metadata filters at the view's version.
+
+        The columns reflect the live store; rows of prompts written since the
+        view was taken are swapped for their earlier state, so the cost of
+        catching up grows with the number of such writes, not with the store.
+
+        Args:
+            **filters: The filters of :meth:`Storage.select_prompts`.
+
+        Returns:
+            Selection: The matching prompts as of the view's version.
+        """
+        selection = self._columns.select(**filters)
+        if selection.version == self.version:
+            return selection
+        changed = self._versions.changed(self.version, selection.version)
+        earlier = (self._as_of(prompt_id, None) for prompt_id in changed)
+        return selection.replace(
+            changed, [prompt for prompt in earlier if prompt is not None and matches(prompt, **filters)],
+            self.version)
+
+    def with_content(self, prompts: Iterable[Prompt]) -> List[Prompt]:
+        """Return ``prompts`` read from this view with any blob-stored bodies read back in.
+
+        Args:
+            prompts (Iterable[Prompt]): Prompts fetched with ``load_content=False``.
+
+        Returns:
+            List[Prompt]: The same prompts, in order, with their content as of the view.
+        """
+        return [self._load(prompt) for prompt in prompts]
+
+    def _as_of(self, prompt_id: str, live: Optional[Prompt]) -> Optional[Prompt]:
+        changed, earlier = self._versions.as_of(prompt_id, self.version)
+        return earlier if changed else live
+
+    def _load(self, prompt: Prompt) -> Prompt:
+        if prompt.content or self._storage._blob_store is None:
+            return prompt
+        loaded = self._storage._materialize(prompt)
+        # The body may have been replaced while it was read; superseded
+        # records are saved with their content before that happens.
+        changed, earlier = self._versions.as_of(prompt.id, self.version)
+        return earlier if changed and earlier is not None else loaded
 
 
 class Storage:
     """Handles in-memory storage for prompts and collections.
 
+    When a blob store is attached, prompt bodies above its threshold are kept
+    there instead of on the heap. The record in ``_prompts`` is then a stub
+    with empty ``content`` (real content is never empty), and the body is
+    read back only when a caller asks for content.
+
     Attributes:
         _prompts: A dictionary to store prompts by their unique IDs.
         _collections: A dictionary to store collections by their unique IDs.
+        _blob_store: Optional store for large prompt bodies.
+        _blob_refs: Stub record and blob reference per prompt ID with a stored body.
+        _stripes: Locks serializing writes to prompts hashing to the same stripe.
+        _collection_index: Membership and statistics per collection.
+        _near_duplicates: MinHash signatures of prompt contents in LSH buckets.
+        _search: Shard membership and packed shard texts for content searches.
+        _columns: Prompt metadata in NumPy columns for filtering and sorting.
+        _changes: Write sequence numbers and delete tombstones for delta sync.
+        _usage: Prompt count and stored bytes, checked against the quotas.
+        _versions: Records superseded while readers hold older versions (see ``snapshot``).
+        _journal: Recent writes to prompts and collections, for ``restore``.
+        _indexed: Set unless the indexes above are still being built after a bulk load.
     """
-    def __init__(self):
+    def __init__(self, blob_store: Optional[BlobStore] = None):
         self._prompts: Dict[str, Prompt] = {}
         self._collections: Dict[str, Collection] = {}
+        self._blob_store = blob_store
+        self._blob_refs: Dict[str, Tuple[Prompt, BlobRef]] = {}
+        self._blob_lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._collection_index = CollectionStatsIndex()
+        self._near_duplicates = NearDuplicateIndex()
+        self._signature_lock = threading.Lock()
+        self._search = ShardedSearch()
+        self._columns = PromptColumns()
+        self._changes = ChangeLog()
+        self._usage = UsageIndex()
+        self._versions = VersionLog()
+        self._journal = MutationJournal()
+        self._indexed = threading.Event()
+        self._indexed.set()
+
+    def _stripe(self, prompt_id: str) -> threading.Lock:
+        return self._stripes[hash(prompt_id) % LOCK_STRIPES]
     
     # ============== Prompt Operations ==============
     
+    @timed_operation("create_prompt")
     def create_prompt(self, prompt: Prompt) -> Prompt:
         """Add a new prompt to storage.
         
+        The derived content statistics (``char_count``, ``token_count``,
+        ``variables``, ``content_valid``) are computed here, once per write,
+        and set on a copy of ``prompt``; the argument is left unchanged.
+
         Args:
             prompt (Prompt): The prompt instance to store.
             
         Returns:
             Prompt: The stored prompt instance.
+
+        Raises:
+            QuotaExceeded: If the store is at its prompt or byte quota.
             
         Example:
             >>> new_prompt = Prompt(id='123', title='Example')
             >>> storage.create_prompt(new_prompt)
         """
-        self._prompts[prompt.id] = prompt
+        content_signature = signature(prompt.content)
+        prompt = prompt.model_copy(update=self._derive_stats(prompt, None))
+        size = record_bytes(prompt)
+        self._await_indexes()
+        with self._stripe(prompt.id):
+            self._usage.admit(prompt.id, size)
+            previous = self._prompts.get(prompt.id)
+            record, ref = self._spill(prompt)
+            with self._publishing(prompt.id, previous, prompt):
+                self._prompts[prompt.id] = self._place(prompt, record, ref)
+                self._columns.upsert(prompt)
+            if previous is None:
+                self._collection_index.add(prompt)
+            else:
+                self._collection_index.replace(previous, prompt)
+            self._near_duplicates.add(prompt.id, content_signature)
+            self._search.add(prompt.id)
+            self._changes.record(prompt.id)
         return prompt
     
-    def get_prompt(self, prompt_id: str) -> Optional[Prompt]:
+    @timed_operation("get_prompt")
+    def get_prompt(self, prompt_id: str, load_content: bool = True) -> Optional[Prompt]:
         """Retrieve a stored prompt by its ID.
         
         Args:
             prompt_id (str): The unique identifier for the prompt.
+            load_content (bool): Read a blob-stored body back. Pass False when
+                ``content`` is not needed; the body is then empty for large prompts.
             
         Returns:
             Optional[Prompt]: The prompt instance if found, None otherwise.
@@ -49,38 +280,259 @@ class Storage:
         Example:
             >>> prompt = storage.get_prompt('123')
         """
-        return self._prompts.get(prompt_id)
+        prompt = self._prompts.get(prompt_id)
+        if prompt is not None and load_content:
+            return self._materialize(prompt)
+        return prompt
     
-    def get_all_prompts(self) -> List[Prompt]:
+    @timed_operation("get_all_prompts")
+    def get_all_prompts(self, load_content: bool = True) -> List[Prompt]:
         """Get a list of all stored prompts.
 
+        Args:
+            load_content (bool): Read blob-stored bodies back. Pass False when
+                only metadata is needed and call :meth:`with_content` on the
+                prompts that are finally returned.
+
         Returns:
             List[Prompt]: A list of all prompt instances stored.
             
         Example:
             >>> all_prompts = storage.get_all_prompts()
         """
-        return list(self._prompts.values())
+        prompts = list(self._prompts.values())
+        if load_content and self._blob_refs:
+            return self.with_content(prompts)
+        return prompts
     
-    def update_prompt(self, prompt_id: str, prompt: Prompt) -> Optional[Prompt]:
+    @timed_operation("get_prompts")
+    def get_prompts(self, prompt_ids: Iterable[str], load_content: bool = True) -> List[Prompt]:
+        """Retrieve several stored prompts by ID, in the given order.
+
+        Args:
+            prompt_ids (Iterable[str]): The prompt IDs; unknown IDs are skipped.
+            load_content (bool): Read blob-stored bodies back.
+
+        Returns:
+            List[Prompt]: The prompts found.
+
+        Example:
+            >>> [p.id for p in storage.get_prompts(['2', 'missing', '1'])]
+            ['2', '1']
+        """
+        records = self._prompts
+        prompts = [prompt for prompt in map(records.get, prompt_ids) if prompt is not None]
+        if load_content and self._blob_refs:
+            return self.with_content(prompts)
+        return prompts
+
+    @timed_operation("select_prompts")
+    def select_prompts(self, collection_id: Optional[str] = None,
+                       tag: Optional[str] = None,
+                       created_after: Optional[datetime] = None,
+                       created_before: Optional[datetime] = None,
+                       updated_after: Optional[datetime] = None,
+                       updated_before: Optional[datetime] = None,
+                       min_tokens: Optional[int] = None,
+                       max_tokens: Optional[int] = None,
+                       has_variable: Optional[bool] = None,
+                       variable: Optional[str] = None) -> Selection:
+        """Select the prompts matching metadata filters, without loading them.
+
+        Runs as vectorized masks over the columnar metadata; time windows are
+        looked up in sorted range indexes. Order and page the result with
+        ``Selection.ordered_ids``, then fetch only those prompts.
+
+        Args:
+            collection_id (Optional[str]): Only prompts in this collection.
+            tag (Optional[str]): Only prompts carrying this tag.
+            created_after (Optional[datetime]): Only prompts created at or after this time.
+            created_before (Optional[datetime]): Only prompts created before this time.
+            updated_after (Optional[datetime]): Only prompts updated at or after this time.
+            updated_before (Optional[datetime]): Only prompts updated before this time.
+            min_tokens (Optional[int]): Only prompts of at least this many tokens.
+            max_tokens (Optional[int]): Only prompts of at most this many tokens.
+            has_variable (Optional[bool]): Only prompts with (True) or without (False)
+                template variables.
+            variable (Optional[str]): Only prompts using this template variable.
+
+        Returns:
+            Selection: The matching prompts.
+
+        Example:
+            >>> page = storage.select_prompts(tag='python').ordered_ids(limit=20)
+        """
+        self._await_indexes()
+        return self._columns.select(collection_id=collection_id, tag=tag,
+                                    created_after=created_after, created_before=created_before,
+                                    updated_after=updated_after, updated_before=updated_before,
+                                    min_tokens=min_tokens, max_tokens=max_tokens,
+                                    has_variable=has_variable, variable=variable)
+
+    @timed_operation("page_prompts")
+    def page_prompts(self, sort_by: str, descending: bool = True, offset: int = 0,
+                     limit: Optional[int] = None, load_content: bool = True
+                     ) -> Optional[Tuple[List[Prompt], int]]:
+        """Return one page of all prompts in sort order, read from an ordered index.
+
+        The cost is a binary search plus the page, not a sort of the store.
+        Only locating the page in the index happens under the version lock,
+        where the version is pinned as for :meth:`snapshot`; the records and
+        their bodies are then read through that view, so the page and the
+        total agree however many writes land meanwhile.
+
+        Args:
+            sort_by (str): The sort key; only keys in ``ORDERED_KEYS`` are indexed.
+            descending (bool): Largest (newest, or last by title) first when True.
+            offset (int): Prompts to skip.
+            limit (Optional[int]): Page size; all remaining prompts when None.
+            load_content (bool): Read blob-stored bodies back.
+
+        Returns:
+            Optional[Tuple[List[Prompt], int]]: The page and the number of stored
+            prompts; None if ``sort_by`` has no ordered index.
+
+        Example:
+            >>> page, total = storage.page_prompts("title", descending=False, limit=20)
+        """
+        self._await_indexes()
+        versions = self._versions
+        with versions.lock:
+            result = self._columns.page(sort_by, descending, offset, limit)
+            if result is None:
+                return None
+            version = self._columns.version
+            versions.pin(version)
+            view = StoreView(self, version)
+        try:
+            prompt_ids, total = result
+            prompts = view.get_prompts(prompt_ids, load_content)
+        finally:
+            versions.unpin(version)
+        return prompts, total
+
+    @timed_operation("update_prompt")
+    def update_prompt(self, prompt_id: str, prompt: Prompt,
+                      expected_revision: Optional[int] = None) -> Optional[Prompt]:
         """Update a stored prompt by its ID.
 
+        The check and the write are atomic with respect to other updates and
+        deletes of the same prompt. Only a striped per-prompt lock is taken,
+        so writers to different prompts do not wait for each other. The
+        stored prompt's ``revision`` is set to one past the current revision,
+        and its content statistics are recomputed if the content changed. Both
+        are set on a copy of ``prompt``, so the argument is left unchanged even
+        if the update fails and is retried.
+
         Args:
             prompt_id (str): The unique identifier of the prompt to update.
             prompt (Prompt): The new prompt data.
+            expected_revision (Optional[int]): Only update if the stored prompt is
+                still at this revision (compare-and-swap). None updates unconditionally.
             
         Returns:
             Optional[Prompt]: The updated prompt instance if found, None otherwise.
+
+        Raises:
+            RevisionConflict: If the stored revision differs from ``expected_revision``.
+            QuotaExceeded: If the larger prompt would take the store past its byte quota.
             
         Example:
             >>> updated_prompt = Prompt(id='123', title='Updated')
-            >>> storage.update_prompt('123', updated_prompt)
+            >>> storage.update_prompt('123', updated_prompt, expected_revision=1)
         """
-        if prompt_id not in self._prompts:
-            return None
-        self._prompts[prompt_id] = prompt
+        # Metadata-only updates keep their body, and with it their indexed
+        # signature. The check is repeated under the lock in case the body
+        # changed meanwhile.
+        current = self._prompts.get(prompt_id)
+        content_signature = None if self._keeps_signature(current, prompt) \
+            else signature(prompt.content)
+        stats = self._derive_stats(prompt, current)
+        size = record_bytes(prompt)
+        self._await_indexes()
+        with self._stripe(prompt_id):
+            current = self._prompts.get(prompt_id)
+            if current is None:
+                return None
+            if expected_revision is not None and current.revision != expected_revision:
+                raise RevisionConflict(prompt_id, expected_revision, current.revision)
+            self._usage.admit(prompt_id, size)
+            if content_signature is None and not self._keeps_signature(current, prompt):
+                content_signature = signature(prompt.content)
+            prompt = prompt.model_copy(update={**stats, "revision": current.revision + 1})
+            record, ref = self._spill(prompt)
+            with self._publishing(prompt_id, current, prompt):
+                self._prompts[prompt_id] = self._place(prompt, record, ref)
+                self._columns.upsert(prompt)
+            self._collection_index.replace(current, prompt)
+            if content_signature is not None:
+                self._near_duplicates.add(prompt_id, content_signature)
+            self._search.touch(prompt_id)
+            self._changes.record(prompt_id)
         return prompt
     
+    @timed_operation("bulk_update_prompts")
+    def bulk_update_prompts(
+        self,
+        prompt_ids: Iterable[str],
+        add_tags: Iterable[str] = (),
+        remove_tags: Iterable[str] = (),
+        set_collection: bool = False,
+        collection_id: Optional[str] = None
+    ) -> int:
+        """Change tags and collection of many prompts in one pass.
+
+        Each changed record is copied with the new values instead of being
+        rebuilt and revalidated, and gets a new revision and ``updated_at``.
+        Each prompt is updated under its lock stripe, so concurrent single
+        updates are never lost. Prompts deleted in the meantime are skipped.
+
+        Args:
+            prompt_ids (Iterable[str]): The prompts to change.
+            add_tags (Iterable[str]): Tags to append where missing.
+            remove_tags (Iterable[str]): Tags to remove where present.
+            set_collection (bool): Whether to move prompts to ``collection_id``.
+            collection_id (Optional[str]): Target collection, or None for no collection.
+
+        Returns:
+            int: The number of prompts that changed.
+
+        Example:
+            >>> storage.bulk_update_prompts(['1', '2'], add_tags=['reviewed'])
+            2
+        """
+        add_tags = list(dict.fromkeys(add_tags))
+        removed = set(remove_tags)
+        now = get_current_time()
+        updated = 0
+        self._await_indexes()
+        for prompt_id in prompt_ids:
+            with self._stripe(prompt_id):
+                current = self._prompts.get(prompt_id)
+                if current is None:
+                    continue
+                tags = [tag for tag in current.tags if tag not in removed]
+                tags.extend(tag for tag in add_tags if tag not in tags)
+                target = collection_id if set_collection else current.collection_id
+                if tags == current.tags and target == current.collection_id:
+                    continue
+                record = current.model_copy(update={
+                    "tags": tags,
+                    "collection_id": target,
+                    "updated_at": now,
+                    "revision": current.revision + 1,
+                })
+                with self._publishing(prompt_id, current, record):
+                    self._prompts[prompt_id] = record
+                    self._columns.upsert(record)
+                self._collection_index.replace(current, record)
+                self._changes.record(prompt_id)
+                if prompt_id in self._blob_refs:
+                    self._restub(record)
+                updated += 1
+        return updated
+
+    @timed_operation("delete_prompt")
     def delete_prompt(self, prompt_id: str) -> bool:
         """Remove a stored prompt by its ID.
 
@@ -93,13 +545,26 @@ class Storage:
         Example:
             >>> storage.delete_prompt('123')
         """
-        if prompt_id in self._prompts:
-            del self._prompts[prompt_id]
-            return True
+        self._await_indexes()
+        with self._stripe(prompt_id):
+            current = self._prompts.get(prompt_id)
+            if current is not None:
+                with self._publishing(prompt_id, current, None):
+                    del self._prompts[prompt_id]
+                    self._columns.remove(prompt_id)
+                self._collection_index.remove(current)
+                self._near_duplicates.remove(prompt_id)
+                self._search.discard(prompt_id)
+                self._changes.record_delete(prompt_id, get_current_time())
+                self._usage.remove(prompt_id)
+                if prompt_id in self._blob_refs:
+                    self._drop_blob(prompt_id)
+                return True
         return False
     
     # ============== Collection Operations ==============
     
+    @timed_operation("create_collection")
     def create_collection(self, collection: Collection) -> Collection:
         """Add a new collection to storage.
         
@@ -113,9 +578,12 @@ class Storage:
             >>> new_collection = Collection(id='col1', title='Examples')
             >>> storage.create_collection(new_collection)
         """
+        previous = self._collections.get(collection.id)
         self._collections[collection.id] = collection
+        self._journal.record(("collection", collection.id), previous, collection)
         return collection
     
+    @timed_operation("get_collection")
     def get_collection(self, collection_id: str) -> Optional[Collection]:
         """Retrieve a stored collection by its ID.
         
@@ -130,6 +598,7 @@ class Storage:
         """
         return self._collections.get(collection_id)
     
+    @timed_operation("get_all_collections")
     def get_all_collections(self) -> List[Collection]:
         """Get a list of all stored collections.
 
@@ -141,6 +610,7 @@ class Storage:
         """
         return list(self._collections.values())
     
+    @timed_operation("delete_collection")
     def delete_collection(self, collection_id: str) -> bool:
         """Remove a stored collection by its ID.
 
@@ -153,16 +623,23 @@ class Storage:
         Example:
             >>> storage.delete_collection('col1')
         """
-        if collection_id in self._collections:
-            del self._collections[collection_id]
-            return True
-        return False
+        collection = self._collections.pop(collection_id, None)
+        if collection is None:
+            return False
+        self._journal.record(("collection", collection_id), collection, None)
+        return True
     
-    def get_prompts_by_collection(self, collection_id: str) -> List[Prompt]:
+    @timed_operation("get_prompts_by_collection")
+    def get_prompts_by_collection(self, collection_id: str,
+                                  load_content: bool = True) -> List[Prompt]:
         """Get a list of prompts belonging to a specific collection.
+
+        Uses the collection index, so the cost is proportional to the size
+        of the collection rather than of the whole store.
         
         Args:
             collection_id (str): The unique identifier of the collection.
+            load_content (bool): Read blob-stored bodies back.
 
         Returns:
             List[Prompt]: A list of prompts that belong to the specified collection.
@@ -170,18 +647,706 @@ class Storage:
         Example:
             >>> prompts_in_col = storage.get_prompts_by_collection('col1')
         """
-        return [p for p in self._prompts.values() if p.collection_id == collection_id]
+        self._await_indexes()
+        records = self._prompts
+        prompts = [records[prompt_id] for prompt_id in self._collection_index.members(collection_id)
+                   if prompt_id in records]
+        return self.with_content(prompts) if load_content and self._blob_refs else prompts
+
+    @timed_operation("get_collection_stats")
+    def get_collection_stats(self, collection_id: str) -> CollectionStats:
+        """Get prompt count, latest update time and tag histogram of a collection.
+
+        The statistics are maintained on every write, so this does not scan prompts.
+
+        Args:
+            collection_id (str): The unique identifier of the collection.
+
+        Returns:
+            CollectionStats: The collection's statistics; zero counts if it holds no prompts.
+
+        Example:
+            >>> storage.get_collection_stats('col1').prompt_count
+            12
+        """
+        self._await_indexes()
+        return self._collection_index.stats(collection_id)
     
+    # ============== Near-Duplicate Detection ==============
+
+    @property
+    def near_duplicate_threshold(self) -> float:
+        """The default similarity threshold for near-duplicate queries."""
+        return self._near_duplicates.threshold
+
+    def set_near_duplicate_threshold(self, threshold: float) -> None:
+        """Set the default similarity threshold for near-duplicate queries.
+
+        Args:
+            threshold (float): Minimum estimated Jaccard similarity, between 0 and 1.
+
+        Example:
+            >>> storage.set_near_duplicate_threshold(0.9)
+        """
+        self._near_duplicates.set_threshold(threshold)
+
+    @timed_operation("find_near_duplicates")
+    def find_near_duplicates(self, prompt_id: str,
+                             threshold: Optional[float] = None) -> Optional[List[Tuple[str, float]]]:
+        """Find prompts whose content nearly duplicates that of ``prompt_id``.
+
+        Args:
+            prompt_id (str): The prompt to compare against.
+            threshold (Optional[float]): Minimum similarity; the configured default if None.
+
+        Returns:
+            Optional[List[Tuple[str, float]]]: ``(prompt_id, similarity)`` pairs, most
+            similar first, or None if the prompt does not exist.
+
+        Raises:
+            IndexNotReady: If signatures are still being computed after a bulk load.
+
+        Example:
+            >>> storage.find_near_duplicates('123')
+            [('456', 0.9375)]
+        """
+        if prompt_id not in self._prompts:
+            return None
+        self._require_signatures()
+        if threshold is None:
+            threshold = self._near_duplicates.threshold
+        return self._near_duplicates.similar(prompt_id, threshold)
+
+    @timed_operation("near_duplicate_clusters")
+    def near_duplicate_clusters(self, threshold: Optional[float] = None) -> List[List[str]]:
+        """Group the whole store into clusters of near-duplicate prompts.
+
+        Args:
+            threshold (Optional[float]): Minimum similarity; the configured default if None.
+
+        Returns:
+            List[List[str]]: Clusters of two or more prompt IDs, largest first.
+
+        Raises:
+            IndexNotReady: If signatures are still being computed after a bulk load.
+
+        Example:
+            >>> storage.near_duplicate_clusters()
+            [['123', '456', '789']]
+        """
+        self._require_signatures()
+        if threshold is None:
+            threshold = self._near_duplicates.threshold
+        return self._near_duplicates.clusters(threshold)
+
+    @timed_operation("variable_counts")
+    def variable_counts(self) -> Dict[str, int]:
+        """Count the prompts using each template variable.
+
+        Read from the variable index, which is kept up to date on every write,
+        so no prompt content is scanned.
+
+        Returns:
+            Dict[str, int]: Number of prompts per variable name.
+
+        Example:
+            >>> storage.variable_counts()
+            {'customer_name': 12, 'topic': 3}
+        """
+        self._await_indexes()
+        return self._columns.variable_counts()
+
+    def _derive_stats(self, prompt: Prompt, current: Optional[Prompt]) -> Dict[str, object]:
+        """Return the content statistics of ``prompt``, copied from ``current`` if the body is the same."""
+        if self._same_content(current, prompt):
+            return {"char_count": current.char_count, "token_count": current.token_count,
+                    "variables": current.variables, "content_valid": current.content_valid}
+        return content_stats(prompt.content)
+
+    def _keeps_signature(self, current: Optional[Prompt], prompt: Prompt) -> bool:
+        """Whether ``prompt`` can reuse the indexed signature of ``current``."""
+        return self._same_content(current, prompt) and current.id in self._near_duplicates
+
+    def _same_content(self, current: Optional[Prompt], prompt: Prompt) -> bool:
+        """Whether ``prompt`` has the body of ``current``, which may be a blob stub."""
+        if current is None:
+            return False
+        if current.content or not prompt.content:
+            return current.content == prompt.content
+        # A stub's body is compared through its blob reference, length first.
+        entry = self._blob_refs.get(current.id)
+        return entry is not None and entry[0] is current and self._same_body(entry[1], prompt.content)
+
+    def complete_signatures(self) -> None:
+        """Compute the signatures of prompts bulk-loaded without one.
+
+        ``bulk_load`` runs this on a background thread, so neither startup
+        nor a request waits for the whole corpus to be hashed. It starts once
+        the other indexes are built and returns once every prompt of the
+        current store has a signature.
+
+        Example:
+            >>> storage.complete_signatures()
+        """
+        self._await_indexes()
+        index = self._near_duplicates
+        with self._signature_lock:
+            if index.complete:
+                return
+            prompts = self._prompts
+            for prompt_id, record in list(prompts.items()):
+                if prompt_id in index:
+                    continue
+                content_signature = signature(self._materialize(record).content)
+                with self._stripe(prompt_id):
+                    # Skip records replaced meanwhile; their writer indexed them.
+                    if self._prompts.get(prompt_id) is record and prompt_id not in index:
+                        index.add(prompt_id, content_signature)
+            # A reload meanwhile starts its own pass over the new records.
+            if self._prompts is prompts:
+                index.complete = True
+
+    def _await_indexes(self) -> None:
+        # Lookups by ID never wait; everything reading or updating an index does.
+        if not self._indexed.is_set():
+            self._indexed.wait()
+
+    def _build_indexes(self, prompts: List[Prompt]) -> None:
+        """Build the indexes of a bulk-loaded store; runs on a background thread."""
+        try:
+            records = self._prompts
+            self._collection_index.rebuild(records.values())
+            self._search.reset(records)
+            columns = PromptColumns()
+            columns.rebuild(records.values())
+            self._columns = columns
+            self._changes.reset(records)
+            self._usage.reset(prompts)
+        finally:
+            self._indexed.set()
+
+    def _require_signatures(self) -> None:
+        if not self._near_duplicates.complete:
+            raise IndexNotReady("near-duplicate")
+
+    # ============== Delta Sync ==============
+
+    def set_tombstone_retention(self, seconds: float) -> None:
+        """Set how long delete tombstones are kept for delta sync.
+
+        Args:
+            seconds (float): Retention period.
+
+        Example:
+            >>> storage.set_tombstone_retention(3600)
+        """
+        self._changes.retention = seconds
+
+    @timed_operation("prompt_changes")
+    def prompt_changes(self, since: Optional[str] = None, limit: int = 1000
+                       ) -> Tuple[List[Prompt], List[Tuple[str, datetime]], str, bool]:
+        """Return the prompts written and deleted after a watermark.
+
+        Each prompt appears at most once, in its latest state: a prompt
+        updated several times is returned once, and a prompt created and
+        deleted since ``since`` appears only as a tombstone. A full sync is
+        served however many tombstones have expired; the watermarks of its
+        pages also record where it started (``epoch.sequence.floor``).
+
+        Args:
+            since (Optional[str]): A watermark from an earlier call; None for a full sync.
+            limit (int): Maximum number of changes to return.
+
+        Returns:
+            Tuple[List[Prompt], List[Tuple[str, datetime]], str, bool]: The written
+            prompts, ``(prompt_id, deleted_at)`` tombstones, the watermark to pass
+            next, and whether more changes are waiting.
+
+        Raises:
+            ValueError: If ``since`` is not a watermark.
+            WatermarkExpired: If ``since`` can no longer be served.
+
+        Example:
+            >>> prompts, deleted, watermark, more = storage.prompt_changes(watermark)
+        """
+        epoch, sequence, floor = None, None, 0
+        if since is not None:
+            epoch, *numbers = since.split(".")
+            if len(numbers) not in (1, 2) or not all(number.isdigit() for number in numbers):
+                raise ValueError(f"invalid watermark {since!r}")
+            sequence, floor = int(numbers[0]), int(numbers[1]) if len(numbers) == 2 else 0
+        self._await_indexes()
+        result = self._changes.changes(epoch, sequence, limit, floor=floor)
+        if result is None:
+            raise WatermarkExpired(since)
+        changes, epoch, watermark, floor, has_more = result
+
+        prompts: List[Prompt] = []
+        deleted: List[Tuple[str, datetime]] = []
+        for prompt_id, deleted_at in changes:
+            if deleted_at is not None:
+                deleted.append((prompt_id, deleted_at))
+                continue
+            prompt = self.get_prompt(prompt_id)
+            if prompt is not None:  # deleted meanwhile; its tombstone follows
+                prompts.append(prompt)
+        if floor > watermark:
+            return prompts, deleted, f"{epoch}.{watermark}.{floor}", has_more
+        return prompts, deleted, f"{epoch}.{watermark}", has_more
+
+    # ============== Snapshot Reads ==============
+
+    @contextmanager
+    def snapshot(self) -> Iterator[StoreView]:
+        """Pin the current version of the store for a consistent read.
+
+        Reads through the yielded view (lookups, listings, metadata
+        selections) all see the store as it was when the block was entered,
+        including its column indexes, while writers keep going. Old records
+        are kept only while some view still needs them.
+
+        Yields:
+            StoreView: The pinned view.
+
+        Example:
+            >>> with storage.snapshot() as view:
+            ...     page = view.get_prompts(view.select_prompts(tag='python').ordered_ids(limit=20))
+        """
+        self._await_indexes()
+        versions = self._versions
+        with versions.lock:
+            version = self._columns.version
+            versions.pin(version)
+            view = StoreView(self, version)
+        try:
+            yield view
+        finally:
+            versions.unpin(version)
+
+    @contextmanager
+    def _publishing(self, prompt_id: str, previous: Optional[Prompt],
+                    record: Optional[Prompt]) -> Iterator[None]:
+        """Make one write the next version, first saving ``previous`` for pinned views.
+
+        The block must change ``_prompts`` and ``_columns`` for ``prompt_id``
+        exactly once, replacing ``previous`` with ``record`` (None for a
+        delete), and should do nothing else: it runs under the store-wide
+        version lock. The write is also journaled. Saved records carry their
+        full content, since a blob-stored body is released when the new
+        record is placed. Callers hold the prompt's stripe lock.
+        """
+        versions, journal = self._versions, self._journal
+        # Reading a blob-stored body back and journaling happen before the
+        # version lock, which only covers saving the record and the swap itself.
+        if previous is not None:
+            previous = self._materialize(previous)
+        if journal.enabled:
+            if record is not None and not record.content:
+                # A metadata-only change of a blob-stored prompt keeps its body
+                record = record.model_copy(update={"content": previous.content})
+            journal.record(("prompt", prompt_id), previous, record)
+        with versions.lock:
+            if versions.pinned:
+                versions.record(prompt_id, self._columns.version + 1, previous)
+            yield
+
+    # ============== Point-in-Time Restore ==============
+
+    def configure_journal(self, max_entries: int, max_bytes: int, retention: float) -> None:
+        """Bound the mutation journal that ``restore`` replays.
+
+        Args:
+            max_entries (int): Most writes kept; 0 disables the journal.
+            max_bytes (int): Most bytes of record text kept.
+            retention (float): Seconds a write is kept.
+
+        Example:
+            >>> storage.configure_journal(100_000, 64 * 1024 * 1024, 7 * 24 * 3600)
+        """
+        journal = self._journal
+        journal.max_entries, journal.max_bytes, journal.retention = max_entries, max_bytes, retention
+        journal.reset()
+
+    @timed_operation("restore")
+    def restore(self, as_of: datetime, prompt_id: Optional[str] = None,
+                collection_id: Optional[str] = None) -> Dict[str, int]:
+        """Put prompts and collections back the way they were at ``as_of``.
+
+        Without ``prompt_id`` or ``collection_id`` the whole store is
+        restored. Only records written since ``as_of`` are touched; each is
+        recreated, rewritten or deleted through the normal write path, so
+        indexes stay current and the restore itself can be undone.
+        Rewritten prompts keep their content and timestamps as of
+        ``as_of`` but get a new revision.
+
+        Args:
+            as_of (datetime): The time to go back to; naive times are UTC.
+            prompt_id (Optional[str]): Restore only this prompt.
+            collection_id (Optional[str]): Restore only this collection and the
+                prompts that were or are in it.
+
+        Returns:
+            Dict[str, int]: Counts of ``prompts_restored``, ``prompts_removed``,
+            ``collections_restored`` and ``collections_removed``.
+
+        Raises:
+            JournalExpired: If the journal is disabled or no longer reaches back to ``as_of``.
+            QuotaExceeded: If a restored prompt does not fit the store's quota.
+
+        Example:
+            >>> storage.restore(datetime(2024, 5, 1, 12, 0), collection_id='col1')
+            {'prompts_restored': 240, 'prompts_removed': 0, 'collections_restored': 1, 'collections_removed': 0}
+        """
+        keys = None if prompt_id is None else [("prompt", prompt_id)]
+        states = self._journal.states_at(as_of, keys)
+        if collection_id is not None:
+            def involved(prompt: Optional[Prompt]) -> bool:
+                return prompt is not None and prompt.collection_id == collection_id
+            states = {key: record for key, record in states.items()
+                      if key == ("collection", collection_id)
+                      or (key[0] == "prompt" and (involved(record)
+                                                  or involved(self._prompts.get(key[1]))))}
+        # A prompt comes back into its collection, even if only the prompt was asked for.
+        missing = {record.collection_id for (kind, _), record in states.items()
+                   if kind == "prompt" and record is not None and record.collection_id
+                   and record.collection_id not in self._collections}
+        states.update(self._journal.states_at(
+            as_of, [("collection", missing_id) for missing_id in missing]))
+
+        counts = dict.fromkeys(("prompts_restored", "prompts_removed",
+                                "collections_restored", "collections_removed"), 0)
+        # Collections come back before their prompts and go after them.
+        for (kind, record_id), record in states.items():
+            if kind == "collection" and record is not None:
+                if self._collections.get(record_id) != record:
+                    self.create_collection(record)
+                    counts["collections_restored"] += 1
+        for (kind, record_id), record in states.items():
+            if kind != "prompt":
+                continue
+            current = self._prompts.get(record_id)
+            if record is None:
+                if current is not None and self.delete_prompt(record_id):
+                    counts["prompts_removed"] += 1
+            elif current is None:
+                self.create_prompt(record.model_copy())
+                counts["prompts_restored"] += 1
+            elif self._materialize(current).model_copy(update={"revision": record.revision}) != record:
+                self.update_prompt(record_id, record.model_copy())
+                counts["prompts_restored"] += 1
+        for (kind, record_id), record in states.items():
+            if kind == "collection" and record is None and self.delete_collection(record_id):
+                counts["collections_removed"] += 1
+        return counts
+
+    # ============== Content Search ==============
+
+    def configure_search(self, workers: int) -> None:
+        """Set the number of worker processes for content searches.
+
+        Args:
+            workers (int): Worker processes; 0 scans the shards in the calling thread.
+
+        Example:
+            >>> storage.configure_search(4)
+        """
+        self._search.close()
+        self._search.workers = workers
+
+    @timed_operation("search_content")
+    def search_content(self, query: str, regex: bool = False,
+                       limit: int = 50) -> Tuple[int, List[str]]:
+        """Find prompts whose title, description or content matches ``query``.
+
+        Matching is case-insensitive. The shards are scanned in parallel when
+        search workers are configured; see :mod:`app.parallel`.
+
+        Args:
+            query (str): A substring, or a regular expression if ``regex`` is True.
+            regex (bool): Interpret ``query`` as a regular expression.
+            limit (int): Number of matching IDs to return.
+
+        Returns:
+            Tuple[int, List[str]]: The total number of matches, and the IDs of the
+            ``limit`` newest matches by ``created_at``, newest first.
+
+        Raises:
+            re.error: If ``regex`` is set and ``query`` is not a valid pattern.
+
+        Example:
+            >>> storage.search_content('haiku', limit=2)
+            (7, ['123', '456'])
+        """
+        self._await_indexes()
+        return self._search.search(query, regex, limit, self._search_records)
+
+    def close_search(self) -> None:
+        """Stop the search workers and free the shared memory shards.
+
+        Example:
+            >>> storage.close_search()
+        """
+        self._search.close()
+
+    def _search_records(self, prompt_ids: List[str]) -> List[Tuple[str, Tuple]]:
+        records = []
+        for prompt_id in prompt_ids:
+            prompt = self._prompts.get(prompt_id)
+            if prompt is None:
+                continue
+            prompt = self._materialize(prompt)
+            records.append((prompt_id, (prompt.title, prompt.description, prompt.content,
+                                        prompt.created_at.timestamp())))
+        return records
+
+    # ============== Blob Storage ==============
+
+    def attach_blob_store(self, blob_store: BlobStore) -> None:
+        """Keep large prompt bodies in ``blob_store`` from now on.
+
+        Bodies of prompts already stored are moved over as well.
+
+        Args:
+            blob_store (BlobStore): The store for bodies above its threshold.
+
+        Example:
+            >>> storage.attach_blob_store(BlobStore("/var/lib/promptlab/blobs"))
+        """
+        self._await_indexes()
+        self._blob_store = blob_store
+        for prompt in list(self._prompts.values()):
+            self._prompts[prompt.id] = self._place(prompt, *self._spill(prompt))
+
+    def with_content(self, prompts: Iterable[Prompt]) -> List[Prompt]:
+        """Return ``prompts`` with any blob-stored bodies read back in.
+
+        Args:
+            prompts (Iterable[Prompt]): Prompts fetched with ``load_content=False``.
+
+        Returns:
+            List[Prompt]: The same prompts, in order, with full content.
+
+        Example:
+            >>> page = storage.with_content(page)
+        """
+        return [self._materialize(prompt) for prompt in prompts]
+
+    def compact_blobs(self, min_dead_ratio: float = 0.0) -> bool:
+        """Reclaim space held by overwritten or deleted bodies.
+
+        Args:
+            min_dead_ratio (float): Only compact once at least this fraction
+                of the blob file is dead.
+
+        Returns:
+            bool: True if a compaction ran.
+
+        Example:
+            >>> storage.compact_blobs(min_dead_ratio=0.5)
+        """
+        blob_store = self._blob_store
+        if blob_store is None or blob_store.dead_bytes == 0:
+            return False
+        with self._blob_lock:
+            if blob_store.dead_ratio() < min_dead_ratio:
+                return False
+            mapping = blob_store.compact(ref for _, ref in self._blob_refs.values())
+            self._blob_refs = {
+                prompt_id: (stub, mapping[ref])
+                for prompt_id, (stub, ref) in self._blob_refs.items()
+            }
+        return True
+
+    def _spill(self, prompt: Prompt) -> Tuple[Prompt, Optional[BlobRef]]:
+        """Write a large body of ``prompt`` to the blob store, ahead of publishing the write.
+
+        Returns the record to keep (a stub without content if the body goes to
+        the blob store) and the new blob; None if the stored body is unchanged
+        or the body stays on the heap. Nothing is visible to readers until
+        :meth:`_place` installs the result.
+        """
+        blob_store = self._blob_store
+        if blob_store is None or not blob_store.should_store(prompt.content):
+            return prompt, None
+        entry = self._blob_refs.get(prompt.id)
+        ref = None if entry is not None and self._same_body(entry[1], prompt.content) \
+            else blob_store.put(prompt.content)
+        return prompt.model_copy(update={"content": ""}), ref
+
+    def _place(self, prompt: Prompt, record: Prompt, ref: Optional[BlobRef]) -> Prompt:
+        """Point the blob entry of ``prompt`` at the result of :meth:`_spill` and return the record."""
+        blob_store = self._blob_store
+        if blob_store is None:
+            return record
+        with self._blob_lock:
+            previous = self._blob_refs.pop(prompt.id, None)
+            if record.content:
+                if previous is not None:
+                    blob_store.release(previous[1])
+                return record
+            if ref is None:
+                # Unchanged body; the entry's ref may have been moved by a compaction
+                ref = previous[1]
+            else:
+                if previous is not None:
+                    blob_store.release(previous[1])
+                if ref.generation != blob_store.generation:
+                    # Compacted since the body was written, which left it out
+                    ref = blob_store.put(prompt.content)
+            self._blob_refs[prompt.id] = (record, ref)
+            return record
+
+    def _same_body(self, ref: BlobRef, content: str) -> bool:
+        # Cheap length check first; unchanged bodies (e.g. a title-only PATCH)
+        # keep their blob instead of appending a copy.
+        if ref.length != len(content.encode("utf-8")):
+            return False
+        try:
+            return self._blob_store.get(ref) == content
+        except StaleBlobRef:
+            return False
+
+    def _restub(self, stub: Prompt) -> None:
+        # Metadata-only change of a prompt whose body stays in the blob store.
+        with self._blob_lock:
+            entry = self._blob_refs.get(stub.id)
+            if entry is not None:
+                self._blob_refs[stub.id] = (stub, entry[1])
+
+    def _drop_blob(self, prompt_id: str) -> None:
+        with self._blob_lock:
+            entry = self._blob_refs.pop(prompt_id, None)
+            if entry is not None:
+                self._blob_store.release(entry[1])
+
+    def _materialize(self, prompt: Prompt) -> Prompt:
+        """Return ``prompt`` with its body, reading it from the blob store if it is a stub."""
+        if prompt.content or self._blob_store is None:
+            return prompt
+        while True:
+            entry = self._blob_refs.get(prompt.id)
+            if entry is None:
+                return prompt
+            stub, ref = entry
+            try:
+                return stub.model_copy(update={"content": self._blob_store.get(ref)})
+            except StaleBlobRef:
+                continue  # compacted concurrently; the entry now holds the new ref
+
     # ============== Utility ==============
+
+    def sizes(self) -> Dict[str, int]:
+        """Report the number of entries held by each storage structure.
+
+        Returns:
+            Dict[str, int]: Entry counts keyed by structure name.
+
+        Example:
+            >>> storage.sizes()
+            {'prompts': 3, 'collections': 1, 'blobs': 0, 'versions': 0, 'journal': 4}
+        """
+        return {
+            "prompts": len(self._prompts),
+            "collections": len(self._collections),
+            "blobs": len(self._blob_refs),
+            "versions": len(self._versions),
+            "journal": len(self._journal),
+        }
     
+    def set_quota(self, max_prompts: Optional[int] = None, max_bytes: Optional[int] = None) -> None:
+        """Limit the number of prompts and the bytes of text the store may hold.
+
+        Creates and updates that would exceed a limit raise ``QuotaExceeded``.
+        Bulk loads are not limited.
+
+        Args:
+            max_prompts (Optional[int]): Most prompts; None for no limit.
+            max_bytes (Optional[int]): Most UTF-8 bytes of titles, descriptions and
+                contents; None for no limit.
+
+        Example:
+            >>> storage.set_quota(max_prompts=10_000, max_bytes=50 * 1024 * 1024)
+        """
+        self._usage.max_prompts = max_prompts
+        self._usage.max_bytes = max_bytes
+
+    def usage(self) -> Dict[str, int]:
+        """Report how much of its quotas the store uses.
+
+        Returns:
+            Dict[str, int]: The prompt count, stored bytes, and writes rejected
+            per quota.
+
+        Example:
+            >>> storage.usage()
+            {'prompts': 3, 'bytes': 1520, 'rejected_prompts': 0, 'rejected_bytes': 0}
+        """
+        self._await_indexes()
+        usage = self._usage
+        return {"prompts": len(usage), "bytes": usage.bytes,
+                "rejected_prompts": usage.rejections["prompts"],
+                "rejected_bytes": usage.rejections["bytes"]}
+
+    def bulk_load(self, prompts: List[Prompt], collections: List[Collection]) -> None:
+        """Replace the entire store in one step.
+
+        Used for warm starts from a snapshot: records are installed directly,
+        without the per-item bookkeeping of ``create_prompt``. The records
+        must already carry their content statistics, as snapshots do. Views
+        taken before the load keep reading the replaced store.
+
+        Only the records are installed before this returns, so lookups by ID
+        are served at once. The collection, search, column, change and usage
+        indexes are rebuilt on a background thread; writes and reads that
+        need an index wait until it is done. Near-duplicate signatures are
+        computed after that (see :meth:`complete_signatures`).
+
+        Args:
+            prompts (List[Prompt]): Every prompt to hold.
+            collections (List[Collection]): Every collection to hold.
+
+        Example:
+            >>> storage.bulk_load(prompts, collections)
+        """
+        self._await_indexes()
+        self._indexed.clear()
+        self._reset_blobs()
+        self._versions = VersionLog()
+        self._journal.reset()
+        self._prompts = {prompt.id: self._place(prompt, *self._spill(prompt)) for prompt in prompts}
+        self._collections = {collection.id: collection for collection in collections}
+        self._near_duplicates.reset(complete=not self._prompts)
+        threading.Thread(target=self._build_indexes, args=(prompts,), name="bulk-load-indexes",
+                         daemon=True).start()
+        if self._prompts:
+            threading.Thread(target=self.complete_signatures, name="near-duplicate-signatures",
+                             daemon=True).start()
+
     def clear(self):
         """Clear all stored prompts and collections, resetting the storage.
         
         Example:
             >>> storage.clear()
         """
-        self._prompts.clear()
+        self._await_indexes()
+        self._versions = VersionLog()
+        self._journal.reset()
+        self._prompts = {}
+        self._collection_index.rebuild(())
+        self._near_duplicates.reset(complete=True)
+        self._search.reset(())
+        self._columns = PromptColumns()
+        self._changes.reset(())
+        self._usage.reset(())
         self._collections.clear()
+        self._reset_blobs()
+
+    def _reset_blobs(self) -> None:
+        if self._blob_store is None:
+            return
+        with self._blob_lock:
+            self._blob_refs = {}
+            self._blob_store.compact([])
 
 
 # Global storage instance
@@ -0,0 +1,170 @@
+"""Tenant namespaces for PromptLab
+
+Several teams can share one deployment without sharing a store. Each tenant
+gets its own :class:`~app.storage.Storage`, with its own records and indexes,
+so a tenant's queries only ever touch that tenant's prompts and their cost
+follows the tenant's data, not the whole deployment's.
+
+A request names its tenant with the ``X-Tenant-Id`` header or with the
+``/tenants/{tenant}`` path prefix (``/tenants/acme/prompts``). Requests that
+name none are served by the ``default`` tenant, which is the application's
+own store. A tenant's store is created on its first request, with the same
+settings as the default one, and is then subject to the per-tenant quotas.
+Which tenants may be created is bounded by an allowlist and a maximum
+number of tenants, so rotating tenant IDs cannot create stores (or metric
+series) without limit.
+
+Tenancy is off unless ``Settings.tenants_enabled`` is set.
+"""
+
+import re
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.storage import QuotaExceeded, Storage
+
+DEFAULT_TENANT = "default"
+
+# Path prefix of the tenant-scoped copy of every route.
+TENANT_PREFIX = "/tenants/{tenant}"
+
+_TENANT_ID = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+
+
+class UnknownTenant(Exception):
+    """Raised for a tenant that is not on the configured allowlist.
+
+    Attributes:
+        tenant (str): The tenant that was named.
+    """
+
+    def __init__(self, tenant: str):
+        super().__init__(f"unknown tenant {tenant!r}")
+        self.tenant = tenant
+
+
+def parse_tenant(path_tenant: Optional[str], header_tenant: Optional[str]) -> str:
+    """Pick the tenant a request names, by path prefix or header.
+
+    Args:
+        path_tenant (Optional[str]): The ``{tenant}`` of the path prefix, if any.
+        header_tenant (Optional[str]): The tenant header, if sent.
+
+    Returns:
+        str: The tenant ID; ``default`` if the request names none.
+
+    Raises:
+        ValueError: If the ID is malformed, or the path and the header disagree.
+
+    Example:
+        >>> parse_tenant("acme", None)
+        'acme'
+    """
+    header_tenant = (header_tenant or "").strip() or None
+    if path_tenant is not None and header_tenant is not None and path_tenant != header_tenant:
+        raise ValueError(f"Tenant header {header_tenant!r} does not match path tenant {path_tenant!r}")
+    tenant = path_tenant or header_tenant or DEFAULT_TENANT
+    if not _TENANT_ID.fullmatch(tenant):
+        raise ValueError(
+            f"Invalid tenant {tenant!r}: use 1-64 letters, digits, '-' or '_', "
+            "starting with a letter or digit")
+    return tenant
+
+
+def strip_tenant_prefix(path: str) -> str:
+    """Return a request path without its ``/tenants/{tenant}`` prefix.
+
+    Args:
+        path (str): The request path.
+
+    Returns:
+        str: The path the route would have without tenancy.
+
+    Example:
+        >>> strip_tenant_prefix("/tenants/acme/prompts")
+        '/prompts'
+    """
+    if not path.startswith("/tenants/"):
+        return path
+    slash = path.find("/", len("/tenants/"))
+    return path[slash:] if slash != -1 else "/"
+
+
+class TenantRegistry:
+    """The store of every tenant, created on first use.
+
+    Attributes:
+        setup (Callable[[str, Storage], None]): Configures a new tenant's store
+            (thresholds, quotas, blob store, snapshot) before it serves requests.
+        allowed (Optional[FrozenSet[str]]): The only tenants that may be created;
+            any tenant when None.
+        max_tenants (int): Most tenants created besides ``default``; 0 for no limit.
+    """
+
+    def __init__(self, default: Storage, setup: Callable[[str, Storage], None],
+                 allowed: Optional[Iterable[str]] = None, max_tenants: int = 0):
+        self.setup = setup
+        self.allowed = frozenset(allowed) if allowed is not None else None
+        self.max_tenants = max_tenants
+        self._stores: Dict[str, Storage] = {DEFAULT_TENANT: default}
+        self._lock = threading.Lock()
+
+    def get(self, tenant: str) -> Storage:
+        """Return the store of ``tenant``, creating it on first use.
+
+        Args:
+            tenant (str): A tenant ID from :func:`parse_tenant`.
+
+        Returns:
+            Storage: The tenant's store.
+
+        Raises:
+            UnknownTenant: If ``tenant`` is not on the allowlist.
+            QuotaExceeded: If ``tenant`` is new and ``max_tenants`` already exist.
+        """
+        store = self._stores.get(tenant)
+        if store is not None:
+            return store
+        if self.allowed is not None and tenant not in self.allowed:
+            raise UnknownTenant(tenant)
+        with self._lock:
+            store = self._stores.get(tenant)
+            if store is None:
+                if self.max_tenants and len(self._stores) - 1 >= self.max_tenants:
+                    raise QuotaExceeded("tenants", self.max_tenants)
+                store = Storage()
+                self.setup(tenant, store)
+                self._stores[tenant] = store
+            return store
+
+    def items(self) -> List[Tuple[str, Storage]]:
+        """List every tenant created so far with its store.
+
+        Returns:
+            List[Tuple[str, Storage]]: ``(tenant, store)`` pairs, default first.
+        """
+        return list(self._stores.items())
+
+    def usage(self) -> Dict[str, Dict[str, int]]:
+        """Report the quota usage of every tenant.
+
+        Returns:
+            Dict[str, Dict[str, int]]: ``Storage.usage()`` per tenant.
+        """
+        return {tenant: store.usage() for tenant, store in self.items()}
+
+    def compact_blobs(self, min_dead_ratio: float = 0.0) -> bool:
+        """Compact the blob store of every tenant that has one.
+
+        Lets a single ``BlobCompactor`` look after all tenants.
+
+        Args:
+            min_dead_ratio (float): Only compact stores at least this sparse.
+
+        Returns:
+            bool: True if any compaction ran.
+        """
+        compacted = False
+        for _, store in self.items():
+            compacted = store.compact_blobs(min_dead_ratio) or compacted
+        return compacted
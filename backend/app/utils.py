@@ -1,8 +1,13 @@
 """Utility functions for PromptLab"""
 
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+from app.columns import SORT_KEYS
 from app.models import Prompt
 
+# Fields a client may select with ``?fields=``, in response order.
+PROMPT_FIELDS: Tuple[str, ...] = tuple(Prompt.model_fields)
+
 
 def sort_prompts_by_date(prompts: List[Prompt], descending: bool = True) -> List[Prompt]:
     """Sort prompts by creation date.
@@ -102,3 +107,172 @@ def extract_variables(content: str) -> List[str]:
     import re
     pattern = r'\{\{(\w+)\}\}'
     return re.findall(pattern, content)
+
+
+def estimate_tokens(content: str) -> int:
+    """Approximate the number of tokens in a text.
+
+    Uses the common rule of thumb of about four characters per token for
+    English text, which is close enough for budgeting and filtering.
+
+    Args:
+        content: The text to measure.
+
+    Returns:
+        The estimated token count, rounded up.
+
+    Example:
+        >>> estimate_tokens('Hello, {{name}}!')
+        4
+    """
+    return (len(content) + 3) // 4
+
+
+def content_stats(content: str) -> Dict[str, Any]:
+    """Derive the statistics stored with a prompt from its content.
+
+    Args:
+        content: The content of the prompt.
+
+    Returns:
+        The values of the ``char_count``, ``token_count``, ``variables`` and
+        ``content_valid`` prompt fields.
+
+    Example:
+        >>> content_stats('Hello, {{name}}! Bye, {{name}}.')
+        {'char_count': 31, 'token_count': 8, 'variables': ['name'], 'content_valid': True}
+    """
+    return {
+        "char_count": len(content),
+        "token_count": estimate_tokens(content),
+        "variables": list(dict.fromkeys(extract_variables(content))) if "{{" in content else [],
+        "content_valid": validate_prompt_content(content),
+    }
+
+
+def parse_fields(fields: Optional[str]) -> Optional[Tuple[str, ...]]:
+    """Parse a ``fields`` query value into an ordered tuple of prompt field names.
+
+    Args:
+        fields: Comma-separated field names, for example ``"id,title,tags"``.
+
+    Returns:
+        The selected names in response order, or None when no projection was requested.
+
+    Raises:
+        ValueError: If a name is not a prompt field.
+
+    Example:
+        >>> parse_fields("id, title")
+        ('title', 'id')
+    """
+    if fields is None or not fields.strip():
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested.difference(PROMPT_FIELDS)
+    if unknown:
+        raise ValueError(
+            f"Unknown fields: {', '.join(sorted(unknown))}. "
+            f"Allowed: {', '.join(PROMPT_FIELDS)}"
+        )
+    return tuple(name for name in PROMPT_FIELDS if name in requested)
+
+
+def parse_sort(sort: Optional[str]) -> Tuple[str, bool]:
+    """Parse a ``sort`` query value into a sort key and direction.
+
+    A leading ``-`` sorts descending; without it the order is ascending.
+
+    Args:
+        sort: A sortable field name, optionally prefixed with ``-``. None or
+            blank means newest first.
+
+    Returns:
+        The sort key and whether to sort descending.
+
+    Raises:
+        ValueError: If the key is not sortable.
+
+    Example:
+        >>> parse_sort("-token_count")
+        ('token_count', True)
+    """
+    if sort is None or not sort.strip():
+        return "created_at", True
+    sort = sort.strip()
+    descending = sort.startswith("-")
+    key = sort[1:] if descending else sort
+    if key not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {key}. Allowed: {', '.join(SORT_KEYS)}")
+    return key, descending
+
+
+def project_prompt(prompt: Prompt, fields: Tuple[str, ...]) -> Dict[str, Any]:
+    """Build the JSON-ready dict of only the selected fields of a prompt.
+
+    Unselected attributes are never read, so they are not validated, encoded
+    or copied. Datetimes use the same ISO 8601 form as the full response.
+
+    Args:
+        prompt: The prompt to project.
+        fields: Field names from :func:`parse_fields`.
+
+    Returns:
+        A dict with one JSON-serializable value per selected field.
+
+    Example:
+        >>> project_prompt(prompt, ("id", "title"))
+        {'id': 'abc-123', 'title': 'Greeting'}
+    """
+    projected = {}
+    for name in fields:
+        value = getattr(prompt, name)
+        projected[name] = value.isoformat() if isinstance(value, datetime) else value
+    return projected
+
+
+def revision_etag(revision: int) -> str:
+    """Format a prompt revision as a strong entity tag.
+
+    Args:
+        revision: The prompt's revision number.
+
+    Returns:
+        The quoted entity tag, for use in an ``ETag`` header.
+
+    Example:
+        >>> revision_etag(3)
+        '"3"'
+    """
+    return f'"{revision}"'
+
+
+def parse_if_match(if_match: Optional[str]) -> Optional[FrozenSet[int]]:
+    """Parse an ``If-Match`` header into the set of acceptable revisions.
+
+    Entity tags may be quoted or unquoted. ``If-Match`` uses the strong
+    comparison, so weak tags (``W/"3"``) never match; neither do tags that
+    are not revision numbers. Both are ignored.
+
+    Args:
+        if_match: The header value, or None if absent.
+
+    Returns:
+        The acceptable revisions, or None when any revision is acceptable
+        (no header, or ``*``). An empty set matches nothing.
+
+    Example:
+        >>> sorted(parse_if_match('"2", W/"3"'))
+        [2]
+    """
+    if if_match is None or if_match.strip() == "*":
+        return None
+    revisions = set()
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            continue
+        tag = tag.strip('"')
+        if tag.isdigit():
+            revisions.add(int(tag))
+    return frozenset(revisions)
@@ -0,0 +1 @@
+"""Benchmark suite for PromptLab storage operations and API endpoints"""
@@ -0,0 +1,80 @@
+"""Endpoint benchmarks through an in-process ASGI client
+
+Requests go through the full FastAPI stack (routing, middleware, validation
+and JSON encoding) via ``httpx.ASGITransport``, without opening a socket.
+"""
+
+import asyncio
+import random
+from typing import Dict, List
+
+import httpx
+
+from app.models import Collection, Prompt
+from app.storage import Storage
+from benchmarks.bench_storage import CASCADE_SIZE
+from benchmarks.common import DEFAULT_SEED, NUM_COLLECTIONS, measure
+
+
+def run_api_benchmarks(app, storage: Storage, num_prompts: int, collection_ids: List[str],
+                       iterations: int, max_seconds: float) -> Dict[str, Dict]:
+    """Run every endpoint case against ``app`` backed by a seeded ``storage``.
+
+    Args:
+        app: The ASGI application under test.
+        storage (Storage): The storage instance ``app`` serves from, already seeded.
+        num_prompts (int): The number of seeded prompts.
+        collection_ids (List[str]): Ids of the seeded collections.
+        iterations (int): Upper bound on measured requests per case.
+        max_seconds (float): Time budget per case.
+
+    Returns:
+        Dict[str, Dict]: Summary statistics keyed by case name.
+    """
+    rng = random.Random(DEFAULT_SEED)
+    prompt_ids = [f"p-{rng.randrange(num_prompts):08d}" for _ in range(iterations + 8)]
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    results: Dict[str, Dict] = {}
+
+    def request(method: str, url: str, **kwargs):
+        response = loop.run_until_complete(client.request(method, url, **kwargs))
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+        return response
+
+    def run(name, func, **kwargs):
+        results[name] = measure(func, iterations, max_seconds, **kwargs)
+
+    try:
+        run("GET /prompts/{id}", lambda i: request("GET", f"/prompts/{prompt_ids[i]}"))
+        run("GET /prompts", lambda i: request("GET", "/prompts"))
+        run("GET /prompts?limit", lambda i: request("GET", "/prompts", params={"limit": 50}))
+        run("GET /prompts?collection_id",
+            lambda i: request("GET", "/prompts",
+                              params={"collection_id": collection_ids[i % NUM_COLLECTIONS]}))
+        run("GET /prompts?search",
+            lambda i: request("GET", "/prompts", params={"search": "refactor plan"}))
+        run("GET /prompts?tag", lambda i: request("GET", "/prompts", params={"tag": "legal"}))
+        run("POST /prompts",
+            lambda i: request("POST", "/prompts",
+                              json={"title": "Bench", "content": "Bench body", "tags": ["qa"]}))
+        run("PATCH /prompts/{id}",
+            lambda i: request("PATCH", f"/prompts/{prompt_ids[i]}", json={"title": "Renamed"}))
+        run("PUT /prompts/{id}",
+            lambda i: request("PUT", f"/prompts/{prompt_ids[i]}",
+                              json={"title": "Replaced", "content": "Replaced body",
+                                    "tags": ["qa"]}))
+
+        def cascade_setup(i):
+            collection = storage.create_collection(Collection(id=f"api-col-{i}", name="Doomed"))
+            for index in range(CASCADE_SIZE):
+                storage.create_prompt(Prompt(id=f"api-col-{i}-{index}", title="Doomed",
+                                             content="Doomed body", collection_id=collection.id))
+
+        run("DELETE /collections/{id}",
+            lambda i: request("DELETE", f"/collections/api-col-{i}"), setup=cascade_setup)
+    finally:
+        loop.run_until_complete(client.aclose())
+        loop.close()
+    return results
@@ -0,0 +1,79 @@
+"""Storage-level benchmarks
+
+Each case calls ``Storage`` (and the ``utils`` query helpers the API layers
+on top of it) directly, without HTTP, so the numbers isolate data-structure
+cost from framework overhead.
+"""
+
+import random
+from typing import Dict, List
+
+from app.models import Collection, Prompt
+from app.storage import Storage
+from app.utils import filter_prompts_by_collection, search_prompts, sort_prompts_by_date
+from benchmarks.common import DEFAULT_SEED, NUM_COLLECTIONS, measure
+
+CASCADE_SIZE = 100
+
+
+def run_storage_benchmarks(storage: Storage, num_prompts: int, collection_ids: List[str],
+                           iterations: int, max_seconds: float) -> Dict[str, Dict]:
+    """Run every storage case against an already seeded ``storage``.
+
+    Args:
+        storage (Storage): A storage seeded by :func:`benchmarks.common.seed_storage`.
+        num_prompts (int): The number of seeded prompts.
+        collection_ids (List[str]): Ids of the seeded collections.
+        iterations (int): Upper bound on measured calls per case.
+        max_seconds (float): Time budget per case.
+
+    Returns:
+        Dict[str, Dict]: Summary statistics keyed by case name.
+    """
+    rng = random.Random(DEFAULT_SEED)
+    prompt_ids = [f"p-{rng.randrange(num_prompts):08d}" for _ in range(iterations + 8)]
+    results: Dict[str, Dict] = {}
+
+    def run(name, func, **kwargs):
+        results[name] = measure(func, iterations, max_seconds, **kwargs)
+
+    run("get_prompt", lambda i: storage.get_prompt(prompt_ids[i]))
+    run("get_all_prompts", lambda i: storage.get_all_prompts())
+    run("get_prompts_by_collection",
+        lambda i: storage.get_prompts_by_collection(collection_ids[i % NUM_COLLECTIONS]))
+    run("list_prompts_sorted",
+        lambda i: sort_prompts_by_date(storage.get_all_prompts(), descending=True))
+    run("list_prompts_by_collection",
+        lambda i: sort_prompts_by_date(filter_prompts_by_collection(
+            storage.get_all_prompts(), collection_ids[i % NUM_COLLECTIONS])))
+    run("search_prompts", lambda i: search_prompts(storage.get_all_prompts(), "refactor plan"))
+
+    def create(i):
+        storage.create_prompt(Prompt(id=f"bench-new-{i}", title="Bench", content="Bench body"))
+
+    run("create_prompt", create)
+
+    def update(i):
+        existing = storage.get_prompt(prompt_ids[i])
+        storage.update_prompt(existing.id, existing.model_copy(update={"title": "Renamed"}))
+
+    run("update_prompt", update)
+
+    def delete_setup(i):
+        storage.create_prompt(Prompt(id=f"bench-del-{i}", title="Doomed", content="Doomed body"))
+
+    run("delete_prompt", lambda i: storage.delete_prompt(f"bench-del-{i}"), setup=delete_setup)
+
+    def cascade_setup(i):
+        collection = storage.create_collection(Collection(id=f"bench-col-{i}", name="Doomed"))
+        for index in range(CASCADE_SIZE):
+            storage.create_prompt(Prompt(id=f"bench-col-{i}-{index}", title="Doomed",
+                                         content="Doomed body", collection_id=collection.id))
+
+    def cascade(i):
+        for prompt in storage.get_prompts_by_collection(f"bench-col-{i}"):
+            storage.delete_prompt(prompt.id)
+        storage.delete_collection(f"bench-col-{i}")
+
+    run("delete_collection_cascade", cascade, setup=cascade_setup)
+    return results
@@ -0,0 +1,183 @@
+"""Shared helpers for the PromptLab benchmark suite
+
+Seeding is deterministic (fixed RNG seed), so two runs against the same code
+see the same synthetic corpus and the results can be compared directly.
+"""
+
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from app.models import Collection, Prompt
+from app.storage import Storage
+
+DEFAULT_SEED = 1234
+NUM_COLLECTIONS = 100
+
+WORDS = (
+    "review summarize translate explain classify extract rewrite draft code email "
+    "report customer support python sql legal medical marketing story poem outline "
+    "bug test refactor plan meeting notes recipe travel finance tutor quiz"
+).split()
+TAGS = ["python", "sql", "review", "writing", "support", "ml", "legal", "draft", "qa", "ops"]
+
+
+def seed_storage(storage: Storage, num_prompts: int, seed: int = DEFAULT_SEED) -> List[str]:
+    """Fill ``storage`` with a deterministic synthetic corpus.
+
+    Prompts are spread evenly over ``NUM_COLLECTIONS`` collections, carry
+    zero to three tags and have creation times spread over one year.
+
+    Args:
+        storage (Storage): The storage instance to fill. It is cleared first.
+        num_prompts (int): Number of prompts to create.
+        seed (int): RNG seed for reproducibility.
+
+    Returns:
+        List[str]: The ids of the created collections.
+
+    Example:
+        >>> collection_ids = seed_storage(Storage(), 10_000)
+    """
+    rng = random.Random(seed)
+    storage.clear()
+    base_time = datetime(2024, 1, 1)
+
+    collection_ids = []
+    for index in range(NUM_COLLECTIONS):
+        collection = Collection(id=f"col-{index:04d}", name=f"Collection {index}",
+                                created_at=base_time)
+        storage.create_collection(collection)
+        collection_ids.append(collection.id)
+
+    for index in range(num_prompts):
+        title_words = rng.choices(WORDS, k=4)
+        created_at = base_time + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        storage.create_prompt(Prompt(
+            id=f"p-{index:08d}",
+            title=" ".join(title_words).capitalize(),
+            content=" ".join(rng.choices(WORDS, k=40)) + " {{input}}",
+            description=" ".join(rng.choices(WORDS, k=8)),
+            collection_id=collection_ids[index % NUM_COLLECTIONS],
+            tags=rng.sample(TAGS, k=rng.randrange(4)),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    return collection_ids
+
+
+def percentile(sorted_samples: List[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of already sorted samples.
+
+    Args:
+        sorted_samples (List[float]): Samples in ascending order.
+        fraction (float): The percentile as a fraction, for example 0.95.
+
+    Returns:
+        float: The sample at that rank, or 0.0 for no samples.
+
+    Example:
+        >>> percentile([1.0, 2.0, 3.0, 4.0], 0.5)
+        2.0
+    """
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples: List[float], wall_seconds: float) -> Dict[str, float]:
+    """Summarize per-call latencies in seconds.
+
+    Args:
+        samples (List[float]): Latency of each call in seconds.
+        wall_seconds (float): Total wall time spent on the calls.
+
+    Returns:
+        Dict[str, float]: Count, throughput and latency percentiles in milliseconds.
+    """
+    ordered = sorted(samples)
+    return {
+        "iterations": len(ordered),
+        "throughput_per_s": round(len(ordered) / wall_seconds, 3) if wall_seconds else 0.0,
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+    }
+
+
+def measure(func: Callable[[int], object], iterations: int, max_seconds: float,
+            warmup: int = 1, setup: Optional[Callable[[int], object]] = None) -> Dict[str, float]:
+    """Time repeated calls of ``func`` and summarize them.
+
+    Args:
+        func (Callable[[int], object]): The operation; receives the iteration number.
+        iterations (int): Upper bound on measured calls.
+        max_seconds (float): Stop early once this much time was spent measuring.
+        warmup (int): Unmeasured calls made first.
+        setup (Optional[Callable[[int], object]]): Untimed preparation run before each call.
+
+    Returns:
+        Dict[str, float]: See :func:`summarize`.
+    """
+    for index in range(warmup):
+        if setup:
+            setup(-1 - index)
+        func(-1 - index)
+
+    samples: List[float] = []
+    spent = 0.0
+    for index in range(iterations):
+        if setup:
+            setup(index)
+        start = time.perf_counter()
+        func(index)
+        elapsed = time.perf_counter() - start
+        samples.append(elapsed)
+        spent += elapsed
+        if spent >= max_seconds:
+            break
+    return summarize(samples, spent)
+
+
+def environment() -> Dict[str, str]:
+    """Describe the machine and code revision the run was made on.
+
+    Returns:
+        Dict[str, str]: Python version, platform, CPU count and git revision.
+    """
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = "unknown"
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpu_count": str(os.cpu_count()),
+        "git_revision": revision,
+        "timestamp": datetime.utcnow().isoformat() + "Z",
+    }
+
+
+def write_results(path: str, results: Dict) -> None:
+    """Write benchmark results as indented JSON.
+
+    Args:
+        path (str): Destination file.
+        results (Dict): The results document.
+    """
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(results, handle, indent=2, sort_keys=True)
+        handle.write("\n")
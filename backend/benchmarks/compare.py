@@ -0,0 +1,81 @@
+"""Compare two benchmark result files and flag regressions
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.compare baseline.json candidate.json --threshold 0.10
+
+Exits with status 1 when any case's p50 or p95 latency grew by more than the
+threshold, so the command can gate CI.
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional, Tuple
+
+METRICS = ("p50_ms", "p95_ms")
+
+
+def find_regressions(baseline: Dict, candidate: Dict,
+                     threshold: float) -> List[Tuple[str, str, float, float]]:
+    """List cases whose latency grew by more than ``threshold``.
+
+    Args:
+        baseline (Dict): The reference results document.
+        candidate (Dict): The new results document.
+        threshold (float): Allowed relative growth, for example 0.10 for 10%.
+
+    Returns:
+        List[Tuple[str, str, float, float]]: ``(case, metric, before, after)`` tuples.
+
+    Example:
+        >>> find_regressions(old, new, 0.10)
+        [('10000/api/GET /prompts', 'p95_ms', 12.1, 15.3)]
+    """
+    regressions = []
+    for size, suites in candidate.get("runs", {}).items():
+        for suite, cases in suites.items():
+            if not isinstance(cases, dict):
+                continue
+            for case, stats in cases.items():
+                before = baseline.get("runs", {}).get(size, {}).get(suite, {}).get(case)
+                if not before:
+                    continue
+                for metric in METRICS:
+                    old, new = before.get(metric, 0.0), stats.get(metric, 0.0)
+                    if old and new > old * (1 + threshold):
+                        regressions.append((f"{size}/{suite}/{case}", metric, old, new))
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Print a comparison table and return 1 if regressions were found.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, encoding="utf-8") as handle:
+        baseline = json.load(handle)
+    with open(args.candidate, encoding="utf-8") as handle:
+        candidate = json.load(handle)
+
+    regressions = find_regressions(baseline, candidate, args.threshold)
+    for case, metric, old, new in regressions:
+        print(f"REGRESSION {case} {metric}: {old:.3f}ms -> {new:.3f}ms "
+              f"(+{(new / old - 1) * 100:.1f}%)")
+    if not regressions:
+        print(f"no regressions above {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""Local load-generation harness with concurrency sweeps
+
+Starts the API under a real uvicorn server on a free loopback port (or
+targets ``--url``), seeds it over HTTP, then drives a weighted mix of
+requests at increasing concurrency. Every level records throughput, latency
+percentiles and error rate, and the sweep reports the saturation point: the
+first level where adding clients no longer buys throughput.
+
+Usage (from the ``backend`` directory, fully offline):
+
+    python -m benchmarks.load --mix list=0.5,search=0.3,get=0.15,write=0.05 \\
+        --concurrency 1 2 4 8 16 32 64 --duration 10 --output load_results.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from benchmarks.common import DEFAULT_SEED, TAGS, WORDS, environment, summarize, write_results
+
+DEFAULT_MIX = "list=0.5,search=0.3,get=0.15,write=0.05"
+DEFAULT_LEVELS = [1, 2, 4, 8, 16, 32, 64]
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A level is saturated once doubling clients gains less than this much throughput.
+SATURATION_GAIN = 0.10
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    """Parse a ``name=weight`` list into normalized weights.
+
+    Args:
+        spec (str): For example ``"list=0.8,get=0.15,write=0.05"``.
+
+    Returns:
+        Dict[str, float]: Weights keyed by operation name, summing to 1.
+
+    Raises:
+        ValueError: If an operation is unknown or the weights are not positive.
+
+    Example:
+        >>> parse_mix("list=8,get=2")
+        {'list': 0.8, 'get': 0.2}
+    """
+    weights = {}
+    for part in spec.split(","):
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in OPERATIONS:
+            raise ValueError(f"unknown operation {name!r}; choose from {sorted(OPERATIONS)}")
+        weights[name] = float(value)
+    total = sum(weights.values())
+    if total <= 0 or any(weight < 0 for weight in weights.values()):
+        raise ValueError("mix weights must be non-negative and sum to more than zero")
+    return {name: weight / total for name, weight in weights.items()}
+
+
+# ============== Operations ==============
+
+async def op_list(client: httpx.AsyncClient, rng: random.Random, state: Dict) -> httpx.Response:
+    """List prompts filtered by a random collection or tag."""
+    if state["collection_ids"] and rng.random() < 0.5:
+        return await client.get("/prompts", params={
+            "collection_id": rng.choice(state["collection_ids"])})
+    return await client.get("/prompts", params={"tag": rng.choice(TAGS)})
+
+
+async def op_search(client: httpx.AsyncClient, rng: random.Random, state: Dict) -> httpx.Response:
+    """Search prompts for a random word."""
+    return await client.get("/prompts", params={"search": rng.choice(WORDS)})
+
+
+async def op_get(client: httpx.AsyncClient, rng: random.Random, state: Dict) -> httpx.Response:
+    """Fetch a random seeded prompt by id."""
+    return await client.get(f"/prompts/{rng.choice(state['prompt_ids'])}")
+
+
+async def op_write(client: httpx.AsyncClient, rng: random.Random, state: Dict) -> httpx.Response:
+    """Create a new prompt or rename an existing one, with equal odds."""
+    if rng.random() < 0.5:
+        return await client.post("/prompts", json=_synthetic_prompt(rng, state))
+    return await client.patch(f"/prompts/{rng.choice(state['prompt_ids'])}",
+                              json={"title": " ".join(rng.choices(WORDS, k=3))})
+
+
+OPERATIONS = {"list": op_list, "search": op_search, "get": op_get, "write": op_write}
+
+
+def _synthetic_prompt(rng: random.Random, state: Dict) -> Dict:
+    return {
+        "title": " ".join(rng.choices(WORDS, k=4)),
+        "content": " ".join(rng.choices(WORDS, k=40)),
+        "description": " ".join(rng.choices(WORDS, k=8)),
+        "collection_id": rng.choice(state["collection_ids"]) if state["collection_ids"] else None,
+        "tags": rng.sample(TAGS, k=rng.randrange(4)),
+    }
+
+
+# ============== Server Lifecycle ==============
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workers: int = 1) -> Tuple[subprocess.Popen, str]:
+    """Start the API under uvicorn on a free loopback port and wait until healthy.
+
+    Args:
+        workers (int): Number of uvicorn worker processes.
+
+    Returns:
+        Tuple[subprocess.Popen, str]: The server process and its base URL.
+
+    Raises:
+        RuntimeError: If the server does not become healthy within 30 seconds.
+    """
+    port = _free_port()
+    command = [
+        sys.executable, "-m", "uvicorn", "app.api:app",
+        "--host", "127.0.0.1", "--port", str(port),
+        "--log-level", "warning", "--no-access-log", "--workers", str(workers),
+    ]
+    process = subprocess.Popen(command, cwd=BACKEND_DIR)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/health", timeout=1).status_code == 200:
+                return process, url
+        except httpx.TransportError:
+            pass
+        if process.poll() is not None:
+            break
+        time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("uvicorn did not become healthy")
+
+
+async def seed(client: httpx.AsyncClient, num_prompts: int, rng: random.Random) -> Dict:
+    """Create collections and prompts over HTTP.
+
+    Args:
+        client (httpx.AsyncClient): Client bound to the server.
+        num_prompts (int): Number of prompts to create.
+        rng (random.Random): Source of synthetic data.
+
+    Returns:
+        Dict: ``prompt_ids`` and ``collection_ids`` for the workload.
+    """
+    state = {"prompt_ids": [], "collection_ids": []}
+    for index in range(10):
+        response = await client.post("/collections", json={"name": f"Load {index}"})
+        response.raise_for_status()
+        state["collection_ids"].append(response.json()["id"])
+
+    semaphore = asyncio.Semaphore(32)
+
+    async def create_one():
+        async with semaphore:
+            response = await client.post("/prompts", json=_synthetic_prompt(rng, state))
+            response.raise_for_status()
+            state["prompt_ids"].append(response.json()["id"])
+
+    await asyncio.gather(*(create_one() for _ in range(num_prompts)))
+    return state
+
+
+# ============== Workload ==============
+
+async def run_level(url: str, concurrency: int, duration: float, mix: Dict[str, float],
+                    state: Dict, seed_value: int) -> Dict:
+    """Drive the mix with ``concurrency`` closed-loop clients for ``duration`` seconds.
+
+    Args:
+        url (str): Base URL of the server.
+        concurrency (int): Number of concurrent clients.
+        duration (float): Measurement time in seconds.
+        mix (Dict[str, float]): Normalized operation weights.
+        state (Dict): Ids produced by :func:`seed`.
+        seed_value (int): RNG seed for the clients.
+
+    Returns:
+        Dict: Overall and per-operation statistics plus the error rate.
+    """
+    names, weights = list(mix), list(mix.values())
+    latencies: Dict[str, List[float]] = {name: [] for name in names}
+    errors: Dict[str, int] = {name: 0 for name in names}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker(worker_id: int):
+            rng = random.Random(seed_value * 1000 + worker_id)
+            while time.perf_counter() < deadline:
+                name = rng.choices(names, weights)[0]
+                start = time.perf_counter()
+                try:
+                    response = await OPERATIONS[name](client, rng, state)
+                    failed = response.status_code >= 400
+                except httpx.HTTPError:
+                    failed = True
+                latencies[name].append(time.perf_counter() - start)
+                if failed:
+                    errors[name] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    all_samples = [sample for samples in latencies.values() for sample in samples]
+    total_errors = sum(errors.values())
+    overall = summarize(all_samples, wall)
+    overall["throughput_per_s"] = round(len(all_samples) / wall, 3) if wall else 0.0
+    return {
+        "concurrency": concurrency,
+        "overall": overall,
+        "error_rate": round(total_errors / len(all_samples), 5) if all_samples else 0.0,
+        "operations": {
+            name: {**summarize(samples, wall), "errors": errors[name]}
+            for name, samples in latencies.items()
+        },
+    }
+
+
+def find_saturation(levels: List[Dict], max_error_rate: float) -> Optional[int]:
+    """Return the concurrency at which the server saturated, if it did.
+
+    A level is the saturation point when the next level gains less than
+    ``SATURATION_GAIN`` throughput, or when its error rate exceeds
+    ``max_error_rate``.
+
+    Args:
+        levels (List[Dict]): Results of :func:`run_level` in increasing concurrency.
+        max_error_rate (float): Highest acceptable error rate.
+
+    Returns:
+        Optional[int]: The saturating concurrency, or None if throughput still scaled.
+
+    Example:
+        >>> find_saturation(results, max_error_rate=0.01)
+        16
+    """
+    for previous, current in zip(levels, levels[1:]):
+        if current["error_rate"] > max_error_rate:
+            return previous["concurrency"]
+        gained = current["overall"]["throughput_per_s"] / max(
+            previous["overall"]["throughput_per_s"], 1e-9) - 1
+        if gained < SATURATION_GAIN:
+            return previous["concurrency"]
+    return None
+
+
+async def sweep(url: str, args: argparse.Namespace) -> Dict:
+    """Seed the server and run every concurrency level.
+
+    Args:
+        url (str): Base URL of the server.
+        args (argparse.Namespace): Parsed command line options.
+
+    Returns:
+        Dict: The full report.
+    """
+    mix = parse_mix(args.mix)
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        state = await seed(client, args.prompts, random.Random(args.seed))
+
+    levels = []
+    for concurrency in args.concurrency:
+        result = await run_level(url, concurrency, args.duration, mix, state, args.seed)
+        overall = result["overall"]
+        print(f"c={concurrency:<4} rps={overall['throughput_per_s']:<10} "
+              f"p50={overall['p50_ms']}ms p99={overall['p99_ms']}ms "
+              f"errors={result['error_rate']:.2%}", file=sys.stderr)
+        levels.append(result)
+
+    return {
+        "environment": environment(),
+        "config": {"mix": mix, "prompts": args.prompts, "duration": args.duration,
+                   "workers": args.workers, "seed": args.seed},
+        "levels": levels,
+        "saturation_concurrency": find_saturation(levels, args.max_error_rate),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the sweep and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="target an already running server instead of starting one")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help=f"operation weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=DEFAULT_LEVELS)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per level")
+    parser.add_argument("--prompts", type=int, default=2000, help="prompts to seed")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", default="load_results.json")
+    args = parser.parse_args(argv)
+
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.workers)
+    try:
+        report = asyncio.run(sweep(url, args))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=10)
+
+    write_results(args.output, report)
+    print(f"saturation at concurrency {report['saturation_concurrency']}; "
+          f"wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,104 @@
+"""Core scaling of sharded content search
+
+Bulk-loads a synthetic corpus, then times ``Storage.search_content`` for a
+substring and a regular expression with 0 (in-process), 1, 2, 4, ... search
+worker processes. Shards are packed once before timing starts, so the
+numbers cover only the scan and the merge. The in-process linear scan that
+``GET /prompts?search=`` uses is timed as the baseline.
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.parallel_search --prompts 200000 --workers 0 1 2 4 8
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.models import Prompt
+from app.storage import Storage
+from app.utils import search_prompts
+from benchmarks.common import DEFAULT_SEED, WORDS, environment, measure, write_results
+
+QUERIES = {
+    "substring": ("refactor plan meeting", False),
+    "regex": (r"\b(bug|test) \w+ (python|sql)\b", True),
+}
+
+
+def build_corpus(num_prompts: int, content_words: int, seed: int = DEFAULT_SEED) -> List[Prompt]:
+    """Generate prompts with ``content_words`` random words of content each.
+
+    Args:
+        num_prompts (int): Number of prompts.
+        content_words (int): Words per prompt body.
+        seed (int): RNG seed for reproducibility.
+
+    Returns:
+        List[Prompt]: The prompts, ready for ``Storage.bulk_load``.
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 1)
+    prompts = []
+    for index in range(num_prompts):
+        created_at = base_time + timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        prompts.append(Prompt(
+            id=f"p-{index:08d}",
+            title=" ".join(rng.choices(WORDS, k=4)).capitalize(),
+            content=" ".join(rng.choices(WORDS, k=content_words)),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    return prompts
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the scaling measurements and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=200_000)
+    parser.add_argument("--content-words", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--max-seconds", type=float, default=10.0)
+    parser.add_argument("--output", default="search_results.json")
+    args = parser.parse_args(argv)
+
+    store = Storage()
+    store.bulk_load(build_corpus(args.prompts, args.content_words), [])
+    results: Dict = {"environment": environment(), "prompts": args.prompts,
+                     "content_words": args.content_words, "cases": {}}
+
+    prompts = store.get_all_prompts()
+    results["cases"]["linear_title_search"] = measure(
+        lambda _: search_prompts(prompts, "refactor plan"), args.iterations, args.max_seconds)
+
+    for workers in args.workers:
+        store.configure_search(workers)
+        for name, (query, regex) in QUERIES.items():
+            start = time.perf_counter()
+            store.search_content(query, regex=regex)  # packs shards, starts the pool
+            prepare = time.perf_counter() - start
+            case = measure(lambda _: store.search_content(query, regex=regex),
+                           args.iterations, args.max_seconds)
+            case["first_call_ms"] = round(prepare * 1000, 1)
+            results["cases"][f"{name}_workers_{workers}"] = case
+    store.close_search()
+
+    for name, case in results["cases"].items():
+        print(f"{name:<24} p50 {case['p50_ms']:>10.2f} ms", file=sys.stderr)
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""Run the PromptLab benchmark suite and write the results as JSON
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.run --sizes 10000 100000 1000000 --output bench.json
+    python -m benchmarks.compare baseline.json bench.json
+"""
+
+import argparse
+import sys
+import time
+from typing import List, Optional
+
+from benchmarks.bench_api import run_api_benchmarks
+from benchmarks.bench_storage import run_storage_benchmarks
+from benchmarks.common import DEFAULT_SEED, environment, seed_storage, write_results
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Parse command line arguments.
+
+    Args:
+        argv (Optional[List[str]]): Arguments to parse; defaults to ``sys.argv``.
+
+    Returns:
+        argparse.Namespace: The parsed options.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="corpus sizes to seed (default: 10k 100k 1M)")
+    parser.add_argument("--suite", choices=["storage", "api", "all"], default="all")
+    parser.add_argument("--iterations", type=int, default=200,
+                        help="upper bound on measured calls per case")
+    parser.add_argument("--max-seconds", type=float, default=5.0,
+                        help="time budget per case; slow cases stop early")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--output", default="bench_results.json")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Seed each corpus size, run the selected suites and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    args = parse_args(argv)
+    from app.api import app
+    from app.storage import storage
+
+    results = {
+        "environment": environment(),
+        "config": {"seed": args.seed, "iterations": args.iterations,
+                   "max_seconds": args.max_seconds},
+        "runs": {},
+    }
+    for size in args.sizes:
+        run = results["runs"][str(size)] = {}
+        if args.suite in ("storage", "all"):
+            start = time.perf_counter()
+            collection_ids = seed_storage(storage, size, args.seed)
+            run["seed_seconds"] = round(time.perf_counter() - start, 3)
+            print(f"[{size}] seeded in {run['seed_seconds']}s; running storage suite",
+                  file=sys.stderr)
+            run["storage"] = run_storage_benchmarks(
+                storage, size, collection_ids, args.iterations, args.max_seconds)
+        if args.suite in ("api", "all"):
+            collection_ids = seed_storage(storage, size, args.seed)
+            print(f"[{size}] running api suite", file=sys.stderr)
+            run["api"] = run_api_benchmarks(
+                app, storage, size, collection_ids, args.iterations, args.max_seconds)
+        storage.clear()
+
+    write_results(args.output, results)
+    print(f"wrote {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
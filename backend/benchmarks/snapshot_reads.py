@@ -0,0 +1,125 @@
+"""Listing throughput and consistency under concurrent writes
+
+Seeds a synthetic corpus, then runs writer threads that keep moving prompts
+between two tags while reader threads page through ``tag=python`` the way
+``GET /prompts`` does (select, sort, fetch one page). Each mode runs for the
+same wall time:
+
+- ``live``: the reads go straight to the store, as listings did before
+  snapshot reads; a page can hold prompts that no longer carry the tag.
+- ``snapshot``: each listing pins a version with ``Storage.snapshot`` and
+  reads through the view, as ``list_prompts`` does now.
+
+For both modes the report gives reads and writes per second, read latency
+and the number of torn pages (a returned prompt without the tag, or a total
+that disagrees with the page).
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.snapshot_reads --prompts 50000 --seconds 5 --output snapshot_results.json
+"""
+
+import argparse
+import random
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+from app.storage import Storage
+from benchmarks.common import environment, seed_storage, summarize, write_results
+
+TAG = "python"
+OTHER_TAG = "ops"
+PAGE = 50
+
+
+def run_mode(storage: Storage, mode: str, readers: int, writers: int, seconds: float) -> Dict:
+    """Run readers and writers against ``storage`` for ``seconds``.
+
+    Args:
+        storage (Storage): The seeded store.
+        mode (str): ``live`` or ``snapshot``.
+        readers (int): Reader threads.
+        writers (int): Writer threads.
+        seconds (float): Wall time of the run.
+
+    Returns:
+        Dict: Read latency summary, write throughput and torn page count.
+    """
+    prompt_ids = [prompt.id for prompt in storage.get_all_prompts(load_content=False)]
+    stop = threading.Event()
+    samples: List[float] = []
+    writes = [0] * writers
+    torn = [0]
+
+    def read() -> None:
+        while not stop.is_set():
+            began = time.perf_counter()
+            if mode == "snapshot":
+                with storage.snapshot() as view:
+                    selection = view.select_prompts(tag=TAG)
+                    page = view.get_prompts(selection.ordered_ids(limit=PAGE), load_content=False)
+            else:
+                selection = storage.select_prompts(tag=TAG)
+                page = storage.get_prompts(selection.ordered_ids(limit=PAGE), load_content=False)
+            samples.append(time.perf_counter() - began)
+            if any(TAG not in prompt.tags for prompt in page) \
+                    or len(page) != min(PAGE, len(selection)):
+                torn[0] += 1
+
+    def write(worker: int) -> None:
+        rng = random.Random(worker)
+        while not stop.is_set():
+            prompt_id = rng.choice(prompt_ids)
+            current = storage.get_prompt(prompt_id, load_content=False)
+            tags = [OTHER_TAG] if TAG in current.tags else [TAG]
+            storage.update_prompt(prompt_id, current.model_copy(update={"tags": tags}))
+            writes[worker] += 1
+
+    threads = [threading.Thread(target=read) for _ in range(readers)]
+    threads += [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - start
+    return {"reads": summarize(samples, wall), "writes_per_s": round(sum(writes) / wall, 1),
+            "torn_pages": torn[0], "retained_versions": storage.sizes()["versions"]}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run both modes and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=50000)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--output", default="snapshot_results.json")
+    args = parser.parse_args(argv)
+
+    storage = Storage()
+    seed_storage(storage, args.prompts)
+    results: Dict = {"environment": environment(), "prompts": args.prompts, "modes": {}}
+    for mode in ("live", "snapshot"):
+        result = run_mode(storage, mode, args.readers, args.writers, args.seconds)
+        results["modes"][mode] = result
+        print(f"{mode:<9} reads {result['reads']['throughput_per_s']:8.1f}/s "
+              f"p50 {result['reads']['p50_ms']:7.2f} ms   writes {result['writes_per_s']:8.1f}/s   "
+              f"torn {result['torn_pages']}", file=sys.stderr)
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
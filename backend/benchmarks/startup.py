@@ -0,0 +1,129 @@
+"""Time-to-first-request for cold, replayed and snapshot warm starts
+
+Seeds a synthetic corpus, writes it as a snapshot, then starts uvicorn with
+the ``app.create_app`` factory and measures the wall time from process spawn
+to the first successful ``GET /prompts/{id}``. Three modes are measured:
+
+- ``cold``: empty store (the floor: interpreter, imports, server start).
+- ``snapshot``: warm start bulk-loading the snapshot via ``PROMPTLAB_SNAPSHOT``;
+  the indexes are still being built in the background when it first answers.
+- ``replay`` (in-process): re-creating every prompt through ``create_prompt``
+  with full validation, the path a snapshot replaces.
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.startup --prompts 1000000 --output startup_results.json
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.snapshot import load_snapshot, write_snapshot
+from app.storage import Storage
+from benchmarks.common import environment, seed_storage, write_results
+from benchmarks.load import BACKEND_DIR, _free_port
+
+SERVER = "import uvicorn; uvicorn.run('app:create_app', factory=True, host='127.0.0.1', " \
+         "port={port}, log_level='warning', access_log=False)"
+
+
+def time_to_first_request(snapshot: Optional[str], probe_id: str, timeout: float = 600) -> float:
+    """Spawn a server and return seconds until ``GET /prompts/{probe_id}`` answers.
+
+    Args:
+        snapshot (Optional[str]): Snapshot path for a warm start, or None for cold.
+        probe_id (str): Prompt id to fetch; a 404 counts as answered for cold starts.
+        timeout (float): Give up after this many seconds.
+
+    Returns:
+        float: Seconds from spawn to first answered request.
+
+    Raises:
+        RuntimeError: If the server does not answer in time.
+    """
+    port = _free_port()
+    env = dict(os.environ)
+    env.pop("PROMPTLAB_SNAPSHOT", None)
+    if snapshot:
+        env["PROMPTLAB_SNAPSHOT"] = snapshot
+    expected = 200 if snapshot else 404
+
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "-c", SERVER.format(port=port)],
+                               cwd=BACKEND_DIR, env=env)
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                response = httpx.get(f"http://127.0.0.1:{port}/prompts/{probe_id}", timeout=5)
+                if response.status_code == expected:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                pass
+            if process.poll() is not None:
+                break
+            time.sleep(0.01)
+        raise RuntimeError("server did not answer")
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Run the startup measurements and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--prompts", type=int, default=1_000_000)
+    parser.add_argument("--snapshot", help="snapshot path (default: a temporary file)")
+    parser.add_argument("--output", default="startup_results.json")
+    args = parser.parse_args(argv)
+
+    snapshot = args.snapshot or os.path.join(tempfile.mkdtemp(), "snapshot.bin")
+    store = Storage()
+    results: Dict = {"environment": environment(), "prompts": args.prompts}
+
+    start = time.perf_counter()
+    seed_storage(store, args.prompts)
+    results["replay_create_seconds"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    write_snapshot(store, snapshot)
+    results["snapshot_write_seconds"] = round(time.perf_counter() - start, 3)
+    results["snapshot_bytes"] = os.path.getsize(snapshot)
+    del store
+
+    start = time.perf_counter()
+    loaded = Storage()
+    load_snapshot(loaded, snapshot)
+    results["snapshot_load_seconds"] = round(time.perf_counter() - start, 3)
+    loaded.page_prompts("created_at", limit=1)  # waits for the background index build
+    results["snapshot_indexed_seconds"] = round(time.perf_counter() - start, 3)
+    del loaded
+
+    probe = f"p-{args.prompts - 1:08d}"
+    results["ttfr_cold_seconds"] = round(time_to_first_request(None, probe), 3)
+    results["ttfr_snapshot_seconds"] = round(time_to_first_request(snapshot, probe), 3)
+
+    for key, value in results.items():
+        if key != "environment":
+            print(f"{key:<26} {value}", file=sys.stderr)
+    write_results(args.output, results)
+    if not args.snapshot:
+        os.remove(snapshot)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Validated versus trusted construction and response paths
+
+Times the per-request model work of the prompt endpoints in-process, without
+ASGI, so the difference is not lost in transport noise:
+
+- ``validated``: the replacement prompt is built with ``Prompt(...)`` and the
+  response goes through FastAPI's ``response_model`` handling (dump, validate,
+  serialize). These are the endpoints as they were before the trusted path.
+- ``trusted``: ``Prompt.model_construct`` or ``model_copy`` for the merge and
+  ``stored_response`` for the reply, as the endpoints do now.
+
+Usage (from the ``backend`` directory):
+
+    python -m benchmarks.trusted_paths --iterations 20000 --output trusted_results.json
+"""
+
+import argparse
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app.api import stored_response
+from app.models import Prompt, PromptList, PromptPatch, PromptUpdate, get_current_time
+from benchmarks.common import environment, summarize, write_results
+
+STORED = Prompt(title="Summarize the meeting notes", content="Summarize: {{notes}} " * 20,
+                description="Short summaries for the weekly sync", tags=["writing", "ops"],
+                collection_id="col-0001")
+PAGE = [STORED.model_copy(update={"id": f"p-{index:03d}"}) for index in range(50)]
+PATCH = PromptPatch(title="Renamed")
+UPDATE = PromptUpdate(title="Replaced", content="Replaced body", tags=["qa"])
+
+PROMPT_FIELD = create_response_field(name="prompt", type_=Prompt)
+LIST_FIELD = create_response_field(name="prompt_list", type_=PromptList)
+
+
+def fastapi_response(field, content) -> bytes:
+    """Serialize ``content`` the way a route with ``response_model`` does."""
+    # With is_coroutine=True serialize_response never suspends, so it is run
+    # to completion directly instead of paying for an event loop per call.
+    coroutine = serialize_response(field=field, response_content=content, is_coroutine=True)
+    try:
+        coroutine.send(None)
+    except StopIteration as finished:
+        return JSONResponse(finished.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def validated_patch() -> bytes:
+    fields = PATCH.model_dump(exclude_unset=True)
+    prompt = Prompt(
+        id=STORED.id,
+        title=fields.get("title", STORED.title),
+        content=fields.get("content", STORED.content),
+        description=fields.get("description", STORED.description),
+        collection_id=fields.get("collection_id", STORED.collection_id),
+        tags=fields.get("tags", STORED.tags),
+        created_at=STORED.created_at,
+        updated_at=get_current_time(),
+    )
+    return fastapi_response(PROMPT_FIELD, prompt)
+
+
+def trusted_patch() -> bytes:
+    fields = PATCH.model_dump(exclude_unset=True)
+    prompt = STORED.model_copy(update={**fields, "updated_at": get_current_time()})
+    return stored_response(prompt).body
+
+
+def validated_put() -> bytes:
+    prompt = Prompt(id=STORED.id, created_at=STORED.created_at, updated_at=get_current_time(),
+                    **UPDATE.model_dump())
+    return fastapi_response(PROMPT_FIELD, prompt)
+
+
+def trusted_put() -> bytes:
+    prompt = Prompt.model_construct(id=STORED.id, created_at=STORED.created_at,
+                                    updated_at=get_current_time(), **UPDATE.model_dump())
+    return stored_response(prompt).body
+
+
+CASES: Dict[str, Dict[str, Callable[[], bytes]]] = {
+    "GET /prompts/{id}": {
+        "validated": lambda: fastapi_response(PROMPT_FIELD, STORED),
+        "trusted": lambda: stored_response(STORED).body,
+    },
+    "GET /prompts?limit=50": {
+        "validated": lambda: fastapi_response(LIST_FIELD, PromptList(prompts=PAGE, total=50)),
+        "trusted": lambda: stored_response(PromptList.model_construct(prompts=PAGE,
+                                                                      total=50)).body,
+    },
+    "PATCH /prompts/{id}": {"validated": validated_patch, "trusted": trusted_patch},
+    "PUT /prompts/{id}": {"validated": validated_put, "trusted": trusted_put},
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Time both paths of every case and write the JSON report.
+
+    Args:
+        argv (Optional[List[str]]): Command line arguments.
+
+    Returns:
+        int: The process exit code.
+    """
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--output", default="trusted_results.json")
+    args = parser.parse_args(argv)
+
+    results: Dict = {"environment": environment(), "cases": {}}
+    for case, paths in CASES.items():
+        results["cases"][case] = {}
+        for path, func in paths.items():
+            func()  # warm up
+            samples = []
+            start = time.perf_counter()
+            for _ in range(args.iterations):
+                began = time.perf_counter()
+                func()
+                samples.append(time.perf_counter() - began)
+            results["cases"][case][path] = summarize(samples, time.perf_counter() - start)
+        validated = results["cases"][case]["validated"]["p50_ms"] * 1000
+        trusted = results["cases"][case]["trusted"]["p50_ms"] * 1000
+        print(f"{case:<24} validated {validated:8.1f} us   trusted {trusted:8.1f} us",
+              file=sys.stderr)
+    write_results(args.output, results)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
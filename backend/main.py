@@ -1,10 +1,13 @@
 """PromptLab API Server
 
 Run with: python main.py
+
+The application is built by the ``app.create_app`` factory inside the server
+process, so importing this module stays cheap. Set ``PROMPTLAB_SNAPSHOT`` to
+warm-start from a snapshot (see ``app/snapshot.py``).
 """
 
 import uvicorn
-from app.api import app
 
 if __name__ == "__main__":
-    uvicorn.run(app, host="0.0.0.0", port=8000, reload=True)
+    uvicorn.run("app:create_app", factory=True, host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,172 @@
+"""Tests for admission control and load shedding."""
+
+import asyncio
+
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.admission import AdmissionMiddleware, ConcurrencyLimiter, RateLimiter
+from app.config import Settings
+from app.storage import Storage
+
+
+def admission_settings(**overrides) -> Settings:
+    values = dict(admission_enabled=True, rate_limit_per_second=1.0, rate_limit_burst=3,
+                  expensive_concurrency=1, cheap_concurrency=2, queue_wait_target=0.05)
+    values.update(overrides)
+    return Settings(**values)
+
+
+class TestRateLimiter:
+
+    def test_allows_burst_then_limits(self):
+        limiter = RateLimiter(rate=2.0, burst=2)
+        assert limiter.acquire("a", now=0.0) == 0.0
+        assert limiter.acquire("a", now=0.0) == 0.0
+        assert limiter.acquire("a", now=0.0) == 0.5
+
+    def test_tokens_refill_over_time(self):
+        limiter = RateLimiter(rate=2.0, burst=1)
+        limiter.acquire("a", now=0.0)
+        assert limiter.acquire("a", now=0.25) > 0.0
+        assert limiter.acquire("a", now=1.0) == 0.0
+
+    def test_clients_have_separate_buckets(self):
+        limiter = RateLimiter(rate=1.0, burst=1)
+        assert limiter.acquire("a", now=0.0) == 0.0
+        assert limiter.acquire("b", now=0.0) == 0.0
+
+    def test_tracks_bounded_number_of_clients(self):
+        limiter = RateLimiter(rate=1.0, burst=1, max_clients=2)
+        for client in ("a", "b", "c"):
+            limiter.acquire(client, now=0.0)
+        assert list(limiter._buckets) == ["b", "c"]
+
+
+class TestConcurrencyLimiter:
+
+    def test_waiter_gets_released_slot(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(limit=1, queue_wait_target=1.0)
+            assert await limiter.acquire() is None
+            waiter = asyncio.ensure_future(limiter.acquire())
+            await asyncio.sleep(0)
+            limiter.release(0.01)
+            return await waiter, limiter.active
+
+        assert asyncio.run(scenario()) == (None, 1)
+
+    def test_sheds_after_queue_wait_target(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(limit=1, queue_wait_target=0.01)
+            await limiter.acquire()
+            return await limiter.acquire(), limiter.queued
+
+        retry_after, queued = asyncio.run(scenario())
+        assert retry_after >= 0.01
+        assert queued == 0
+
+    def test_sheds_immediately_when_expected_wait_is_too_long(self):
+        async def scenario():
+            limiter = ConcurrencyLimiter(limit=1, queue_wait_target=0.5)
+            limiter.service_time = 2.0
+            await limiter.acquire()
+            return await limiter.acquire()
+
+        assert asyncio.run(scenario()) == 2.0
+
+
+def run_requests(middleware, requests):
+    """Run ``(method, path, query)`` requests concurrently and return their statuses."""
+    async def one(method, path, query):
+        statuses = []
+        scope = {"type": "http", "method": method, "path": path,
+                 "query_string": query.encode(), "headers": [], "client": ("10.0.0.1", 1)}
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        async def send(message):
+            if message["type"] == "http.response.start":
+                statuses.append(message["status"])
+
+        await middleware(scope, receive, send)
+        return statuses[0]
+
+    async def scenario():
+        return await asyncio.gather(*(one(*request) for request in requests))
+
+    return asyncio.run(scenario())
+
+
+async def slow_app(scope, receive, send):
+    await asyncio.sleep(0.2)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+
+class TestAdmissionMiddleware:
+
+    def test_expensive_burst_does_not_block_cheap_requests(self):
+        middleware = AdmissionMiddleware(slow_app, admission_settings(rate_limit_per_second=0))
+        statuses = run_requests(middleware, [
+            ("GET", "/prompts", "search=a"),
+            ("GET", "/prompts", "search=b"),
+            ("GET", "/prompts/p1", ""),
+            ("GET", "/prompts/p2", ""),
+        ])
+        assert statuses == [200, 503, 200, 200]
+
+    def test_corpus_wide_routes_share_the_expensive_budget(self):
+        middleware = AdmissionMiddleware(slow_app, admission_settings(rate_limit_per_second=0))
+        statuses = run_requests(middleware, [
+            ("GET", "/prompts:near-duplicates", ""),
+            ("POST", "/prompts:bulk-update", ""),
+            ("POST", "/restore", ""),
+            ("GET", "/prompts/p1", ""),
+        ])
+        assert statuses == [200, 503, 503, 200]
+
+    def test_clients_are_keyed_on_the_peer_unless_it_is_a_trusted_proxy(self):
+        middleware = AdmissionMiddleware(slow_app, admission_settings(trusted_proxies=("10.0.0.9",)))
+        headers = [(b"x-client-id", b"alice")]
+        assert middleware._client({"client": ("10.0.0.9", 1), "headers": headers}) == "alice"
+        assert middleware._client({"client": ("10.0.0.9", 1), "headers": []}) == "10.0.0.9"
+        assert middleware._client({"client": ("10.0.0.1", 1), "headers": headers}) == "10.0.0.1"
+
+    def test_exempt_paths_are_not_limited(self):
+        middleware = AdmissionMiddleware(slow_app, admission_settings(rate_limit_per_second=0))
+        statuses = run_requests(middleware, [("GET", "/prompts", "")] + [("GET", "/health", "")] * 3)
+        assert statuses == [200, 200, 200, 200]
+
+
+class TestAdmissionApi:
+
+    def test_rate_limited_client_gets_429_with_retry_after(self):
+        client = TestClient(create_app(admission_settings(), storage=Storage()))
+        statuses = [client.get("/prompts").status_code for _ in range(3)]
+        response = client.get("/prompts")
+        assert statuses == [200, 200, 200]
+        assert response.status_code == 429
+        assert response.json() == {"detail": "Rate limit exceeded"}
+        assert int(response.headers["retry-after"]) >= 1
+
+    def test_client_id_header_is_ignored_from_other_peers(self):
+        client = TestClient(create_app(admission_settings(rate_limit_burst=1), storage=Storage()))
+        assert client.get("/prompts", headers={"X-Client-Id": "a"}).status_code == 200
+        assert client.get("/prompts", headers={"X-Client-Id": "b"}).status_code == 429
+
+    def test_health_is_never_rate_limited(self):
+        client = TestClient(create_app(admission_settings(rate_limit_burst=1), storage=Storage()))
+        assert all(client.get("/health").status_code == 200 for _ in range(5))
+
+    def test_shed_requests_are_counted(self):
+        client = TestClient(create_app(admission_settings(rate_limit_burst=1), storage=Storage()))
+        client.get("/prompts/missing")
+        client.get("/prompts/missing")
+        body = client.get("/metrics").text
+        assert 'promptlab_admission_shed_total{reason="rate_limited",budget="cheap"}' in body
+
+    def test_disabled_by_default(self):
+        application = create_app(Settings(), storage=Storage())
+        assert AdmissionMiddleware not in [entry.cls for entry in application.user_middleware]
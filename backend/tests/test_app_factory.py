@@ -0,0 +1,193 @@
+"""Tests for the application factory and warm-start snapshots."""
+
+import gc
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app import columns as columns_module
+from app.config import Settings
+from app.models import Collection, Prompt
+from app.snapshot import SnapshotError, load_snapshot, read_snapshot, write_snapshot
+from app.storage import Storage
+
+
+def filled_storage() -> Storage:
+    store = Storage()
+    store.create_collection(Collection(id="col-1", name="Dev"))
+    store.create_prompt(Prompt(id="p-1", title="One", content="First content",
+                               collection_id="col-1", tags=["a"]))
+    store.create_prompt(Prompt(id="p-2", title="Two", content="Second content"))
+    return store
+
+
+class Unpickled:
+    loaded = False
+
+    def __reduce__(self):
+        return setattr, (Unpickled, "loaded", True)
+
+
+class TestCreateApp:
+
+    def test_apps_serve_their_own_storage(self):
+        first, second = Storage(), Storage()
+        client_one = TestClient(create_app(Settings(), storage=first))
+        client_two = TestClient(create_app(Settings(), storage=second))
+        client_one.post("/prompts", json={"title": "Only here", "content": "Some content"})
+        assert client_one.get("/prompts").json()["total"] == 1
+        assert client_two.get("/prompts").json()["total"] == 0
+
+    def test_default_app_is_built_lazily(self):
+        import app.api as api_module
+        assert api_module.app is api_module.app
+
+    def test_unknown_module_attribute_raises(self):
+        import app.api as api_module
+        with pytest.raises(AttributeError):
+            api_module.does_not_exist
+
+
+class TestSnapshots:
+
+    def test_round_trip_preserves_records(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        source = filled_storage()
+        assert write_snapshot(source, path) == 2
+
+        target = Storage()
+        assert load_snapshot(target, path) == 2
+        assert target.get_prompt("p-1") == source.get_prompt("p-1")
+        assert target.get_collection("col-1") == source.get_collection("col-1")
+        assert [p.id for p in target.get_prompts_by_collection("col-1")] == ["p-1"]
+
+    def test_load_replaces_existing_contents(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        write_snapshot(filled_storage(), path)
+        target = Storage()
+        target.create_prompt(Prompt(id="stale", title="Stale", content="Old content"))
+        load_snapshot(target, path)
+        assert target.get_prompt("stale") is None
+
+    def test_pickle_snapshot_is_refused_unread(self, tmp_path):
+        import pickle
+        path = tmp_path / "snapshot.bin"
+        path.write_bytes(pickle.dumps(Unpickled()))
+        with pytest.raises(SnapshotError, match="pickle"):
+            load_snapshot(Storage(), str(path))
+        assert not Unpickled.loaded
+
+    def test_binary_round_trip_keeps_every_field(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        source = filled_storage()
+        source.create_prompt(Prompt(id="p-3", title="Ünïcode ✓", content="日本語 {{x}}",
+                                    description="", tags=["a", "b", "ü"], revision=4))
+        source.create_collection(Collection(id="col-2", name="Ops", description="Runbooks"))
+        write_snapshot(source, path)
+        prompts, collections = read_snapshot(path)
+        assert prompts == source.get_all_prompts()
+        assert collections == source.get_all_collections()
+        assert prompts[1].description is None
+
+    def test_empty_store_round_trips(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        write_snapshot(Storage(), path)
+        assert read_snapshot(path) == ([], [])
+
+    def test_checksum_detects_corruption(self, tmp_path):
+        path = tmp_path / "snapshot.bin"
+        write_snapshot(filled_storage(), str(path))
+        data = bytearray(path.read_bytes())
+        data[len(data) // 2] ^= 0xFF
+        path.write_bytes(bytes(data))
+        target = filled_storage()
+        with pytest.raises(SnapshotError, match="checksum"):
+            load_snapshot(target, str(path))
+        assert target.get_prompt("p-1") is not None
+
+    def test_truncated_snapshot_raises(self, tmp_path):
+        path = tmp_path / "snapshot.bin"
+        write_snapshot(filled_storage(), str(path))
+        path.write_bytes(path.read_bytes()[:-20])
+        with pytest.raises(SnapshotError):
+            load_snapshot(Storage(), str(path))
+
+    def test_unknown_binary_version_raises(self, tmp_path):
+        from app import snapshot
+        path = tmp_path / "snapshot.bin"
+        write_snapshot(filled_storage(), str(path))
+        data = bytearray(path.read_bytes())
+        data[len(snapshot.MAGIC)] = 99
+        path.write_bytes(bytes(data))
+        with pytest.raises(SnapshotError, match="version 99"):
+            load_snapshot(Storage(), str(path))
+
+    def test_corrupt_snapshot_raises(self, tmp_path):
+        path = tmp_path / "snapshot.bin"
+        path.write_bytes(b"not a snapshot")
+        with pytest.raises(SnapshotError):
+            load_snapshot(Storage(), str(path))
+
+    def test_warm_start_serves_snapshot(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        write_snapshot(filled_storage(), path)
+        client = TestClient(create_app(Settings(snapshot_path=path), storage=Storage()))
+        assert client.get("/prompts/p-1").json()["title"] == "One"
+        assert client.get("/prompts").json()["total"] == 2
+
+    def test_indexes_are_built_after_the_load_returns(self, monkeypatch):
+        release, original = threading.Event(), columns_module.PromptColumns.rebuild
+
+        def blocked(columns, prompts):
+            release.wait(5)
+            original(columns, prompts)
+        monkeypatch.setattr(columns_module.PromptColumns, "rebuild", blocked)
+        source = filled_storage()
+        target = Storage()
+        target.bulk_load(source.get_all_prompts(), source.get_all_collections())
+        assert target.get_prompt("p-1").title == "One"
+
+        pages = []
+        reader = threading.Thread(target=lambda: pages.append(target.page_prompts("title", descending=False)))
+        reader.start()
+        reader.join(0.2)
+        assert reader.is_alive()
+        release.set()
+        reader.join(5)
+        page, total = pages[0]
+        assert [prompt.id for prompt in page] == ["p-1", "p-2"] and total == 2
+        assert target.get_collection_stats("col-1").prompt_count == 1
+
+    def test_load_leaves_the_collector_alone(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        write_snapshot(filled_storage(), path)
+        frozen = gc.get_freeze_count()
+        load_snapshot(Storage(), path)
+        assert gc.get_freeze_count() == frozen and gc.isenabled()
+
+    def test_gc_freeze_is_a_startup_setting(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        write_snapshot(filled_storage(), path)
+        application = create_app(Settings(snapshot_path=path, gc_freeze=True), storage=Storage())
+        try:
+            with TestClient(application):
+                assert gc.get_freeze_count() > 0
+        finally:
+            gc.unfreeze()
+
+    def test_missing_snapshot_starts_empty(self, tmp_path):
+        settings = Settings(snapshot_path=str(tmp_path / "absent.bin"))
+        client = TestClient(create_app(settings, storage=Storage()))
+        assert client.get("/prompts").json()["total"] == 0
+
+    def test_snapshot_written_on_shutdown(self, tmp_path):
+        path = str(tmp_path / "snapshot.bin")
+        settings = Settings(snapshot_path=path, snapshot_on_shutdown=True)
+        with TestClient(create_app(settings, storage=Storage())) as client:
+            client.post("/prompts", json={"title": "Persist me", "content": "Some content"})
+
+        restored = Storage()
+        load_snapshot(restored, path)
+        assert [p.title for p in restored.get_all_prompts()] == ["Persist me"]
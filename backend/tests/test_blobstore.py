@@ -0,0 +1,182 @@
+"""Tests for the memory-mapped blob store for large prompt bodies."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.blobstore import BlobCompactor, BlobStore, StaleBlobRef
+from app.config import Settings
+from app.models import Prompt
+from app.storage import Storage
+
+THRESHOLD = 100
+LARGE = "x" * 500
+LARGER = "y" * 800
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    store = BlobStore(str(tmp_path / "blobs"), threshold=THRESHOLD)
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def blob_storage(blob_store):
+    return Storage(blob_store=blob_store)
+
+
+class TestBlobStore:
+
+    def test_put_and_get_round_trip(self, blob_store):
+        first = blob_store.put("héllo " * 50)
+        second = blob_store.put(LARGE)
+        assert blob_store.get(first) == "héllo " * 50
+        assert blob_store.get(second) == LARGE
+        assert second.offset == first.length
+
+    def test_should_store_uses_threshold(self, blob_store):
+        assert blob_store.should_store("a" * THRESHOLD)
+        assert not blob_store.should_store("a" * (THRESHOLD - 1))
+
+    def test_release_tracks_dead_bytes(self, blob_store):
+        ref = blob_store.put(LARGE)
+        blob_store.put(LARGE)
+        blob_store.release(ref)
+        assert blob_store.dead_ratio() == 0.5
+
+    def test_compact_rewrites_live_blobs(self, blob_store):
+        dead = blob_store.put(LARGE)
+        live = blob_store.put(LARGER)
+        blob_store.release(dead)
+        mapping = blob_store.compact([live])
+        assert blob_store.get(mapping[live]) == LARGER
+        assert mapping[live].offset == 0
+        assert blob_store.dead_bytes == 0
+
+    def test_references_two_compactions_old_are_stale(self, blob_store):
+        ref = blob_store.put(LARGE)
+        first = blob_store.compact([ref])
+        assert blob_store.get(ref) == LARGE  # previous segment still readable
+        blob_store.compact([first[ref]])
+        with pytest.raises(StaleBlobRef):
+            blob_store.get(ref)
+
+
+class TestStorageWithBlobs:
+
+    def test_large_body_is_kept_out_of_the_heap(self, blob_storage):
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.create_prompt(Prompt(id="small", title="Small", content="tiny body"))
+        assert blob_storage.sizes()["blobs"] == 1
+        assert blob_storage.get_prompt("big", load_content=False).content == ""
+        assert blob_storage.get_prompt("big").content == LARGE
+        assert blob_storage.get_prompt("small", load_content=False).content == "tiny body"
+
+    def test_get_all_prompts_loads_content_by_default(self, blob_storage):
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        assert blob_storage.get_all_prompts()[0].content == LARGE
+        stubs = blob_storage.get_all_prompts(load_content=False)
+        assert blob_storage.with_content(stubs)[0].content == LARGE
+
+    def test_unchanged_body_reuses_blob(self, blob_storage, blob_store):
+        prompt = blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.update_prompt("big", prompt.model_copy(update={"title": "Renamed"}))
+        assert blob_store.dead_bytes == 0
+        assert blob_storage.get_prompt("big").title == "Renamed"
+
+    def test_metadata_update_reuses_signature_and_stats(self, blob_storage, monkeypatch):
+        from app import storage as storage_module
+        calls = []
+        for name in ("signature", "content_stats"):
+            original = getattr(storage_module, name)
+            monkeypatch.setattr(storage_module, name,
+                                lambda content, original=original, name=name:
+                                calls.append(name) or original(content))
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        calls.clear()
+        prompt = blob_storage.get_prompt("big")
+        updated = blob_storage.update_prompt("big", prompt.model_copy(update={"title": "Renamed"}))
+        assert calls == []
+        assert (updated.char_count, updated.revision) == (len(LARGE), 2)
+        blob_storage.update_prompt("big", prompt.model_copy(update={"content": LARGER}))
+        assert sorted(calls) == ["content_stats", "signature"]
+
+    def test_changed_body_releases_old_blob(self, blob_storage, blob_store):
+        prompt = blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.update_prompt("big", prompt.model_copy(update={"content": LARGER}))
+        assert blob_store.dead_bytes == len(LARGE)
+        assert blob_storage.get_prompt("big").content == LARGER
+
+    def test_shrinking_body_moves_back_to_heap(self, blob_storage):
+        prompt = blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.update_prompt("big", prompt.model_copy(update={"content": "short now"}))
+        assert blob_storage.sizes()["blobs"] == 0
+        assert blob_storage.get_prompt("big").content == "short now"
+
+    def test_bulk_update_keeps_blob_and_new_metadata(self, blob_storage, blob_store):
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.bulk_update_prompts(["big"], add_tags=["bulk"])
+        prompt = blob_storage.get_prompt("big")
+        assert (prompt.tags, prompt.content) == (["bulk"], LARGE)
+        assert blob_store.dead_bytes == 0
+
+    def test_delete_releases_blob(self, blob_storage, blob_store):
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.delete_prompt("big")
+        assert blob_storage.sizes()["blobs"] == 0
+        assert blob_store.live_bytes == 0
+
+    def test_compaction_keeps_content_readable(self, blob_storage):
+        for index in range(4):
+            blob_storage.create_prompt(Prompt(id=f"p{index}", title="Big", content=LARGE))
+        blob_storage.delete_prompt("p0")
+        blob_storage.delete_prompt("p1")
+        assert blob_storage.compact_blobs(min_dead_ratio=0.9) is False
+        assert blob_storage.compact_blobs(min_dead_ratio=0.5) is True
+        assert [p.content for p in blob_storage.get_all_prompts()] == [LARGE, LARGE]
+
+    def test_attach_moves_existing_bodies(self, blob_store):
+        storage = Storage()
+        storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        storage.attach_blob_store(blob_store)
+        assert storage.sizes()["blobs"] == 1
+        assert storage.get_prompt("big").content == LARGE
+
+    def test_background_compactor_reclaims_space(self, blob_storage, blob_store):
+        blob_storage.create_prompt(Prompt(id="big", title="Big", content=LARGE))
+        blob_storage.delete_prompt("big")
+        compactor = BlobCompactor(blob_storage, interval=0.01, min_dead_ratio=0.5)
+        compactor.start()
+        try:
+            for _ in range(200):
+                if blob_store.dead_bytes == 0:
+                    break
+                compactor._stopped.wait(0.01)
+        finally:
+            compactor.stop()
+        assert blob_store.dead_bytes == 0
+
+
+class TestApiWithBlobs:
+
+    @pytest.fixture
+    def blob_client(self, tmp_path):
+        settings = Settings(blob_dir=str(tmp_path / "blobs"), blob_threshold=THRESHOLD)
+        return TestClient(create_app(settings, storage=Storage()))
+
+    def test_full_responses_include_large_content(self, blob_client):
+        prompt_id = blob_client.post("/prompts", json={"title": "Big", "content": LARGE}).json()["id"]
+        assert blob_client.get(f"/prompts/{prompt_id}").json()["content"] == LARGE
+        assert blob_client.get("/prompts").json()["prompts"][0]["content"] == LARGE
+
+    def test_projection_without_content_skips_blob(self, blob_client):
+        blob_client.post("/prompts", json={"title": "Big", "content": LARGE})
+        prompt = blob_client.get("/prompts?fields=id,title").json()["prompts"][0]
+        assert prompt["title"] == "Big"
+        assert "content" not in prompt
+
+    def test_patch_keeps_large_content(self, blob_client):
+        prompt_id = blob_client.post("/prompts", json={"title": "Big", "content": LARGE}).json()["id"]
+        patched = blob_client.patch(f"/prompts/{prompt_id}", json={"title": "Renamed"}).json()
+        assert patched["content"] == LARGE
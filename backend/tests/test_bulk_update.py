@@ -0,0 +1,103 @@
+"""Tests for bulk tag and collection updates by filter."""
+
+from app.models import Prompt
+from app.storage import Storage
+
+
+def create(client, title, **extra):
+    body = {"title": title, "content": "Some prompt content", **extra}
+    return client.post("/prompts", json=body).json()
+
+
+def bulk(client, filter, operation):
+    return client.post("/prompts:bulk-update", json={"filter": filter, "operation": operation})
+
+
+class TestStorageBulkUpdate:
+
+    def test_changes_tags_and_bumps_revision(self):
+        storage = Storage()
+        storage.create_prompt(Prompt(id="a", title="A", content="C", tags=["x", "old"]))
+        storage.create_prompt(Prompt(id="b", title="B", content="C", tags=["new"]))
+        updated = storage.bulk_update_prompts(["a", "b"], add_tags=["new"], remove_tags=["old"])
+        assert updated == 1
+        assert storage.get_prompt("a").tags == ["x", "new"]
+        assert storage.get_prompt("a").revision == 2
+        assert storage.get_prompt("b").revision == 1
+
+    def test_skips_missing_prompts(self):
+        storage = Storage()
+        assert storage.bulk_update_prompts(["missing"], add_tags=["x"]) == 0
+
+    def test_moves_to_collection_and_out_again(self):
+        storage = Storage()
+        storage.create_prompt(Prompt(id="a", title="A", content="C"))
+        storage.bulk_update_prompts(["a"], set_collection=True, collection_id="col")
+        assert storage.get_prompt("a").collection_id == "col"
+        storage.bulk_update_prompts(["a"], set_collection=True, collection_id=None)
+        assert storage.get_prompt("a").collection_id is None
+
+
+class TestBulkUpdateApi:
+
+    def test_add_tag_to_search_hits(self, client):
+        create(client, "Code review helper")
+        create(client, "Review checklist", tags=["review"])
+        create(client, "Email writer")
+        response = bulk(client, {"search": "review"}, {"add_tags": ["review"]})
+        assert response.status_code == 200
+        assert response.json() == {"matched": 2, "updated": 1, "unchanged": 1}
+        tagged = client.get("/prompts?tag=review").json()["prompts"]
+        assert sorted(p["title"] for p in tagged) == ["Code review helper", "Review checklist"]
+
+    def test_move_collection_to_another(self, client, sample_collection_data):
+        source = client.post("/collections", json=sample_collection_data).json()["id"]
+        target = client.post("/collections", json={"name": "Target"}).json()["id"]
+        for index in range(3):
+            create(client, f"Prompt {index}", collection_id=source)
+        response = bulk(client, {"collection_id": source}, {"collection_id": target})
+        assert response.json()["updated"] == 3
+        assert client.get(f"/prompts?collection_id={target}").json()["total"] == 3
+        assert client.get(f"/prompts?collection_id={source}").json()["total"] == 0
+
+    def test_filters_combine(self, client):
+        first = create(client, "One", tags=["a", "b"])
+        create(client, "Two", tags=["a"])
+        create(client, "Three", tags=["a", "b"])
+        response = bulk(client, {"tags": ["a", "b"], "ids": [first["id"], "missing"]},
+                        {"remove_tags": ["a"]})
+        assert response.json() == {"matched": 1, "updated": 1, "unchanged": 0}
+        assert client.get(f"/prompts/{first['id']}").json()["tags"] == ["b"]
+
+    def test_bulk_update_changes_etag(self, client):
+        prompt = create(client, "One")
+        bulk(client, {"ids": [prompt["id"]]}, {"add_tags": ["x"]})
+        stale = client.patch(f"/prompts/{prompt['id']}", json={"title": "Two"},
+                             headers={"If-Match": '"1"'})
+        assert stale.status_code == 412
+
+    def test_unknown_target_collection_is_400(self, client):
+        create(client, "One")
+        response = bulk(client, {"search": "One"}, {"collection_id": "missing"})
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Collection not found"
+
+    def test_empty_filter_is_400(self, client):
+        assert bulk(client, {}, {"add_tags": ["x"]}).status_code == 400
+
+    def test_null_or_empty_criteria_are_400(self, client):
+        prompt = create(client, "One")
+        for selector in ({"ids": None}, {"tags": []}, {"search": None}, {"ids": [], "tags": None}):
+            assert bulk(client, selector, {"add_tags": ["x"]}).status_code == 400
+        assert client.get(f"/prompts/{prompt['id']}").json()["tags"] == []
+
+    def test_null_collection_selects_uncategorized(self, client, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        create(client, "Filed", collection_id=collection_id)
+        loose = create(client, "Loose")
+        response = bulk(client, {"collection_id": None}, {"add_tags": ["x"]})
+        assert response.json()["matched"] == 1
+        assert client.get(f"/prompts/{loose['id']}").json()["tags"] == ["x"]
+
+    def test_empty_operation_is_400(self, client):
+        assert bulk(client, {"search": "x"}, {}).status_code == 400
@@ -0,0 +1,99 @@
+"""Tests for incrementally maintained per-collection statistics."""
+
+from datetime import datetime, timedelta
+
+from app.models import Prompt
+from app.storage import Storage
+
+BASE = datetime(2024, 1, 1)
+
+
+def stored(storage, prompt_id, collection_id="col", tags=(), minutes=0):
+    return storage.create_prompt(Prompt(
+        id=prompt_id, title=prompt_id, content="Some content", collection_id=collection_id,
+        tags=list(tags), updated_at=BASE + timedelta(minutes=minutes)))
+
+
+class TestStorageCollectionStats:
+
+    def test_counts_prompts_tags_and_latest_update(self):
+        storage = Storage()
+        stored(storage, "a", tags=["x", "y"], minutes=1)
+        stored(storage, "b", tags=["x"], minutes=5)
+        stored(storage, "c", collection_id="other")
+        stats = storage.get_collection_stats("col")
+        assert stats.prompt_count == 2
+        assert stats.last_updated_at == BASE + timedelta(minutes=5)
+        assert stats.tag_counts == {"x": 2, "y": 1}
+
+    def test_empty_collection_has_zero_stats(self):
+        stats = Storage().get_collection_stats("none")
+        assert (stats.prompt_count, stats.last_updated_at, stats.tag_counts) == (0, None, {})
+
+    def test_deleting_newest_prompt_recomputes_latest(self):
+        storage = Storage()
+        stored(storage, "a", tags=["x"], minutes=1)
+        stored(storage, "b", tags=["x"], minutes=5)
+        storage.delete_prompt("b")
+        stats = storage.get_collection_stats("col")
+        assert stats.prompt_count == 1
+        assert stats.last_updated_at == BASE + timedelta(minutes=1)
+        assert stats.tag_counts == {"x": 1}
+
+    def test_update_moves_prompt_between_collections(self):
+        storage = Storage()
+        prompt = stored(storage, "a", tags=["x"])
+        storage.update_prompt("a", prompt.model_copy(update={"collection_id": "other"}))
+        assert storage.get_collection_stats("col").prompt_count == 0
+        assert storage.get_collection_stats("other").tag_counts == {"x": 1}
+
+    def test_update_to_older_timestamp_recomputes_latest(self):
+        storage = Storage()
+        stored(storage, "a", minutes=1)
+        prompt = stored(storage, "b", minutes=5)
+        storage.update_prompt("b", prompt.model_copy(update={"updated_at": BASE}))
+        assert storage.get_collection_stats("col").last_updated_at == BASE + timedelta(minutes=1)
+
+    def test_bulk_update_and_bulk_load_keep_stats(self):
+        storage = Storage()
+        stored(storage, "a", tags=["x"])
+        stored(storage, "b", tags=["x"])
+        storage.bulk_update_prompts(["a", "b"], remove_tags=["x"], add_tags=["z"])
+        assert storage.get_collection_stats("col").tag_counts == {"z": 2}
+        storage.bulk_load([Prompt(id="n", title="N", content="C", collection_id="col")], [])
+        assert storage.get_collection_stats("col").prompt_count == 1
+
+    def test_get_prompts_by_collection_uses_membership(self):
+        storage = Storage()
+        stored(storage, "a")
+        stored(storage, "b", collection_id="other")
+        stored(storage, "c")
+        assert [p.id for p in storage.get_prompts_by_collection("col")] == ["a", "c"]
+
+
+class TestCollectionStatsApi:
+
+    def test_list_collections_includes_stats(self, client, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        client.post("/prompts", json={"title": "One", "content": "Content one",
+                                      "collection_id": collection_id, "tags": ["a"]})
+        latest = client.post("/prompts", json={"title": "Two", "content": "Content two",
+                                               "collection_id": collection_id,
+                                               "tags": ["a", "b"]}).json()
+        stats = client.get("/collections").json()["collections"][0]["stats"]
+        assert stats == {"prompt_count": 2, "last_updated_at": latest["updated_at"],
+                         "tag_counts": {"a": 2, "b": 1}}
+
+    def test_get_collection_includes_stats(self, client, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        response = client.get(f"/collections/{collection_id}").json()
+        assert response["name"] == sample_collection_data["name"]
+        assert response["stats"] == {"prompt_count": 0, "last_updated_at": None,
+                                     "tag_counts": {}}
+
+    def test_stats_follow_deletes(self, client, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        prompt_id = client.post("/prompts", json={"title": "One", "content": "Content one",
+                                                  "collection_id": collection_id}).json()["id"]
+        client.delete(f"/prompts/{prompt_id}")
+        assert client.get(f"/collections/{collection_id}").json()["stats"]["prompt_count"] == 0
@@ -0,0 +1,121 @@
+"""Tests for the columnar prompt metadata and paginated listing."""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from app.columns import PromptColumns, to_micros
+from app.models import Prompt
+
+
+def make_prompt(index, minutes, tags=(), collection_id=None):
+    created = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    return Prompt(id=f"p{index}", title=f"P{index}", content="Body", tags=list(tags),
+                  collection_id=collection_id, created_at=created, updated_at=created)
+
+
+class TestToMicros:
+
+    def test_naive_is_utc(self):
+        assert to_micros(datetime(1970, 1, 1, 0, 0, 1, 5)) == 1_000_005
+
+    def test_aware_is_converted(self):
+        aware = datetime(1970, 1, 1, 2, tzinfo=timezone(timedelta(hours=2)))
+        assert to_micros(aware) == 0
+
+
+class TestPromptColumns:
+
+    def test_filters_by_collection_and_tag(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(1, 1, tags=["a"], collection_id="c"))
+        columns.upsert(make_prompt(2, 2, tags=["a", "b"]))
+        columns.upsert(make_prompt(3, 3, tags=["b"], collection_id="c"))
+        assert columns.select(collection_id="c").ordered_ids() == ["p3", "p1"]
+        assert columns.select(tag="a").ordered_ids() == ["p2", "p1"]
+        assert columns.select(collection_id="c", tag="b").ordered_ids() == ["p3"]
+        assert columns.select(collection_id="missing").ordered_ids() == []
+        assert columns.select(tag="missing").ordered_ids() == []
+
+    def test_upsert_moves_prompt_between_filters(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(1, 1, tags=["a"], collection_id="c"))
+        columns.upsert(make_prompt(1, 1, tags=["b"], collection_id="d"))
+        assert len(columns) == 1
+        assert columns.select(tag="a").ordered_ids() == []
+        assert columns.select(collection_id="d", tag="b").ordered_ids() == ["p1"]
+
+    def test_removed_rows_are_reused(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(1, 1, tags=["a"]))
+        columns.remove("p1")
+        columns.remove("p1")
+        columns.upsert(make_prompt(2, 2))
+        assert columns.select().ordered_ids() == ["p2"]
+        assert columns.select(tag="a").ordered_ids() == []
+
+    def test_order_and_pages_match_python_sort(self):
+        rng = random.Random(7)
+        prompts = [make_prompt(index, rng.randrange(50), tags=rng.sample("abc", 1))
+                   for index in range(3000)]
+        columns = PromptColumns()
+        for prompt in prompts:
+            columns.upsert(prompt)
+        expected = [p.id for p in sorted(prompts, key=lambda p: p.created_at, reverse=True)]
+        selection = columns.select()
+        assert selection.ordered_ids() == expected
+        assert selection.ordered_ids(offset=10, limit=25) == expected[10:35]
+        assert selection.ordered_ids(descending=False, limit=5) == \
+            [p.id for p in sorted(prompts, key=lambda p: p.created_at)][:5]
+        assert selection.ordered_ids(offset=5000, limit=10) == []
+
+    def test_rebuild_replaces_rows(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(9, 9, tags=["x"]))
+        columns.rebuild([make_prompt(1, 1, tags=["a"]), make_prompt(2, 2, collection_id="c")])
+        assert columns.select().ordered_ids() == ["p2", "p1"]
+        assert columns.select(tag="x").ordered_ids() == []
+        assert columns.select(collection_id="c").ordered_ids() == ["p2"]
+
+    def test_selection_is_not_affected_by_later_writes(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(1, 1))
+        selection = columns.select()
+        columns.remove("p1")
+        columns.upsert(make_prompt(2, 2))
+        assert selection.ordered_ids() == ["p1"]
+
+
+class TestListPagination:
+
+    def create(self, client, count, **extra):
+        return [client.post("/prompts", json={"title": f"P{index}", "content": "Body", **extra}).json()
+                for index in range(count)]
+
+    def test_limit_and_offset(self, client):
+        created = self.create(client, 5)
+        newest_first = [prompt["id"] for prompt in reversed(created)]
+        body = client.get("/prompts?limit=2&offset=1").json()
+        assert body["total"] == 5
+        assert [prompt["id"] for prompt in body["prompts"]] == newest_first[1:3]
+
+    def test_offset_past_the_end(self, client):
+        self.create(client, 2)
+        body = client.get("/prompts?offset=10").json()
+        assert body == {"prompts": [], "total": 2}
+
+    def test_pagination_with_search_counts_all_matches(self, client):
+        self.create(client, 3)
+        client.post("/prompts", json={"title": "Other", "content": "Body"})
+        body = client.get("/prompts?search=P&limit=1&fields=title").json()
+        assert body == {"prompts": [{"title": "P2"}], "total": 3}
+
+    def test_tag_and_collection_filters_combine(self, client, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        self.create(client, 2, tags=["x"], collection_id=collection_id)
+        self.create(client, 1, tags=["x"])
+        body = client.get(f"/prompts?tag=x&collection_id={collection_id}").json()
+        assert body["total"] == 2
+
+    def test_invalid_limit_is_422(self, client):
+        assert client.get("/prompts?limit=0").status_code == 422
+        assert client.get("/prompts?offset=-1").status_code == 422
@@ -0,0 +1,152 @@
+"""Tests for prompt revisions, compare-and-swap updates and If-Match."""
+
+import threading
+
+import pytest
+
+from app.models import Prompt
+from app.storage import RevisionConflict, Storage
+from app.utils import parse_if_match, revision_etag
+
+
+class TestParseIfMatch:
+
+    def test_absent_or_wildcard_matches_anything(self):
+        assert parse_if_match(None) is None
+        assert parse_if_match("*") is None
+
+    def test_accepts_quoted_and_unquoted_tags(self):
+        assert parse_if_match('"1", 2') == {1, 2}
+
+    def test_weak_tags_match_nothing(self):
+        assert parse_if_match('"1", W/"3"') == {1}
+        assert parse_if_match('W/"3"') == frozenset()
+
+    def test_foreign_tags_match_nothing(self):
+        assert parse_if_match('"abc"') == frozenset()
+
+    def test_etag_round_trips(self):
+        assert parse_if_match(revision_etag(7)) == {7}
+
+
+class TestStorageRevisions:
+
+    def test_new_prompt_starts_at_revision_one(self):
+        storage = Storage()
+        assert storage.create_prompt(Prompt(title="T", content="C")).revision == 1
+
+    def test_update_increments_revision(self):
+        storage = Storage()
+        prompt = storage.create_prompt(Prompt(id="p", title="T", content="C"))
+        updated = storage.update_prompt("p", prompt.model_copy(update={"title": "U"}))
+        assert updated.revision == 2
+        assert storage.get_prompt("p").revision == 2
+
+    def test_compare_and_swap_rejects_stale_revision(self):
+        storage = Storage()
+        prompt = storage.create_prompt(Prompt(id="p", title="T", content="C"))
+        storage.update_prompt("p", prompt.model_copy(update={"title": "U"}), expected_revision=1)
+        with pytest.raises(RevisionConflict) as conflict:
+            storage.update_prompt("p", prompt.model_copy(update={"title": "V"}),
+                                  expected_revision=1)
+        assert (conflict.value.expected, conflict.value.current) == (1, 2)
+        assert storage.get_prompt("p").title == "U"
+
+    def test_update_leaves_the_argument_unchanged(self):
+        storage = Storage()
+        storage.create_prompt(Prompt(id="p", title="T", content="C"))
+        storage.update_prompt("p", Prompt(id="p", title="U", content="C"))
+        incoming = Prompt(id="p", title="V", content="Use {{x}}")
+        before = incoming.model_copy()
+        with pytest.raises(RevisionConflict):
+            storage.update_prompt("p", incoming, expected_revision=1)
+        assert incoming == before
+        updated = storage.update_prompt("p", incoming, expected_revision=2)
+        assert incoming == before
+        assert (updated.revision, updated.variables) == (3, ["x"])
+
+    def test_concurrent_compare_and_swap_has_one_winner(self):
+        storage = Storage()
+        prompt = storage.create_prompt(Prompt(id="p", title="T", content="C"))
+        barrier = threading.Barrier(8)
+        winners = []
+
+        def writer(index):
+            barrier.wait()
+            try:
+                storage.update_prompt("p", prompt.model_copy(update={"title": str(index)}),
+                                      expected_revision=1)
+                winners.append(index)
+            except RevisionConflict:
+                pass
+
+        threads = [threading.Thread(target=writer, args=(index,)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(winners) == 1
+        assert storage.get_prompt("p").title == str(winners[0])
+
+
+class TestIfMatchApi:
+
+    def test_get_returns_etag(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.get(f"/prompts/{prompt_id}")
+        assert response.headers["etag"] == '"1"'
+        assert response.json()["revision"] == 1
+
+    def test_projected_get_returns_etag(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.get(f"/prompts/{prompt_id}?fields=title")
+        assert response.headers["etag"] == '"1"'
+
+    def test_patch_with_matching_etag_succeeds(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.patch(f"/prompts/{prompt_id}", json={"title": "New"},
+                                headers={"If-Match": '"1"'})
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"2"'
+        assert response.json()["revision"] == 2
+
+    def test_patch_with_stale_etag_fails_412(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        client.patch(f"/prompts/{prompt_id}", json={"title": "First"})
+        response = client.patch(f"/prompts/{prompt_id}", json={"title": "Second"},
+                                headers={"If-Match": '"1"'})
+        assert response.status_code == 412
+        assert response.json()["detail"] == "Prompt has been modified"
+        assert client.get(f"/prompts/{prompt_id}").json()["title"] == "First"
+
+    def test_put_with_stale_etag_fails_412(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        client.put(f"/prompts/{prompt_id}", json=sample_prompt_data)
+        response = client.put(f"/prompts/{prompt_id}", json=sample_prompt_data,
+                              headers={"If-Match": '"1"'})
+        assert response.status_code == 412
+
+    def test_patch_with_weak_etag_fails_412(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.patch(f"/prompts/{prompt_id}", json={"title": "New"},
+                                headers={"If-Match": 'W/"1"'})
+        assert response.status_code == 412
+        assert client.get(f"/prompts/{prompt_id}").json()["revision"] == 1
+
+    def test_put_with_wildcard_succeeds(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.put(f"/prompts/{prompt_id}", json=sample_prompt_data,
+                              headers={"If-Match": "*"})
+        assert response.status_code == 200
+        assert response.headers["etag"] == '"2"'
+
+    def test_missing_prompt_is_404_before_412(self, client):
+        response = client.patch("/prompts/missing", json={"title": "X"},
+                                headers={"If-Match": '"1"'})
+        assert response.status_code == 404
+
+    def test_updates_without_if_match_are_not_lost(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        for index in range(3):
+            client.patch(f"/prompts/{prompt_id}", json={"tags": [str(index)]})
+        assert client.get(f"/prompts/{prompt_id}").json()["revision"] == 4
@@ -0,0 +1,145 @@
+"""Tests for write-time content statistics and the filters and sorts they back."""
+
+import numpy as np
+import pytest
+
+from app.models import Prompt
+from app import snapshot
+from app.snapshot import load_snapshot, write_snapshot
+from app.storage import Storage, storage
+from app.utils import content_stats, estimate_tokens, parse_sort
+
+
+class TestContentStats:
+
+    def test_stats_of_a_template(self):
+        stats = content_stats("Hi {{name}}, meet {{other}} and {{name}}")
+        assert stats["char_count"] == 40
+        assert stats["token_count"] == 10
+        assert stats["variables"] == ["name", "other"]
+        assert stats["content_valid"] is True
+
+    def test_stats_of_plain_and_blank_content(self):
+        assert content_stats("Plain text")["variables"] == []
+        assert content_stats("   ")["content_valid"] is False
+        assert estimate_tokens("") == 0
+        assert estimate_tokens("abcde") == 2
+
+
+class TestParseSort:
+
+    def test_default_is_newest_first(self):
+        assert parse_sort(None) == ("created_at", True)
+        assert parse_sort(" ") == ("created_at", True)
+
+    def test_prefix_sets_direction(self):
+        assert parse_sort("token_count") == ("token_count", False)
+        assert parse_sort("-char_count") == ("char_count", True)
+
+    def test_unknown_key(self):
+        with pytest.raises(ValueError):
+            parse_sort("-popularity")
+
+
+class TestStorageStats:
+
+    def test_create_derives_and_ignores_client_values(self):
+        local = Storage()
+        prompt = local.create_prompt(Prompt(title="T", content="Use {{x}} here", token_count=999,
+                                            variables=["bogus"]))
+        assert (prompt.char_count, prompt.token_count) == (14, 4)
+        assert prompt.variables == ["x"] and prompt.content_valid is True
+
+    def test_update_recomputes_only_changed_content(self):
+        local = Storage()
+        created = local.create_prompt(Prompt(title="T", content="Use {{x}}"))
+        renamed = local.update_prompt(created.id, created.model_copy(update={"title": "New"}))
+        assert renamed.variables == ["x"]
+        rewritten = local.update_prompt(created.id, renamed.model_copy(update={"content": "None"}))
+        assert (rewritten.char_count, rewritten.variables) == (4, [])
+
+    def test_snapshot_round_trip_keeps_stats(self, tmp_path):
+        local = Storage()
+        local.create_prompt(Prompt(title="T", content="Use {{x}} and {{y}}"))
+        path = tmp_path / "snapshot.bin"
+        write_snapshot(local, str(path))
+        restored = Storage()
+        load_snapshot(restored, str(path))
+        prompt = restored.get_all_prompts()[0]
+        assert (prompt.token_count, prompt.variables) == (5, ["x", "y"])
+
+    def test_legacy_snapshot_stats_are_derived(self, tmp_path):
+        path = str(tmp_path / "legacy.snap")
+        prompt = Prompt(id="p1", title="T", content="Hi {{who}}")
+        with snapshot.SnapshotWriter(path) as writer:
+            for field in ("id", "title", "content", "description"):
+                writer.write_text(f"prompt.{field}", [getattr(prompt, field)])
+            writer.write_column("prompt.coll", np.array([-1], dtype=np.int32))
+            writer.write_column("prompt.ntags", np.zeros(1, dtype=np.int32))
+            writer.write_column("prompt.tags", np.zeros(0, dtype=np.int32))
+            writer.write_column("prompt.created", np.zeros(1, dtype=np.int64))
+            writer.write_column("prompt.updated", np.zeros(1, dtype=np.int64))
+            writer.write_column("prompt.revision", np.ones(1, dtype=np.int64))
+            writer.write_text("strings", [])
+            for field in ("id", "name", "description"):
+                writer.write_text(f"coll.{field}", [])
+            writer.write_column("coll.created", np.zeros(0, dtype=np.int64))
+            writer.close(1, 0)
+        restored = Storage()
+        load_snapshot(restored, path)
+        assert restored.get_prompt("p1").variables == ["who"]
+
+
+class TestStatsApi:
+
+    def seed(self, client, sample_prompt_data):
+        ids = {}
+        for name, content in (("short", "Hi"), ("template", "Dear {{name}}, " * 4),
+                              ("long", "word " * 100)):
+            response = client.post("/prompts", json={**sample_prompt_data, "content": content})
+            ids[name] = response.json()["id"]
+        return ids
+
+    def test_response_carries_stats(self, client, sample_prompt_data):
+        body = client.post("/prompts", json={**sample_prompt_data, "content": "Hello {{a}}"}).json()
+        assert body["char_count"] == 11 and body["token_count"] == 3
+        assert body["variables"] == ["a"] and body["content_valid"] is True
+
+    def test_token_range(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        body = client.get("/prompts?min_tokens=5&max_tokens=100").json()
+        assert [prompt["id"] for prompt in body["prompts"]] == [ids["template"]]
+        assert client.get("/prompts?max_tokens=0").json()["total"] == 0
+
+    def test_has_variable(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        with_vars = client.get("/prompts?has_variable=true").json()["prompts"]
+        without = client.get("/prompts?has_variable=false").json()["prompts"]
+        assert [prompt["id"] for prompt in with_vars] == [ids["template"]]
+        assert {prompt["id"] for prompt in without} == {ids["short"], ids["long"]}
+
+    def test_sort_by_tokens(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        ascending = client.get("/prompts?sort=token_count").json()["prompts"]
+        assert [prompt["id"] for prompt in ascending] == [ids["short"], ids["template"], ids["long"]]
+        page = client.get("/prompts?sort=-char_count&limit=1").json()
+        assert [prompt["id"] for prompt in page["prompts"]] == [ids["long"]]
+        assert page["total"] == 3
+
+    def test_sort_applies_with_search(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        body = client.get("/prompts", params={"search": sample_prompt_data["title"],
+                                              "sort": "token_count"}).json()
+        assert [prompt["id"] for prompt in body["prompts"]][0] == ids["short"]
+
+    def test_edit_moves_prompt_between_filters(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        client.patch(f"/prompts/{ids['short']}", json={"content": "Hi {{who}}"})
+        with_vars = client.get("/prompts?has_variable=true").json()["prompts"]
+        assert {prompt["id"] for prompt in with_vars} == {ids["short"], ids["template"]}
+        assert storage.get_prompt(ids["short"]).variables == ["who"]
+
+    def test_unknown_sort_is_400(self, client):
+        response = client.get("/prompts?sort=-popularity")
+        assert response.status_code == 400
+        assert "popularity" in response.json()["detail"]
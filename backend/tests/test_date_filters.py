@@ -0,0 +1,115 @@
+"""Tests for the timestamp range indexes and the date filters of GET /prompts."""
+
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from app.columns import PromptColumns, RangeIndex
+from app.models import Prompt
+from app.storage import storage
+
+BASE = datetime(2024, 1, 1)
+
+
+def make_prompt(index, created_minutes, updated_minutes=None, tags=()):
+    updated_minutes = created_minutes if updated_minutes is None else updated_minutes
+    return Prompt(id=f"p{index}", title=f"P{index}", content="Body", tags=list(tags),
+                  created_at=BASE + timedelta(minutes=created_minutes),
+                  updated_at=BASE + timedelta(minutes=updated_minutes))
+
+
+def minutes(value):
+    return BASE + timedelta(minutes=value)
+
+
+class TestRangeIndex:
+
+    def test_half_open_window(self):
+        index = RangeIndex()
+        column = np.array([10, 20, 30, 40], dtype=np.int64)
+        index.build(column, np.arange(4))
+        assert sorted(index.rows_between(20, 40, column).tolist()) == [1, 2]
+        assert sorted(index.rows_between(None, 20, column).tolist()) == [0]
+        assert sorted(index.rows_between(35, None, column).tolist()) == [3]
+
+    def test_outdated_pairs_are_dropped(self):
+        index = RangeIndex()
+        column = np.array([10, 20], dtype=np.int64)
+        index.build(column, np.arange(2))
+        column[0] = 50
+        index.add(50, 0)
+        assert index.rows_between(None, 30, column).tolist() == [1]
+        assert index.rows_between(40, None, column).tolist() == [0]
+
+    def test_tail_asks_for_merge_when_large(self):
+        index = RangeIndex()
+        due = [index.add(key, key) for key in range(5000)]
+        assert not due[0] and due[-1]
+
+
+class TestColumnWindows:
+
+    def test_windows_match_a_linear_filter(self):
+        rng = random.Random(3)
+        columns = PromptColumns()
+        live = {}
+        for step in range(12000):
+            index = rng.randrange(3000)
+            if rng.random() < 0.1:
+                columns.remove(f"p{index}")
+                live.pop(f"p{index}", None)
+            else:
+                prompt = make_prompt(index, rng.randrange(500), rng.randrange(500, 1000))
+                columns.upsert(prompt)
+                live[prompt.id] = prompt
+        for low, high in ((100, 200), (None, 50), (450, None)):
+            expected = {prompt_id for prompt_id, prompt in live.items()
+                        if (low is None or prompt.created_at >= minutes(low))
+                        and (high is None or prompt.created_at < minutes(high))}
+            selection = columns.select(created_after=low and minutes(low),
+                                       created_before=high and minutes(high))
+            assert set(selection.ordered_ids()) == expected
+
+    def test_updated_window_follows_updates(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt(1, 0, 10))
+        columns.upsert(make_prompt(2, 0, 10))
+        columns.upsert(make_prompt(1, 0, 90))
+        assert columns.select(updated_after=minutes(60)).ordered_ids() == ["p1"]
+        assert columns.select(updated_before=minutes(60)).ordered_ids() == ["p2"]
+
+    def test_windows_combine_with_tags(self):
+        columns = PromptColumns()
+        columns.rebuild([make_prompt(1, 5, tags=["a"]), make_prompt(2, 6, tags=["b"]),
+                         make_prompt(3, 50, tags=["a"])])
+        selection = columns.select(tag="a", created_before=minutes(10))
+        assert selection.ordered_ids() == ["p1"]
+
+
+class TestDateFilterApi:
+
+    def seed(self):
+        for index, created in enumerate((0, 60, 120, 180)):
+            storage.create_prompt(make_prompt(index, created, created + 1000))
+
+    def test_created_window_with_pagination(self, client):
+        self.seed()
+        body = client.get("/prompts", params={"created_after": minutes(60).isoformat(),
+                                              "created_before": minutes(180).isoformat(),
+                                              "limit": 1}).json()
+        assert body["total"] == 2
+        assert [prompt["id"] for prompt in body["prompts"]] == ["p2"]
+
+    def test_updated_since(self, client):
+        self.seed()
+        body = client.get("/prompts", params={"updated_after": minutes(1120).isoformat()}).json()
+        assert [prompt["id"] for prompt in body["prompts"]] == ["p3", "p2"]
+
+    def test_timezone_offsets_are_converted_to_utc(self, client):
+        self.seed()
+        body = client.get("/prompts", params={"created_before": "2024-01-01T02:30:00+02:00"}).json()
+        assert [prompt["id"] for prompt in body["prompts"]] == ["p0"]
+
+    def test_invalid_datetime_is_422(self, client):
+        assert client.get("/prompts?created_after=yesterday").status_code == 422
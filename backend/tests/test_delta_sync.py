@@ -0,0 +1,185 @@
+"""Tests for delta sync: the change log, tombstones and GET /prompts/changes."""
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.config import Settings
+from app import indexes as indexes_module
+from app.indexes import ChangeLog
+from app.models import Prompt
+from app.storage import Storage, WatermarkExpired
+
+
+def make_prompt(prompt_id, title="T"):
+    return Prompt(id=prompt_id, title=title, content="Body")
+
+
+class TestChangeLog:
+
+    def test_latest_write_per_prompt_in_sequence_order(self):
+        log = ChangeLog()
+        for prompt_id in ("a", "b", "a", "c"):
+            log.record(prompt_id)
+        changes, _, watermark, _, has_more = log.changes(None, 0, 10)
+        assert [prompt_id for prompt_id, _ in changes] == ["b", "a", "c"]
+        assert (watermark, has_more) == (4, False)
+
+    def test_resumes_after_watermark_with_limit(self):
+        log = ChangeLog()
+        for prompt_id in "abcde":
+            log.record(prompt_id)
+        changes, epoch, watermark, _, has_more = log.changes(None, 1, 2)
+        assert [prompt_id for prompt_id, _ in changes] == ["b", "c"]
+        assert (watermark, has_more) == (3, True)
+        changes, _, watermark, _, has_more = log.changes(epoch, watermark, 10)
+        assert [prompt_id for prompt_id, _ in changes] == ["d", "e"]
+        assert (watermark, has_more) == (5, False)
+
+    def test_delete_leaves_tombstone(self):
+        log = ChangeLog()
+        log.record("a")
+        deleted_at = datetime(2024, 1, 1)
+        log.record_delete("a", deleted_at)
+        changes = log.changes(None, 0, 10, now=deleted_at)[0]
+        assert changes == [("a", deleted_at)]
+
+    def test_expired_tombstones_move_the_horizon(self):
+        log = ChangeLog(retention=60)
+        log.record("a")
+        log.record("b")
+        deleted_at = datetime(2024, 1, 1)
+        log.record_delete("a", deleted_at)
+        later = deleted_at + timedelta(minutes=5)
+        assert log.changes(None, 0, 10, now=later) is None
+        changes, _, watermark, _, _ = log.changes(None, 3, 10, now=later)
+        assert (changes, watermark) == ([], 3)
+        assert len(log) == 1
+
+    def test_full_sync_pages_past_expired_tombstones(self):
+        log = ChangeLog(retention=60)
+        for prompt_id in "abc":
+            log.record(prompt_id)
+        deleted_at = datetime(2024, 1, 1)
+        log.record_delete("b", deleted_at)
+        later = deleted_at + timedelta(minutes=5)
+        changes, epoch, watermark, floor, has_more = log.changes(None, None, 1, now=later)
+        assert (changes, watermark, floor, has_more) == ([("a", None)], 1, 4, True)
+        assert log.changes(epoch, watermark, 10, now=later) is None
+        changes, _, watermark, _, has_more = log.changes(epoch, watermark, 10, now=later,
+                                                         floor=floor)
+        assert (changes, watermark, has_more) == ([("c", None)], 4, False)
+
+    def test_superseded_entries_are_compacted(self):
+        log = ChangeLog()
+        for _ in range(5000):
+            log.record("a")
+        assert len(log) < 2100
+
+    def test_other_epoch_is_rejected(self):
+        log = ChangeLog()
+        log.record("a")
+        assert log.changes("other", 0, 10) is None
+
+
+class TestStorageChanges:
+
+    def test_full_then_incremental_sync(self):
+        storage = Storage()
+        storage.create_prompt(make_prompt("a"))
+        storage.create_prompt(make_prompt("b"))
+        prompts, deleted, watermark, _ = storage.prompt_changes()
+        assert [prompt.id for prompt in prompts] == ["a", "b"]
+
+        storage.update_prompt("a", make_prompt("a", "New"))
+        storage.delete_prompt("b")
+        prompts, deleted, watermark, has_more = storage.prompt_changes(watermark)
+        assert [(prompt.id, prompt.title) for prompt in prompts] == [("a", "New")]
+        assert [prompt_id for prompt_id, _ in deleted] == ["b"]
+        assert storage.prompt_changes(watermark)[:2] == ([], [])
+
+    def test_bulk_update_is_a_change(self):
+        storage = Storage()
+        storage.create_prompt(make_prompt("a"))
+        watermark = storage.prompt_changes()[2]
+        storage.bulk_update_prompts(["a"], add_tags=["x"])
+        prompts = storage.prompt_changes(watermark)[0]
+        assert prompts[0].tags == ["x"]
+
+    def test_reload_expires_watermarks(self):
+        storage = Storage()
+        storage.create_prompt(make_prompt("a"))
+        watermark = storage.prompt_changes()[2]
+        storage.bulk_load([make_prompt("a")], [])
+        with pytest.raises(WatermarkExpired):
+            storage.prompt_changes(watermark)
+
+    def test_malformed_watermark(self):
+        with pytest.raises(ValueError):
+            Storage().prompt_changes("nonsense")
+
+
+class TestChangesApi:
+
+    def test_sync_round_trip(self, client, sample_prompt_data):
+        first = client.post("/prompts", json=sample_prompt_data).json()
+        second = client.post("/prompts", json=sample_prompt_data).json()
+        body = client.get("/prompts/changes").json()
+        assert [prompt["id"] for prompt in body["changes"]] == [first["id"], second["id"]]
+        assert body["deleted"] == [] and body["has_more"] is False
+
+        client.patch(f"/prompts/{first['id']}", json={"title": "Renamed"})
+        client.delete(f"/prompts/{second['id']}")
+        delta = client.get(f"/prompts/changes?since={body['watermark']}").json()
+        assert [prompt["title"] for prompt in delta["changes"]] == ["Renamed"]
+        assert [tombstone["id"] for tombstone in delta["deleted"]] == [second["id"]]
+
+    def test_limit_pages_through_changes(self, client, sample_prompt_data):
+        for _ in range(3):
+            client.post("/prompts", json=sample_prompt_data)
+        page = client.get("/prompts/changes?limit=2").json()
+        assert len(page["changes"]) == 2 and page["has_more"] is True
+        rest = client.get(f"/prompts/changes?since={page['watermark']}&limit=2").json()
+        assert len(rest["changes"]) == 1 and rest["has_more"] is False
+
+    @pytest.fixture
+    def expiring_client(self, monkeypatch):
+        client = TestClient(create_app(Settings(tombstone_retention=60), storage=Storage()))
+
+        def expire_tombstones():
+            later = datetime.utcnow() + timedelta(minutes=5)
+            monkeypatch.setattr(indexes_module, "get_current_time", lambda: later)
+        return client, expire_tombstones
+
+    def test_full_sync_after_a_tombstone_expires(self, expiring_client, sample_prompt_data):
+        client, expire_tombstones = expiring_client
+        first = client.post("/prompts", json=sample_prompt_data).json()
+        second = client.post("/prompts", json=sample_prompt_data).json()
+        client.delete(f"/prompts/{second['id']}")
+        expire_tombstones()
+        response = client.get("/prompts/changes")
+        assert response.status_code == 200
+        body = response.json()
+        assert [prompt["id"] for prompt in body["changes"]] == [first["id"]]
+        assert body["deleted"] == [] and body["has_more"] is False
+        assert client.get(f"/prompts/changes?since={body['watermark']}").status_code == 200
+
+    def test_paged_full_sync_after_a_tombstone_expires(self, expiring_client, sample_prompt_data):
+        client, expire_tombstones = expiring_client
+        ids = [client.post("/prompts", json=sample_prompt_data).json()["id"] for _ in range(3)]
+        client.delete(f"/prompts/{ids[2]}")
+        expire_tombstones()
+        page = client.get("/prompts/changes?limit=1").json()
+        assert [prompt["id"] for prompt in page["changes"]] == ids[:1] and page["has_more"]
+        rest = client.get(f"/prompts/changes?since={page['watermark']}").json()
+        assert [prompt["id"] for prompt in rest["changes"]] == ids[1:2]
+        assert rest["has_more"] is False
+
+    def test_invalid_watermark_is_400(self, client):
+        assert client.get("/prompts/changes?since=abc").status_code == 400
+
+    def test_stale_watermark_is_410(self, client):
+        response = client.get("/prompts/changes?since=0123456789ab.0")
+        assert response.status_code == 410
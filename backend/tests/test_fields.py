@@ -0,0 +1,81 @@
+"""Tests for sparse field projection on the prompt read endpoints."""
+
+from fastapi.testclient import TestClient
+
+
+class TestListPromptsFields:
+
+    def test_list_returns_only_selected_fields(self, client: TestClient, sample_prompt_data):
+        client.post("/prompts", json={**sample_prompt_data, "tags": ["ai"]})
+        data = client.get("/prompts?fields=id,title,tags,updated_at").json()
+        assert data["total"] == 1
+        assert set(data["prompts"][0]) == {"id", "title", "tags", "updated_at"}
+        assert data["prompts"][0]["tags"] == ["ai"]
+
+    def test_projected_values_match_full_response(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data)
+        full = client.get("/prompts").json()["prompts"][0]
+        projected = client.get("/prompts?fields=created_at,title").json()["prompts"][0]
+        assert projected == {"title": full["title"], "created_at": full["created_at"]}
+
+    def test_fields_compose_with_filters_and_sorting(self, client):
+        client.post("/prompts", json={"title": "Alpha", "content": "First content", "tags": ["x"]})
+        client.post("/prompts", json={"title": "Beta", "content": "Second content"})
+        data = client.get("/prompts?tag=x&fields=title").json()
+        assert data == {"prompts": [{"title": "Alpha"}], "total": 1}
+
+    def test_whitespace_and_duplicates_are_tolerated(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data)
+        prompt = client.get("/prompts?fields= id , id,title").json()["prompts"][0]
+        assert list(prompt) == ["title", "id"]  # full-response field order
+
+    def test_unknown_field_returns_400(self, client):
+        response = client.get("/prompts?fields=id,secret")
+        assert response.status_code == 400
+        assert "secret" in response.json()["detail"]
+
+    def test_empty_fields_returns_full_prompts(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data)
+        prompt = client.get("/prompts?fields=").json()["prompts"][0]
+        assert "content" in prompt
+
+
+class TestGetPromptFields:
+
+    def test_get_returns_only_selected_fields(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        data = client.get(f"/prompts/{prompt_id}?fields=id,description").json()
+        assert data == {"id": prompt_id, "description": sample_prompt_data["description"]}
+
+    def test_get_not_found_with_fields(self, client):
+        response = client.get("/prompts/missing?fields=id")
+        assert response.status_code == 404
+
+    def test_get_unknown_field_returns_400(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        assert client.get(f"/prompts/{prompt_id}?fields=nope").status_code == 400
+
+
+class TestOpenApi:
+
+    def test_fields_parameter_is_documented(self, client):
+        schema = client.get("/openapi.json").json()
+        for path in ("/prompts", "/prompts/{prompt_id}"):
+            parameters = schema["paths"][path]["get"]["parameters"]
+            assert "fields" in [parameter["name"] for parameter in parameters]
+
+    def test_projected_shapes_are_documented(self, client):
+        schema = client.get("/openapi.json").json()
+        expected = {"/prompts": {"PromptList", "PromptProjectionList"},
+                    "/prompts:search": {"PromptList", "PromptProjectionList"},
+                    "/prompts/{prompt_id}": {"Prompt", "PromptProjection"}}
+        for path, names in expected.items():
+            response = schema["paths"][path]["get"]["responses"]["200"]
+            options = response["content"]["application/json"]["schema"]["anyOf"]
+            assert {option["$ref"].rsplit("/", 1)[1] for option in options} == names
+
+    def test_projection_schema_has_every_prompt_field_optional(self, client):
+        components = client.get("/openapi.json").json()["components"]["schemas"]
+        projection = components["PromptProjection"]
+        assert set(projection["properties"]) == set(components["Prompt"]["properties"])
+        assert not projection.get("required")
@@ -0,0 +1,137 @@
+"""Tests for the background job runner and asynchronous collection deletes."""
+
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.config import Settings
+from app.jobs import JobQueueFull, JobRunner
+
+
+def batches(count, size=1, gate=None):
+    def steps():
+        for _ in range(count):
+            if gate is not None:
+                gate.wait()
+            yield size
+    return steps
+
+
+class TestJobRunner:
+
+    def test_runs_to_completion_with_progress(self):
+        runner = JobRunner(workers=1, batch_pause=0)
+        job = runner.submit("test", batches(4, size=5), total=20)
+        finished = runner.wait(job.id, timeout=5)
+        assert finished.status == "succeeded"
+        assert (finished.done, finished.total) == (20, 20)
+        assert finished.started_at is not None and finished.finished_at is not None
+        runner.shutdown()
+
+    def test_failure_is_recorded(self):
+        def steps():
+            yield 1
+            raise ValueError("boom")
+
+        runner = JobRunner(workers=1, batch_pause=0)
+        finished = runner.wait(runner.submit("test", steps).id, timeout=5)
+        assert finished.status == "failed"
+        assert finished.error == "ValueError: boom"
+        assert finished.done == 1
+        runner.shutdown()
+
+    def test_cancel_stops_at_batch_boundary(self):
+        gate = threading.Event()
+        runner = JobRunner(workers=1, batch_pause=0)
+        job = runner.submit("test", batches(100, gate=gate), total=100)
+        assert runner.cancel(job.id).cancel_requested
+        gate.set()
+        finished = runner.wait(job.id, timeout=5)
+        assert finished.status == "cancelled"
+        assert finished.done < 100
+        runner.shutdown()
+
+    def test_queued_job_is_cancelled_immediately(self):
+        gate = threading.Event()
+        runner = JobRunner(workers=1, batch_pause=0)
+        runner.submit("blocker", batches(1, gate=gate))
+        queued = runner.submit("test", batches(1))
+        assert runner.cancel(queued.id).status == "cancelled"
+        gate.set()
+        runner.shutdown()
+        assert runner.get(queued.id).done == 0
+
+    def test_bounded_queue(self):
+        gate = threading.Event()
+        runner = JobRunner(workers=1, max_queued=1, batch_pause=0)
+        runner.submit("blocker", batches(1, gate=gate))
+        with pytest.raises(JobQueueFull):
+            for _ in range(3):
+                runner.submit("test", batches(1))
+        gate.set()
+        runner.shutdown()
+
+    def test_finished_jobs_expire(self):
+        runner = JobRunner(workers=1, max_finished=2, batch_pause=0)
+        ids = [runner.submit("test", batches(1)).id for _ in range(3)]
+        runner.wait(ids[2], timeout=5)
+        runner.shutdown()
+        assert runner.get(ids[0]) is None
+        assert runner.get(ids[2]).status == "succeeded"
+
+    def test_unknown_job(self):
+        runner = JobRunner()
+        assert runner.get("missing") is None
+        assert runner.cancel("missing") is None
+
+
+@pytest.fixture
+def async_client():
+    application = create_app(Settings(job_inline_limit=2, job_batch_size=2))
+    with TestClient(application) as client:
+        yield client
+
+
+class TestCollectionDeleteJobs:
+
+    def fill(self, client, count):
+        collection_id = client.post("/collections", json={"name": "Big"}).json()["id"]
+        for index in range(count):
+            client.post("/prompts", json={"title": f"P{index}", "content": "Body",
+                                          "collection_id": collection_id})
+        return collection_id
+
+    def test_small_collection_is_deleted_inline(self, async_client):
+        collection_id = self.fill(async_client, 2)
+        assert async_client.delete(f"/collections/{collection_id}").status_code == 204
+        assert async_client.get(f"/collections/{collection_id}").status_code == 404
+
+    def test_large_collection_returns_202_and_job(self, async_client):
+        collection_id = self.fill(async_client, 5)
+        async_client.post("/prompts", json={"title": "Other", "content": "Body"})
+        response = async_client.delete(f"/collections/{collection_id}")
+        assert response.status_code == 202
+        job = response.json()
+        assert job["kind"] == "delete_collection"
+        assert job["total"] == 5
+        assert response.headers["location"] == f"/jobs/{job['id']}"
+
+        finished = async_client.app.state.jobs.wait(job["id"], timeout=5)
+        assert finished.status == "succeeded"
+        status = async_client.get(f"/jobs/{job['id']}").json()
+        assert (status["status"], status["done"]) == ("succeeded", 5)
+        assert async_client.get(f"/collections/{collection_id}").status_code == 404
+        assert [p["title"] for p in async_client.get("/prompts").json()["prompts"]] == ["Other"]
+
+    def test_cancel_finished_job_is_409(self, async_client):
+        collection_id = self.fill(async_client, 3)
+        job_id = async_client.delete(f"/collections/{collection_id}").json()["id"]
+        async_client.app.state.jobs.wait(job_id, timeout=5)
+        response = async_client.post(f"/jobs/{job_id}:cancel")
+        assert response.status_code == 409
+
+    def test_unknown_job_is_404(self, async_client):
+        assert async_client.get("/jobs/missing").status_code == 404
+        assert async_client.post("/jobs/missing:cancel").status_code == 404
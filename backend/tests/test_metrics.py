@@ -0,0 +1,132 @@
+"""Tests for the /metrics endpoint and the metrics primitives."""
+
+import threading
+
+import pytest
+
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.config import Settings
+from app.metrics import Counter, Gauge, Histogram, Registry
+from app.models import Prompt
+from app.storage import Storage
+
+
+class TestPrimitives:
+    """Counters, gauges and histograms render valid exposition text."""
+
+    def test_counter_sums_across_threads(self):
+        counter = Counter("test_total", "A test counter.", ("kind",))
+        child = counter.labels("a")
+
+        def work():
+            for _ in range(1000):
+                child.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert child.value == 8000
+
+    def test_exited_threads_fold_into_the_total(self):
+        counter = Counter("test_churn_total", "A counter written by short-lived threads.")
+        child = counter.labels()
+        for _ in range(50):
+            thread = threading.Thread(target=child.inc, args=(2,))
+            thread.start()
+            thread.join()
+        child.inc()
+        assert child.value == 101
+        assert len(child._cells._shards) == 1
+
+    def test_gauge_inc_and_dec(self):
+        gauge = Gauge("test_gauge", "A test gauge.")
+        child = gauge.labels()
+        child.inc(3)
+        child.dec()
+        assert child.value == 2
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = Histogram("test_seconds", "A test histogram.", buckets=(0.1, 1.0))
+        child = histogram.labels()
+        for value in (0.05, 0.5, 5.0):
+            child.observe(value)
+        lines = histogram.render()
+        assert 'test_seconds_bucket{le="0.1"} 1' in lines
+        assert 'test_seconds_bucket{le="1.0"} 2' in lines
+        assert 'test_seconds_bucket{le="+Inf"} 3' in lines
+        assert "test_seconds_count 3" in lines
+
+    def test_labels_require_matching_arity(self):
+        counter = Counter("test_arity_total", "Arity check.", ("a", "b"))
+        with pytest.raises(ValueError):
+            counter.labels("only-one")
+
+    def test_registry_renders_help_and_type(self):
+        registry = Registry()
+        registry.register(Counter("test_render_total", "Rendered counter.")).labels().inc()
+        text = registry.render()
+        assert "# HELP test_render_total Rendered counter." in text
+        assert "# TYPE test_render_total counter" in text
+        assert "test_render_total 1" in text
+
+
+class TestMetricsEndpoint:
+    """GET /metrics exposes request and storage metrics."""
+
+    def test_metrics_returns_prometheus_text(self, client):
+        response = client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+
+    def test_metrics_counts_requests_by_route_template(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        client.get(f"/prompts/{prompt_id}")
+        text = client.get("/metrics").text
+        assert 'route="/prompts/{prompt_id}"' in text
+        assert prompt_id not in text
+        assert "promptlab_http_request_duration_seconds_bucket" in text
+
+    def test_metrics_exposes_storage_operations(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data)
+        text = client.get("/metrics").text
+        assert 'promptlab_storage_operations_total{operation="create_prompt"}' in text
+        assert 'promptlab_storage_operation_duration_seconds_count{operation="create_prompt"}' in text
+
+    def test_metrics_exposes_storage_sizes(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data)
+        text = client.get("/metrics").text
+        assert 'promptlab_storage_entries{tenant="default",structure="prompts"} 1' in text
+
+    def test_each_application_reports_its_own_storage(self):
+        first, second = Storage(), Storage()
+        second.create_prompt(Prompt(title="Only here", content="Body"))
+        first_client = TestClient(create_app(Settings(), storage=first))
+        second_client = TestClient(create_app(Settings(), storage=second))
+        entries = 'promptlab_storage_entries{tenant="default",structure="prompts"}'
+        assert f"{entries} 0" in first_client.get("/metrics").text
+        text = second_client.get("/metrics").text
+        assert text.count(f"{entries} ") == 1
+        assert f"{entries} 1" in text
+
+    def test_storage_sizes_cover_every_tenant(self, sample_prompt_data):
+        client = TestClient(create_app(Settings(tenants_enabled=True), storage=Storage()))
+        client.post("/tenants/acme/prompts", json=sample_prompt_data)
+        text = client.get("/metrics").text
+        assert 'promptlab_storage_entries{tenant="acme",structure="prompts"} 1' in text
+        assert 'promptlab_storage_entries{tenant="default",structure="prompts"} 0' in text
+
+    def test_unknown_methods_share_one_label(self, client):
+        for method in ("FOO", "BAR"):
+            client.request(method, "/prompts")
+        text = client.get("/metrics").text
+        assert 'method="other",route="/prompts"' in text
+        assert 'method="FOO"' not in text and 'method="BAR"' not in text
+
+    def test_metrics_exposes_in_flight_gauge(self, client):
+        text = client.get("/metrics").text
+        # The scrape itself is in flight while it renders.
+        assert 'promptlab_http_requests_in_flight{method="GET"} 1' in text
@@ -0,0 +1,171 @@
+"""Tests for snapshot reads: pinned versions, the version log and consistent listings."""
+
+import threading
+
+from app.blobstore import BlobStore
+from app.columns import PromptColumns
+from app.indexes import VersionLog
+from app.models import Prompt
+from app.storage import Storage, storage as shared_storage
+
+
+def make_prompt(title, tags=(), content="Body text"):
+    return Prompt(title=title, content=content, tags=list(tags))
+
+
+class TestVersionLog:
+
+    def test_records_nothing_while_unpinned(self):
+        storage = Storage()
+        prompt = storage.create_prompt(make_prompt("A"))
+        storage.update_prompt(prompt.id, prompt.model_copy(update={"title": "B"}))
+        assert storage.sizes()["versions"] == 0
+
+    def test_as_of_finds_the_oldest_newer_entry(self):
+        log = VersionLog()
+        first, second = make_prompt("v1"), make_prompt("v2")
+        log.record("p", 3, None)
+        log.record("p", 5, first)
+        log.record("p", 8, second)
+        assert log.as_of("p", 2) == (True, None)
+        assert log.as_of("p", 4) == (True, first)
+        assert log.as_of("p", 7) == (True, second)
+        assert log.as_of("p", 8) == (False, None)
+        assert log.changed(4) == ["p"] and log.changed(8) == []
+        assert log.changed(5, 7) == []
+
+    def test_unpin_reclaims_entries_no_reader_needs(self):
+        log = VersionLog()
+        with log.lock:
+            log.pin(1)
+            log.pin(4)
+        log.record("p", 2, None)
+        log.record("q", 6, None)
+        log.unpin(1)
+        assert len(log) == 1 and log.changed(0) == ["q"]
+        log.unpin(4)
+        assert len(log) == 0
+
+
+class TestStoreView:
+
+    def test_view_ignores_later_writes(self):
+        storage = Storage()
+        kept = storage.create_prompt(make_prompt("Kept", ["a"]))
+        doomed = storage.create_prompt(make_prompt("Doomed", ["a"]))
+        with storage.snapshot() as view:
+            storage.update_prompt(kept.id, kept.model_copy(update={"title": "Renamed"}))
+            storage.delete_prompt(doomed.id)
+            storage.create_prompt(make_prompt("New", ["a"]))
+            assert view.get_prompt(kept.id).title == "Kept"
+            assert view.get_prompt(doomed.id).title == "Doomed"
+            assert {prompt.title for prompt in view.get_all_prompts()} == {"Kept", "Doomed"}
+            assert storage.sizes()["versions"] == 3
+        assert storage.get_prompt(kept.id).title == "Renamed"
+        assert storage.sizes()["versions"] == 0
+
+    def test_select_is_corrected_to_the_view(self):
+        storage = Storage()
+        moved = storage.create_prompt(make_prompt("Moved", ["a"]))
+        stays = storage.create_prompt(make_prompt("Stays", ["a"]))
+        with storage.snapshot() as view:
+            storage.update_prompt(moved.id, moved.model_copy(update={"tags": ["b"]}))
+            late = storage.create_prompt(make_prompt("Late", ["a"]))
+            selection = view.select_prompts(tag="a")
+            assert selection.ordered_ids() == [stays.id, moved.id]
+            assert view.select_prompts(tag="b").ordered_ids() == []
+        assert set(storage.select_prompts(tag="a").ordered_ids()) == {stays.id, late.id}
+
+    def test_view_without_writes_uses_the_live_selection(self):
+        storage = Storage()
+        storage.create_prompt(make_prompt("A", ["a"]))
+        with storage.snapshot() as view:
+            assert view.select_prompts(tag="a").version == view.version
+
+    def test_replaced_blob_bodies_stay_readable(self, tmp_path):
+        storage = Storage()
+        storage.attach_blob_store(BlobStore(str(tmp_path), threshold=16))
+        prompt = storage.create_prompt(make_prompt("Big", content="x" * 100))
+        with storage.snapshot() as view:
+            storage.update_prompt(prompt.id, prompt.model_copy(update={"content": "y" * 100}))
+            stub = view.get_prompts([prompt.id], load_content=False)
+            assert view.with_content(stub)[0].content == "x" * 100
+        assert storage.get_prompt(prompt.id).content == "y" * 100
+
+    def test_clear_leaves_views_on_the_old_store(self):
+        storage = Storage()
+        prompt = storage.create_prompt(make_prompt("A"))
+        with storage.snapshot() as view:
+            storage.clear()
+            assert view.get_prompt(prompt.id).title == "A"
+        assert storage.get_all_prompts() == []
+
+    def test_columns_count_versions(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt("A"))
+        columns.remove("missing")
+        assert columns.version == 2
+        assert columns.select().version == 2
+
+
+class TestPublishLock:
+
+    def test_blob_io_runs_outside_the_version_lock(self, tmp_path):
+        storage = Storage()
+        blobs = BlobStore(str(tmp_path), threshold=16)
+        storage.attach_blob_store(blobs)
+        prompt = storage.create_prompt(make_prompt("Big", content="x" * 100))
+        held = []
+        for name in ("put", "get"):
+            original = getattr(blobs, name)
+
+            def spy(*args, _original=original):
+                held.append(storage._versions.lock.locked())
+                return _original(*args)
+            setattr(blobs, name, spy)
+        with storage.snapshot():
+            storage.update_prompt(prompt.id, prompt.model_copy(update={"content": "y" * 100}))
+        assert held and not any(held)
+
+    def test_body_written_before_a_compaction_survives_it(self, tmp_path):
+        storage = Storage()
+        storage.attach_blob_store(BlobStore(str(tmp_path), threshold=16))
+        prompt = storage.create_prompt(make_prompt("Big", content="x" * 100))
+        storage.delete_prompt(storage.create_prompt(make_prompt("Gone", content="z" * 100)).id)
+        replacement = prompt.model_copy(update={"content": "y" * 100})
+        record, ref = storage._spill(replacement)
+        assert storage.compact_blobs()
+        storage._prompts[prompt.id] = storage._place(replacement, record, ref)
+        storage.compact_blobs()
+        assert storage.get_prompt(prompt.id).content == "y" * 100
+
+
+class TestConsistentListing:
+
+    def test_listings_never_tear_under_writes(self, client, sample_prompt_data):
+        ids = [client.post("/prompts", json={**sample_prompt_data, "tags": ["a"]}).json()["id"]
+               for _ in range(20)]
+        stop = threading.Event()
+
+        def writer(offset):
+            flip = 0
+            while not stop.is_set():
+                for prompt_id in ids[offset::2]:
+                    current = shared_storage.get_prompt(prompt_id)
+                    shared_storage.update_prompt(prompt_id, current.model_copy(
+                        update={"tags": ["b" if flip else "a"], "title": f"T{flip}"}))
+                flip ^= 1
+
+        threads = [threading.Thread(target=writer, args=(offset,)) for offset in (0, 1)]
+        for thread in threads:
+            thread.start()
+        try:
+            for _ in range(50):
+                body = client.get("/prompts?tag=a").json()
+                assert body["total"] == len(body["prompts"])
+                assert all(prompt["tags"] == ["a"] for prompt in body["prompts"])
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
+        assert shared_storage.sizes()["versions"] == 0
@@ -0,0 +1,151 @@
+"""Tests for MinHash/LSH near-duplicate detection."""
+
+import time
+
+import pytest
+
+from app.minhash import choose_bands, shingles, signature, similarity
+from app.models import Prompt
+from app.storage import IndexNotReady, Storage, storage as shared_storage
+
+BASE = ("You are a senior reviewer. Read the pull request below and list every bug, "
+        "security issue and performance problem you find, ordered by severity, with a "
+        "one sentence explanation and a suggested fix for each of them")
+VARIANT = BASE.replace("senior reviewer", "senior code reviewer")
+OTHER = ("Write a short friendly email to a customer thanking them for their order and "
+         "letting them know when the package will arrive at their address next week")
+
+
+class TestMinHash:
+
+    def test_identical_texts_have_identical_signatures(self):
+        assert signature(BASE) == signature(BASE)
+
+    def test_similarity_tracks_overlap(self):
+        assert similarity(signature(BASE), signature(VARIANT)) > 0.7
+        assert similarity(signature(BASE), signature(OTHER)) < 0.2
+
+    def test_short_text_is_one_shingle(self):
+        assert shingles("Hi there") == ["hi there"]
+
+    def test_bands_midpoint_is_below_threshold(self):
+        bands, rows = choose_bands(0.8)
+        assert bands * rows == 64
+        assert (1 / bands) ** (1 / rows) <= 0.8
+
+
+class TestStorageNearDuplicates:
+
+    def filled(self) -> Storage:
+        storage = Storage()
+        storage.create_prompt(Prompt(id="base", title="Base", content=BASE))
+        storage.create_prompt(Prompt(id="variant", title="Variant", content=VARIANT))
+        storage.create_prompt(Prompt(id="copy", title="Copy", content=BASE))
+        storage.create_prompt(Prompt(id="other", title="Other", content=OTHER))
+        return storage
+
+    def test_finds_copies_and_variants(self):
+        matches = self.filled().find_near_duplicates("base", threshold=0.7)
+        assert [match_id for match_id, _ in matches] == ["copy", "variant"]
+        assert matches[0][1] == 1.0
+
+    def test_threshold_filters_matches(self):
+        matches = self.filled().find_near_duplicates("base", threshold=1.0)
+        assert [match_id for match_id, _ in matches] == ["copy"]
+
+    def test_missing_prompt_returns_none(self):
+        assert Storage().find_near_duplicates("missing") is None
+
+    def test_updates_and_deletes_maintain_index(self):
+        storage = self.filled()
+        storage.update_prompt("copy", Prompt(id="copy", title="Copy", content=OTHER))
+        storage.delete_prompt("variant")
+        matches = storage.find_near_duplicates("base", threshold=0.7)
+        assert matches == []
+        assert [m for m, _ in storage.find_near_duplicates("other")] == ["copy"]
+
+    def test_clusters_group_transitively(self):
+        storage = self.filled()
+        storage.create_prompt(Prompt(id="other-copy", title="Other copy", content=OTHER))
+        clusters = storage.near_duplicate_clusters(threshold=0.7)
+        assert clusters == [["base", "copy", "variant"], ["other", "other-copy"]]
+
+    def test_large_group_of_copies_is_one_cluster(self):
+        storage = Storage()
+        for index in range(200):
+            storage.create_prompt(Prompt(id=f"p{index:03d}", title="Same", content=BASE))
+        clusters = storage.near_duplicate_clusters()
+        assert len(clusters) == 1 and len(clusters[0]) == 200
+
+    def test_signatures_computed_in_background_after_bulk_load(self):
+        storage = Storage()
+        storage.bulk_load([Prompt(id="a", title="A", content=BASE),
+                           Prompt(id="b", title="B", content=BASE)], [])
+        storage.complete_signatures()
+        assert "a" in storage._near_duplicates
+        assert storage.find_near_duplicates("a") == [("b", 1.0)]
+
+    def test_queries_before_signatures_are_ready_raise(self):
+        storage = self.filled()
+        storage._near_duplicates.complete = False
+        with pytest.raises(IndexNotReady):
+            storage.find_near_duplicates("base")
+        with pytest.raises(IndexNotReady):
+            storage.near_duplicate_clusters()
+
+    def test_large_body_signature_is_fast(self):
+        text = " ".join(f"word{index % 5000}" for index in range(60_000))
+        began = time.perf_counter()
+        signature(text)
+        assert time.perf_counter() - began < 1.0
+
+    def test_threshold_change_rebands(self):
+        storage = self.filled()
+        storage.set_near_duplicate_threshold(0.5)
+        assert storage.near_duplicate_threshold == 0.5
+        assert len(storage.find_near_duplicates("base")) == 2
+
+
+class TestNearDuplicateApi:
+
+    def create(self, client, title, content):
+        return client.post("/prompts", json={"title": title, "content": content}).json()["id"]
+
+    def test_near_duplicates_endpoint(self, client):
+        base = self.create(client, "Base", BASE)
+        copy = self.create(client, "Copy", BASE)
+        self.create(client, "Other", OTHER)
+        body = client.get(f"/prompts/{base}/near-duplicates").json()
+        assert body["threshold"] == 0.8
+        assert body["duplicates"] == [{"id": copy, "title": "Copy", "similarity": 1.0}]
+        assert body["total"] == 1
+
+    def test_near_duplicates_of_missing_prompt_is_404(self, client):
+        assert client.get("/prompts/missing/near-duplicates").status_code == 404
+
+    def test_invalid_threshold_is_422(self, client):
+        base = self.create(client, "Base", BASE)
+        assert client.get(f"/prompts/{base}/near-duplicates?threshold=2").status_code == 422
+
+    def test_report_lists_clusters(self, client):
+        self.create(client, "Base", BASE)
+        self.create(client, "Variant", VARIANT)
+        self.create(client, "Other", OTHER)
+        body = client.get("/prompts:near-duplicates?threshold=0.7").json()
+        assert body["total"] == 1
+        assert body["duplicate_prompts"] == 2
+        assert body["clusters"][0]["size"] == 2
+
+    def test_building_index_is_503(self, client):
+        self.create(client, "Base", BASE)
+        shared_storage._near_duplicates.complete = False
+        response = client.get("/prompts:near-duplicates")
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "5"
+
+    def test_report_limit(self, client):
+        for content in (BASE, BASE, OTHER, OTHER):
+            self.create(client, "Prompt", content)
+        body = client.get("/prompts:near-duplicates?limit=1").json()
+        assert body["total"] == 2
+        assert len(body["clusters"]) == 1
@@ -0,0 +1,233 @@
+"""Tests for sharded content search over shared memory."""
+
+import gc
+import random
+import re
+from datetime import datetime, timedelta
+from multiprocessing.shared_memory import SharedMemory
+
+import pytest
+
+from app.models import Prompt
+from app.parallel import ShardedSearch, pack_records, scan, shard_of
+from app.storage import Storage
+
+
+def records(*texts):
+    return [(f"Title {index}", None, text, float(index)) for index, text in enumerate(texts)]
+
+
+def make_prompt(prompt_id, content, minutes=0, **extra):
+    created = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    return Prompt(id=prompt_id, title=f"Prompt {prompt_id}", content=content,
+                  created_at=created, updated_at=created, **extra)
+
+
+class TestShardOf:
+
+    def test_stable_and_in_range(self):
+        assert shard_of("abc-123", 32) == shard_of("abc-123", 32)
+        assert all(0 <= shard_of(str(index), 7) < 7 for index in range(100))
+
+
+class TestScan:
+
+    def test_substring_is_case_insensitive(self):
+        data = pack_records(records("Write a Haiku", "Summarize", "haiku again"))
+        count, top = scan(data, "HAIKU", False, 10)
+        assert count == 2
+        assert [index for _, index in top] == [2, 0]
+
+    def test_regex(self):
+        data = pack_records(records("step 1", "no steps", "step 22"))
+        count, top = scan(data, r"step \d+$", True, 10)
+        assert count == 2
+        assert sorted(index for _, index in top) == [0, 2]
+
+    def test_matches_do_not_span_records(self):
+        data = pack_records(records("ends with foo", "bar starts here"))
+        assert scan(data, "foo\nbar", False, 10)[0] == 0
+        assert scan(data, r"foo.*bar", True, 10)[0] == 0
+
+    def test_longer_match_is_rechecked_within_record(self):
+        data = pack_records(records("a b", "b"))
+        count, top = scan(data, r"a[^x]*b", True, 10)
+        assert count == 1
+
+    def test_limit_keeps_newest(self):
+        data = pack_records(records(*["match"] * 5))
+        count, top = scan(data, "match", False, 2)
+        assert count == 5
+        assert [index for _, index in top] == [4, 3]
+
+    def test_title_and_description_are_searched(self):
+        data = pack_records([("Greeting", "polite opener", "Hello", 0.0)])
+        assert scan(data, "greeting", False, 1)[0] == 1
+        assert scan(data, "opener", False, 1)[0] == 1
+
+    def test_empty_segment(self):
+        assert scan(pack_records([]), "x", False, 10) == (0, [])
+
+
+class TestShardedSearch:
+
+    def test_merges_top_k_across_shards(self):
+        texts = {f"id-{index}": (f"T{index}", None, "needle", float(index)) for index in range(40)}
+        search = ShardedSearch(num_shards=4)
+        search.reset(texts)
+        load = lambda ids: [(prompt_id, texts[prompt_id]) for prompt_id in ids]
+        try:
+            total, ids = search.search("needle", False, 3, load)
+        finally:
+            search.close()
+        assert total == 40
+        assert ids == ["id-39", "id-38", "id-37"]
+
+    def test_worker_pool_gives_same_result(self):
+        texts = {f"id-{index}": (f"T{index}", None, f"body {index % 3}", float(index))
+                 for index in range(30)}
+        load = lambda ids: [(prompt_id, texts[prompt_id]) for prompt_id in ids]
+        serial, pooled = ShardedSearch(num_shards=4), ShardedSearch(num_shards=4, workers=2)
+        try:
+            for search in (serial, pooled):
+                search.reset(texts)
+            assert pooled.search(r"body [12]", True, 5, load) == serial.search(r"body [12]", True, 5, load)
+        finally:
+            serial.close()
+            pooled.close()
+
+
+class TestShardDeltas:
+
+    def churn(self, search, texts, rng, steps):
+        for _ in range(steps):
+            prompt_id = f"id-{rng.randrange(60)}"
+            if rng.random() < 0.2:
+                if texts.pop(prompt_id, None) is not None:
+                    search.discard(prompt_id)
+            elif prompt_id in texts:
+                texts[prompt_id] = (prompt_id, None, rng.choice(["needle", "hay"]), texts[prompt_id][3])
+                search.touch(prompt_id)
+            else:
+                texts[prompt_id] = (prompt_id, None, rng.choice(["needle", "hay"]), rng.random())
+                search.add(prompt_id)
+
+    def expected(self, texts, limit):
+        hits = sorted((-record[3], prompt_id) for prompt_id, record in texts.items()
+                      if "needle" in record[2])
+        return len(hits), [prompt_id for _, prompt_id in hits[:limit]]
+
+    @pytest.mark.parametrize("workers", [0, 2])
+    def test_deltas_match_a_full_repack_under_writes(self, workers):
+        rng = random.Random(3)
+        texts = {}
+        search = ShardedSearch(num_shards=4, workers=workers, max_delta=8)
+        load = lambda ids: [(prompt_id, texts[prompt_id]) for prompt_id in ids if prompt_id in texts]
+        try:
+            for _ in range(30):
+                self.churn(search, texts, rng, rng.randrange(1, 20))
+                assert search.search("needle", False, 5, load) == self.expected(texts, 5)
+        finally:
+            search.close()
+
+    def test_writes_pack_only_the_changed_records(self):
+        texts = {f"id-{index}": (f"T{index}", None, "body", float(index)) for index in range(100)}
+        loaded = []
+
+        def load(ids):
+            loaded.extend(ids)
+            return [(prompt_id, texts[prompt_id]) for prompt_id in ids]
+
+        search = ShardedSearch(num_shards=4)
+        search.reset(texts)
+        search.search("body", False, 1, load)
+        loaded.clear()
+        texts["id-7"] = ("T7", None, "changed", 7.0)
+        search.touch("id-7")
+        assert search.search("body", False, 1, load)[0] == 99
+        assert loaded == ["id-7"]
+
+    def test_in_process_scans_use_no_shared_memory(self):
+        texts = {"a": ("A", None, "needle", 1.0)}
+        search = ShardedSearch(num_shards=2)
+        search.reset(texts)
+        search.search("needle", False, 1, lambda ids: [(i, texts[i]) for i in ids])
+        assert all(base.segment is None for base in search._bases)
+
+    def test_unclosed_segments_are_released(self):
+        texts = {"a": ("A", None, "needle", 1.0)}
+        search = ShardedSearch(num_shards=2, workers=1)
+        search.reset(texts)
+        search._release(search._acquire(lambda ids: [(i, texts[i]) for i in ids]))
+        names = [base.segment.name for base in search._bases]
+        del search
+        gc.collect()
+        for name in names:
+            with pytest.raises(FileNotFoundError):
+                SharedMemory(name=name)
+
+
+class TestStorageSearch:
+
+    def test_follows_writes_and_deletes(self):
+        storage = Storage()
+        try:
+            storage.create_prompt(make_prompt("a", "Explain recursion", minutes=1))
+            storage.create_prompt(make_prompt("b", "Explain closures", minutes=2))
+            assert storage.search_content("explain") == (2, ["b", "a"])
+
+            storage.update_prompt("a", make_prompt("a", "Describe recursion", minutes=1))
+            storage.delete_prompt("b")
+            assert storage.search_content("explain") == (0, [])
+            assert storage.search_content("describe") == (1, ["a"])
+        finally:
+            storage.close_search()
+
+    def test_bulk_load_and_clear(self):
+        storage = Storage()
+        try:
+            storage.bulk_load([make_prompt("a", "needle"), make_prompt("b", "hay")], [])
+            assert storage.search_content("needle") == (1, ["a"])
+            storage.clear()
+            assert storage.search_content("needle") == (0, [])
+        finally:
+            storage.close_search()
+
+    def test_invalid_regex_raises(self):
+        storage = Storage()
+        with pytest.raises(re.error):
+            storage.search_content("(", regex=True)
+
+
+class TestSearchApi:
+
+    def test_finds_prompts_by_content(self, client):
+        client.post("/prompts", json={"title": "One", "content": "Think step by step"})
+        client.post("/prompts", json={"title": "Two", "content": "Answer briefly"})
+        response = client.get("/prompts:search?q=STEP BY")
+        assert response.status_code == 200
+        body = response.json()
+        assert body["total"] == 1
+        assert body["prompts"][0]["title"] == "One"
+
+    def test_total_counts_beyond_limit(self, client):
+        for index in range(4):
+            client.post("/prompts", json={"title": f"P{index}", "content": "shared body"})
+        body = client.get("/prompts:search?q=shared&limit=2&fields=title").json()
+        assert body["total"] == 4
+        assert len(body["prompts"]) == 2
+        assert set(body["prompts"][0]) == {"title"}
+
+    def test_regex_search(self, client):
+        client.post("/prompts", json={"title": "One", "content": "Version 12"})
+        client.post("/prompts", json={"title": "Two", "content": "Version x"})
+        body = client.get("/prompts:search", params={"q": r"version \d+", "regex": "true"}).json()
+        assert [prompt["title"] for prompt in body["prompts"]] == ["One"]
+
+    def test_invalid_regex_is_400(self, client):
+        response = client.get("/prompts:search", params={"q": "(", "regex": "true"})
+        assert response.status_code == 400
+        assert response.json()["detail"].startswith("Invalid regular expression")
+
+    def test_query_is_required(self, client):
+        assert client.get("/prompts:search").status_code == 422
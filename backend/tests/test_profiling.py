@@ -0,0 +1,66 @@
+"""Tests for the per-request profiling hook."""
+
+import json
+
+import pytest
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.config import Settings
+from app.metrics import MetricsMiddleware
+from app.profiling import stage
+
+HEADER = {"X-PromptLab-Profile": "1"}
+
+
+@pytest.fixture
+def profiled_client(tmp_path):
+    settings = Settings(profiling_enabled=True, profile_dir=str(tmp_path))
+    return TestClient(create_app(settings))
+
+
+class TestProfilingEnabled:
+
+    def test_profiled_request_returns_server_timing(self, profiled_client, sample_prompt_data):
+        profiled_client.post("/prompts", json=sample_prompt_data)
+        response = profiled_client.get("/prompts?search=code", headers=HEADER)
+        assert response.status_code == 200
+        timing = response.headers["server-timing"]
+        for name in ("fetch", "filter", "search", "sort", "serialize", "total"):
+            assert f"{name};dur=" in timing
+
+    def test_profiled_request_writes_artifacts(self, profiled_client, tmp_path):
+        response = profiled_client.get("/prompts", headers=HEADER)
+        profile_id = response.headers["x-promptlab-profile-id"]
+        assert (tmp_path / f"{profile_id}.prof").exists()
+        summary = json.loads((tmp_path / f"{profile_id}.json").read_text())
+        assert summary["path"] == "/prompts"
+        assert summary["status"] == 200
+        assert "list_prompts" in summary["top_functions"]
+
+    def test_request_without_header_is_not_profiled(self, profiled_client, tmp_path):
+        response = profiled_client.get("/prompts")
+        assert "server-timing" not in response.headers
+        assert list(tmp_path.iterdir()) == []
+
+    def test_header_value_false_is_not_profiled(self, profiled_client):
+        response = profiled_client.get("/prompts", headers={"X-PromptLab-Profile": "0"})
+        assert "server-timing" not in response.headers
+
+
+class TestProfilingDisabled:
+
+    def test_disabled_settings_install_nothing(self):
+        disabled = create_app(Settings(profiling_enabled=False))
+        classes = [middleware.cls for middleware in disabled.user_middleware]
+        assert classes == [MetricsMiddleware, CORSMiddleware]
+
+    def test_header_ignored_when_disabled(self, client):
+        response = client.get("/prompts", headers=HEADER)
+        assert response.status_code == 200
+        assert "server-timing" not in response.headers
+
+    def test_stage_is_noop_outside_profiled_request(self):
+        with stage("fetch") as value:
+            assert value is None
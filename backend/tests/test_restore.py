@@ -0,0 +1,175 @@
+"""Tests for the mutation journal and point-in-time restore (POST /restore)."""
+
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.blobstore import BlobStore
+from app.indexes import JournalExpired, MutationJournal
+from app.models import Collection, Prompt, get_current_time
+from app.storage import Storage
+
+T0 = datetime(2024, 1, 1)
+
+
+def at(seconds):
+    return T0 + timedelta(seconds=seconds)
+
+
+def moment():
+    """A time strictly between the writes made before and after the call."""
+    time.sleep(0.002)
+    now = get_current_time()
+    time.sleep(0.002)
+    return now
+
+
+class TestMutationJournal:
+
+    def test_states_of_records_written_since(self):
+        journal = MutationJournal()
+        journal.reset(at(0))
+        v1, v2 = Prompt(title="v1", content="Body"), Prompt(title="v2", content="Body")
+        journal.record(("prompt", "p"), None, v1, now=at(10))
+        journal.record(("prompt", "p"), v1, v2, now=at(20))
+        journal.record(("prompt", "q"), v2, None, now=at(30))
+        assert journal.states_at(at(5)) == {("prompt", "p"): None, ("prompt", "q"): v2}
+        assert journal.states_at(at(15)) == {("prompt", "p"): v1, ("prompt", "q"): v2}
+        assert journal.states_at(at(30)) == {}
+        assert journal.states_at(at(15), [("prompt", "q"), ("prompt", "x")]) == {("prompt", "q"): v2}
+
+    def test_trimming_keeps_the_earlier_record(self):
+        journal = MutationJournal(max_entries=2)
+        journal.reset(at(0))
+        records = [Prompt(title=f"v{index}", content="Body") for index in range(3)]
+        journal.record(("prompt", "p"), None, records[0], now=at(10))
+        journal.record(("prompt", "p"), records[0], records[1], now=at(20))
+        journal.record(("prompt", "p"), records[1], records[2], now=at(30))
+        assert len(journal) == 2 and journal.horizon == at(10)
+        assert journal.states_at(at(15)) == {("prompt", "p"): records[0]}
+        with pytest.raises(JournalExpired):
+            journal.states_at(at(5))
+
+    def test_age_and_byte_bounds(self):
+        journal = MutationJournal(retention=60)
+        journal.reset(at(0))
+        record = Prompt(title="T", content="x" * 100)
+        journal.record(("prompt", "a"), None, record, now=at(0))
+        journal.record(("prompt", "b"), None, record, now=at(120))
+        assert len(journal) == 1
+        journal.max_bytes = 150
+        journal.record(("prompt", "c"), None, record, now=at(121))
+        assert len(journal) == 1 and journal.bytes == 101
+
+    def test_disabled(self):
+        journal = MutationJournal(max_entries=0)
+        journal.record(("prompt", "p"), None, Prompt(title="T", content="Body"))
+        assert len(journal) == 0
+        with pytest.raises(JournalExpired) as raised:
+            journal.states_at(get_current_time())
+        assert raised.value.horizon is None
+
+
+class TestStorageRestore:
+
+    def test_restores_deleted_and_overwritten_prompts(self):
+        storage = Storage()
+        kept = storage.create_prompt(Prompt(title="Kept", content="Original body"))
+        doomed = storage.create_prompt(Prompt(title="Doomed", content="Doomed body"))
+        as_of = moment()
+        storage.update_prompt(kept.id, kept.model_copy(update={"content": "Overwritten"}))
+        storage.delete_prompt(doomed.id)
+        late = storage.create_prompt(Prompt(title="Late", content="Late body"))
+
+        counts = storage.restore(as_of)
+        assert counts == {"prompts_restored": 2, "prompts_removed": 1,
+                          "collections_restored": 0, "collections_removed": 0}
+        assert storage.get_prompt(kept.id).content == "Original body"
+        assert storage.get_prompt(kept.id).revision == 3
+        assert storage.get_prompt(doomed.id).title == "Doomed"
+        assert storage.get_prompt(late.id) is None
+        assert storage.select_prompts().ordered_ids() == [doomed.id, kept.id]
+
+    def test_single_prompt_leaves_the_rest(self):
+        storage = Storage()
+        first = storage.create_prompt(Prompt(title="First", content="Body one"))
+        second = storage.create_prompt(Prompt(title="Second", content="Body two"))
+        as_of = moment()
+        storage.delete_prompt(first.id)
+        storage.delete_prompt(second.id)
+        storage.restore(as_of, prompt_id=first.id)
+        assert storage.get_prompt(first.id) is not None
+        assert storage.get_prompt(second.id) is None
+
+    def test_restore_can_be_undone(self):
+        storage = Storage()
+        prompt = storage.create_prompt(Prompt(title="A", content="Body"))
+        before_delete = moment()
+        storage.delete_prompt(prompt.id)
+        before_restore = moment()
+        storage.restore(before_delete)
+        storage.restore(before_restore)
+        assert storage.get_prompt(prompt.id) is None
+
+    def test_blob_stored_body_survives_metadata_change_and_delete(self, tmp_path):
+        storage = Storage()
+        storage.attach_blob_store(BlobStore(str(tmp_path), threshold=16))
+        storage.create_collection(Collection(id="c", name="C"))
+        prompt = storage.create_prompt(Prompt(title="Big", content="x" * 100))
+        storage.bulk_update_prompts([prompt.id], add_tags=["t"])
+        as_of = moment()
+        storage.delete_prompt(prompt.id)
+        storage.restore(as_of, prompt_id=prompt.id)
+        restored = storage.get_prompt(prompt.id)
+        assert restored.content == "x" * 100 and restored.tags == ["t"]
+
+    def test_clear_starts_a_new_history(self):
+        storage = Storage()
+        as_of = moment()
+        storage.clear()
+        with pytest.raises(JournalExpired):
+            storage.restore(as_of)
+
+
+class TestRestoreApi:
+
+    def test_undoes_a_collection_cascade(self, client, sample_prompt_data, sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        ids = [client.post("/prompts", json={**sample_prompt_data,
+                                             "collection_id": collection_id}).json()["id"]
+               for _ in range(3)]
+        outside = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        as_of = moment()
+        assert client.delete(f"/collections/{collection_id}").status_code == 204
+        client.delete(f"/prompts/{outside}")
+
+        response = client.post("/restore", params={"as_of": as_of.isoformat(),
+                                                   "collection_id": collection_id})
+        assert response.status_code == 200
+        assert response.json()["prompts_restored"] == 3
+        assert response.json()["collections_restored"] == 1
+        listed = client.get("/prompts", params={"collection_id": collection_id}).json()
+        assert sorted(prompt["id"] for prompt in listed["prompts"]) == sorted(ids)
+        assert client.get(f"/prompts/{outside}").status_code == 404
+
+    def test_prompt_comes_back_with_its_collection(self, client, sample_prompt_data,
+                                                    sample_collection_data):
+        collection_id = client.post("/collections", json=sample_collection_data).json()["id"]
+        prompt_id = client.post("/prompts", json={**sample_prompt_data,
+                                                  "collection_id": collection_id}).json()["id"]
+        as_of = moment()
+        client.delete(f"/collections/{collection_id}")
+        client.post("/restore", params={"as_of": as_of.isoformat(), "prompt_id": prompt_id})
+        assert client.get(f"/prompts/{prompt_id}").json()["collection_id"] == collection_id
+        assert client.get(f"/collections/{collection_id}").status_code == 200
+
+    def test_errors(self, client, sample_prompt_data):
+        now = get_current_time().isoformat()
+        both = client.post("/restore", params={"as_of": now, "prompt_id": "a", "collection_id": "b"})
+        assert both.status_code == 400
+        assert client.post("/restore", params={"as_of": now, "prompt_id": "nope"}).status_code == 404
+        old = client.post("/restore", params={"as_of": "2000-01-01T00:00:00"})
+        assert old.status_code == 410
+        assert "earliest restorable time" in old.json()["detail"]
+        assert client.post("/restore").status_code == 422
@@ -0,0 +1,127 @@
+"""Tests for the ordered sort indexes and title-sorted listings."""
+
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import columns as columns_module
+from app.blobstore import BlobStore
+from app.columns import ORDERED_KEYS, PromptColumns
+from app.models import Prompt
+from app.storage import Storage, StoreView
+
+
+def make_prompt(index, minutes, title):
+    created = datetime(2024, 1, 1) + timedelta(minutes=minutes)
+    return Prompt(id=f"p{index}", title=title, content="Body", created_at=created,
+                  updated_at=created)
+
+
+class TestOrderedIndex:
+
+    def test_pages_match_a_full_sort_under_churn(self, monkeypatch):
+        monkeypatch.setattr(columns_module, "_CHUNK", 4)
+        rng = random.Random(7)
+        columns = PromptColumns()
+        for step in range(600):
+            index = rng.randrange(80)
+            if rng.random() < 0.2:
+                columns.remove(f"p{index}")
+            else:
+                columns.upsert(make_prompt(index, rng.randrange(30), rng.choice("abcAB")))
+            if step % 50 == 0:
+                for key in ORDERED_KEYS:
+                    for descending in (True, False):
+                        expected = columns.select().ordered_ids(key, descending)
+                        offset = rng.randrange(max(1, len(expected)))
+                        page, total = columns.page(key, descending, offset, 7)
+                        assert total == len(expected)
+                        assert page == expected[offset:offset + 7]
+
+    def test_rebuild_matches_incremental_writes(self):
+        columns = PromptColumns()
+        prompts = [make_prompt(index, index % 3, f"T{index % 4}") for index in range(20)]
+        for prompt in prompts:
+            columns.upsert(prompt)
+        incremental = columns.page("title", False)
+        columns.rebuild(prompts)
+        assert columns.page("title", False) == incremental
+
+    def test_unindexed_key(self):
+        columns = PromptColumns()
+        assert columns.page("token_count", True) is None
+
+
+class TestTitleSort:
+
+    def test_titles_sort_case_insensitively(self):
+        columns = PromptColumns()
+        for index, title in enumerate(["beta", "Alpha", "gamma", "alpha"]):
+            columns.upsert(make_prompt(index, index, title))
+        assert columns.select().ordered_ids("title", False) == ["p1", "p3", "p0", "p2"]
+        assert columns.page("title", True)[0] == ["p2", "p0", "p1", "p3"]
+
+    def test_rename_moves_the_prompt(self):
+        storage = Storage()
+        first = storage.create_prompt(Prompt(title="A", content="Body"))
+        second = storage.create_prompt(Prompt(title="B", content="Body"))
+        storage.update_prompt(first.id, first.model_copy(update={"title": "C"}))
+        page, total = storage.page_prompts("title", descending=False, limit=10)
+        assert [prompt.id for prompt in page] == [second.id, first.id] and total == 2
+
+
+class TestPagedReads:
+
+    def test_page_is_loaded_outside_the_version_lock(self, tmp_path):
+        storage = Storage()
+        blobs = BlobStore(str(tmp_path), threshold=16)
+        storage.attach_blob_store(blobs)
+        storage.create_prompt(Prompt(title="Big", content="x" * 100))
+        original, held = blobs.get, []
+
+        def spy(ref):
+            held.append(storage._versions.lock.locked())
+            return original(ref)
+        blobs.get = spy
+        page, total = storage.page_prompts("title", limit=1)
+        assert page[0].content == "x" * 100 and held == [False]
+        assert storage.sizes()["versions"] == 0
+
+    def test_page_reads_the_pinned_version(self, monkeypatch):
+        storage = Storage()
+        first = storage.create_prompt(Prompt(title="A", content="Body"))
+        storage.create_prompt(Prompt(title="B", content="Body"))
+        original = StoreView.get_prompts
+
+        def write_then_read(view, prompt_ids, load_content=True):
+            storage.update_prompt(first.id, first.model_copy(update={"title": "Z"}))
+            return original(view, prompt_ids, load_content)
+        monkeypatch.setattr(StoreView, "get_prompts", write_then_read)
+        page, total = storage.page_prompts("title", descending=False, limit=1)
+        assert [prompt.title for prompt in page] == ["A"] and total == 2
+
+
+class TestSortedListing:
+
+    @pytest.fixture
+    def titles(self, client, sample_prompt_data):
+        for title in ["delta", "Bravo", "alpha", "charlie"]:
+            client.post("/prompts", json={**sample_prompt_data, "title": title})
+
+    def titles_of(self, client, **params):
+        body = client.get("/prompts", params=params).json()
+        return [prompt["title"] for prompt in body["prompts"]], body["total"]
+
+    def test_sort_by_title_with_paging(self, client, titles):
+        assert self.titles_of(client, sort="title", limit=2) == (["alpha", "Bravo"], 4)
+        assert self.titles_of(client, sort="title", limit=2, offset=2) == (["charlie", "delta"], 4)
+        assert self.titles_of(client, sort="-title", limit=3) == (["delta", "charlie", "Bravo"], 4)
+
+    def test_sort_by_time_with_paging(self, client, titles):
+        assert self.titles_of(client, sort="created_at", limit=2, offset=1) == (["Bravo", "alpha"], 4)
+        assert self.titles_of(client, sort="-updated_at", limit=1) == (["charlie"], 4)
+
+    def test_filtered_listing_sorts_by_title(self, client, titles):
+        assert self.titles_of(client, sort="title", search="a", limit=2)[0] == ["alpha", "Bravo"]
+        assert self.titles_of(client, sort="-title", max_tokens=10_000, limit=1) == (["delta"], 4)
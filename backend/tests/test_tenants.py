@@ -0,0 +1,163 @@
+"""Tests for tenant namespaces: isolation, tenant selection, quotas and metrics."""
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import create_app
+from app.config import Settings
+from app.indexes import QuotaExceeded, UsageIndex, record_bytes
+from app.models import Prompt
+from app.storage import Storage
+from app.tenants import parse_tenant, strip_tenant_prefix
+
+
+def tenant_client(tmp_path=None, **settings) -> TestClient:
+    config = Settings(tenants_enabled=True, **settings)
+    if tmp_path is not None:
+        config.snapshot_path = str(tmp_path / "snapshot.bin")
+        config.snapshot_on_shutdown = True
+    return TestClient(create_app(config, Storage()))
+
+
+class TestTenantSelection:
+
+    def test_default_when_unnamed(self):
+        assert parse_tenant(None, None) == "default"
+        assert parse_tenant(None, "  ") == "default"
+
+    def test_path_or_header(self):
+        assert parse_tenant("acme", None) == "acme"
+        assert parse_tenant(None, "acme") == "acme"
+        assert parse_tenant("acme", "acme") == "acme"
+
+    def test_conflicting_or_malformed(self):
+        with pytest.raises(ValueError):
+            parse_tenant("acme", "globex")
+        with pytest.raises(ValueError):
+            parse_tenant(None, "../etc")
+
+    def test_strip_prefix(self):
+        assert strip_tenant_prefix("/tenants/acme/prompts") == "/prompts"
+        assert strip_tenant_prefix("/prompts") == "/prompts"
+
+
+class TestUsageIndex:
+
+    def test_counts_utf8_bytes(self):
+        prompt = Prompt(title="ab", content="é", description=None)
+        assert record_bytes(prompt) == 4
+
+    def test_prompt_limit_allows_overwrites(self):
+        usage = UsageIndex()
+        usage.max_prompts = 1
+        usage.admit("a", 10)
+        usage.admit("a", 20)
+        with pytest.raises(QuotaExceeded):
+            usage.admit("b", 1)
+        assert (len(usage), usage.bytes, usage.rejections["prompts"]) == (1, 20, 1)
+
+    def test_byte_limit_allows_shrinking(self):
+        usage = UsageIndex()
+        usage.admit("a", 100)
+        usage.max_bytes = 50
+        usage.admit("a", 80)
+        with pytest.raises(QuotaExceeded):
+            usage.admit("a", 90)
+        usage.remove("a")
+        assert usage.bytes == 0
+
+
+class TestTenantIsolation:
+
+    def test_tenants_see_only_their_prompts(self, sample_prompt_data):
+        client = tenant_client()
+        created = client.post("/tenants/acme/prompts", json=sample_prompt_data).json()
+        client.post("/prompts", json=sample_prompt_data, headers={"X-Tenant-Id": "globex"})
+        client.post("/prompts", json=sample_prompt_data)
+
+        acme = client.get("/prompts", headers={"X-Tenant-Id": "acme"}).json()
+        assert [prompt["id"] for prompt in acme["prompts"]] == [created["id"]]
+        assert client.get("/tenants/globex/prompts").json()["total"] == 1
+        assert client.get("/prompts").json()["total"] == 1
+        assert client.get(f"/tenants/globex/prompts/{created['id']}").status_code == 404
+
+    def test_default_tenant_is_the_application_store(self, sample_prompt_data):
+        store = Storage()
+        client = TestClient(create_app(Settings(tenants_enabled=True), store))
+        client.post("/tenants/default/prompts", json=sample_prompt_data)
+        assert len(store.get_all_prompts()) == 1
+
+    def test_bad_tenant_is_400(self, sample_prompt_data):
+        client = tenant_client()
+        assert client.get("/prompts", headers={"X-Tenant-Id": "a b"}).status_code == 400
+        response = client.get("/tenants/acme/prompts", headers={"X-Tenant-Id": "globex"})
+        assert response.status_code == 400
+
+    def test_header_ignored_when_tenancy_is_off(self, client, sample_prompt_data):
+        client.post("/prompts", json=sample_prompt_data, headers={"X-Tenant-Id": "acme"})
+        assert client.get("/prompts").json()["total"] == 1
+        assert client.get("/tenants/acme/prompts").status_code == 404
+
+    def test_tenant_snapshots_round_trip(self, tmp_path, sample_prompt_data):
+        with tenant_client(tmp_path) as client:
+            client.post("/tenants/acme/prompts", json=sample_prompt_data)
+        assert (tmp_path / "snapshot.bin.acme").exists()
+        with tenant_client(tmp_path) as client:
+            assert client.get("/tenants/acme/prompts").json()["total"] == 1
+            assert client.get("/prompts").json()["total"] == 0
+
+
+class TestTenantAdmission:
+
+    def test_allowlist_rejects_unknown_tenants(self, sample_prompt_data):
+        client = tenant_client(tenant_allowlist=("acme",))
+        assert client.post("/tenants/acme/prompts", json=sample_prompt_data).status_code == 201
+        response = client.get("/prompts", headers={"X-Tenant-Id": "intruder"})
+        assert response.status_code == 404
+        assert client.get("/prompts").status_code == 200
+        assert 'tenant="intruder"' not in client.get("/metrics").text
+
+    def test_tenant_count_is_bounded(self):
+        client = tenant_client(tenant_max_tenants=2)
+        for tenant in ("a", "b"):
+            assert client.get(f"/tenants/{tenant}/prompts").status_code == 200
+        response = client.get("/tenants/c/prompts")
+        assert response.status_code == 403
+        assert "2 tenants" in response.json()["detail"]
+        assert client.get("/tenants/a/prompts").status_code == 200
+        assert len(client.app.state.tenants.items()) == 3
+
+
+class TestTenantQuotas:
+
+    def test_prompt_quota_is_403(self, sample_prompt_data):
+        client = tenant_client(tenant_max_prompts=2)
+        for _ in range(2):
+            assert client.post("/tenants/acme/prompts", json=sample_prompt_data).status_code == 201
+        response = client.post("/tenants/acme/prompts", json=sample_prompt_data)
+        assert response.status_code == 403
+        assert "2 prompts" in response.json()["detail"]
+        assert client.post("/tenants/globex/prompts", json=sample_prompt_data).status_code == 201
+
+    def test_delete_frees_quota(self, sample_prompt_data):
+        client = tenant_client(tenant_max_prompts=1)
+        prompt_id = client.post("/tenants/acme/prompts", json=sample_prompt_data).json()["id"]
+        client.delete(f"/tenants/acme/prompts/{prompt_id}")
+        assert client.post("/tenants/acme/prompts", json=sample_prompt_data).status_code == 201
+
+    def test_byte_quota_applies_to_updates(self, sample_prompt_data):
+        client = tenant_client(tenant_max_bytes=200)
+        prompt_id = client.post("/tenants/acme/prompts", json=sample_prompt_data).json()["id"]
+        response = client.patch(f"/tenants/acme/prompts/{prompt_id}", json={"content": "x" * 500})
+        assert response.status_code == 403
+        assert client.patch(f"/tenants/acme/prompts/{prompt_id}",
+                            json={"content": "Shorter body"}).status_code == 200
+
+    def test_usage_metrics(self, sample_prompt_data):
+        client = tenant_client(tenant_max_prompts=1)
+        client.post("/tenants/acme/prompts", json=sample_prompt_data)
+        client.post("/tenants/acme/prompts", json=sample_prompt_data)
+        text = client.get("/metrics").text
+        assert 'promptlab_tenant_prompts{tenant="acme"} 1' in text
+        assert 'promptlab_tenant_quota_rejections_total{tenant="acme",quota="prompts"} 1' in text
+        assert 'promptlab_tenant_requests_total{tenant="acme"}' in text
@@ -0,0 +1,69 @@
+"""Tests for the trusted construction and response paths of the prompt endpoints."""
+
+from fastapi.encoders import jsonable_encoder
+
+import app.storage as storage_module
+from app.models import Prompt
+from app.storage import storage
+
+
+class TestTrustedResponses:
+
+    def test_stored_prompt_serializes_like_the_response_model(self, client, sample_prompt_data):
+        created = client.post("/prompts", json={**sample_prompt_data, "tags": ["ünï"]})
+        assert created.status_code == 201
+        assert created.headers["content-type"] == "application/json"
+        stored = storage.get_prompt(created.json()["id"])
+        expected = jsonable_encoder(Prompt.model_validate(stored.model_dump()))
+        assert created.json() == expected
+        assert client.get(f"/prompts/{stored.id}").json() == expected
+        assert client.get("/prompts").json() == {"prompts": [expected], "total": 1}
+
+    def test_etag_survives_the_fast_path(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        assert client.get(f"/prompts/{prompt_id}").headers["etag"] == '"1"'
+        patched = client.patch(f"/prompts/{prompt_id}", json={"title": "New"})
+        assert patched.headers["etag"] == '"2"'
+        replaced = client.put(f"/prompts/{prompt_id}", json=sample_prompt_data)
+        assert replaced.headers["etag"] == '"3"'
+
+
+class TestTrustedPatch:
+
+    def test_merge_keeps_unsent_fields(self, client, sample_prompt_data):
+        created = client.post("/prompts", json={**sample_prompt_data, "tags": ["a"]}).json()
+        patched = client.patch(f"/prompts/{created['id']}", json={"tags": ["b"]}).json()
+        assert patched["tags"] == ["b"]
+        for field in ("title", "content", "description", "created_at"):
+            assert patched[field] == created[field]
+        assert patched["updated_at"] >= created["updated_at"]
+
+    def test_sent_fields_are_still_validated(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        assert client.patch(f"/prompts/{prompt_id}", json={"title": ""}).status_code == 422
+        assert client.patch(f"/prompts/{prompt_id}", json={"title": "x" * 201}).status_code == 422
+
+    def test_null_for_a_required_field_is_422(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        for field in ("title", "content", "tags"):
+            response = client.patch(f"/prompts/{prompt_id}", json={field: None})
+            assert response.status_code == 422
+        assert client.get(f"/prompts/{prompt_id}").json()["title"] == sample_prompt_data["title"]
+
+    def test_null_description_clears_it(self, client, sample_prompt_data):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        response = client.patch(f"/prompts/{prompt_id}", json={"description": None})
+        assert response.status_code == 200
+        assert response.json()["description"] is None
+
+    def test_metadata_patch_reuses_the_content_signature(self, client, sample_prompt_data,
+                                                         monkeypatch):
+        prompt_id = client.post("/prompts", json=sample_prompt_data).json()["id"]
+        calls = []
+        original = storage_module.signature
+        monkeypatch.setattr(storage_module, "signature",
+                            lambda content: calls.append(content) or original(content))
+        client.patch(f"/prompts/{prompt_id}", json={"title": "Renamed"})
+        assert calls == []
+        client.patch(f"/prompts/{prompt_id}", json={"content": "Entirely new body text"})
+        assert calls == ["Entirely new body text"]
@@ -0,0 +1,91 @@
+"""Tests for the template variable index, GET /variables and GET /prompts?variable=."""
+
+import random
+
+from app.columns import PromptColumns
+from app.models import Prompt
+from app.storage import Storage
+
+
+def make_prompt(prompt_id, variables=(), tags=()):
+    return Prompt(id=prompt_id, title=prompt_id, content="Body", tags=list(tags),
+                  variables=list(variables))
+
+
+class TestVariableIndex:
+
+    def test_rewrites_move_rows_between_variables(self):
+        columns = PromptColumns()
+        columns.upsert(make_prompt("a", ["x", "y"]))
+        columns.upsert(make_prompt("b", ["x"]))
+        columns.upsert(make_prompt("a", ["z"]))
+        assert columns.variable_counts() == {"x": 1, "z": 1}
+        columns.remove("b")
+        assert columns.variable_counts() == {"z": 1}
+        assert columns.select(variable="x").ordered_ids() == []
+
+    def test_matches_a_linear_scan(self):
+        rng = random.Random(5)
+        columns = PromptColumns()
+        live = {}
+        for _ in range(5000):
+            prompt_id = f"p{rng.randrange(800)}"
+            if rng.random() < 0.1:
+                columns.remove(prompt_id)
+                live.pop(prompt_id, None)
+                continue
+            prompt = make_prompt(prompt_id, rng.sample("abcdef", rng.randrange(3)),
+                                 rng.sample("tu", rng.randrange(2)))
+            columns.upsert(prompt)
+            live[prompt_id] = prompt
+        for name in "abcdef":
+            expected = {pid for pid, prompt in live.items() if name in prompt.variables}
+            assert set(columns.select(variable=name).ordered_ids()) == expected
+            both = {pid for pid in expected if "t" in live[pid].tags}
+            assert set(columns.select(variable=name, tag="t").ordered_ids()) == both
+
+    def test_rebuild_indexes_variables(self):
+        columns = PromptColumns()
+        columns.rebuild([make_prompt("a", ["x"]), make_prompt("b", ["x", "y"])])
+        assert columns.variable_counts() == {"x": 2, "y": 1}
+
+    def test_storage_uses_derived_variables(self):
+        storage = Storage()
+        prompt = storage.create_prompt(Prompt(title="T", content="Dear {{customer_name}}"))
+        assert storage.variable_counts() == {"customer_name": 1}
+        storage.update_prompt(prompt.id, prompt.model_copy(update={"content": "Dear {{name}}"}))
+        assert storage.variable_counts() == {"name": 1}
+
+
+class TestVariablesApi:
+
+    def seed(self, client, sample_prompt_data):
+        ids = []
+        for content in ("Hi {{customer_name}}", "Bye {{customer_name}} from {{agent}}",
+                        "No variables"):
+            ids.append(client.post("/prompts", json={**sample_prompt_data,
+                                                     "content": content}).json()["id"])
+        return ids
+
+    def test_counts_most_used_first(self, client, sample_prompt_data):
+        self.seed(client, sample_prompt_data)
+        body = client.get("/variables").json()
+        assert body == {"variables": [{"name": "customer_name", "prompt_count": 2},
+                                      {"name": "agent", "prompt_count": 1}],
+                        "total": 2}
+
+    def test_prompts_by_variable(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        body = client.get("/prompts?variable=customer_name").json()
+        assert body["total"] == 2
+        assert [prompt["id"] for prompt in body["prompts"]] == [ids[1], ids[0]]
+        assert client.get("/prompts?variable=missing").json()["total"] == 0
+
+    def test_deleted_prompts_leave_the_index(self, client, sample_prompt_data):
+        ids = self.seed(client, sample_prompt_data)
+        client.delete(f"/prompts/{ids[1]}")
+        assert client.get("/variables").json()["variables"] == [
+            {"name": "customer_name", "prompt_count": 1}]
+
+    def test_empty_store(self, client):
+        assert client.get("/variables").json() == {"variables": [], "total": 0}